@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Přidá do Transaction tabulky plátcovství DPH protistrany (doplňuje ho ARES na pozadí)
+"""
+import asyncio
+import sys
+import os
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.database.connection import init_database, db_manager
+from sqlalchemy import text
+
+async def add_counterparty_vat_payer_field():
+    """Přidá column counterparty_vat_payer"""
+    
+    # Inicializuj databázi
+    await init_database()
+    
+    print("🔧 PŘIDÁVÁNÍ COUNTERPARTY_VAT_PAYER")
+    print("=" * 50)
+    
+    statement = "ALTER TABLE transactions ADD COLUMN counterparty_vat_payer BOOLEAN"
+    async with db_manager.get_session() as db:
+        try:
+            await db.execute(text(statement))
+            await db.commit()
+            print(f"✅ {statement}")
+        except Exception as e:
+            if "already exists" in str(e) or "duplicate column" in str(e):
+                print(f"⏭️  Column already exists: {statement}")
+            else:
+                print(f"❌ Error: {statement} - {e}")
+        
+    # Uzavři databázové spojení
+    from app.database.connection import close_database
+    await close_database()
+
+if __name__ == "__main__":
+    asyncio.run(add_counterparty_vat_payer_field())
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Připraví VatRecord na průběžné součty DPH: unikátní index na období
+a naplnění součtů z existujících transakcí
+"""
+import asyncio
+import sys
+import os
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.database.connection import init_database, db_manager
+from app.services.vat_period import reconcile_vat_totals
+from sqlalchemy import text
+
+async def add_vat_running_totals():
+    """Unikátní ix_vat_records_user_period a backfill součtů"""
+    
+    # Inicializuj databázi
+    await init_database()
+    
+    print("🔧 PRŮBĚŽNÉ SOUČTY DPH")
+    print("=" * 50)
+    
+    statements = [
+        "DROP INDEX IF EXISTS ix_vat_records_user_period",
+        "CREATE UNIQUE INDEX ix_vat_records_user_period ON vat_records (user_id, period_year, period_month)",
+    ]
+    async with db_manager.get_session() as db:
+        for statement in statements:
+            try:
+                await db.execute(text(statement))
+                await db.commit()
+                print(f"✅ {statement}")
+            except Exception as e:
+                await db.rollback()
+                print(f"❌ Error: {statement} - {e}")
+                print("   Nejdřív slučte duplicitní řádky vat_records pro stejné období")
+                return
+        
+        drift = await reconcile_vat_totals(db, fix=True)
+        periods = {(d['user_id'], d['year'], d['month']) for d in drift}
+        print(f"✅ Součty DPH naplněny pro {len(periods)} období")
+        
+    # Uzavři databázové spojení
+    from app.database.connection import close_database
+    await close_database()
+
+if __name__ == "__main__":
+    asyncio.run(add_vat_running_totals())
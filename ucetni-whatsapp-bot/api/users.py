@@ -12,13 +12,14 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app.database.connection import get_database_session, engine
 from app.database.models import User, Payment, Transaction, UserSettings
+from utils.money import Money
 
 app = Flask(__name__)
 
 class DecimalEncoder(json.JSONEncoder):
     """JSON encoder for handling Decimal objects"""
     def default(self, obj):
-        if isinstance(obj, Decimal):
+        if isinstance(obj, (Decimal, Money)):
             return float(obj)
         if isinstance(obj, datetime):
             return obj.isoformat()
@@ -7,7 +7,8 @@ from decimal import Decimal
 import logging
 from datetime import datetime, date
 from utils.currency_converter import CurrencyConverter
-from utils.ares_validator import AresValidator
+from app.services.exchange_rates import exchange_rate_service
+from app.services.rate_history import rate_history
 from dataclasses import dataclass
 
 logger = logging.getLogger(__name__)
@@ -50,8 +51,7 @@ class AIProcessor:
             self.client = Groq(api_key=self.api_key)
         
         # Inicializace služeb
-        self.currency_converter = CurrencyConverter()
-        self.ares_validator = AresValidator()
+        self.currency_converter = CurrencyConverter(exchange_rate_service, rate_history)
         
         self.expense_categories = {
             "501100": {"name": "Spotřeba materiálu", "keywords": ["materiál", "papír", "toner", "kancelářské potřeby", "psací potřeby", "složky", "šanony"]},
@@ -134,23 +134,49 @@ class AIProcessor:
         description = self._extract_description(message, float(amount))
         
         # Převod na CZK pro uložení
-        try:
-            amount_czk = self.currency_converter.convert_to_czk(amount, currency) if currency != 'CZK' else amount
-        except ValueError:
-            # Pokud se nepodaří převést, použijeme původní částku jako CZK
-            amount_czk = amount
-            currency = 'CZK'
+        conversion = self._convert_currency(amount, currency)
         
         return {
             'type': trans_type,
-            'amount': float(amount_czk),  # CZK pro kompatibilitu
+            'amount': conversion['amount'],  # CZK pro kompatibilitu
             'original_amount': float(amount),  # Původní částka
-            'original_currency': currency,
-            'exchange_rate': float(self.currency_converter.get_rate(currency)) if currency != 'CZK' else 1.0,
+            'original_currency': conversion['original_currency'],
+            'exchange_rate': conversion['exchange_rate'],
+            'conversion_date': conversion['conversion_date'],
             'description': description,
             'original_message': message,
             'original_text': original_text
         }
+    
+    def _convert_currency(self, amount: Decimal, currency: str, on_date: Optional[date] = None) -> Dict[str, Any]:
+        """
+        Přepočet na CZK kurzem ČNB ke dni dokladu (bez data k dnešku)
+        
+        Returns:
+            Dict s amount (CZK), original_currency, exchange_rate a conversion_date
+        """
+        on_date = on_date or date.today()
+        if currency != 'CZK':
+            try:
+                rate, _ = self.currency_converter.rate_on(currency, on_date)
+                if rate is None:
+                    raise ValueError(f"Neznámá měna: {currency}")
+                return {
+                    'amount': float(self.currency_converter.convert_to_czk(amount, currency, on_date)),
+                    'original_currency': currency,
+                    'exchange_rate': float(rate),
+                    'conversion_date': datetime.combine(on_date, datetime.min.time())
+                }
+            except ValueError:
+                # Pokud se nepodaří převést, použijeme původní částku jako CZK
+                pass
+        
+        return {
+            'amount': float(amount),
+            'original_currency': 'CZK',
+            'exchange_rate': 1.0,
+            'conversion_date': None
+        }
 
     def _extract_description(self, message: str, amount: float) -> str:
         description = re.sub(r'\d+[\s\d]*\s*(?:kč|czk|korun)?', '', message, flags=re.IGNORECASE)
@@ -289,18 +315,11 @@ Vrať pouze JSON bez dalšího textu:
             currency = data.get('currency', 'CZK')
             original_amount = Decimal(str(data['amount']))
             
-            try:
-                amount_czk = self.currency_converter.convert_to_czk(original_amount, currency) if currency != 'CZK' else original_amount
-            except ValueError:
-                # Pokud se nepodaří převést, použijeme původní částku jako CZK
-                amount_czk = original_amount
-                currency = 'CZK'
+            conversion = self._convert_currency(original_amount, currency)
             
             data['original_message'] = original_message
             data['original_amount'] = float(original_amount)
-            data['original_currency'] = currency
-            data['exchange_rate'] = float(self.currency_converter.get_rate(currency)) if currency != 'CZK' else 1.0
-            data['amount'] = float(amount_czk)  # Převedeno na CZK
+            data.update(conversion)  # amount převedeno na CZK
             
             if 'category' not in data:
                 if data['type'] == 'expense':
@@ -431,7 +450,7 @@ DŮLEŽITÉ:
 - Pokud není jasné, použij null
 - Vrať pouze validní JSON!"""
 
-    async def _call_groq_api_enhanced(self, prompt: str) -> Optional[str]:
+    async def _call_groq_api_enhanced(self, prompt: str, max_tokens: int = 1000) -> Optional[str]:
         """
         Volání Groq API s rozšířenými parametry pro složitější parsování
         """
@@ -446,7 +465,7 @@ DŮLEŽITÉ:
                     {"role": "user", "content": prompt}
                 ],
                 temperature=0.1,  # Nižší teplota pro přesnější výsledky
-                max_tokens=1000   # Více tokenů pro komplexní odpovědi
+                max_tokens=max_tokens   # Více tokenů pro komplexní odpovědi
             )
             
             return response.choices[0].message.content
@@ -455,6 +474,106 @@ DŮLEŽITÉ:
             logger.error(f"Groq API enhanced chyba: {str(e)}")
             return None
 
+    async def process_missing_fields(self, ocr_text: str, missing: List[str],
+                                     known: Dict[str, Any] = None) -> Optional[Dict[str, Any]]:
+        """
+        Doplní z OCR textu jen pole, která pravidlová extrakce nenašla
+
+        Args:
+            ocr_text: text účtenky (případně se zprávou uživatele)
+            missing: pole k doplnění (amount, date, ico, vendor, category, description)
+            known: už spolehlivě nalezené hodnoty, AI je jen převezme jako kontext
+
+        Returns:
+            Dict jen s doplněnými poli (klíče jako u OCR extrakce) nebo None
+        """
+        if not self.client or not missing:
+            return None
+
+        try:
+            prompt = self._create_missing_fields_prompt(ocr_text, missing, known or {})
+            # Krátká odpověď - plochý JSON s několika klíči
+            response = await self._call_groq_api_enhanced(prompt, max_tokens=40 + 30 * len(missing))
+            if response:
+                return self._parse_missing_fields_response(response, missing)
+            return None
+
+        except Exception as e:
+            logger.error(f"Chyba při doplňování polí z OCR: {str(e)}")
+            return None
+
+    def _create_missing_fields_prompt(self, text: str, missing: List[str], known: Dict[str, Any]) -> str:
+        """
+        Zkrácený prompt - popíše jen chybějící pole, známé hodnoty pošle jako kontext
+        """
+        field_hints = {
+            'amount': '"amount": celková částka k úhradě v Kč (číslo)',
+            'date': '"date": datum vystavení YYYY-MM-DD',
+            'ico': '"ico": IČO prodejce, 8 číslic',
+            'vendor': '"vendor": název prodejce',
+            'category': '"category": kód kategorie (501100 materiál, 501300 PHM, 501400 drobný majetek, '
+                        '512100 cestovné, 513100 reprezentace, 518300 software, 518900 ostatní služby, '
+                        '549100 ostatní)',
+            'description': '"description": stručný popis nákupu (max 50 znaků)',
+        }
+        fields = "\n".join(f"- {field_hints[name]}" for name in missing if name in field_hints)
+        known_values = ", ".join(
+            f"{name}={known[name]}" for name in ('total', 'date', 'ico', 'vendor') if known.get(name)
+        )
+
+        return f"""Z OCR textu účtenky doplň POUZE tato pole:
+{fields}
+
+Už známe: {known_values or 'nic'}
+
+TEXT: {text}
+
+Vrať pouze plochý JSON s uvedenými klíči, null pro nenalezené."""
+
+    def _parse_missing_fields_response(self, response: str, missing: List[str]) -> Optional[Dict[str, Any]]:
+        """
+        Parsuje odpověď zkráceného promptu, nevyžádané klíče zahodí
+        """
+        try:
+            response = response.strip()
+            if response.startswith('```json'):
+                response = response[7:]
+            if response.endswith('```'):
+                response = response[:-3]
+
+            data = json.loads(response)
+            if not isinstance(data, dict):
+                return None
+
+            result = {}
+            if 'amount' in missing and data.get('amount'):
+                amount = float(str(data['amount']).replace(',', '.'))
+                if amount > 0:
+                    result['amount'] = amount
+            if 'date' in missing:
+                parsed_date = self._parse_date(data.get('date'))
+                if parsed_date:
+                    result['date'] = parsed_date.isoformat()
+            if 'ico' in missing and self._validate_ico(data.get('ico')):
+                result['ico'] = self._validate_ico(data['ico'])
+            if 'vendor' in missing and data.get('vendor'):
+                result['vendor'] = str(data['vendor'])[:100]
+            if 'category' in missing and data.get('category') in self.expense_categories:
+                result['category'] = data['category']
+                result['category_name'] = self.expense_categories[data['category']]['name']
+            if 'description' in missing and data.get('description'):
+                result['description'] = str(data['description'])[:50]
+
+            if not result:
+                return None
+            result['ai_confidence'] = 0.8
+            result['ai_model_used'] = 'llama-3.1-8b-instant'
+            return result
+
+        except (json.JSONDecodeError, ValueError, TypeError) as e:
+            logger.error(f"Chyba při parsování doplněných polí: {str(e)}")
+            return None
+
     def _parse_enhanced_ai_response(self, response: str, original_text: str) -> Optional[Dict[str, Any]]:
         """
         Parsuje rozšířenou AI odpověď s podporou všech nových polí
@@ -481,20 +600,20 @@ DŮLEŽITÉ:
             currency = data.get('currency', 'CZK')
             original_amount = Decimal(str(data['amount']))
             
-            try:
-                amount_czk = self.currency_converter.convert_to_czk(original_amount, currency) if currency != 'CZK' else original_amount
-            except ValueError:
-                amount_czk = original_amount
-                currency = 'CZK'
+            # Kurz ke dni dokladu, bez data dokladu k dnešku
+            doc_info = data.get('document_info') or {}
+            document_date = self._parse_date(doc_info.get('document_date'))
+            conversion = self._convert_currency(original_amount, currency, document_date)
             
             # Sestavení základních dat
             result = {
                 'original_message': original_text,
                 'type': data['type'],
-                'amount': float(amount_czk),
+                'amount': conversion['amount'],
                 'original_amount': float(original_amount),
-                'original_currency': currency,
-                'exchange_rate': float(self.currency_converter.get_rate(currency)) if currency != 'CZK' else 1.0,
+                'original_currency': conversion['original_currency'],
+                'exchange_rate': conversion['exchange_rate'],
+                'conversion_date': conversion['conversion_date'],
                 'description': data.get('description', ''),
                 'category': data.get('category', '549100' if data['type'] == 'expense' else '648100'),
                 'category_name': data.get('category_name', 'Ostatní'),
@@ -522,15 +641,7 @@ DŮLEŽITÉ:
                     'counterparty_dic': cp.get('dic'),
                     'counterparty_address': cp.get('address')
                 })
-                
-                # Validace IČO přes ARES
-                if result.get('counterparty_ico'):
-                    try:
-                        ares_data = self.ares_validator.validate_ico(result['counterparty_ico'])
-                        if ares_data and not result.get('counterparty_name'):
-                            result['counterparty_name'] = ares_data.get('obchodni_firma', '')
-                    except Exception as e:
-                        logger.warning(f"ARES validace selhala: {str(e)}")
+                # Název, DIČ a adresu z ARES doplní counterparty_enricher po uložení
             
             # Platební údaje  
             if 'payment_info' in data and data['payment_info']:
@@ -7,7 +7,11 @@ from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy import text
 from contextlib import asynccontextmanager
 
+from utils.money import json_dumps
+
 from .models import Base
+from .money_columns import check_money_columns
+from .vat_totals import VatTotalsSession
 
 logger = logging.getLogger(__name__)
 
@@ -19,6 +23,11 @@ class DatabaseManager:
         self.async_session_maker = None
         self._initialized = False
     
+    @property
+    def is_initialized(self) -> bool:
+        """Bylo už připojení inicializováno (initialize())?"""
+        return self._initialized
+    
     def initialize(self, database_url: str = None):
         """Inicializuje databázové připojení"""
         if self._initialized:
@@ -43,6 +52,7 @@ class DatabaseManager:
             engine_kwargs = {
                 "echo": False,  # Set to True for SQL logging in development
                 "future": True,
+                "json_serializer": json_dumps,  # JSON sloupce můžou obsahovat Money
             }
             
             if database_url.startswith('sqlite'):
@@ -78,6 +88,7 @@ class DatabaseManager:
             self.async_session_maker = async_sessionmaker(
                 bind=self.engine,
                 class_=AsyncSession,
+                sync_session_class=VatTotalsSession,  # průběžné součty DPH ve VatRecord
                 expire_on_commit=False,
                 autoflush=True,
                 autocommit=False
@@ -192,17 +203,25 @@ async def get_db_session() -> AsyncGenerator[AsyncSession, None]:
         yield session
 
 # Utility funkce pro inicializaci
-async def init_database(database_url: str = None, create_tables: bool = True):
+async def init_database(database_url: str = None, create_tables: bool = True, check_money: bool = True):
     """
     Inicializuje databázi - volá se při startu aplikace
     
     Args:
         database_url: Connection string (pokud None, použije se z ENV)
         create_tables: Zda vytvořit tabulky
+        check_money: Odmítnout start, dokud peněžní sloupce nejsou v haléřích
+            (vypíná jen convert_money_to_halere.py)
+    
+    Raises:
+        MoneyColumnsNotConverted: databáze má peněžní sloupce ještě v korunách
     """
     try:
         db_manager.initialize(database_url)
         
+        if check_money:
+            await check_money_columns(db_manager.engine)
+        
         if create_tables:
             await db_manager.create_tables()
             logger.info("Databáze inicializována a tabulky vytvořeny")
@@ -5,6 +5,8 @@ from sqlalchemy.sql import func
 from datetime import datetime, timedelta
 from decimal import Decimal
 from typing import Optional
+
+from utils.money import MoneyType
 import secrets
 
 Base = declarative_base()
@@ -200,8 +202,8 @@ class Transaction(Base):
     original_message = Column(Text, nullable=False)
     description = Column(String(500))
     
-    # Částky - vždy v CZK pro účetnictví
-    amount_czk = Column(Numeric(12, 2), nullable=False)
+    # Částky - vždy v CZK pro účetnictví (BIGINT haléřů, v Pythonu Money)
+    amount_czk = Column(MoneyType, nullable=False)
     
     # Původní měna (pokud jiná než CZK)
     original_amount = Column(Numeric(12, 2))
@@ -216,8 +218,8 @@ class Transaction(Base):
     
     # DPH informace (pouze pro plátce DPH)
     vat_rate = Column(Integer, default=0)  # 0, 12, 21
-    vat_base = Column(Numeric(12, 2))     # základ daně
-    vat_amount = Column(Numeric(12, 2))   # výše DPH
+    vat_base = Column(MoneyType)     # základ daně
+    vat_amount = Column(MoneyType)   # výše DPH
     vat_included = Column(Boolean, default=False)  # byla DPH už v částce?
     
     # ROZŠÍŘENÉ DOKUMENTAČNÍ FIELDY
@@ -231,6 +233,7 @@ class Transaction(Base):
     counterparty_ico = Column(String(8))     # "27082440" - pouze 8 číslic
     counterparty_dic = Column(String(12))    # "CZ27082440" - DIČ
     counterparty_address = Column(Text)
+    counterparty_vat_payer = Column(Boolean, nullable=True)  # plátce DPH podle ARES, None = neověřeno
     
     # LEGACY fieldy (zachováme pro zpětnou kompatibilitu)
     partner_name = Column(String(200))     # název dodavatele/odběratele
@@ -307,21 +310,21 @@ class VatRecord(Base):
     period_year = Column(Integer, nullable=False)
     
     # Výstupy (uskutečněná zdanitelná plnění)
-    output_base_21 = Column(Numeric(12, 2), default=0)
-    output_vat_21 = Column(Numeric(12, 2), default=0)
-    output_base_12 = Column(Numeric(12, 2), default=0)
-    output_vat_12 = Column(Numeric(12, 2), default=0)
-    output_base_0 = Column(Numeric(12, 2), default=0)
+    output_base_21 = Column(MoneyType, default=0)
+    output_vat_21 = Column(MoneyType, default=0)
+    output_base_12 = Column(MoneyType, default=0)
+    output_vat_12 = Column(MoneyType, default=0)
+    output_base_0 = Column(MoneyType, default=0)
     
     # Vstupy (přijatá zdanitelná plnění)
-    input_base_21 = Column(Numeric(12, 2), default=0)
-    input_vat_21 = Column(Numeric(12, 2), default=0)
-    input_base_12 = Column(Numeric(12, 2), default=0)
-    input_vat_12 = Column(Numeric(12, 2), default=0)
-    input_base_0 = Column(Numeric(12, 2), default=0)
+    input_base_21 = Column(MoneyType, default=0)
+    input_vat_21 = Column(MoneyType, default=0)
+    input_base_12 = Column(MoneyType, default=0)
+    input_vat_12 = Column(MoneyType, default=0)
+    input_base_0 = Column(MoneyType, default=0)
     
     # Výsledek
-    vat_liability = Column(Numeric(12, 2))  # kladné = k zaplacení, záporné = nadměrný odpočet
+    vat_liability = Column(MoneyType)  # kladné = k zaplacení, záporné = nadměrný odpočet
     
     # Stav podání
     filed = Column(Boolean, default=False)
@@ -333,7 +336,7 @@ class VatRecord(Base):
     # Platba
     paid = Column(Boolean, default=False)
     paid_date = Column(DateTime)
-    paid_amount = Column(Numeric(12, 2))
+    paid_amount = Column(MoneyType)
     
     # Timestamps
     created_at = Column(DateTime, default=func.now())
@@ -341,7 +344,7 @@ class VatRecord(Base):
     
     # Indexy
     __table_args__ = (
-        Index('ix_vat_records_user_period', 'user_id', 'period_year', 'period_month'),
+        Index('ix_vat_records_user_period', 'user_id', 'period_year', 'period_month', unique=True),
     )
     
     # Relationships
@@ -372,6 +375,20 @@ class BusinessCategory(Base):
     def __repr__(self):
         return f"<BusinessCategory(type='{self.business_type}', code='{self.category_code}')>"
 
+class AresCacheEntry(Base):
+    """Uložené odpovědi z ARES - sdílená cache pro všechny procesy"""
+    __tablename__ = 'ares_cache'
+
+    source = Column(String(20), primary_key=True)  # klient ARES: 'service', 'validator'
+    ico = Column(String(8), primary_key=True)
+    found = Column(Boolean, nullable=False)         # False = IČO v ARES není (krátké TTL)
+    data = Column(JSON, nullable=False)             # výsledek klienta tak, jak ho vrací
+    fetched_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<AresCacheEntry(source='{self.source}', ico='{self.ico}', found={self.found})>"
+
 class Reminder(Base):
     """Připomínky pro daňové povinnosti"""
     __tablename__ = 'reminders'
@@ -483,16 +500,16 @@ class TransactionItem(Base):
     unit = Column(String(10), default="ks")      # "ks", "hod", "kg", "m"
     
     # Ceny
-    unit_price = Column(Numeric(12, 2))          # Cena za jednotku bez DPH: 45000
-    unit_price_with_vat = Column(Numeric(12, 2)) # Cena za jednotku s DPH: 54450
+    unit_price = Column(MoneyType)          # Cena za jednotku bez DPH: 45000
+    unit_price_with_vat = Column(MoneyType) # Cena za jednotku s DPH: 54450
     
     # DPH pro tuto položku
     vat_rate = Column(Integer, default=21)       # 21%, 12%, 0%
     
     # Vypočítané částky pro tuto položku
-    total_without_vat = Column(Numeric(12, 2))   # quantity * unit_price
-    vat_amount = Column(Numeric(12, 2))          # DPH částka
-    total_with_vat = Column(Numeric(12, 2))      # celkem s DPH
+    total_without_vat = Column(MoneyType)   # quantity * unit_price
+    vat_amount = Column(MoneyType)          # DPH částka
+    total_with_vat = Column(MoneyType)      # celkem s DPH
     
     # Kategorizace specifická pro položku (může se lišit od celkové transakce)
     item_category_code = Column(String(10))      # 501400 (drobný majetek)
@@ -0,0 +1,72 @@
+"""
+Kontrola, že peněžní sloupce jsou převedené na celé haléře
+
+MoneyType čte i zapisuje celé haléře. Nad sloupcem, který je ještě
+NUMERIC(12,2) v korunách, by čtení částky useklo a zápis uložil
+stonásobek (a convert_money_to_halere.py by ho pak vynásobil znovu).
+Proto init_database odmítne start, dokud převod neproběhne.
+
+Sloupec je v pořádku, když je celočíselný (nová databáze, PostgreSQL
+po ALTER TYPE), nebo je zapsaný v money_halere_migrations (SQLite
+typ sloupce nemění).
+"""
+import logging
+from typing import List, Tuple
+
+from sqlalchemy import Integer, inspect, text
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_TABLE = 'money_halere_migrations'
+
+MONEY_COLUMNS = {
+    'transactions': ['amount_czk', 'vat_base', 'vat_amount'],
+    'transaction_items': ['unit_price', 'unit_price_with_vat', 'total_without_vat', 'vat_amount', 'total_with_vat'],
+    'vat_records': [
+        'output_base_21', 'output_vat_21', 'output_base_12', 'output_vat_12', 'output_base_0',
+        'input_base_21', 'input_vat_21', 'input_base_12', 'input_vat_12', 'input_base_0',
+        'vat_liability', 'paid_amount',
+    ],
+}
+
+
+class MoneyColumnsNotConverted(RuntimeError):
+    """Databáze má peněžní sloupce ještě v korunách"""
+
+
+def unconverted_money_columns(sync_conn) -> List[Tuple[str, str]]:
+    """Sloupce (tabulka, sloupec), které jsou ještě v korunách - volá se přes run_sync"""
+    inspector = inspect(sync_conn)
+    tables = set(inspector.get_table_names())
+
+    done = set()
+    if MIGRATIONS_TABLE in tables:
+        done = {
+            (row.table_name, row.column_name)
+            for row in sync_conn.execute(text(f"SELECT table_name, column_name FROM {MIGRATIONS_TABLE}"))
+        }
+
+    pending = []
+    for table, columns in MONEY_COLUMNS.items():
+        if table not in tables:
+            continue  # vytvoří ji create_all rovnou jako BIGINT
+        types = {column['name']: column['type'] for column in inspector.get_columns(table)}
+        for column in columns:
+            if column not in types or isinstance(types[column], Integer) or (table, column) in done:
+                continue
+            pending.append((table, column))
+    return pending
+
+
+async def check_money_columns(engine) -> None:
+    """
+    Raises:
+        MoneyColumnsNotConverted: některý peněžní sloupec ještě není v haléřích
+    """
+    async with engine.connect() as conn:
+        pending = await conn.run_sync(unconverted_money_columns)
+    if pending:
+        columns = ', '.join(f"{table}.{column}" for table, column in pending)
+        raise MoneyColumnsNotConverted(
+            f"Peněžní sloupce nejsou v haléřích ({columns}) - spusťte nejdřív convert_money_to_halere.py"
+        )
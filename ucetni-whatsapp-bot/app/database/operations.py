@@ -9,11 +9,12 @@ from typing import Dict, List, Optional, Any, Tuple
 from datetime import datetime, timedelta
 from decimal import Decimal
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_, or_, text
+from sqlalchemy import select, func, and_, or_, text, case
 from sqlalchemy.orm import selectinload
 
 from .models import User, UserSettings, Transaction, VatRecord, BusinessCategory, Reminder, ExportHistory, BUSINESS_CATEGORIES_DATA
 from .connection import db_manager, get_db_session
+from utils.money import Money, money_sum
 
 logger = logging.getLogger(__name__)
 
@@ -153,7 +154,7 @@ class DatabaseOperations:
                 type=transaction_data['type'],
                 original_message=transaction_data.get('original_message', ''),
                 description=transaction_data.get('description', ''),
-                amount_czk=Decimal(str(transaction_data['amount'])),
+                amount_czk=Money.of(transaction_data['amount']),
                 original_amount=Decimal(str(transaction_data.get('original_amount', transaction_data['amount']))),
                 original_currency=transaction_data.get('original_currency', 'CZK'),
                 exchange_rate=Decimal(str(transaction_data.get('exchange_rate', 1.0))),
@@ -162,8 +163,8 @@ class DatabaseOperations:
                 category_name=transaction_data.get('category_name'),
                 auto_categorized=transaction_data.get('auto_categorized', True),
                 vat_rate=transaction_data.get('vat_rate', 0),
-                vat_base=Decimal(str(transaction_data['vat_base'])) if transaction_data.get('vat_base') else None,
-                vat_amount=Decimal(str(transaction_data['vat_amount'])) if transaction_data.get('vat_amount') else None,
+                vat_base=Money.of(transaction_data['vat_base']) if transaction_data.get('vat_base') else None,
+                vat_amount=Money.of(transaction_data['vat_amount']) if transaction_data.get('vat_amount') else None,
                 vat_included=transaction_data.get('vat_included', False),
                 document_number=transaction_data.get('document_number'),
                 partner_name=transaction_data.get('partner_name'),
@@ -224,12 +225,10 @@ class DatabaseOperations:
             # Get summary stats
             result = await session.execute(
                 select(
-                    func.coalesce(func.sum(
-                        func.case((Transaction.type == 'income', Transaction.amount_czk), else_=0)
-                    ), 0).label('total_income'),
-                    func.coalesce(func.sum(
-                        func.case((Transaction.type == 'expense', Transaction.amount_czk), else_=0)
-                    ), 0).label('total_expenses'),
+                    money_sum(case((Transaction.type == 'income', Transaction.amount_czk), else_=0))
+                    .label('total_income'),
+                    money_sum(case((Transaction.type == 'expense', Transaction.amount_czk), else_=0))
+                    .label('total_expenses'),
                     func.count(Transaction.id).label('transaction_count')
                 )
                 .where(
@@ -249,7 +248,7 @@ class DatabaseOperations:
             result = await session.execute(
                 select(
                     Transaction.category_name,
-                    func.sum(Transaction.amount_czk).label('amount')
+                    money_sum(Transaction.amount_czk).label('amount')
                 )
                 .where(
                     and_(
@@ -287,12 +286,10 @@ class DatabaseOperations:
             # Get summary stats
             result = await session.execute(
                 select(
-                    func.coalesce(func.sum(
-                        func.case((Transaction.type == 'income', Transaction.amount_czk), else_=0)
-                    ), 0).label('total_income'),
-                    func.coalesce(func.sum(
-                        func.case((Transaction.type == 'expense', Transaction.amount_czk), else_=0)
-                    ), 0).label('total_expenses'),
+                    money_sum(case((Transaction.type == 'income', Transaction.amount_czk), else_=0))
+                    .label('total_income'),
+                    money_sum(case((Transaction.type == 'expense', Transaction.amount_czk), else_=0))
+                    .label('total_expenses'),
                     func.count(Transaction.id).label('transaction_count')
                 )
                 .where(
@@ -312,7 +309,7 @@ class DatabaseOperations:
             result = await session.execute(
                 select(
                     Transaction.category_name,
-                    func.sum(Transaction.amount_czk).label('amount')
+                    money_sum(Transaction.amount_czk).label('amount')
                 )
                 .where(
                     and_(
@@ -328,7 +325,7 @@ class DatabaseOperations:
             category_breakdown = result.all()
             
             total_income = float(summary.total_income)
-            vat_estimate = total_income * 0.21 if total_income > 0 else 0
+            vat_estimate = float(summary.total_income * Decimal('0.21')) if total_income > 0 else 0
             
             return {
                 'total_income': total_income,
@@ -447,12 +444,10 @@ class DatabaseOperations:
             result = await session.execute(
                 select(
                     func.count(Transaction.id).label('total_transactions'),
-                    func.coalesce(func.sum(
-                        func.case((Transaction.type == 'income', Transaction.amount_czk), else_=0)
-                    ), 0).label('total_income'),
-                    func.coalesce(func.sum(
-                        func.case((Transaction.type == 'expense', Transaction.amount_czk), else_=0)
-                    ), 0).label('total_expenses'),
+                    money_sum(case((Transaction.type == 'income', Transaction.amount_czk), else_=0))
+                    .label('total_income'),
+                    money_sum(case((Transaction.type == 'expense', Transaction.amount_czk), else_=0))
+                    .label('total_expenses'),
                     func.min(Transaction.created_at).label('first_transaction'),
                     func.max(Transaction.created_at).label('last_transaction')
                 )
@@ -0,0 +1,161 @@
+"""
+Průběžné součty DPH ve VatRecord
+
+Každý flush, který přidá, změní nebo smaže transakci s DPH, přičte
+rozdíl do řádku VatRecord (uživatel, rok, měsíc) - ve stejné databázové
+transakci jako změna samotná, takže souhrn za období je jeden řádek
+a /dph ani export nemusí sčítat transakce. Původní hodnoty se čtou před
+flush, nové až po něm - to už je vyplněné user_id i u transakce
+přiřazené přes vztah (Transaction(user=...)).
+
+Zapisuje se atomickým přičtením haléřů (INSERT ... ON CONFLICT DO UPDATE
+col = col + delta), souběžné zápisy se tak nepřepisují. Hromadné
+UPDATE/DELETE přes session.execute() ORM události obcházejí - takové
+změny dorovná scripts/reconcile_vat_totals.py.
+"""
+import logging
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import event, func, inspect, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from utils.money import Money, ZERO
+from utils.vat_calculator import vat_columns
+from .models import Transaction, VatRecord
+
+logger = logging.getLogger(__name__)
+
+VAT_FIELDS = ('user_id', 'type', 'vat_rate', 'vat_base', 'vat_amount', 'transaction_date')
+PERIOD_KEYS = ('user_id', 'period_year', 'period_month')
+
+PENDING_KEY = 'vat_totals_pending'
+
+PeriodKey = Tuple[int, int, int]   # (user_id, rok, měsíc)
+Deltas = Dict[PeriodKey, Dict[str, Money]]
+
+
+class VatTotalsSession(Session):
+    """Session, která při flush udržuje průběžné součty DPH (sync_session_class pro AsyncSession)"""
+
+
+def _add_contribution(deltas: Deltas, values: Dict[str, Any], sign: int) -> None:
+    when = values['transaction_date']
+    columns = vat_columns(values['type'], values['vat_rate'])
+    if columns is None or when is None:
+        return
+    if values['user_id'] is None:
+        logger.warning("Transakce s DPH bez user_id - součty DPH dorovná rekonciliace")
+        return
+
+    base = Money.of(values['vat_base'])
+    vat = Money.of(values['vat_amount'])
+    if not base and not vat:
+        return
+
+    period = deltas[(values['user_id'], when.year, when.month)]
+    base_column, vat_column = columns
+    period[base_column] = period.get(base_column, ZERO) + base * sign
+    if vat_column:
+        period[vat_column] = period.get(vat_column, ZERO) + vat * sign
+
+
+def collect_deltas(session: Session) -> Deltas:
+    """
+    Odečte původní hodnoty měněných a mazaných transakcí (před flush)
+
+    Nové a změněné transakce si poznamená do session.info, jejich nové
+    hodnoty přičte add_new_values() po flush.
+    """
+    deltas: Deltas = defaultdict(dict)
+    changed: Dict[int, Optional[Transaction]] = {}
+    pending = []
+
+    for obj in session.new:
+        if isinstance(obj, Transaction):
+            if obj.transaction_date is None:
+                # Jinak by ho doplnil až DEFAULT v databázi a období by nebylo známé
+                obj.transaction_date = datetime.now()
+            pending.append(obj)
+
+    for obj in session.dirty:
+        if isinstance(obj, Transaction) and obj.id is not None:
+            attrs = inspect(obj).attrs
+            if any(attrs[field].history.has_changes() for field in VAT_FIELDS + ('user',)):
+                changed[obj.id] = obj
+
+    for obj in session.deleted:
+        if isinstance(obj, Transaction) and obj.id is not None:
+            changed[obj.id] = None
+
+    if changed:
+        # Původní hodnoty z databáze - flush je ještě nezapsal
+        stored = session.connection().execute(
+            select(Transaction.id, *(getattr(Transaction, field) for field in VAT_FIELDS))
+            .where(Transaction.id.in_(changed))
+        )
+        for row in stored:
+            _add_contribution(deltas, {field: getattr(row, field) for field in VAT_FIELDS}, -1)
+            if changed[row.id] is not None:
+                pending.append(changed[row.id])
+
+    session.info[PENDING_KEY] = (deltas, pending)
+    return deltas
+
+
+def add_new_values(session: Session) -> Deltas:
+    """Přičte nové hodnoty transakcí poznamenaných před flush (cizí klíče už jsou vyplněné)"""
+    deltas, pending = session.info.pop(PENDING_KEY, (defaultdict(dict), []))
+    for obj in pending:
+        _add_contribution(deltas, {field: getattr(obj, field) for field in VAT_FIELDS}, +1)
+
+    return {
+        key: {column: delta for column, delta in columns.items() if delta}
+        for key, columns in deltas.items()
+        if any(columns.values())
+    }
+
+
+def apply_deltas(session: Session, deltas: Deltas) -> None:
+    """Přičte rozdíly do VatRecord ve stejné transakci jako flush"""
+    connection = session.connection()
+    table = VatRecord.__table__
+    dialect_insert = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}.get(connection.dialect.name)
+
+    for (user_id, year, month), columns in deltas.items():
+        liability = (sum((delta for column, delta in columns.items() if column.startswith('output_vat')), ZERO)
+                     - sum((delta for column, delta in columns.items() if column.startswith('input_vat')), ZERO))
+        values = dict(columns, vat_liability=liability)
+        increments = {
+            column: func.coalesce(table.c[column], 0) + delta
+            for column, delta in values.items()
+        }
+        increments['updated_at'] = func.now()
+
+        if dialect_insert is not None:
+            stmt = dialect_insert(table).values(user_id=user_id, period_year=year, period_month=month, **values)
+            connection.execute(stmt.on_conflict_do_update(index_elements=list(PERIOD_KEYS), set_=increments))
+            continue
+
+        result = connection.execute(
+            update(table)
+            .where(table.c.user_id == user_id, table.c.period_year == year, table.c.period_month == month)
+            .values(increments)
+        )
+        if result.rowcount == 0:
+            connection.execute(table.insert().values(user_id=user_id, period_year=year, period_month=month, **values))
+
+
+@event.listens_for(VatTotalsSession, 'before_flush')
+def _collect_vat_totals(session: Session, flush_context, instances) -> None:
+    collect_deltas(session)
+
+
+@event.listens_for(VatTotalsSession, 'after_flush')
+def _update_vat_totals(session: Session, flush_context) -> None:
+    deltas = add_new_values(session)
+    if deltas:
+        apply_deltas(session, deltas)
+        logger.debug(f"Součty DPH upraveny pro {len(deltas)} období")
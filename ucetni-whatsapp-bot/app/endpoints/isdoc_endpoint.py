@@ -0,0 +1,83 @@
+"""
+Import ISDOC faktur přes HTTP
+"""
+from fastapi import APIRouter, UploadFile, File, HTTPException, Form, Depends
+from fastapi.responses import JSONResponse
+import logging
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database.connection import get_db_session
+from app.database.models import User
+from app.services.counterparty_enrichment import counterparty_enricher
+from app.services.isdoc_import import import_isdoc
+
+router = APIRouter(prefix="/isdoc", tags=["ISDOC"])
+logger = logging.getLogger(__name__)
+
+ALLOWED_EXTENSIONS = {'isdoc', 'isdocx', 'xml'}
+MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
+
+def allowed_file(filename: str) -> bool:
+    """Check if file extension is allowed"""
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
+@router.post("/import")
+async def import_invoice(
+    user_id: int = Form(...),
+    file: UploadFile = File(...),
+    db: AsyncSession = Depends(get_db_session)
+):
+    """
+    Uloží ISDOC fakturu jako transakci s položkami - bez OCR a AI
+    """
+    if not file.filename or not allowed_file(file.filename):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Nepodporovaný formát souboru. Povolené: {', '.join(sorted(ALLOWED_EXTENSIONS))}"
+        )
+
+    content = await file.read()
+    if len(content) > MAX_FILE_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Soubor je příliš velký. Maximum: {MAX_FILE_SIZE // (1024 * 1024)}MB"
+        )
+
+    user = (await db.execute(select(User).where(User.id == user_id))).scalar_one_or_none()
+    if not user:
+        raise HTTPException(status_code=404, detail="Uživatel nenalezen")
+
+    result = await import_isdoc(db, user_id, content, user_ico=user.ico, file_name=file.filename)
+    if result.get('duplicate'):
+        raise HTTPException(
+            status_code=409,
+            detail={"message": result['message'], "transaction_id": result['duplicate_transaction_id']}
+        )
+    if not result['success']:
+        raise HTTPException(status_code=422, detail={"message": result['message'], "error": result['error']})
+
+    transaction = result['transaction']
+    if transaction['counterparty_ico']:
+        for transaction_id in result['transaction_ids']:
+            counterparty_enricher.schedule(transaction_id)
+    return JSONResponse(content={
+        "success": True,
+        "message": "Faktura byla úspěšně importována",
+        "transaction": {
+            "id": result['transaction_id'],
+            "transaction_ids": result['transaction_ids'],
+            "type": transaction['type'],
+            "description": transaction['description'],
+            "amount": float(transaction['amount_czk']),
+            "currency": transaction['original_currency'],
+            "category": transaction['category_name'],
+            "document_number": transaction['document_number'],
+            "document_date": transaction['document_date'].isoformat() if transaction['document_date'] else None,
+            "due_date": transaction['due_date'].isoformat() if transaction['due_date'] else None,
+            "counterparty": transaction['counterparty_name'],
+            "counterparty_ico": transaction['counterparty_ico'],
+            "vat_amount": float(transaction['vat_amount']) if transaction['vat_amount'] is not None else None,
+            "items_count": result['items_count']
+        }
+    })
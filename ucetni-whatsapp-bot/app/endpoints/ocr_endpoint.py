@@ -7,7 +7,8 @@ from typing import Optional, Dict, Any, List
 import logging
 import io
 import os
-from datetime import datetime
+import asyncio
+from datetime import date, datetime
 
 # OCR dependencies
 try:
@@ -25,6 +26,10 @@ except ImportError as e:
     print(f"WARNING: OCR dependencies not installed: {e}")
 
 from app.ai_processor import AIProcessor
+from app.services.counterparty_enrichment import counterparty_enricher
+from app.services.image_quality import assess_quality
+from app.services.pdf_ingestion import PDF_AVAILABLE, extract_pdf_text, is_pdf, ocr_pool
+from app.services.qr_payment import read_qr_payment
 from app.services.user_service import UserService
 from app.database.models import TransactionAttachment, Transaction, TransactionItem
 from app.database.connection import get_db_session
@@ -38,13 +43,56 @@ ai_processor = AIProcessor()
 user_service = UserService()
 
 # Allowed file types for OCR
-ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'bmp', 'tiff', 'webp'}
+ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'bmp', 'tiff', 'webp', 'pdf'}
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
 
 def allowed_file(filename: str) -> bool:
     """Check if file extension is allowed"""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+async def _pdf_to_text(content: bytes, language: str = 'ces+eng'):
+    """
+    Text PDF - textová vrstva, OCR jen stránek bez ní (paralelně v OCR poolu)
+    
+    Returns:
+        (text, průměrná confidence OCR 0-100, přehled stránek)
+    """
+    if not PDF_AVAILABLE:
+        raise HTTPException(status_code=503, detail="Čtení PDF není dostupné. Chybí pypdfium2.")
+    
+    confidences: List[int] = []
+    
+    def ocr_page(image) -> str:
+        ocr_data = pytesseract.image_to_data(image, lang=language, output_type=pytesseract.Output.DICT)
+        confidences.extend(int(float(conf)) for conf in ocr_data['conf'] if int(float(conf)) > 0)
+        return ' '.join(word for word in ocr_data['text'] if word.strip())
+    
+    loop = asyncio.get_running_loop()
+    pdf_text = await loop.run_in_executor(None, extract_pdf_text, content, ocr_page, ocr_pool)
+    # Textová vrstva je přesná, confidence se počítá jen z OCR stránek
+    avg_confidence = sum(confidences) / len(confidences) if confidences else 100.0
+    return pdf_text.text, avg_confidence, pdf_text.summary()
+
+def _apply_qr_payment(ai_result: Dict[str, Any], qr_payment) -> None:
+    """Hodnoty z QR kódu přepíší údaje přečtené OCR + AI"""
+    if qr_payment.amount and qr_payment.currency == 'CZK':
+        ai_result['amount'] = qr_payment.amount
+        ai_result['original_amount'] = qr_payment.amount
+    overrides = {
+        'bank_account': qr_payment.bank_account,
+        'variable_symbol': qr_payment.variable_symbol,
+        'constant_symbol': qr_payment.constant_symbol,
+        'specific_symbol': qr_payment.specific_symbol,
+        'due_date': date.fromisoformat(qr_payment.due_date) if qr_payment.due_date else None,
+        'document_number': qr_payment.document_number,
+        'document_date': date.fromisoformat(qr_payment.document_date) if qr_payment.document_date else None,
+        'counterparty_ico': qr_payment.ico,
+        'counterparty_dic': qr_payment.dic,
+    }
+    ai_result.update({key: value for key, value in overrides.items() if value is not None})
+    if qr_payment.bank_account and not ai_result.get('payment_method'):
+        ai_result['payment_method'] = 'bankovní_převod'
+
 @router.get("/status")
 async def ocr_status():
     """Check OCR service status"""
@@ -95,21 +143,44 @@ async def process_receipt(
         
         logger.info(f"Processing OCR for user {user_id}, file: {file.filename}")
         
-        # Process image with OCR
-        try:
-            image = Image.open(io.BytesIO(content))
-            
-            # Extract text using Tesseract
-            ocr_text = pytesseract.image_to_string(image, lang='ces+eng')
+        pdf_pages = None
+        if is_pdf(content):
+            # PDF faktura - kontrola kvality fotky a QR se netýkají
+            quality, qr_payment = None, None
+            try:
+                ocr_text, avg_confidence, pdf_pages = await _pdf_to_text(content)
+            except HTTPException:
+                raise
+            except Exception as e:
+                logger.error(f"PDF processing failed: {str(e)}")
+                raise HTTPException(status_code=500, detail=f"Chyba při čtení PDF: {str(e)}")
+        else:
+            # Fast quality gate before the expensive OCR + AI pass
+            quality = assess_quality(content)
+            if not quality.ok:
+                raise HTTPException(
+                    status_code=422,
+                    detail={"message": quality.hint, "quality_issue": quality.issue, "quality": quality.metrics}
+                )
             
-            # Get confidence score
-            ocr_data = pytesseract.image_to_data(image, lang='ces+eng', output_type=pytesseract.Output.DICT)
-            confidences = [int(conf) for conf in ocr_data['conf'] if int(conf) > 0]
-            avg_confidence = sum(confidences) / len(confidences) if confidences else 0
+            # QR Platba / QR Faktura nese přesné platební údaje
+            qr_payment = read_qr_payment(content)
             
-        except Exception as e:
-            logger.error(f"OCR processing failed: {str(e)}")
-            raise HTTPException(status_code=500, detail=f"Chyba při OCR zpracování: {str(e)}")
+            # Process image with OCR
+            try:
+                image = Image.open(io.BytesIO(content))
+                
+                # Extract text using Tesseract
+                ocr_text = pytesseract.image_to_string(image, lang='ces+eng')
+                
+                # Get confidence score
+                ocr_data = pytesseract.image_to_data(image, lang='ces+eng', output_type=pytesseract.Output.DICT)
+                confidences = [int(conf) for conf in ocr_data['conf'] if int(conf) > 0]
+                avg_confidence = sum(confidences) / len(confidences) if confidences else 0
+                
+            except Exception as e:
+                logger.error(f"OCR processing failed: {str(e)}")
+                raise HTTPException(status_code=500, detail=f"Chyba při OCR zpracování: {str(e)}")
         
         if not ocr_text.strip():
             raise HTTPException(status_code=422, detail="Z obrázku se nepodařilo extrahovat žádný text")
@@ -147,6 +218,9 @@ async def process_receipt(
                 }
             })
         
+        if qr_payment:
+            _apply_qr_payment(ai_result, qr_payment)
+        
         # Save transaction and attachment to database
         try:
             # Create transaction
@@ -206,6 +280,11 @@ async def process_receipt(
                 ocr_processed=True,
                 ocr_confidence=avg_confidence / 100.0,  # Convert to 0-1 range
                 ocr_text=ocr_text,
+                ocr_extracted_data={
+                    "quality": quality.metrics if quality else None,
+                    "qr_payment": qr_payment.raw if qr_payment else None,
+                    "pdf_pages": pdf_pages,
+                },
                 ai_processed=True,
                 ai_extracted_data=ai_result,
                 ai_confidence=ai_result.get('ai_confidence', 0.8),
@@ -239,6 +318,9 @@ async def process_receipt(
             
             db.commit()
             
+            if transaction.counterparty_ico:
+                counterparty_enricher.schedule(transaction.id)
+            
             logger.info(f"Successfully processed OCR transaction {transaction.id} for user {user_id}")
             
             # Prepare response
@@ -309,14 +391,17 @@ async def extract_text_only(
                 detail="Soubor je příliš velký"
             )
         
-        # Process with OCR
-        image = Image.open(io.BytesIO(content))
-        ocr_text = pytesseract.image_to_string(image, lang=language)
-        
-        # Get confidence data
-        ocr_data = pytesseract.image_to_data(image, lang=language, output_type=pytesseract.Output.DICT)
-        confidences = [int(conf) for conf in ocr_data['conf'] if int(conf) > 0]
-        avg_confidence = sum(confidences) / len(confidences) if confidences else 0
+        if is_pdf(content):
+            ocr_text, avg_confidence, _ = await _pdf_to_text(content, language)
+        else:
+            # Process with OCR
+            image = Image.open(io.BytesIO(content))
+            ocr_text = pytesseract.image_to_string(image, lang=language)
+            
+            # Get confidence data
+            ocr_data = pytesseract.image_to_data(image, lang=language, output_type=pytesseract.Output.DICT)
+            confidences = [int(conf) for conf in ocr_data['conf'] if int(conf) > 0]
+            avg_confidence = sum(confidences) / len(confidences) if confidences else 0
         
         return JSONResponse(content={
             "success": True,
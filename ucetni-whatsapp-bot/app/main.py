@@ -7,11 +7,13 @@ from sqlalchemy.orm import Session
 from typing import List, Optional
 import os
 from datetime import datetime, timedelta
+from decimal import Decimal
 
 # Import nových modelů a databáze
 from app.database_new import get_db, init_db
 from app.models import User, Transaction, TransactionType, SubscriptionStatus
 from app.core.config import settings
+from utils.money import Money, ZERO, money_sum
 
 # Import služeb
 from app.services.whatsapp import send_whatsapp_message
@@ -177,7 +179,7 @@ async def get_users(
                 "subscription_status": user.subscription_status.value,
                 "vat_payer": user.vat_payer,
                 "total_transactions": user.total_transactions,
-                "current_year_revenue": user.current_year_revenue,
+                "current_year_revenue": float(user.current_year_revenue or 0),
                 "created_at": user.created_at.isoformat()
             }
             for user in users
@@ -208,7 +210,7 @@ async def get_user(user_id: int, db: Session = Depends(get_db)):
         "subscription_plan": user.subscription_plan,
         "subscription_until": user.subscription_until.isoformat() if user.subscription_until else None,
         "total_transactions": user.total_transactions,
-        "current_year_revenue": user.current_year_revenue,
+        "current_year_revenue": float(user.current_year_revenue or 0),
         "created_at": user.created_at.isoformat()
     }
 
@@ -220,15 +222,14 @@ async def get_transaction_stats(db: Session = Depends(get_db)):
     total_transactions = db.query(Transaction).count()
     
     # Příjmy a výdaje
-    income_sum = db.query(Transaction).filter(
+    # Součty v haléřích sečte databáze
+    total_income = db.query(money_sum(Transaction.amount)).filter(
         Transaction.type == TransactionType.INCOME
-    ).with_entities(Transaction.amount).all()
-    total_income = sum(t.amount for t in income_sum)
+    ).scalar()
     
-    expense_sum = db.query(Transaction).filter(
+    total_expenses = db.query(money_sum(Transaction.amount)).filter(
         Transaction.type == TransactionType.EXPENSE
-    ).with_entities(Transaction.amount).all()
-    total_expenses = sum(t.amount for t in expense_sum)
+    ).scalar()
     
     # Aktuální měsíc
     current_month = datetime.now().replace(day=1)
@@ -238,9 +239,9 @@ async def get_transaction_stats(db: Session = Depends(get_db)):
     
     return TransactionStats(
         total_transactions=total_transactions,
-        total_income=total_income,
-        total_expenses=total_expenses,
-        profit=total_income - total_expenses,
+        total_income=float(total_income),
+        total_expenses=float(total_expenses),
+        profit=float(total_income - total_expenses),
         current_month_transactions=current_month_count
     )
 
@@ -291,10 +292,10 @@ async def get_transaction(transaction_id: int, db: Session = Depends(get_db)):
         "id": transaction.id,
         "user_id": transaction.user_id,
         "type": transaction.type.value,
-        "amount": transaction.amount,
-        "vat_amount": transaction.vat_amount,
+        "amount": float(transaction.amount),
+        "vat_amount": float(transaction.vat_amount or 0),
         "vat_rate": transaction.vat_rate,
-        "amount_without_vat": transaction.amount_without_vat,
+        "amount_without_vat": float(transaction.amount_without_vat or 0),
         "description": transaction.description,
         "category": transaction.category,
         "counterparty_name": transaction.counterparty_name,
@@ -319,13 +320,13 @@ async def create_transaction(
     """Vytvoření nové transakce"""
     try:
         # Vypočítej DPH
-        total_amount = transaction_data.amount
+        total_amount = Money.of(transaction_data.amount)
         if transaction_data.vat_rate > 0 and transaction_data.type == TransactionType.EXPENSE:
-            amount_without_vat = total_amount / (1 + transaction_data.vat_rate/100)
+            amount_without_vat = Money.of(total_amount.to_decimal() / (1 + Decimal(transaction_data.vat_rate) / 100))
             vat_amount = total_amount - amount_without_vat
         else:
             amount_without_vat = total_amount
-            vat_amount = 0
+            vat_amount = ZERO
         
         # Vytvoř transakci
         transaction = Transaction(
@@ -351,8 +352,8 @@ async def create_transaction(
         return {
             "message": "Transakce vytvořena",
             "transaction_id": transaction.id,
-            "amount": transaction.amount,
-            "vat_amount": transaction.vat_amount
+            "amount": float(transaction.amount),
+            "vat_amount": float(transaction.vat_amount or 0)
         }
         
     except Exception as e:
@@ -375,17 +376,15 @@ async def get_user_transactions(
     ).order_by(Transaction.created_at.desc()).limit(limit).all()
     
     # Statistiky uživatele
-    income_sum = db.query(Transaction).filter(
+    total_income = db.query(money_sum(Transaction.amount)).filter(
         Transaction.user_id == user_id,
         Transaction.type == TransactionType.INCOME
-    ).with_entities(Transaction.amount).all()
-    total_income = sum(t.amount for t in income_sum)
+    ).scalar()
     
-    expense_sum = db.query(Transaction).filter(
+    total_expenses = db.query(money_sum(Transaction.amount)).filter(
         Transaction.user_id == user_id,
         Transaction.type == TransactionType.EXPENSE
-    ).with_entities(Transaction.amount).all()
-    total_expenses = sum(t.amount for t in expense_sum)
+    ).scalar()
     
     return {
         "user": {
@@ -396,15 +395,15 @@ async def get_user_transactions(
         },
         "stats": {
             "total_transactions": len(transactions),
-            "total_income": total_income,
-            "total_expenses": total_expenses,
-            "profit": total_income - total_expenses
+            "total_income": float(total_income),
+            "total_expenses": float(total_expenses),
+            "profit": float(total_income - total_expenses)
         },
         "transactions": [
             {
                 "id": t.id,
                 "type": t.type.value,
-                "amount": t.amount,
+                "amount": float(t.amount),
                 "description": t.description,
                 "category": t.category,
                 "counterparty_name": t.counterparty_name,
@@ -489,7 +488,7 @@ async def get_demo_data(db: Session = Depends(get_db)):
                 "business_name": user.business_name,
                 "subscription_status": user.subscription_status.value,
                 "total_transactions": len(user.transactions),
-                "current_year_revenue": user.current_year_revenue
+                "current_year_revenue": float(user.current_year_revenue or 0)
             }
             for user in users
         ],
@@ -498,7 +497,7 @@ async def get_demo_data(db: Session = Depends(get_db)):
                 "id": t.id,
                 "user_name": t.user.full_name if t.user else "Neznámý",
                 "type": t.type.value,
-                "amount": t.amount,
+                "amount": float(t.amount),
                 "description": t.description,
                 "counterparty_name": t.counterparty_name,
                 "created_at": t.created_at.isoformat()
@@ -40,6 +40,12 @@ from app.services.activation_service import ActivationService
 from app.services.payment_service import payment_service
 from app.services.smart_ai_processor import SmartAIProcessor
 from app.services.compliance_report_service import ComplianceReportService
+from app.services.pdf_ingestion import PDF_CONTENT_TYPE
+from app.services.isdoc_import import ISDOC_CONTENT_TYPES
+from app.services.ares_cache import ares_cache
+from app.services.counterparty_enrichment import counterparty_enricher
+from app.services.exchange_rates import exchange_rate_service
+from app.services.epo_schema import SCHEMA_FILES, epo_schema_validator
 from app.middleware.trial_check import TrialCheckMiddleware
 from utils.notifications import NotificationManager
 from sqlalchemy.orm import sessionmaker
@@ -139,6 +145,18 @@ async def startup_event():
     smart_ai_processor = SmartAIProcessor()
     compliance_report_service = ComplianceReportService()
     
+    # Kurzy ČNB: uložený lístek je k dispozici hned, nový se stahuje na pozadí
+    exchange_rate_service.start()
+    
+    # XSD schémata EPO se zkompilují předem, první export DPH na ně nečeká
+    epo_schemas = await asyncio.to_thread(epo_schema_validator.preload)
+    if len(epo_schemas) < len(SCHEMA_FILES) and epo_schema_validator.required:
+        api_logger.error("EPO XSD schemas missing, VAT XML export will fail until scripts/fetch_epo_xsd.py is run",
+                         directory=str(epo_schema_validator.directory), loaded=epo_schemas)
+    elif not epo_schemas:
+        api_logger.warning("EPO XSD schemas not found, VAT XML is checked for well-formedness only",
+                           directory=str(epo_schema_validator.directory))
+    
     api_logger.info("Services initialized successfully", 
                    startup_time_seconds=round(time.time() - startup_time, 2))
     
@@ -150,6 +168,10 @@ async def startup_event():
     from app.endpoints.ocr_endpoint import router as ocr_router
     app.include_router(ocr_router)
     
+    # Include ISDOC import router
+    from app.endpoints.isdoc_endpoint import router as isdoc_router
+    app.include_router(isdoc_router)
+    
     # Add simple webhook for testing
     from app.simple_webhook import create_simple_webhook_endpoint
     create_simple_webhook_endpoint(app)
@@ -167,6 +189,7 @@ async def startup_event():
 @app.on_event("shutdown")
 async def shutdown_event():
     api_logger.info("Shutting down ÚčetníBot WhatsApp service")
+    await exchange_rate_service.stop()
     from app.database.connection import close_database
     await close_database()
     api_logger.info("Service shutdown complete")
@@ -269,6 +292,8 @@ async def health_check():
                     "status": "healthy" if db_healthy else "unhealthy",
                     "error": db_error
                 },
+                "ares_cache": ares_cache.stats(),
+                "exchange_rates": exchange_rate_service.stats(),
                 "system": {
                     "cpu_percent": cpu_percent,
                     "memory_percent": memory.percent,
@@ -375,19 +400,21 @@ async def whatsapp_webhook(request: Request):
                         media_url = form_data.get(f'MediaUrl{i}')
                         media_type = form_data.get(f'MediaContentType{i}')
                         
-                        if media_type and media_type.startswith('image/'):
+                        if media_type and (media_type.startswith('image/') or media_type == PDF_CONTENT_TYPE):
                             try:
                                 image_data = await _download_twilio_media(media_url)
                                 from app.services.whatsapp_ocr_service import whatsapp_ocr_service
                                 ocr_result = await whatsapp_ocr_service.process_receipt_from_whatsapp(
-                                    image_data, message_body, user_id
+                                    image_data, message_body, user_id, media_url=media_url
                                 ) if user_id else {'success': False, 'message': 'Uživatel není aktivován'}
                                 
-                                if ocr_result.get('success') and user_id:
-                                    transaction = await _create_transaction_from_ocr(
-                                        user_id, ocr_result, message_body
-                                    )
+                                if ocr_result.get('duplicate'):
+                                    response_text = _format_duplicate_response(ocr_result)
+                                elif ocr_result.get('success') and user_id:
+                                    transaction = await _save_ocr_transaction(user_id, ocr_result, message_body)
                                     response_text = _format_ocr_response(ocr_result, transaction)
+                                elif ocr_result.get('quality_issue'):
+                                    response_text = _format_quality_response(ocr_result)
                                 else:
                                     response_text = f"""📸 {ocr_result.get('message', 'Nepodařilo se zpracovat obrázek')}
 
@@ -401,6 +428,13 @@ async def whatsapp_webhook(request: Request):
                             except Exception as e:
                                 api_logger.error(f"OCR processing failed: {str(e)}")
                                 response_text = "❌ Chyba při zpracování obrázku."
+                        elif media_type in ISDOC_CONTENT_TYPES and user_id:
+                            # ISDOC faktura - strukturovaná data bez OCR a AI
+                            try:
+                                response_text = await _import_isdoc_from_whatsapp(user_id, media_url)
+                            except Exception as e:
+                                api_logger.error(f"ISDOC import failed: {str(e)}")
+                                response_text = "❌ Chyba při importu ISDOC faktury."
                         break
                 elif message_body:
                     # Textové příkazy
@@ -517,7 +551,7 @@ async def whatsapp_webhook(request: Request):
                 
                 api_logger.info(f"Processing media {i}: type={media_type}, url={media_url[:50] if media_url else 'None'}...")
                 
-                if media_type and media_type.startswith('image/'):
+                if media_type and (media_type.startswith('image/') or media_type == PDF_CONTENT_TYPE):
                     try:
                         # Stáhni a zpracuj obrázek
                         image_data = await _download_twilio_media(media_url)
@@ -525,17 +559,21 @@ async def whatsapp_webhook(request: Request):
                         # OCR zpracování pomocí WhatsApp OCR service
                         from app.services.whatsapp_ocr_service import whatsapp_ocr_service
                         ocr_result = await whatsapp_ocr_service.process_receipt_from_whatsapp(
-                            image_data, message_body, user_id if user_id else 0
+                            image_data, message_body, user_id if user_id else 0, media_url=media_url
                         )
                         
-                        if ocr_result.get('success'):
+                        if ocr_result.get('duplicate'):
+                            # Stejná účtenka už byla zpracována - nevytvářej duplicitní transakci
+                            response_text = _format_duplicate_response(ocr_result)
+                        elif ocr_result.get('success'):
                             # Vytvoř transakci z OCR dat
-                            transaction = await _create_transaction_from_ocr(
-                                user_id, ocr_result, message_body
-                            )
+                            transaction = await _save_ocr_transaction(user_id, ocr_result, message_body)
                             
                             # Připrav odpověď
                             response_text = _format_ocr_response(ocr_result, transaction)
+                        elif ocr_result.get('quality_issue'):
+                            # Konkrétní rada z kontroly kvality místo obecných tipů
+                            response_text = _format_quality_response(ocr_result)
                         else:
                             response_text = f"""📸 {ocr_result.get('message', 'Nepodařilo se zpracovat obrázek')}
 
@@ -555,12 +593,21 @@ async def whatsapp_webhook(request: Request):
 "Nákup materiálu 500 Kč"
 
 📞 Nebo kontaktujte podporu pokud problém přetrvává."""
+                
+                elif media_type in ISDOC_CONTENT_TYPES and user_id:
+                    # ISDOC faktura - strukturovaná data bez OCR a AI
+                    try:
+                        response_text = await _import_isdoc_from_whatsapp(user_id, media_url)
+                    except Exception as e:
+                        api_logger.error(f"Chyba při importu ISDOC: {str(e)}")
+                        response_text = "❌ Chyba při importu ISDOC faktury. Zkuste ji poslat znovu."
                         
                 else:
-                    response_text = """📎 Podporuji pouze obrázky účtenek.
+                    response_text = """📎 Podporuji pouze obrázky účtenek, PDF a ISDOC faktury.
 
 📸 **Pošlete prosím:**
 • Fotku účtenky nebo faktury
+• Fakturu v PDF
 • Screenshot e-fakturou
 • Obrázek dokladu
 
@@ -767,6 +814,25 @@ async def _download_twilio_media(media_url: str) -> bytes:
         api_logger.error(f"Chyba při stahování média z Twilio: {str(e)}")
         raise
 
+async def _save_ocr_transaction(user_id: int, ocr_result: dict, original_message: str = ""):
+    """
+    Vytvoří transakci z OCR a zapíše ji k obrázku v cache duplicit
+
+    Když se transakci nepodaří uložit, obrázek se z cache zase odebere -
+    jinak by ho opakované poslání hlásilo jako duplicitu a nešel by uložit.
+    """
+    from app.services.whatsapp_ocr_service import whatsapp_ocr_service
+
+    try:
+        transaction = await _create_transaction_from_ocr(user_id, ocr_result, original_message)
+    except Exception:
+        if user_id:
+            whatsapp_ocr_service.dedup_cache.discard(user_id, ocr_result['image_sha256'])
+        raise
+    if user_id:
+        whatsapp_ocr_service.dedup_cache.set_transaction(user_id, ocr_result['image_sha256'], transaction.id)
+    return transaction
+
 async def _create_transaction_from_ocr(user_id: int, ocr_result: dict, original_message: str = ""):
     """
     Vytvoří transakci z OCR dat
@@ -796,6 +862,11 @@ async def _create_transaction_from_ocr(user_id: int, ocr_result: dict, original_
             # Rozšířené údaje z OCR
             'document_number': ocr_result.get('document_number'),
             'document_date': ocr_result.get('date'),
+            'due_date': ocr_result.get('due_date'),
+            'bank_account': ocr_result.get('bank_account'),
+            'variable_symbol': ocr_result.get('variable_symbol'),
+            'constant_symbol': ocr_result.get('constant_symbol'),
+            'specific_symbol': ocr_result.get('specific_symbol'),
             'counterparty_name': ocr_result.get('vendor') or ocr_result.get('vendor_verified'),
             'counterparty_ico': ocr_result.get('ico'),
             'counterparty_dic': ocr_result.get('dic'),
@@ -803,6 +874,11 @@ async def _create_transaction_from_ocr(user_id: int, ocr_result: dict, original_
             'vat_rate': ocr_result.get('vat_rate', 21),
             'vat_included': True,
             
+            # Podobná účtenka už byla zpracována (pHash) - transakce vznikne, ale k ověření
+            'tags': ['possible_duplicate'] if ocr_result.get('possible_duplicate') else None,
+            'notes': (f"Možná duplicita transakce #{ocr_result['possible_duplicate_transaction_id']}"
+                      if ocr_result.get('possible_duplicate_transaction_id') else None),
+            
             'created_at': datetime.now(),
             'updated_at': datetime.now(),
             'transaction_date': datetime.now()
@@ -840,6 +916,102 @@ async def _create_transaction_from_ocr(user_id: int, ocr_result: dict, original_
         api_logger.error(f"Chyba při vytváření transakce z OCR: {str(e)}")
         raise
 
+def _format_quality_response(ocr_result: dict) -> str:
+    """
+    Odpověď na fotku odmítnutou kontrolou kvality - jen konkrétní rada
+    """
+    return f"""📸 {ocr_result.get('message')}
+
+Pošlete prosím novou fotku, nebo napište údaje ručně: "Alza 1500 Kč\""""
+
+async def _import_isdoc_from_whatsapp(user_id: int, media_url: str) -> str:
+    """
+    ISDOC faktura poslaná jako dokument - uloží transakci s položkami a vrátí odpověď
+    """
+    from app.services.isdoc_import import import_isdoc, is_isdoc
+    from app.database.connection import db_manager
+    from app.database.models import User
+    from sqlalchemy import select
+    
+    data = await _download_twilio_media(media_url)
+    if not is_isdoc(data):
+        return """📎 Tento dokument neumím přečíst.
+
+📸 Pošlete fotku účtenky, fakturu v PDF nebo ISDOC."""
+    
+    async with db_manager.get_session() as db:
+        user = (await db.execute(select(User).where(User.id == user_id))).scalar_one_or_none()
+        result = await import_isdoc(
+            db, user_id, data, user_ico=user.ico if user else None,
+            file_url=media_url, uploaded_via='whatsapp'
+        )
+    if result.get('success') and result['transaction'].get('counterparty_ico'):
+        for transaction_id in result['transaction_ids']:
+            counterparty_enricher.schedule(transaction_id)
+    return _format_isdoc_response(result)
+
+def _format_isdoc_response(result: dict) -> str:
+    """
+    Odpověď po importu ISDOC faktury
+    """
+    if not result.get('success'):
+        return f"⚠️ {result.get('message', 'ISDOC fakturu se nepodařilo uložit.')}"
+    
+    transaction = result['transaction']
+    kind = 'Příjem' if transaction['type'] == 'income' else 'Výdaj'
+    role = 'Odběratel' if transaction['type'] == 'income' else 'Dodavatel'
+    response = f"""✅ **ISDOC faktura uložena!**
+
+📊 **{kind}:**
+💰 Celkem: {transaction['amount_czk']} Kč
+🏢 {role}: {transaction['counterparty_name'] or 'neuvedeno'}"""
+    
+    if transaction.get('counterparty_ico'):
+        response += f"\n🏷️ IČO: {transaction['counterparty_ico']}"
+    if transaction.get('document_number'):
+        response += f"\n📄 Faktura: {transaction['document_number']}"
+    if transaction.get('document_date'):
+        response += f"\n📅 Vystaveno: {transaction['document_date'].strftime('%d.%m.%Y')}"
+    if transaction.get('due_date'):
+        response += f"\n⏰ Splatnost: {transaction['due_date'].strftime('%d.%m.%Y')}"
+    if transaction.get('vat_amount') is not None:
+        response += f"\n🧾 DPH: {transaction['vat_amount']} Kč"
+    
+    response += f"\n📦 Položek: {result['items_count']}"
+    response += f"\n💾 Transakce #{result['transaction_id']}"
+    return response
+
+def _format_duplicate_response(ocr_result: dict) -> str:
+    """
+    Varování při opakovaně poslaném souboru (stejná data nebo MediaUrl) - transakce se znovu nevytváří
+    """
+    amount = ocr_result.get('amount', ocr_result.get('total', 'nerozpoznáno'))
+    vendor = ocr_result.get('vendor_verified') or ocr_result.get('vendor') or 'nerozpoznáno'
+    
+    response = f"""⚠️ **Tuto účtenku jste už posílal(a)**
+
+💰 Celkem: {amount} Kč
+🏢 Obchod: {vendor}"""
+    
+    if ocr_result.get('duplicate_transaction_id'):
+        response += f"\n💾 Uloženo jako transakce #{ocr_result['duplicate_transaction_id']}"
+    
+    response += """
+
+Novou transakci jsem nevytvořil, aby se výdaj nezapočítal dvakrát.
+📝 Pokud jde o jiný nákup, napište údaje ručně: "Alza 1500 Kč\""""
+    return response
+
+def _format_possible_duplicate_warning(ocr_result: dict) -> str:
+    """
+    Upozornění u účtenky podobné dříve poslané - transakce se vytvořila, uživatel ověří
+    """
+    response = "\n\n⚠️ **Možná duplicita:** podobnou účtenku jste už posílal(a)"
+    if ocr_result.get('possible_duplicate_transaction_id'):
+        response += f" (transakce #{ocr_result['possible_duplicate_transaction_id']})"
+    response += ".\nPokud jde o stejný nákup, jednu z transakcí smažte, aby se výdaj nezapočítal dvakrát."
+    return response
+
 def _format_ocr_response(ocr_result: dict, transaction) -> str:
     """
     Formátuje odpověď z OCR zpracování pro WhatsApp
@@ -872,6 +1044,14 @@ def _format_ocr_response(ocr_result: dict, transaction) -> str:
         if ocr_result.get('document_number'):
             response += f"\n📄 Doklad: {ocr_result['document_number']}"
         
+        # Platební údaje z QR Platby
+        if ocr_result.get('bank_account'):
+            response += f"\n🏦 Účet: {ocr_result['bank_account']}"
+        if ocr_result.get('variable_symbol'):
+            response += f"\n🔢 VS: {ocr_result['variable_symbol']}"
+        if ocr_result.get('due_date'):
+            response += f"\n⏰ Splatnost: {ocr_result['due_date']}"
+        
         # Položky (max 5)
         items = ocr_result.get('items', [])
         if items:
@@ -899,6 +1079,9 @@ def _format_ocr_response(ocr_result: dict, transaction) -> str:
         
         if ocr_result.get('ai_processed'):
             response += "\n🤖 Zpracováno pomocí AI"
+        
+        if ocr_result.get('possible_duplicate'):
+            response += _format_possible_duplicate_warning(ocr_result)
             
         return response
         
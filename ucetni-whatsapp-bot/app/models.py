@@ -1,9 +1,11 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, Date, ForeignKey, JSON, Text, Enum
+from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, Date, ForeignKey, JSON, Text, Enum, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
 import enum
 
+from utils.money import MoneyType
+
 Base = declarative_base()
 
 class SubscriptionStatus(enum.Enum):
@@ -61,8 +63,8 @@ class User(Base):
     stripe_subscription_id = Column(String(255), unique=True, nullable=True)
     
     # Statistiky
-    current_year_revenue = Column(Float, default=0)
-    last_12_months_revenue = Column(Float, default=0)
+    current_year_revenue = Column(MoneyType, default=0)
+    last_12_months_revenue = Column(MoneyType, default=0)
     total_transactions = Column(Integer, default=0)
     
     # Nastavení
@@ -90,10 +92,10 @@ class Transaction(Base):
     
     # Základní údaje
     type = Column(Enum(TransactionType), nullable=False)
-    amount = Column(Float, nullable=False)
-    vat_amount = Column(Float, default=0)
+    amount = Column(MoneyType, nullable=False)
+    vat_amount = Column(MoneyType, default=0)
     vat_rate = Column(Integer, default=21)
-    amount_without_vat = Column(Float)
+    amount_without_vat = Column(MoneyType)
     
     # Popis
     description = Column(Text)
@@ -142,11 +144,11 @@ class TransactionItem(Base):
     description = Column(String(255), nullable=False)
     quantity = Column(Float, default=1)
     unit = Column(String(20), default="ks")
-    unit_price = Column(Float, nullable=False)
+    unit_price = Column(MoneyType, nullable=False)
     vat_rate = Column(Integer, default=21)
-    total_without_vat = Column(Float)
-    vat_amount = Column(Float)
-    total_with_vat = Column(Float)
+    total_without_vat = Column(MoneyType)
+    vat_amount = Column(MoneyType)
+    total_with_vat = Column(MoneyType)
 
 class Attachment(Base):
     """Přílohy (účtenky, faktury)"""
@@ -212,30 +214,35 @@ class VatRecord(Base):
     period_quarter = Column(Integer)
     
     # DPH vstupy (nákupy)
-    input_vat_base_21 = Column(Float, default=0)
-    input_vat_21 = Column(Float, default=0)
-    input_vat_base_12 = Column(Float, default=0)
-    input_vat_12 = Column(Float, default=0)
-    input_vat_base_10 = Column(Float, default=0)
-    input_vat_10 = Column(Float, default=0)
+    input_vat_base_21 = Column(MoneyType, default=0)
+    input_vat_21 = Column(MoneyType, default=0)
+    input_vat_base_12 = Column(MoneyType, default=0)
+    input_vat_12 = Column(MoneyType, default=0)
+    input_vat_base_10 = Column(MoneyType, default=0)
+    input_vat_10 = Column(MoneyType, default=0)
     
     # DPH výstupy (prodeje)
-    output_vat_base_21 = Column(Float, default=0)
-    output_vat_21 = Column(Float, default=0)
-    output_vat_base_12 = Column(Float, default=0)
-    output_vat_12 = Column(Float, default=0)
-    output_vat_base_10 = Column(Float, default=0)
-    output_vat_10 = Column(Float, default=0)
+    output_vat_base_21 = Column(MoneyType, default=0)
+    output_vat_21 = Column(MoneyType, default=0)
+    output_vat_base_12 = Column(MoneyType, default=0)
+    output_vat_12 = Column(MoneyType, default=0)
+    output_vat_base_10 = Column(MoneyType, default=0)
+    output_vat_10 = Column(MoneyType, default=0)
     
     # Výsledek
-    vat_liability = Column(Float)  # K úhradě
-    vat_refund = Column(Float)  # Nadměrný odpočet
+    vat_liability = Column(MoneyType)  # K úhradě
+    vat_refund = Column(MoneyType)  # Nadměrný odpočet
     
     # Status
     is_submitted = Column(Boolean, default=False)
     submitted_at = Column(DateTime)
     
     created_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        # Jeden řádek na období - na něm stojí ON CONFLICT průběžných součtů
+        Index('ix_vat_records_user_period', 'user_id', 'period_year', 'period_month', unique=True),
+    )
 
 class Payment(Base):
     """Platby za předplatné"""
@@ -4,6 +4,9 @@ from datetime import datetime, timedelta
 import logging
 import asyncio
 from utils.ares_validator import validate_ico
+from app.services.ares_cache import ares_cache
+from app.services.ares_prefetch import ares_prefetch
+from utils.ico import ico_checksum_valid
 from app.services.user_service import UserService
 
 logger = logging.getLogger(__name__)
@@ -101,7 +104,7 @@ class OnboardingWizard:
             elif current_step == OnboardingStep.ICO:
                 return await self._handle_ico(user_id, message)
             elif current_step == OnboardingStep.ICO_CONFIRM:
-                return self._handle_ico_confirm(user_id, message)
+                return await self._handle_ico_confirm(user_id, message)
             elif current_step == OnboardingStep.TAX_MODE:
                 return self._handle_tax_mode(user_id, message)
             elif current_step == OnboardingStep.TAX_MODE_HELP:
@@ -170,18 +173,23 @@ Pokud ho ještě nemáš, napiš "*nemám*".
         if not ico.isdigit() or len(ico) != 8:
             return "❌ IČO musí být přesně 8 číslic.\n\n📝 Zadej prosím jen čísla (např. 12345678) nebo 'nemám'."
         
-        # Dočasný bypass pro ARES - uložíme IČO přímo
+        if not ico_checksum_valid(ico):
+            return ("❌ Tohle IČO nesedí (špatná kontrolní číslice).\n\n"
+                    "📝 Zkontroluj ho prosím a zadej znovu, nebo napiš 'nemám'.")
+        
+        # ARES se dotazuje na pozadí, údaje se vyzvednou až při potvrzení
         try:
             self.user_sessions[user_id]['data']['ico'] = ico
             self.user_sessions[user_id]['data']['company_name'] = f"Podnikatel IČO {ico}"
             self.user_sessions[user_id]['data']['dic'] = None
             self.user_sessions[user_id]['data']['address'] = ''
             self.user_sessions[user_id]['step'] = OnboardingStep.ICO_CONFIRM
+            ares_prefetch.start(self._prefetch_key(user_id), ico, self._lookup_ares)
             
             return f"""✅ *IČO přijato:*
 
 🏢 *IČO:* {ico}
-📋 *Poznámka:* Údaje z ARES se načtou později
+📋 *Poznámka:* Údaje z ARES mezitím načítám
 
 *Je to správně?* (ano/ne)"""
                 
@@ -189,20 +197,52 @@ Pokud ho ještě nemáš, napiš "*nemám*".
             logger.error(f"ICO processing error: {str(e)}")
             return "❌ Chyba při zpracování IČO. Zkuste to znovu nebo napište 'nemám'."
     
-    def _handle_ico_confirm(self, user_id: int, message: str) -> str:
+    async def _handle_ico_confirm(self, user_id: int, message: str) -> str:
         response = message.strip().lower()
         
         if response in ['ano', 'a', 'yes', 'správně', 'spravne']:
+            ico = self.user_sessions[user_id]['data']['ico']
+            ares_result = await ares_prefetch.result(self._prefetch_key(user_id), ico, self._lookup_ares)
+            summary = self._apply_ares_data(user_id, ares_result)
+            
             # Přechod na daňový režim
             self.user_sessions[user_id]['step'] = OnboardingStep.TAX_MODE
             logger.info(f"Uživatel {user_id} potvrdil IČO, přechod na TAX_MODE")
-            return self._get_tax_mode_message()
+            return f"{summary}{self._get_tax_mode_message()}"
         elif response in ['ne', 'n', 'no', 'špatně', 'spatne']:
+            ares_prefetch.discard(self._prefetch_key(user_id))
             self.user_sessions[user_id]['step'] = OnboardingStep.ICO
             return "Zadejte prosím správné IČO nebo napište 'nemám':"
         else:
             return "Odpovězte prosím 'ano' nebo 'ne':"
     
+    def _prefetch_key(self, user_id: int):
+        return ('onboarding_wizard', user_id)
+    
+    async def _lookup_ares(self, ico: str) -> Dict[str, Any]:
+        """Dotaz do ARES přes sdílenou cache odpovědí"""
+        return await validate_ico(ico, cache=ares_cache)
+    
+    def _apply_ares_data(self, user_id: int, ares_result: Optional[Dict[str, Any]]) -> str:
+        """Uloží název, adresu a DIČ z ARES do session, vrátí shrnutí pro uživatele"""
+        if not ares_result or not ares_result.get('valid'):
+            return "📋 Údaje z ARES se nepodařilo načíst, doplníš je později v nastavení.\n\n"
+        
+        data = self.user_sessions[user_id]['data']
+        data['company_name'] = ares_result.get('name') or data['company_name']
+        data['address'] = ares_result.get('full_address') or ''
+        data['dic'] = ares_result.get('dic')
+        # Podle DIČ v ARES se předvyplní plátcovství, krok DPH ho může změnit
+        data['vat_payer'] = bool(ares_result.get('dic'))
+        data['ares_loaded'] = True
+        
+        summary = f"🏢 *{data['company_name']}*"
+        if data['address']:
+            summary += f"\n📍 {data['address']}"
+        if data['dic']:
+            summary += f"\n💳 DIČ: {data['dic']}"
+        return summary + "\n\n"
+    
     def _get_tax_mode_message(self) -> str:
         return """💰 *Jaký máš daňový režim?*
 
@@ -416,6 +456,15 @@ Přednaplnil jsem časté kategorie výdajů:
         self.user_sessions[user_id]['data']['reminder_settings'] = notifications
         self.user_sessions[user_id]['step'] = OnboardingStep.COMPLETED
         
+        # ARES mohl při potvrzení IČO nestihnout odpovědět - vezmi výsledek, pokud už je
+        if not self.user_sessions[user_id]['data'].get('ares_loaded'):
+            late_result = ares_prefetch.peek(self._prefetch_key(user_id))
+            if late_result and late_result.get('valid'):
+                vat_payer = self.user_sessions[user_id]['data'].get('vat_payer')
+                self._apply_ares_data(user_id, late_result)
+                if vat_payer is not None:
+                    self.user_sessions[user_id]['data']['vat_payer'] = vat_payer
+        
         # Ulož onboarding data do databáze
         if self.user_service:
             try:
@@ -478,5 +527,6 @@ Napište *info* pro více informací o předplatném."""
     
     def cleanup_session(self, user_id: int):
         """Vyčistí session data po dokončení"""
+        ares_prefetch.discard(self._prefetch_key(user_id))
         if user_id in self.user_sessions:
             del self.user_sessions[user_id]
\ No newline at end of file
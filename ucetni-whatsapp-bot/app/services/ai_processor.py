@@ -5,10 +5,13 @@ import re
 import json
 from datetime import datetime
 from typing import Dict, Optional, Tuple
+from decimal import Decimal
+from sqlalchemy import case, func
 from sqlalchemy.orm import Session
 
 from app.models import User, Transaction, TransactionType, ActivationToken
 from app.core.config import settings
+from utils.money import Money, ZERO, money_sum
 import logging
 
 logger = logging.getLogger(__name__)
@@ -251,15 +254,16 @@ _Pro nápovědu napište 'help'_"""
     # Vytvoř transakci v databázi
     try:
         # Vypočítej DPH
-        amount = transaction_data["amount"]
+        amount = Money.of(transaction_data["amount"])
         vat_rate = 21 if transaction_data["type"] == "expense" else 0
         
         if vat_rate > 0:
-            amount_without_vat = amount / (1 + vat_rate/100)
+            # Základ se zaokrouhlí na haléře, DPH je zbytek - součet vždy sedí
+            amount_without_vat = Money.of(amount.to_decimal() / (1 + Decimal(vat_rate) / 100))
             vat_amount = amount - amount_without_vat
         else:
             amount_without_vat = amount
-            vat_amount = 0
+            vat_amount = ZERO
         
         # Vytvoř transakci
         transaction = Transaction(
@@ -304,28 +308,33 @@ _Pro nápovědu napište 'help'_"""
 def get_user_statistics(user: User, db: Session) -> Dict:
     """Získá statistiky uživatele"""
     
-    # Základní statistiky
-    transactions = db.query(Transaction).filter(Transaction.user_id == user.id).all()
+    # Součty v haléřích sečte databáze, transakce se nenačítají
+    current_month = datetime.now().replace(day=1)
+    in_current_month = Transaction.created_at >= current_month
+    rows = db.query(
+        Transaction.type,
+        func.count(Transaction.id).label('count'),
+        money_sum(Transaction.amount).label('total'),
+        func.count(case((in_current_month, Transaction.id))).label('month_count'),
+        money_sum(case((in_current_month, Transaction.amount), else_=0)).label('month_total')
+    ).filter(Transaction.user_id == user.id).group_by(Transaction.type).all()
+    by_type = {row.type: row for row in rows}
+    
+    def total(transaction_type, column):
+        row = by_type.get(transaction_type)
+        return getattr(row, column) if row is not None else ZERO
     
     stats = {
-        "total_transactions": len(transactions),
-        "total_income": sum(t.amount for t in transactions if t.type == TransactionType.INCOME),
-        "total_expenses": sum(t.amount for t in transactions if t.type == TransactionType.EXPENSE),
-        "current_month_transactions": 0,
-        "current_month_income": 0,
-        "current_month_expenses": 0
+        "total_transactions": sum(row.count for row in rows),
+        "total_income": total(TransactionType.INCOME, 'total'),
+        "total_expenses": total(TransactionType.EXPENSE, 'total'),
+        "current_month_transactions": sum(row.month_count for row in rows),
+        "current_month_income": total(TransactionType.INCOME, 'month_total'),
+        "current_month_expenses": total(TransactionType.EXPENSE, 'month_total')
     }
     
     stats["profit"] = stats["total_income"] - stats["total_expenses"]
     
-    # Aktuální měsíc
-    current_month = datetime.now().replace(day=1)
-    current_month_transactions = [t for t in transactions if t.created_at >= current_month]
-    
-    stats["current_month_transactions"] = len(current_month_transactions)
-    stats["current_month_income"] = sum(t.amount for t in current_month_transactions if t.type == TransactionType.INCOME)
-    stats["current_month_expenses"] = sum(t.amount for t in current_month_transactions if t.type == TransactionType.EXPENSE)
-    
     return stats
 
 def update_user_stats(user: User, db: Session):
@@ -0,0 +1,278 @@
+"""
+Cache dotazů do ARES
+
+Stejné IČO (Alza, Lidl, Shell...) se v ARES ověřuje pořád dokola, každý
+dotaz přitom může trvat až do timeoutu. Cache drží výsledky ve dvou
+vrstvách: LRU v paměti procesu a tabulka ares_cache v databázi, kterou
+sdílí všechny procesy a přežije restart.
+
+- nalezené IČO platí ARES_CACHE_TTL_HOURS (výchozí týden)
+- IČO, které ARES nezná, se pamatuje jen krátce (ARES_CACHE_NEGATIVE_TTL_MINUTES),
+  aby se čerstvě založená firma brzy ukázala
+- prošlý záznam se ještě ARES_CACHE_STALE_DAYS vrací hned a obnoví se na pozadí;
+  když ARES nejde, zůstane v platnosti starý údaj
+- chyby spojení se neukládají vůbec
+
+Souběžné dotazy na stejné IČO, které v cache není, se slučují do jednoho
+požadavku na ARES.
+
+Počty zásahů a doba odpovědi ARES jdou do Prometheus metrik (/metrics)
+a do stats() pro /health.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from utils.ico import AresUnavailableError  # noqa: F401 - klienti ho importují odsud
+
+try:
+    from prometheus_client import Counter, Histogram
+    ARES_CACHE_LOOKUPS = Counter('ares_cache_lookups_total', 'ARES cache lookups', ['source', 'result'])
+    ARES_REQUEST_DURATION = Histogram('ares_request_duration_seconds', 'ARES request duration', ['source', 'outcome'])
+    METRICS_AVAILABLE = True
+except ImportError:
+    METRICS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+CacheKey = Tuple[str, str]
+
+
+@dataclass(frozen=True)
+class AresCacheSettings:
+    """Jak dlouho platí odpovědi ARES"""
+    ttl: timedelta = timedelta(days=7)                  # nalezené IČO
+    negative_ttl: timedelta = timedelta(hours=1)        # IČO, které ARES nezná
+    stale_ttl: timedelta = timedelta(days=30)           # jak dlouho po expiraci smí být vrácen starý údaj
+    max_entries: int = 2048                             # velikost LRU v paměti
+
+    @classmethod
+    def from_env(cls) -> "AresCacheSettings":
+        return cls(
+            ttl=timedelta(hours=float(os.getenv('ARES_CACHE_TTL_HOURS') or 24 * 7)),
+            negative_ttl=timedelta(minutes=float(os.getenv('ARES_CACHE_NEGATIVE_TTL_MINUTES') or 60)),
+            stale_ttl=timedelta(days=float(os.getenv('ARES_CACHE_STALE_DAYS') or 30)),
+            max_entries=int(os.getenv('ARES_CACHE_SIZE') or 2048),
+        )
+
+
+@dataclass
+class CachedAnswer:
+    data: Dict[str, Any]
+    found: bool
+    fetched_at: datetime
+    expires_at: datetime
+
+    def is_fresh(self, now: datetime) -> bool:
+        return now < self.expires_at
+
+    def is_usable(self, now: datetime, stale_ttl: timedelta) -> bool:
+        return now < self.expires_at + stale_ttl
+
+
+def _default_session_factory():
+    from app.database.connection import db_manager
+    return db_manager.get_session() if db_manager.is_initialized else None
+
+
+class AresCache:
+    """Dvouvrstvá cache odpovědí ARES s obnovou na pozadí"""
+
+    def __init__(self, settings: Optional[AresCacheSettings] = None,
+                 session_factory: Optional[Callable[[], Any]] = _default_session_factory):
+        """
+        Args:
+            settings: TTL a velikost; výchozí z proměnných prostředí
+            session_factory: vrací async context manager s AsyncSession, nebo None,
+                když databáze není k dispozici (pak jen paměť)
+        """
+        self.settings = settings or AresCacheSettings.from_env()
+        self.session_factory = session_factory
+        self._entries: "OrderedDict[CacheKey, CachedAnswer]" = OrderedDict()
+        self._refreshing: Dict[CacheKey, asyncio.Task] = {}
+        self._in_flight: Dict[CacheKey, asyncio.Future] = {}
+        self.counters = {'hit': 0, 'db_hit': 0, 'stale': 0, 'miss': 0, 'coalesced': 0,
+                         'error': 0, 'stale_on_error': 0}
+        self.ares_requests = 0
+        self.ares_seconds = 0.0
+
+    async def lookup(self, source: str, ico: str,
+                     fetch: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        """
+        Výsledek dotazu na IČO z cache, případně z ARES
+
+        Args:
+            source: který klient se ptá - výsledky klientů mají různý tvar
+            ico: normalizované 8místné IČO
+            fetch: dotaz do ARES; vrací výsledek klienta ('valid' False = nenalezeno),
+                při nedostupnosti ARES vyhodí AresUnavailableError
+
+        Raises:
+            AresUnavailableError: ARES nejde a v cache není ani starý údaj
+        """
+        key = (source, ico)
+        now = datetime.now()
+
+        entry = self._memory_get(key)
+        result = 'hit'
+        if entry is None:
+            entry = await self._db_get(key)
+            result = 'db_hit'
+            if entry is not None:
+                self._memory_put(key, entry)
+
+        if entry is not None and entry.is_fresh(now):
+            self._count(source, result)
+            return entry.data
+
+        # Prošlý nalezený záznam - vrátit hned, ARES se zeptá na pozadí
+        if entry is not None and entry.found and entry.is_usable(now, self.settings.stale_ttl):
+            self._count(source, 'stale')
+            self._schedule_refresh(key, fetch)
+            return entry.data
+
+        self._count(source, 'miss')
+        try:
+            return (await self._fetch_shared(key, fetch)).data
+        except AresUnavailableError:
+            if entry is not None and entry.is_usable(now, self.settings.stale_ttl):
+                self._count(source, 'stale_on_error')
+                logger.warning(
+                    f"ARES nedostupný, vracím uložený údaj pro IČO {ico} z {entry.fetched_at:%d.%m.%Y}"
+                )
+                return entry.data
+            raise
+
+    async def _fetch_shared(self, key: CacheKey, fetch: Callable[[], Awaitable[Dict[str, Any]]]) -> CachedAnswer:
+        """Jeden dotaz do ARES na klíč - souběžná volání na stejné IČO čekají na jeho výsledek"""
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._refresh(key, fetch))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        else:
+            self._count(key[0], 'coalesced')
+        # shield - zrušení jednoho čekajícího nezruší dotaz ostatním
+        return await asyncio.shield(task)
+
+    async def _refresh(self, key: CacheKey, fetch: Callable[[], Awaitable[Dict[str, Any]]]) -> CachedAnswer:
+        source, ico = key
+        started = time.perf_counter()
+        outcome = 'error'
+        try:
+            data = await fetch()
+            outcome = 'found' if data.get('valid') else 'not_found'
+        except AresUnavailableError:
+            self._count(source, 'error')
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            self.ares_requests += 1
+            self.ares_seconds += elapsed
+            if METRICS_AVAILABLE:
+                ARES_REQUEST_DURATION.labels(source=source, outcome=outcome).observe(elapsed)
+
+        found = bool(data.get('valid'))
+        now = datetime.now()
+        entry = CachedAnswer(data=data, found=found, fetched_at=now,
+                             expires_at=now + (self.settings.ttl if found else self.settings.negative_ttl))
+        self._memory_put(key, entry)
+        await self._db_put(key, entry)
+        return entry
+
+    def _schedule_refresh(self, key: CacheKey, fetch: Callable[[], Awaitable[Dict[str, Any]]]) -> None:
+        if key in self._refreshing:
+            return
+
+        async def refresh():
+            try:
+                await self._fetch_shared(key, fetch)
+            except AresUnavailableError as e:
+                logger.warning(f"Obnova IČO {key[1]} z ARES selhala: {str(e)}")
+            except Exception as e:
+                logger.error(f"Obnova IČO {key[1]} z ARES selhala: {str(e)}")
+            finally:
+                self._refreshing.pop(key, None)
+
+        self._refreshing[key] = asyncio.create_task(refresh())
+
+    async def wait_refreshes(self) -> None:
+        """Počká na rozběhnuté obnovy na pozadí (testy, ukončení aplikace)"""
+        while self._refreshing:
+            await asyncio.gather(*list(self._refreshing.values()), return_exceptions=True)
+
+    def _memory_get(self, key: CacheKey) -> Optional[CachedAnswer]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def _memory_put(self, key: CacheKey, entry: CachedAnswer) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.settings.max_entries:
+            self._entries.popitem(last=False)
+
+    async def _db_get(self, key: CacheKey) -> Optional[CachedAnswer]:
+        from app.database.models import AresCacheEntry
+
+        session_cm = self.session_factory() if self.session_factory else None
+        if session_cm is None:
+            return None
+        try:
+            async with session_cm as session:
+                row = await session.get(AresCacheEntry, key)
+                if row is None:
+                    return None
+                return CachedAnswer(data=row.data, found=row.found,
+                                    fetched_at=row.fetched_at, expires_at=row.expires_at)
+        except Exception as e:
+            logger.warning(f"Čtení ARES cache z databáze selhalo: {str(e)}")
+            return None
+
+    async def _db_put(self, key: CacheKey, entry: CachedAnswer) -> None:
+        from app.database.models import AresCacheEntry
+
+        session_cm = self.session_factory() if self.session_factory else None
+        if session_cm is None:
+            return
+        try:
+            async with session_cm as session:
+                await session.merge(AresCacheEntry(
+                    source=key[0], ico=key[1], found=entry.found, data=entry.data,
+                    fetched_at=entry.fetched_at, expires_at=entry.expires_at
+                ))
+                await session.commit()
+        except Exception as e:
+            logger.warning(f"Zápis ARES cache do databáze selhal: {str(e)}")
+
+    def _count(self, source: str, result: str) -> None:
+        self.counters[result] += 1
+        if METRICS_AVAILABLE:
+            ARES_CACHE_LOOKUPS.labels(source=source, result=result).inc()
+
+    def clear(self) -> None:
+        """Vyprázdní paměťovou vrstvu (databázová zůstává)"""
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Úspěšnost cache a doba odpovědi ARES"""
+        served = self.counters['hit'] + self.counters['db_hit'] + self.counters['stale']
+        lookups = served + self.counters['miss']
+        return {
+            **self.counters,
+            'lookups': lookups,
+            'hit_rate': round(served / lookups, 3) if lookups else None,
+            'entries': len(self._entries),
+            'ares_requests': self.ares_requests,
+            'ares_avg_ms': round(self.ares_seconds / self.ares_requests * 1000, 1) if self.ares_requests else None,
+        }
+
+
+# Globální instance sdílená klienty ARES
+ares_cache = AresCache()
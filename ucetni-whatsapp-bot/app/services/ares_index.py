@@ -0,0 +1,324 @@
+"""
+Offline index hromadných dat ARES
+
+Většinu IČO protistran jde ověřit bez sítě z lokální kopie veřejného
+hromadného exportu (CSV se subjekty, typicky komprimované gzip/zip/xz/bz2).
+Import čte export jako proud řádek po řádku a ukládá ho do SQLite
+souboru: tabulka subjektů s IČO jako clustered klíčem (WITHOUT ROWID -
+vyhledání je binární hledání v B-stromu) a index normalizovaného názvu
+pro hledání podle začátku jména. Soubor se čte jen pro čtení přes mmap.
+
+Nový index se staví do dočasného souboru a na místo starého se přesune
+až hotový, běžící procesy si ho při dalším dotazu samy znovu otevřou.
+
+AresService se ptá nejdřív sem a na živé ARES jde jen pro IČO, které
+v indexu není, nebo když je index starší než ARES_INDEX_MAX_AGE_DAYS.
+DIČ má index jen z exportu se sloupcem DIC - kdo DIČ potřebuje
+(validate_ico(need_dic=True)) a index ho nezná, jde na živé ARES.
+"""
+import bz2
+import csv
+import gzip
+import io
+import logging
+import lzma
+import os
+import sqlite3
+import threading
+import time
+import zipfile
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
+
+from app.services.vendor_registry import normalize_name
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_PATH = Path(__file__).resolve().parent.parent / "data" / "ares_index.sqlite"
+
+# Sloupce exportu - první nalezený název vyhrává (porovnává se bez ohledu na velikost písmen)
+COLUMN_ALIASES = {
+    'ico': ('ico',),
+    'name': ('firma', 'obchodnijmeno', 'obchodni_jmeno', 'nazev', 'name'),
+    'dic': ('dic',),
+    'legal_form': ('forma', 'pravniforma', 'pravni_forma'),
+    'street': ('ulice_text', 'nazevulice', 'ulice'),
+    'house_number': ('cdom', 'cislodomovni', 'cislo_domovni'),
+    'orientation_number': ('cor', 'cisloorientacni', 'cislo_orientacni'),
+    'city': ('obec_text', 'nazevobce', 'obec'),
+    'postal_code': ('psc',),
+    'address': ('textadr', 'textovaadresa', 'adresa'),
+    'founded': ('ddatvzn', 'datumvzniku', 'datum_vzniku'),
+    'ceased': ('ddatzan', 'datumzaniku', 'datum_zaniku'),
+}
+RECORD_FIELDS = tuple(COLUMN_ALIASES)
+DELIMITERS = (';', ',', '\t', '|')
+
+# Mmap pro čtení - pokryje běžnou velikost indexu (~300 MB)
+MMAP_SIZE = 512 * 1024 * 1024
+
+
+@dataclass
+class AresRecord:
+    """Subjekt z hromadných dat"""
+    ico: str
+    name: str
+    legal_form: Optional[str] = None
+    dic: Optional[str] = None
+    address: Dict[str, str] = field(default_factory=dict)
+    full_address: Optional[str] = None
+    founded: Optional[str] = None
+    ceased: Optional[str] = None
+
+
+def _iso_date(value: str) -> Optional[str]:
+    """Datum z exportu (2001-05-12 nebo 12.05.2001) jako ISO řetězec"""
+    value = (value or '').strip()[:10]
+    if not value:
+        return None
+    for fmt in ('%Y-%m-%d', '%d.%m.%Y'):
+        try:
+            return datetime.strptime(value, fmt).date().isoformat()
+        except ValueError:
+            continue
+    return None
+
+
+def _normalize_ico(value: str) -> Optional[str]:
+    value = (value or '').strip()
+    if not value.isdigit() or len(value) > 8:
+        return None
+    return value.zfill(8)
+
+
+def open_bulk_export(path: Path) -> BinaryIO:
+    """Otevře export jako binární proud - komprese se pozná podle hlavičky souboru"""
+    with open(path, 'rb') as probe:
+        magic = probe.read(6)
+
+    if magic.startswith(b'\x1f\x8b'):
+        return gzip.open(path, 'rb')
+    if magic.startswith(b'BZh'):
+        return bz2.open(path, 'rb')
+    if magic.startswith(b'\xfd7zXZ\x00'):
+        return lzma.open(path, 'rb')
+    if magic.startswith(b'PK\x03\x04'):
+        archive = zipfile.ZipFile(path)
+        members = [name for name in archive.namelist() if name.lower().endswith('.csv')]
+        if not members:
+            archive.close()
+            raise ValueError(f"Archiv {path} neobsahuje CSV")
+        return archive.open(members[0])
+    return open(path, 'rb')
+
+
+def _column_positions(header: List[str]) -> Dict[str, int]:
+    names = [name.strip().lower() for name in header]
+    positions = {}
+    for key, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in names:
+                positions[key] = names.index(alias)
+                break
+    if 'ico' not in positions or 'name' not in positions:
+        raise ValueError(f"Export nemá sloupce IČO a název firmy (hlavička: {', '.join(header[:12])})")
+    return positions
+
+
+def iter_bulk_rows(stream: BinaryIO, encoding: str = 'utf-8-sig') -> Iterator[Tuple]:
+    """
+    Řádky exportu jako n-tice v pořadí RECORD_FIELDS
+
+    Neplatné řádky (bez IČO nebo názvu) se přeskočí. Čte se průběžně,
+    v paměti je vždy jen jeden řádek.
+    """
+    text = io.TextIOWrapper(stream, encoding=encoding, errors='replace', newline='')
+    header_line = text.readline()
+    delimiter = max(DELIMITERS, key=header_line.count)
+    positions = _column_positions(next(csv.reader([header_line], delimiter=delimiter)))
+    width = max(positions.values()) + 1
+
+    for row in csv.reader(text, delimiter=delimiter):
+        if len(row) < width:
+            continue
+        ico = _normalize_ico(row[positions['ico']])
+        name = row[positions['name']].strip()
+        if not ico or not name:
+            continue
+        values = {key: row[index].strip() or None for key, index in positions.items()}
+        values['ico'] = ico
+        values['name'] = name
+        for key in ('founded', 'ceased'):
+            values[key] = _iso_date(values.get(key))
+        yield tuple(values.get(key) for key in RECORD_FIELDS)
+
+
+def build_index(source: Path, index_path: Path = DEFAULT_INDEX_PATH, encoding: str = 'utf-8-sig',
+                batch_size: int = 20000, progress: Optional[Callable[[int], None]] = None) -> Dict:
+    """
+    Postaví index z hromadného exportu a atomicky nahradí ten stávající
+
+    Args:
+        source: soubor exportu (CSV, i komprimované)
+        index_path: cílový SQLite soubor
+        encoding: kódování CSV
+        batch_size: řádků na jeden executemany
+        progress: volá se s počtem dosud načtených subjektů
+
+    Returns:
+        Dict se statistikou importu
+    """
+    started = time.perf_counter()
+    index_path = Path(index_path)
+    index_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = index_path.with_name(index_path.name + '.tmp')
+    if tmp_path.exists():
+        tmp_path.unlink()
+
+    columns = ', '.join(RECORD_FIELDS)
+    placeholders = ', '.join('?' for _ in RECORD_FIELDS)
+    rows = 0
+
+    conn = sqlite3.connect(tmp_path)
+    try:
+        # Soubor se staví od nuly - žurnál ani fsync nejsou potřeba
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.execute("""
+            CREATE TABLE subjects (
+                ico TEXT PRIMARY KEY, name TEXT NOT NULL, dic TEXT, legal_form TEXT,
+                street TEXT, house_number TEXT, orientation_number TEXT,
+                city TEXT, postal_code TEXT, address TEXT,
+                founded TEXT, ceased TEXT, name_key TEXT NOT NULL
+            ) WITHOUT ROWID
+        """)
+        conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+
+        insert = f"INSERT OR REPLACE INTO subjects ({columns}, name_key) VALUES ({placeholders}, ?)"
+        batch = []
+        with open_bulk_export(Path(source)) as stream:
+            for row in iter_bulk_rows(stream, encoding):
+                batch.append(row + (normalize_name(row[1]),))
+                if len(batch) >= batch_size:
+                    conn.executemany(insert, batch)
+                    rows += len(batch)
+                    batch.clear()
+                    if progress:
+                        progress(rows)
+            if batch:
+                conn.executemany(insert, batch)
+                rows += len(batch)
+
+        # Duplicitní IČO v exportu přepíše poslední řádek
+        records = conn.execute("SELECT COUNT(*) FROM subjects").fetchone()[0]
+
+        # Index jmen až po načtení - stavba najednou je řádově rychlejší než průběžná
+        conn.execute("CREATE INDEX ix_subjects_name_key ON subjects (name_key)")
+        conn.executemany("INSERT INTO meta (key, value) VALUES (?, ?)", [
+            ('imported_at', datetime.now().isoformat(timespec='seconds')),
+            ('source', Path(source).name),
+            ('records', str(records)),
+        ])
+        conn.commit()
+    finally:
+        conn.close()
+
+    os.replace(tmp_path, index_path)
+    elapsed = time.perf_counter() - started
+    logger.info(f"ARES index: {records} subjektů za {elapsed:.1f} s -> {index_path}")
+    return {
+        'records': records,
+        'duplicates': rows - records,
+        'path': str(index_path),
+        'size_mb': round(index_path.stat().st_size / 1024 / 1024, 1),
+        'elapsed_s': round(elapsed, 1),
+    }
+
+
+class AresIndex:
+    """Čtení indexu - každé vlákno má vlastní spojení jen pro čtení"""
+
+    def __init__(self, path: Optional[Path] = None, max_age: Optional[timedelta] = None):
+        self.path = Path(path or os.getenv('ARES_INDEX_PATH') or DEFAULT_INDEX_PATH)
+        self.max_age = max_age or timedelta(days=float(os.getenv('ARES_INDEX_MAX_AGE_DAYS') or 35))
+        self._local = threading.local()
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        try:
+            stat = self.path.stat()
+        except OSError:
+            return None
+
+        # Po obnově je na cestě nový soubor - staré spojení se zahodí
+        version = (stat.st_ino, stat.st_mtime_ns)
+        if getattr(self._local, 'version', None) != version:
+            old = getattr(self._local, 'conn', None)
+            if old is not None:
+                old.close()
+            conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+            conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+            meta = dict(conn.execute("SELECT key, value FROM meta").fetchall())
+            # Index postavený starší verzí nemusí mít všechny sloupce (např. dic)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(subjects)")}
+            self._local.conn = conn
+            self._local.fields = tuple(key for key in RECORD_FIELDS if key in columns)
+            self._local.version = version
+            self._local.imported_at = datetime.fromisoformat(meta['imported_at']) if meta.get('imported_at') else None
+        return self._local.conn
+
+    @property
+    def available(self) -> bool:
+        return self._connection() is not None
+
+    @property
+    def imported_at(self) -> Optional[datetime]:
+        return self._local.imported_at if self._connection() is not None else None
+
+    def is_fresh(self, now: Optional[datetime] = None) -> bool:
+        """Index existuje a není starší než max_age"""
+        imported_at = self.imported_at
+        return imported_at is not None and (now or datetime.now()) - imported_at <= self.max_age
+
+    def lookup(self, ico: str) -> Optional[AresRecord]:
+        conn = self._connection()
+        if conn is None:
+            return None
+        row = conn.execute(
+            f"SELECT {', '.join(self._local.fields)} FROM subjects WHERE ico = ?", (ico,)
+        ).fetchone()
+        return self._record(self._local.fields, row) if row else None
+
+    def search_name(self, prefix: str, limit: int = 10) -> List[AresRecord]:
+        """Subjekty, jejichž normalizovaný název začíná na prefix"""
+        conn = self._connection()
+        key = normalize_name(prefix)
+        if conn is None or not key:
+            return []
+        rows = conn.execute(
+            f"SELECT {', '.join(self._local.fields)} FROM subjects "
+            "WHERE name_key >= ? AND name_key < ? ORDER BY name_key LIMIT ?",
+            (key, key + '\x7f', limit)
+        ).fetchall()
+        return [self._record(self._local.fields, row) for row in rows]
+
+    @staticmethod
+    def _record(fields: Tuple[str, ...], row: Tuple) -> AresRecord:
+        values = dict(zip(fields, row))
+        house_number = values.get('house_number')
+        if house_number and values.get('orientation_number'):
+            house_number = f"{house_number}/{values['orientation_number']}"
+        address = {key: value for key, value in (
+            ('street', values.get('street')), ('house_number', house_number),
+            ('city', values.get('city')), ('postal_code', values.get('postal_code'))
+        ) if value}
+        return AresRecord(
+            ico=values['ico'], name=values['name'], legal_form=values.get('legal_form'),
+            dic=values.get('dic'), address=address, full_address=values.get('address'),
+            founded=values.get('founded'), ceased=values.get('ceased')
+        )
+
+
+# Globální instance - bez souboru indexu se AresService ptá rovnou živého ARES
+ares_index = AresIndex()
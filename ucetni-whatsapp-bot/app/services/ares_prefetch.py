@@ -0,0 +1,97 @@
+"""
+Načítání údajů z ARES dopředu během onboardingu
+
+Po zadání IČO bot hned odpoví další otázkou a dotaz do ARES běží na
+pozadí. Výsledek se vyzvedne až v kroku, který údaje potřebuje
+(potvrzení IČO, DIČ, dokončení registrace). Pokud tam ještě není, čeká
+se nejvýše ARES_PREFETCH_WAIT_SECONDS - pak onboarding pokračuje bez
+údajů z ARES a dotaz doběhne dál pro pozdější krok.
+
+Hotový výsledek se drží ARES_PREFETCH_TTL_SECONDS a pak se zahodí, aby
+uživatelé, kteří onboarding nedokončili, nezůstávali v paměti navždy.
+"""
+import asyncio
+import logging
+import os
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+AresLookup = Callable[[str], Awaitable[Dict[str, Any]]]
+
+
+class AresPrefetch:
+    """Rozběhnuté dotazy do ARES podle klíče (typicky uživatele)"""
+
+    def __init__(self, wait_timeout: Optional[float] = None, ttl: Optional[float] = None):
+        self.wait_timeout = wait_timeout if wait_timeout is not None else float(
+            os.getenv('ARES_PREFETCH_WAIT_SECONDS') or 3)
+        self.ttl = ttl if ttl is not None else float(os.getenv('ARES_PREFETCH_TTL_SECONDS') or 900)
+        self._tasks: Dict[Hashable, Tuple[str, asyncio.Task]] = {}
+
+    def start(self, key: Hashable, ico: str, lookup: AresLookup) -> asyncio.Task:
+        """Spustí dotaz na pozadí a hned se vrátí; předchozí dotaz pro klíč zahodí"""
+        current = self._tasks.get(key)
+        if current and current[0] == ico:
+            return current[1]
+        self.discard(key)
+
+        task = asyncio.create_task(lookup(ico))
+        task.add_done_callback(self._log_failure)
+        task.add_done_callback(lambda done: done.get_loop().call_later(self.ttl, self._expire, key, done))
+        self._tasks[key] = (ico, task)
+        return task
+
+    def peek(self, key: Hashable) -> Optional[Dict[str, Any]]:
+        """Hotový výsledek bez čekání, jinak None"""
+        current = self._tasks.get(key)
+        if not current or not current[1].done() or current[1].cancelled() or current[1].exception():
+            return None
+        return current[1].result()
+
+    async def result(self, key: Hashable, ico: str, lookup: AresLookup,
+                     timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        Výsledek dotazu pro IČO s omezeným čekáním
+
+        Když dotaz neběží (restart procesu, jiné IČO), spustí se teď.
+
+        Returns:
+            Odpověď ARES, nebo None při vypršení limitu či chybě
+        """
+        current = self._tasks.get(key)
+        task = current[1] if current and current[0] == ico else self.start(key, ico, lookup)
+
+        try:
+            result = await asyncio.wait_for(asyncio.shield(task), timeout if timeout is not None else self.wait_timeout)
+        except asyncio.TimeoutError:
+            logger.info(f"ARES pro IČO {ico} zatím neodpověděl, pokračuji bez údajů")
+            return None
+        except Exception as e:
+            self.discard(key)
+            logger.warning(f"Načtení IČO {ico} z ARES selhalo: {str(e)}")
+            return None
+
+        self._tasks.pop(key, None)
+        return result
+
+    def discard(self, key: Hashable) -> None:
+        """Zapomene dotaz pro klíč (jiné IČO, zrušená registrace)"""
+        current = self._tasks.pop(key, None)
+        if current and not current[1].done():
+            current[1].cancel()
+
+    def _expire(self, key: Hashable, task: asyncio.Task) -> None:
+        # Klíč mezitím mohl dostat nový dotaz - ten se nezahazuje
+        current = self._tasks.get(key)
+        if current and current[1] is task:
+            del self._tasks[key]
+
+    @staticmethod
+    def _log_failure(task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception():
+            logger.warning(f"Dotaz do ARES na pozadí selhal: {str(task.exception())}")
+
+
+# Globální instance sdílená oběma průvodci registrací
+ares_prefetch = AresPrefetch()
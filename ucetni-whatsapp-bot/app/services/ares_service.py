@@ -2,31 +2,56 @@
 ARES Service - Validace IČO a získávání informací o firmách z ARES registru
 """
 import aiohttp
+import asyncio
 import logging
+import os
 from typing import Dict, Any, Optional
 import xml.etree.ElementTree as ET
 from datetime import datetime
 
+from app.services.ares_cache import AresUnavailableError, ares_cache
+from app.services.ares_index import AresRecord, ares_index
+from utils.ico import ico_checksum_valid
+
 logger = logging.getLogger(__name__)
 
+# Odpovědi, které ARES nevrátil v očekávaném tvaru - neukládají se jako "IČO neexistuje"
+PARSE_ERRORS = ("Chyba při zpracování odpovědi z ARES", "Neočekávaná chyba při zpracování ARES dat")
+
+# IČO je opravdu chybné nebo v ARES není - ostatní chyby jsou výpadek ARES
+ICO_FORMAT_ERROR = "IČO musí mít přesně 8 číslic"
+ICO_CHECKSUM_ERROR = "IČO nesplňuje kontrolní součet"
+ICO_NOT_FOUND_ERROR = "IČO nenalezeno v ARES registru"
+ICO_REJECTED_ERRORS = (ICO_FORMAT_ERROR, ICO_CHECKSUM_ERROR, ICO_NOT_FOUND_ERROR)
+
+
+def ico_rejected(result: Optional[Dict[str, Any]]) -> bool:
+    """Odpověď říká, že IČO neexistuje nebo je chybné (ne že ARES selhal)"""
+    return bool(result) and not result.get("valid") and result.get("error") in ICO_REJECTED_ERRORS
+
 class AresService:
     """Service pro práci s ARES registrem"""
     
     def __init__(self):
         self.ares_url = "https://wwwinfo.mfcr.cz/cgi-bin/ares/darv_bas.cgi"
         self.timeout = 10  # seconds
+        self.max_concurrency = int(os.getenv('ARES_MAX_CONCURRENCY') or 5)  # souběžné dotazy v dávce
     
-    async def validate_ico(self, ico: str) -> Dict[str, Any]:
+    async def validate_ico(self, ico: str, session: Optional[aiohttp.ClientSession] = None,
+                           need_dic: bool = False) -> Dict[str, Any]:
         """
         Validuje IČO pomocí ARES registru
         
         Args:
             ico: 8-digit IČO string
+            session: sdílená HTTP session (dávkové ověření); bez ní se otevře vlastní
+            need_dic: volající potřebuje DIČ - záznam z indexu bez DIČ nestačí
             
         Returns:
             Dict obsahující:
             - valid: bool - zda je IČO platné
             - business_name: str - obchodní název
+            - dic: str - DIČ (jen plátci DPH; z indexu jen pokud ho export obsahuje)
             - address: dict - adresní údaje
             - vat_payer: bool - zda je plátce DPH
             - error: str - chybová zpráva pokud nastala chyba
@@ -36,45 +61,26 @@ class AresService:
             if not ico or len(ico) != 8 or not ico.isdigit():
                 return {
                     "valid": False,
-                    "error": "IČO musí mít přesně 8 číslic"
+                    "error": ICO_FORMAT_ERROR
                 }
             
             # Kontrola pomocí modulo 11 algoritmu
             if not self._validate_ico_checksum(ico):
                 return {
                     "valid": False,
-                    "error": "IČO nesplňuje kontrolní součet"
+                    "error": ICO_CHECKSUM_ERROR
                 }
             
-            # Dotaz na ARES
-            params = {
-                'ico': ico,
-                'MAX_POCET': '1'
-            }
+            # Lokální kopie hromadných dat ARES - bez sítě, dokud není moc stará
+            if ares_index.is_fresh():
+                record = ares_index.lookup(ico)
+                if record is not None and (record.dic or not need_dic):
+                    return self._index_result(record)
             
-            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout)) as session:
-                try:
-                    async with session.get(self.ares_url, params=params) as response:
-                        if response.status != 200:
-                            logger.error(f"ARES API error: HTTP {response.status}")
-                            return {
-                                "valid": False,
-                                "error": f"ARES API nedostupné (HTTP {response.status})"
-                            }
-                        
-                        xml_content = await response.text()
-                        return self._parse_ares_response(xml_content, ico)
-                        
-                except aiohttp.ClientError as e:
-                    logger.error(f"ARES network error: {str(e)}")
-                    # Při síťové chybě předpokládáme, že IČO je validní kvůli checksumu
-                    return {
-                        "valid": True,
-                        "business_name": None,
-                        "address": {},
-                        "vat_payer": False,
-                        "warning": "Síťová chyba - IČO nebylo možné ověřit v ARES registru"
-                    }
+            try:
+                return await ares_cache.lookup('service', ico, lambda: self._fetch_ico(ico, session))
+            except AresUnavailableError as e:
+                return e.fallback
                 
         except Exception as e:
             logger.error(f"Unexpected error in ARES validation: {str(e)}")
@@ -83,6 +89,66 @@ class AresService:
                 "error": "Neočekávaná chyba při ověřování IČO"
             }
     
+    async def _fetch_ico(self, ico: str, session: Optional[aiohttp.ClientSession] = None) -> Dict[str, Any]:
+        """
+        Dotaz na ARES bez cache
+        
+        Raises:
+            AresUnavailableError: ARES neodpověděl, e.fallback je výsledek pro volajícího
+        """
+        # Obnova na pozadí může doběhnout až po skončení dávky, která session zavřela
+        if session is None or session.closed:
+            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout)) as session:
+                return await self._fetch_ico(ico, session)
+        
+        params = {
+            'ico': ico,
+            'MAX_POCET': '1'
+        }
+        
+        try:
+            async with session.get(self.ares_url, params=params) as response:
+                if response.status != 200:
+                    logger.error(f"ARES API error: HTTP {response.status}")
+                    raise AresUnavailableError(f"HTTP {response.status}", {
+                        "valid": False,
+                        "error": f"ARES API nedostupné (HTTP {response.status})"
+                    })
+                
+                xml_content = await response.text()
+                result = self._parse_ares_response(xml_content, ico)
+                if result.get("error") in PARSE_ERRORS:
+                    raise AresUnavailableError(result["error"], result)
+                return result
+                
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error(f"ARES network error: {str(e)}")
+            # Při síťové chybě předpokládáme, že IČO je validní kvůli checksumu
+            raise AresUnavailableError(str(e) or type(e).__name__, {
+                "valid": True,
+                "business_name": None,
+                "address": {},
+                "vat_payer": False,
+                "warning": "Síťová chyba - IČO nebylo možné ověřit v ARES registru"
+            })
+    
+    def _index_result(self, record: AresRecord) -> Dict[str, Any]:
+        """Výsledek ve stejném tvaru jako z živého ARES"""
+        result = {
+            "valid": True,
+            "ico": record.ico,
+            "business_name": record.name,
+            "dic": record.dic,
+            "address": record.address,
+            "vat_payer": bool(record.dic) or self._guess_vat_payer_status(record.name),
+            "registration_date": record.founded,
+            "last_updated": ares_index.imported_at.isoformat(),
+            "source": "ares_index"
+        }
+        if record.ceased:
+            result["ceased_date"] = record.ceased
+        return result
+    
     def _validate_ico_checksum(self, ico: str) -> bool:
         """
         Validuje IČO pomocí modulo 11 algoritmu
@@ -93,27 +159,7 @@ class AresService:
         Returns:
             bool: True pokud je IČO validní
         """
-        try:
-            # Převod na čísla
-            digits = [int(d) for d in ico]
-            
-            # Modulo 11 algoritmus
-            weights = [8, 7, 6, 5, 4, 3, 2]
-            
-            # Výpočet kontrolního součtu
-            suma = sum(digit * weight for digit, weight in zip(digits[:7], weights))
-            remainder = suma % 11
-            
-            # Kontrolní číslice
-            if remainder < 2:
-                check_digit = remainder
-            else:
-                check_digit = 11 - remainder
-            
-            return digits[7] == check_digit
-            
-        except (ValueError, IndexError):
-            return False
+        return ico_checksum_valid(ico)
     
     def _parse_ares_response(self, xml_content: str, ico: str) -> Dict[str, Any]:
         """
@@ -135,7 +181,7 @@ class AresService:
             if record is None:
                 return {
                     "valid": False,
-                    "error": "IČO nenalezeno v ARES registru"
+                    "error": ICO_NOT_FOUND_ERROR
                 }
             
             # Extract business name
@@ -173,9 +219,15 @@ class AresService:
                 if zip_elem is not None:
                     address['postal_code'] = zip_elem.text
             
+            # DIČ uvádí ARES jen u registrovaných plátců DPH
+            dic = None
+            dic_elem = record.find('.//DIC')
+            if dic_elem is not None and dic_elem.text:
+                dic = dic_elem.text.strip()
+            
             # Check VAT payer status (simplified - real check would need another API call)
-            # For now, we'll determine based on business name patterns
-            vat_payer = self._guess_vat_payer_status(business_name)
+            # Without DIČ, we'll determine based on business name patterns
+            vat_payer = bool(dic) or self._guess_vat_payer_status(business_name)
             
             # Extract registration date if available
             reg_date = None
@@ -192,6 +244,7 @@ class AresService:
                 "valid": True,
                 "ico": ico,
                 "business_name": business_name,
+                "dic": dic,
                 "address": address,
                 "vat_payer": vat_payer,
                 "registration_date": reg_date.isoformat() if reg_date else None,
@@ -283,32 +336,43 @@ class AresService:
         
         return ', '.join(parts) if parts else ''
     
-    async def batch_validate_ico(self, ico_list: list) -> Dict[str, Any]:
+    async def batch_validate_ico(self, ico_list: list, max_concurrency: Optional[int] = None) -> Dict[str, Any]:
         """
         Validuje více IČO najednou
         
+        Dotazy běží souběžně přes jednu HTTP session, nejvýš max_concurrency
+        najednou (ARES omezuje počet dotazů). Opakované IČO se ověří jen
+        jednou, duplicity v seznamu nezabírají místo v semaforu.
+        
         Args:
             ico_list: seznam IČO k validaci
+            max_concurrency: souběžné dotazy, výchozí ARES_MAX_CONCURRENCY
             
         Returns:
-            Dict s výsledky pro každé IČO
+            Dict s výsledky pro každé IČO; items jsou výsledky v pořadí vstupu,
+            total_count a valid_count se počítají z různých IČO
         """
-        results = {}
+        unique_icos = list(dict.fromkeys(ico_list))
+        semaphore = asyncio.Semaphore(max_concurrency or self.max_concurrency)
         
-        for ico in ico_list:
-            try:
-                result = await self.validate_ico(ico)
-                results[ico] = result
-            except Exception as e:
-                logger.error(f"Failed to validate IČO {ico}: {str(e)}")
-                results[ico] = {
-                    "valid": False,
-                    "error": f"Chyba při validaci: {str(e)}"
-                }
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout)) as session:
+            async def validate_one(ico) -> Dict[str, Any]:
+                async with semaphore:
+                    try:
+                        return await self.validate_ico(ico, session=session)
+                    except Exception as e:
+                        logger.error(f"Failed to validate IČO {ico}: {str(e)}")
+                        return {
+                            "valid": False,
+                            "error": f"Chyba při validaci: {str(e)}"
+                        }
+            
+            results = dict(zip(unique_icos, await asyncio.gather(*(validate_one(ico) for ico in unique_icos))))
         
         return {
             "results": results,
-            "total_count": len(ico_list),
+            "items": [{"ico": ico, **results[ico]} for ico in ico_list],
+            "total_count": len(results),
             "valid_count": sum(1 for r in results.values() if r.get('valid')),
             "processed_at": datetime.now().isoformat()
-        }
\ No newline at end of file
+        }
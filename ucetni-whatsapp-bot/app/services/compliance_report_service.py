@@ -5,11 +5,11 @@ Podle zákona č. 586/1992 Sb., o daních z příjmů
 import logging
 from typing import Dict, List, Optional
 from datetime import datetime, timedelta
-from decimal import Decimal
 
 from app.database.connection import db_manager
 from app.database.models import User, Transaction
 from app.services.tax_evidence_validator import TaxEvidenceValidator
+from utils.money import ZERO
 from sqlalchemy import select, and_, func, desc
 
 logger = logging.getLogger(__name__)
@@ -99,13 +99,13 @@ class ComplianceReportService:
         warning_count = 0    # 60-79%
         critical_count = 0   # <60%
         
-        total_amount = Decimal('0')
-        high_risk_amount = Decimal('0')
+        total_amount = ZERO
+        high_risk_amount = ZERO
         issues_by_type = {}
         incomplete_transactions = []
         
         for trans in transactions:
-            total_amount += trans.amount_czk or 0
+            total_amount += trans.amount_czk or ZERO
             score = trans.evidence_completeness_score or 0
             
             if score >= 95:
@@ -116,7 +116,7 @@ class ComplianceReportService:
                 warning_count += 1
             else:
                 critical_count += 1
-                high_risk_amount += trans.amount_czk or 0
+                high_risk_amount += trans.amount_czk or ZERO
                 incomplete_transactions.append(trans)
             
             # Analýza problémů
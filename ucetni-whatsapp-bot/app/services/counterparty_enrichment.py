@@ -0,0 +1,163 @@
+"""
+Doplnění údajů o protistraně z ARES na pozadí
+
+Odpověď uživateli na ARES nečeká: transakce se uloží s tím, co přišlo
+z účtenky nebo faktury, a teprve potom se podle IČO doplní název, DIČ,
+adresa a plátcovství DPH protistrany a přepočítá se úplnost daňové
+evidence. Údaje z dokladu mají přednost - doplňují se jen prázdná pole.
+Dotaz jde přes AresService, tedy offline index, cache a až nakonec
+živé ARES.
+"""
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from sqlalchemy import func, select
+
+from app.database.models import Transaction, TransactionAttachment, User
+from app.services.ares_service import AresService
+from app.services.tax_evidence_validator import TaxEvidenceValidator
+
+logger = logging.getLogger(__name__)
+
+# Délky sloupců protistrany v Transaction
+NAME_MAX_LENGTH = 200
+DIC_MAX_LENGTH = 12
+
+
+class CounterpartyEnricher:
+    """Fronta doplnění protistrany - úlohy běží po uložení transakce mimo odpověď"""
+
+    def __init__(self, session_factory: Optional[Callable[[], Any]] = None,
+                 ares_service: Optional[AresService] = None, max_concurrency: int = 4):
+        """
+        Args:
+            session_factory: vrací async context manager s AsyncSession; výchozí db_manager.get_session
+            ares_service: klient ARES
+            max_concurrency: kolik transakcí se doplňuje souběžně
+        """
+        self.session_factory = session_factory
+        self.ares_service = ares_service or AresService()
+        self.validator = TaxEvidenceValidator()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._tasks: Set[asyncio.Task] = set()
+
+    def schedule(self, transaction_id: Optional[int]) -> Optional[asyncio.Task]:
+        """Naplánuje doplnění transakce a hned se vrátí"""
+        if not transaction_id:
+            return None
+        task = asyncio.create_task(self._run(transaction_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def wait(self) -> None:
+        """Počká na naplánované úlohy (testy, ukončení aplikace)"""
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    async def _run(self, transaction_id: int) -> None:
+        async with self._semaphore:
+            try:
+                result = await self.enrich(transaction_id)
+                if result['updated']:
+                    logger.info(f"Transakce {transaction_id}: z ARES doplněno {', '.join(result['updated'])}")
+            except Exception as e:
+                logger.error(f"Doplnění protistrany transakce {transaction_id} selhalo: {str(e)}")
+
+    def _session(self):
+        if self.session_factory is not None:
+            return self.session_factory()
+        from app.database.connection import db_manager
+        return db_manager.get_session()
+
+    async def enrich(self, transaction_id: int) -> Dict[str, Any]:
+        """
+        Doplní protistranu transakce z ARES a přepočítá úplnost evidence
+
+        Returns:
+            Dict s transaction_id, seznamem doplněných polí a novou úplností
+        """
+        result = {'transaction_id': transaction_id, 'updated': [], 'completeness': None}
+
+        async with self._session() as session:
+            transaction = await session.get(Transaction, transaction_id)
+            if transaction is None or not transaction.counterparty_ico:
+                return result
+
+            ares = await self.ares_service.validate_ico(
+                transaction.counterparty_ico, need_dic=not transaction.counterparty_dic
+            )
+            # Varování = ARES nebylo dostupné a výsledek nenese žádné údaje
+            if not ares.get('valid') or ares.get('warning'):
+                return result
+
+            updated = self._apply_ares(transaction, ares)
+            if not updated:
+                return result
+
+            has_attachment = await session.scalar(
+                select(func.count()).select_from(TransactionAttachment)
+                .where(TransactionAttachment.transaction_id == transaction_id)
+            )
+            user = await session.get(User, transaction.user_id)
+            evidence = self._evidence_data(transaction, bool(has_attachment))
+            validation = self.validator.validate_transaction(evidence, user)
+
+            transaction.evidence_completeness_score = validation['completeness']
+            transaction.evidence_risk_level = validation['risk_level']
+            transaction.evidence_missing_required = validation['missing_required']
+            transaction.evidence_missing_recommended = validation['missing_recommended']
+            transaction.evidence_compliance_warnings = validation['warnings']
+            transaction.evidence_validation_date = datetime.now()
+            transaction.evidence_needs_attention = validation['risk_level'] in ['high', 'medium-high']
+            await session.commit()
+
+            result['updated'] = updated
+            result['completeness'] = validation['completeness']
+            return result
+
+    def _apply_ares(self, transaction: Transaction, ares: Dict[str, Any]) -> List[str]:
+        """Doplní prázdná pole protistrany, vrací názvy změněných polí"""
+        updated = []
+        address = self.ares_service.format_address(ares.get('address') or {})
+        values = {
+            'counterparty_name': (ares.get('business_name') or '')[:NAME_MAX_LENGTH],
+            'counterparty_dic': (ares.get('dic') or '')[:DIC_MAX_LENGTH],
+            'counterparty_address': address,
+        }
+        for field, value in values.items():
+            if value and not getattr(transaction, field):
+                setattr(transaction, field, value)
+                updated.append(field)
+
+        # Plátce DPH jen podle DIČ, které ARES opravdu vrátil - vat_payer bez DIČ
+        # je odhad z právní formy v názvu, bez DIČ zůstává sloupec jak je (NULL = neověřeno)
+        if ares.get('dic') and transaction.counterparty_vat_payer is not True:
+            transaction.counterparty_vat_payer = True
+            updated.append('counterparty_vat_payer')
+        return updated
+
+    @staticmethod
+    def _evidence_data(transaction: Transaction, has_attachment: bool) -> Dict[str, Any]:
+        """Transakce ve tvaru, který čeká TaxEvidenceValidator"""
+        return {
+            'type': transaction.type,
+            'amount': transaction.amount_czk,
+            'description': transaction.description,
+            'counterparty_name': transaction.counterparty_name,
+            'counterparty_ico': transaction.counterparty_ico,
+            'counterparty_dic': transaction.counterparty_dic,
+            'counterparty_address': transaction.counterparty_address,
+            'document_number': transaction.document_number,
+            'invoice_number': transaction.document_number,
+            'document_date': transaction.document_date,
+            'payment_method': transaction.payment_method,
+            'receipt_photo': has_attachment or None,
+            'invoice_copy': has_attachment or None,
+        }
+
+
+# Globální instance pro ukládání transakcí
+counterparty_enricher = CounterpartyEnricher()
@@ -0,0 +1,285 @@
+"""
+Kontrola XML pro DPH podle XSD schémat EPO
+
+Schémata (dphdp3.xsd, dphkh1.xsd a jejich importy) stáhne z EPO
+scripts/fetch_epo_xsd.py do EPO_XSD_DIR (v Dockerfile při buildu) -
+samotná kontrola na síť nesahá. Každé schéma se zkompiluje jednou
+a drží v paměti, znovu se načte jen když se soubor změní. Soubor se
+kontroluje proudově (iterparse se schématem), hotové elementy se hned
+uvolňují, takže velké KH nezabere paměť.
+
+Bez lxml nebo bez schématu se kontroluje jen správnost XML a výsledek
+to uvádí (checked=False). V produkci (ENVIRONMENT=production nebo
+EPO_XSD_REQUIRED=true) chybějící schéma export odmítne.
+"""
+import logging
+import os
+import shutil
+import threading
+import time
+import urllib.request
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass, field
+from pathlib import Path, PurePosixPath
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urljoin
+
+try:
+    from lxml import etree
+    LXML_AVAILABLE = True
+except ImportError:
+    LXML_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_XSD_DIR = Path(__file__).resolve().parent.parent / 'data' / 'epo_xsd'
+SCHEMA_FILES = {
+    'DP3': 'dphdp3.xsd',
+    'KH1': 'dphkh1.xsd',
+}
+MAX_ERRORS = 20
+
+# Oficiální struktury EPO (Finanční správa ČR), EPO_XSD_URL adresu přepíše
+DEFAULT_XSD_URL = 'https://adisspr.mfcr.cz/adistc/adis/idpr_pub/epo2_info/xsd/'
+SCHEMA_SOURCES = {
+    'DP3': 'dphdp3_epo2.xsd',
+    'KH1': 'dphkh1_epo2.xsd',
+}
+XS_NAMESPACE = '{http://www.w3.org/2001/XMLSchema}'
+
+
+class SchemaFetchError(RuntimeError):
+    """Schémata EPO se nepodařilo stáhnout nebo zkompilovat"""
+
+
+def schemas_required() -> bool:
+    """Musí být XSD k dispozici? EPO_XSD_REQUIRED, jinak jen v produkci"""
+    value = os.getenv('EPO_XSD_REQUIRED')
+    if value is not None:
+        return value.strip().lower() in ('1', 'true', 'yes')
+    return os.getenv('ENVIRONMENT') == 'production'
+
+
+@dataclass
+class SchemaValidation:
+    """Výsledek kontroly jednoho souboru"""
+    document: str
+    valid: bool
+    checked: bool                   # False = jen správnost XML (chybí lxml nebo XSD)
+    errors: List[str] = field(default_factory=list)
+    elements: int = 0
+    elapsed_ms: float = 0.0
+
+
+class EpoSchemaValidator:
+    """Předkompilovaná XSD schémata EPO a proudová kontrola souborů"""
+
+    def __init__(self, directory: Optional[Path] = None, required: Optional[bool] = None):
+        """
+        Args:
+            directory: Adresář se schématy (výchozí EPO_XSD_DIR nebo app/data/epo_xsd)
+            required: Chybějící schéma je chyba (výchozí schemas_required())
+        """
+        self.directory = Path(directory or os.getenv('EPO_XSD_DIR') or DEFAULT_XSD_DIR)
+        self.required = schemas_required() if required is None else required
+        self._schemas: Dict[str, Tuple[float, 'etree.XMLSchema']] = {}
+        self._lock = threading.Lock()
+
+    def schema_path(self, document: str) -> Path:
+        return self.directory / SCHEMA_FILES[document]
+
+    def schema(self, document: str) -> Optional['etree.XMLSchema']:
+        """Zkompilované schéma z cache, None když lxml nebo soubor chybí"""
+        if not LXML_AVAILABLE:
+            return None
+        path = self.schema_path(document)
+        try:
+            mtime = path.stat().st_mtime
+        except OSError:
+            return None
+
+        cached = self._schemas.get(document)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+        with self._lock:
+            cached = self._schemas.get(document)
+            if cached is not None and cached[0] == mtime:
+                return cached[1]
+            started = time.perf_counter()
+            # Importy schémat jen z lokálního adresáře
+            parser = etree.XMLParser(no_network=True, resolve_entities=False)
+            schema = etree.XMLSchema(etree.parse(str(path), parser))
+            self._schemas[document] = (mtime, schema)
+            logger.info(f"XSD {path.name} zkompilováno za {(time.perf_counter() - started) * 1000:.0f} ms")
+            return schema
+
+    def preload(self) -> List[str]:
+        """Zkompiluje dostupná schémata předem (start aplikace), vrací jejich dokumenty"""
+        loaded = []
+        for document in SCHEMA_FILES:
+            try:
+                if self.schema(document) is not None:
+                    loaded.append(document)
+            except (etree.XMLSchemaParseError, etree.XMLSyntaxError) as e:
+                logger.error(f"XSD pro {document} nelze zkompilovat: {str(e)}")
+        return loaded
+
+    def validate_file(self, path: Path, document: str) -> SchemaValidation:
+        """
+        Zkontroluje XML soubor proudově
+
+        Args:
+            path: Soubor DP3/KH1
+            document: 'DP3' nebo 'KH1'
+        """
+        started = time.perf_counter()
+        try:
+            schema = self.schema(document)
+        except (etree.XMLSchemaParseError, etree.XMLSyntaxError) as e:
+            logger.error(f"XSD pro {document} nelze zkompilovat: {str(e)}")
+            schema = None
+
+        if schema is None and self.required:
+            result = SchemaValidation(document, valid=False, checked=False, errors=[
+                f"Chybí XSD schéma {self.schema_path(document)} - spusťte scripts/fetch_epo_xsd.py"
+            ])
+        elif schema is None:
+            result = self._check_well_formed(path, document)
+        else:
+            result = self._validate_with_schema(path, document, schema)
+        result.elapsed_ms = round((time.perf_counter() - started) * 1000, 2)
+        return result
+
+    def _validate_with_schema(self, path: Path, document: str, schema: 'etree.XMLSchema') -> SchemaValidation:
+        elements = 0
+        try:
+            for _, elem in etree.iterparse(str(path), events=('end',), schema=schema,
+                                           no_network=True, resolve_entities=False):
+                elements += 1
+                # Hotový element i předchozí sourozence uvolníme
+                elem.clear()
+                while elem.getprevious() is not None:
+                    del elem.getparent()[0]
+        except etree.XMLSyntaxError as e:
+            errors = self._error_lines(e.error_log)
+            if errors and all(error.line for error in e.error_log):
+                return SchemaValidation(document, valid=False, checked=True, errors=errors, elements=elements)
+            # Chyby schématu při proudovém čtení nemají číslo řádku - chybný soubor
+            # projdeme ještě jednou celý, ať uživatel ví, kde chybu hledat
+            return SchemaValidation(document, valid=False, checked=True,
+                                    errors=self._full_validation_errors(path, schema) or errors or [str(e)],
+                                    elements=elements)
+        except OSError as e:
+            return SchemaValidation(document, valid=False, checked=True, errors=[str(e)])
+        return SchemaValidation(document, valid=True, checked=True, elements=elements)
+
+    @staticmethod
+    def _error_lines(error_log) -> List[str]:
+        return [
+            f"řádek {error.line}: {error.message}" if error.line else error.message
+            for error in error_log
+        ][:MAX_ERRORS]
+
+    def _full_validation_errors(self, path: Path, schema: 'etree.XMLSchema') -> List[str]:
+        parser = etree.XMLParser(no_network=True, resolve_entities=False, huge_tree=True)
+        try:
+            tree = etree.parse(str(path), parser)
+        except etree.XMLSyntaxError as e:
+            return self._error_lines(e.error_log)
+        schema.validate(tree)
+        return self._error_lines(schema.error_log)
+
+    @staticmethod
+    def _check_well_formed(path: Path, document: str) -> SchemaValidation:
+        elements = 0
+        try:
+            for _, elem in ET.iterparse(str(path), events=('end',)):
+                elements += 1
+                elem.clear()
+        except (ET.ParseError, OSError) as e:
+            return SchemaValidation(document, valid=False, checked=False, errors=[str(e)], elements=elements)
+        return SchemaValidation(document, valid=True, checked=False, elements=elements)
+
+
+def _download(url: str, timeout: float) -> bytes:
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            return response.read()
+    except (OSError, ValueError) as e:
+        raise SchemaFetchError(f"{url}: {str(e)}") from e
+
+
+def _schema_locations(content: bytes, url: str) -> List[str]:
+    """Relativní schemaLocation z xs:import a xs:include"""
+    try:
+        root = ET.fromstring(content)
+    except ET.ParseError as e:
+        raise SchemaFetchError(f"{url} není platné XSD: {str(e)}") from e
+    locations = []
+    for tag in ('import', 'include'):
+        for elem in root.iter(f"{XS_NAMESPACE}{tag}"):
+            location = elem.get('schemaLocation')
+            if not location:
+                continue
+            # Kontrola běží bez sítě - importy musí ležet vedle schématu
+            if '://' in location or PurePosixPath(location).is_absolute() or '..' in PurePosixPath(location).parts:
+                raise SchemaFetchError(f"{url} importuje {location} mimo adresář schémat")
+            locations.append(location)
+    return locations
+
+
+def fetch_schemas(directory: Optional[Path] = None, base_url: Optional[str] = None,
+                  timeout: float = 30.0) -> List[Path]:
+    """
+    Stáhne schémata DP3/KH1 i s importy a ověří, že jdou zkompilovat
+
+    Soubory se zapíší až po úspěšném stažení všech, stávající schémata
+    tak chyba nepřepíše. Jakákoliv chyba je SchemaFetchError.
+
+    Returns:
+        Zapsané soubory
+    """
+    directory = Path(directory or os.getenv('EPO_XSD_DIR') or DEFAULT_XSD_DIR)
+    base_url = base_url or os.getenv('EPO_XSD_URL') or DEFAULT_XSD_URL
+    if not base_url.endswith('/'):
+        base_url += '/'
+
+    files: Dict[str, bytes] = {}
+    for document, source in SCHEMA_SOURCES.items():
+        queue = [(urljoin(base_url, source), SCHEMA_FILES[document])]
+        while queue:
+            url, name = queue.pop()
+            if name in files:
+                continue
+            files[name] = _download(url, timeout)
+            for location in _schema_locations(files[name], url):
+                target = str(PurePosixPath(name).parent / location)
+                queue.append((urljoin(url, location), target))
+
+    directory.mkdir(parents=True, exist_ok=True)
+    staging = directory / '.download'
+    written = []
+    for name, content in files.items():
+        path = staging / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(content)
+    try:
+        if LXML_AVAILABLE:
+            for document in SCHEMA_SOURCES:
+                try:
+                    EpoSchemaValidator(staging, required=True).schema(document)
+                except (etree.XMLSchemaParseError, etree.XMLSyntaxError) as e:
+                    raise SchemaFetchError(f"XSD pro {document} nelze zkompilovat: {str(e)}") from e
+        for name in files:
+            target = directory / name
+            target.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(staging / name, target)
+            written.append(target)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+    return written
+
+
+# Globální instance - schémata se kompilují při startu nebo první kontrole
+epo_schema_validator = EpoSchemaValidator()
@@ -0,0 +1,347 @@
+"""
+Kurzy ČNB bez čekání na síť
+
+Kurzovní lístek se při startu načte z posledního uloženého souboru
+(CNB_RATES_PATH), takže start procesu ani nový CurrencyConverter nic
+nestahuje. Nový lístek ČNB vyhlašuje v pracovní dny po 14:30 - teprve
+potom je ten uložený zastaralý a stáhne se asynchronně na pozadí, buď
+smyčkou spuštěnou při startu aplikace, nebo při prvním dotazu na kurz.
+
+Dotazy čtou neměnný snímek (RateSnapshot); obnova připraví nový snímek
+a jen vymění odkaz, takže čtení nikdy nevidí napůl přepsanou tabulku.
+Pevné záložní kurzy se použijí jen když neexistuje žádný uložený lístek
+a je to vidět v metrice cnb_rates_fallback i v /health.
+"""
+import asyncio
+import json
+import logging
+import os
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+import aiohttp
+import requests
+
+from app.services.rate_history import rate_history
+
+try:
+    from prometheus_client import Counter, Gauge
+    CNB_RATES_AGE = Gauge('cnb_rates_age_seconds', 'Seconds since publication of the ČNB rate table in use')
+    CNB_RATES_STALE = Gauge('cnb_rates_stale', 'ČNB published a newer rate table than the one in use')
+    CNB_RATES_FALLBACK = Gauge('cnb_rates_fallback', 'Hardcoded fallback rates are in use')
+    CNB_RATES_REFRESH = Counter('cnb_rates_refresh_total', 'ČNB rate table downloads', ['outcome'])
+    METRICS_AVAILABLE = True
+except ImportError:
+    METRICS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+CNB_DAILY_URL = ("https://www.cnb.cz/cs/financni-trhy/devizovy-trh/kurzy-devizoveho-trhu/"
+                 "kurzy-devizoveho-trhu/denni_kurz.txt")
+DEFAULT_RATES_PATH = Path(__file__).resolve().parent.parent / 'data' / 'cnb_rates.json'
+
+PRAGUE = ZoneInfo('Europe/Prague')
+PUBLICATION_TIME = time(14, 30)          # ČNB vyhlašuje kurzy v pracovní dny po 14:30
+PUBLICATION_DELAY = timedelta(minutes=5)  # rezerva, než je nový lístek ke stažení
+
+# Poslední záchrana, když není uložený žádný lístek - jen pro orientační převod
+FALLBACK_RATES = {
+    'CZK': Decimal('1.0'),
+    'EUR': Decimal('24.50'),
+    'USD': Decimal('22.80'),
+    'GBP': Decimal('28.90'),
+    'PLN': Decimal('5.60')
+}
+
+
+@dataclass(frozen=True)
+class RateSnapshot:
+    """Jeden kurzovní lístek - kurz za 1 jednotku měny v CZK"""
+    valid_for: Optional[date]          # datum vyhlášení, None u záložních kurzů
+    rates: Mapping[str, Decimal]
+    fetched_at: datetime
+    source: str                        # 'cnb', 'file' nebo 'fallback'
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            'valid_for': self.valid_for.isoformat(),
+            'fetched_at': self.fetched_at.isoformat(),
+            'rates': {code: str(rate) for code, rate in self.rates.items()},
+        }
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any], source: str = 'file') -> 'RateSnapshot':
+        return cls(
+            valid_for=date.fromisoformat(data['valid_for']),
+            rates=MappingProxyType({code: Decimal(rate) for code, rate in data['rates'].items()}),
+            fetched_at=datetime.fromisoformat(data['fetched_at']),
+            source=source,
+        )
+
+
+def parse_cnb_daily(text: str) -> Tuple[date, Dict[str, Decimal]]:
+    """
+    Parsuje denní kurzovní lístek ČNB
+
+    Formát:
+        17.10.2025 #202
+        země|měna|množství|kód|kurz
+        EMU|euro|1|EUR|24,335
+
+    Returns:
+        (datum vyhlášení, kurzy za 1 jednotku měny)
+
+    Raises:
+        ValueError: text nevypadá jako kurzovní lístek
+    """
+    lines = [line.strip() for line in text.strip().splitlines()]
+    if len(lines) < 3:
+        raise ValueError("Kurzovní lístek ČNB je prázdný")
+
+    try:
+        valid_for = datetime.strptime(lines[0].split('#')[0].strip(), '%d.%m.%Y').date()
+    except ValueError:
+        raise ValueError(f"Neočekávaná hlavička kurzovního lístku: {lines[0][:40]}")
+
+    rates = {'CZK': Decimal('1.0')}
+    for line in lines[2:]:
+        parts = line.split('|')
+        if len(parts) < 5:
+            continue
+        try:
+            # Některé měny jsou per 100 (např. JPY)
+            rates[parts[3].strip()] = Decimal(parts[4].strip().replace(',', '.')) / Decimal(parts[2].strip())
+        except (InvalidOperation, ArithmeticError):
+            continue
+
+    if len(rates) == 1:
+        raise ValueError("Kurzovní lístek ČNB neobsahuje žádné kurzy")
+    return valid_for, rates
+
+
+def latest_publication(now: Optional[datetime] = None) -> date:
+    """Datum posledního lístku, který už ČNB měla vyhlásit (bez svátků)"""
+    local = (now or datetime.now(PRAGUE)).astimezone(PRAGUE)
+    day = local.date()
+    if local.time() < (datetime.combine(day, PUBLICATION_TIME) + PUBLICATION_DELAY).time():
+        day -= timedelta(days=1)
+    while day.weekday() >= 5:
+        day -= timedelta(days=1)
+    return day
+
+
+def next_publication(now: Optional[datetime] = None) -> datetime:
+    """Okamžik, kdy má být ke stažení další lístek"""
+    local = (now or datetime.now(PRAGUE)).astimezone(PRAGUE)
+    day = local.date()
+    while True:
+        moment = datetime.combine(day, PUBLICATION_TIME, tzinfo=PRAGUE) + PUBLICATION_DELAY
+        if day.weekday() < 5 and moment > local:
+            return moment
+        day += timedelta(days=1)
+
+
+class ExchangeRateService:
+    """Kurzy ČNB z uloženého lístku s obnovou na pozadí"""
+
+    def __init__(self, path: Optional[Path] = None, url: str = CNB_DAILY_URL,
+                 retry_interval: timedelta = timedelta(minutes=15)):
+        """
+        Args:
+            path: soubor s posledním lístkem, výchozí CNB_RATES_PATH
+            url: adresa denního lístku ČNB
+            retry_interval: po neúspěšném stažení se další pokus zkusí až po této době
+        """
+        self.path = Path(path or os.getenv('CNB_RATES_PATH') or DEFAULT_RATES_PATH)
+        self.url = url
+        self.retry_interval = retry_interval
+        self._snapshot: Optional[RateSnapshot] = None
+        self._last_attempt: Optional[datetime] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._runner: Optional[asyncio.Task] = None
+
+    @property
+    def snapshot(self) -> RateSnapshot:
+        """Aktuální lístek - při prvním použití se načte z disku, bez sítě"""
+        if self._snapshot is None:
+            self._snapshot = self._load() or self._fallback()
+            if self._snapshot.valid_for:
+                rate_history.add_table(self._snapshot.valid_for, dict(self._snapshot.rates))
+            self._update_metrics()
+        return self._snapshot
+
+    def get_rate(self, currency: str) -> Optional[Decimal]:
+        """Kurz za 1 jednotku měny v CZK, None pro neznámou měnu"""
+        snapshot = self.snapshot
+        self.refresh_in_background()
+        return snapshot.rates.get(currency)
+
+    def is_stale(self, now: Optional[datetime] = None) -> bool:
+        """ČNB už vyhlásila novější lístek, než jaký používáme"""
+        valid_for = self.snapshot.valid_for
+        return valid_for is None or valid_for < latest_publication(now)
+
+    def age_seconds(self, now: Optional[datetime] = None) -> float:
+        """Doba od vyhlášení používaného lístku"""
+        valid_for = self.snapshot.valid_for
+        if valid_for is None:
+            return float('inf')
+        published = datetime.combine(valid_for, PUBLICATION_TIME, tzinfo=PRAGUE)
+        return max(((now or datetime.now(PRAGUE)) - published).total_seconds(), 0.0)
+
+    def install(self, valid_for: date, rates: Dict[str, Decimal], source: str = 'cnb') -> RateSnapshot:
+        """Vymění používaný lístek za nový a uloží ho na disk"""
+        snapshot = RateSnapshot(valid_for, MappingProxyType(dict(rates)), datetime.now(), source)
+        self._snapshot = snapshot
+        rate_history.add_table(valid_for, rates)
+        self._save(snapshot)
+        self._update_metrics()
+        return snapshot
+
+    def refresh_in_background(self) -> Optional[asyncio.Task]:
+        """Spustí stažení lístku, pokud je zastaralý a běží event loop - nečeká na něj"""
+        if self._refresh_task and not self._refresh_task.done():
+            return self._refresh_task
+        if not self.is_stale() or not self._retry_allowed():
+            return None
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return None
+        self._refresh_task = loop.create_task(self.refresh())
+        return self._refresh_task
+
+    async def refresh(self) -> bool:
+        """Stáhne aktuální lístek z ČNB; při chybě zůstane ten dosavadní"""
+        self._last_attempt = datetime.now()
+        try:
+            valid_for, rates = parse_cnb_daily(await self._download())
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            logger.warning(f"Kurzovní lístek ČNB se nepodařilo stáhnout: {str(e)}")
+            if METRICS_AVAILABLE:
+                CNB_RATES_REFRESH.labels(outcome='error').inc()
+            return False
+
+        if METRICS_AVAILABLE:
+            CNB_RATES_REFRESH.labels(outcome='ok').inc()
+        if self._snapshot and self._snapshot.valid_for == valid_for and self._snapshot.source != 'fallback':
+            # Svátek nebo lístek ještě nevyšel - ČNB vrací ten předchozí
+            return True
+
+        snapshot = RateSnapshot(valid_for, MappingProxyType(rates), datetime.now(), 'cnb')
+        self._snapshot = snapshot
+        rate_history.add_table(valid_for, rates)
+        await asyncio.to_thread(self._save, snapshot)
+        self._update_metrics()
+        logger.info(f"Kurzovní lístek ČNB z {valid_for.isoformat()} načten: {len(rates)} měn")
+        return True
+
+    def refresh_blocking(self) -> bool:
+        """Synchronně stáhne aktuální lístek - jen pro skripty, aplikace obnovuje kurzy na pozadí"""
+        self._last_attempt = datetime.now()
+        try:
+            response = requests.get(self.url, timeout=10)
+            response.raise_for_status()
+            response.encoding = 'utf-8'
+            valid_for, rates = parse_cnb_daily(response.text)
+        except (requests.RequestException, ValueError) as e:
+            logger.error(f"Chyba při stahování kurzů z ČNB: {str(e)}")
+            return False
+
+        self.install(valid_for, rates)
+        logger.info(f"Kurzovní lístek aktualizován: {len(rates)} měn")
+        return True
+
+    async def run(self) -> None:
+        """Smyčka obnovy podle harmonogramu vyhlašování ČNB"""
+        while True:
+            if self.is_stale() and self._retry_allowed():
+                await self.refresh()
+            self._update_metrics()
+
+            if self.is_stale():
+                delay = self.retry_interval.total_seconds()
+            else:
+                delay = (next_publication() - datetime.now(PRAGUE)).total_seconds()
+            await asyncio.sleep(max(delay, 1))
+
+    def start(self) -> asyncio.Task:
+        """Spustí smyčku obnovy (při startu aplikace)"""
+        if self._runner is None or self._runner.done():
+            self._runner = asyncio.create_task(self.run())
+        return self._runner
+
+    async def stop(self) -> None:
+        for task in (self._runner, self._refresh_task):
+            if task and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+
+    def stats(self) -> Dict[str, Any]:
+        """Stav kurzovního lístku pro /health"""
+        snapshot = self.snapshot
+        age = self.age_seconds()
+        return {
+            'valid_for': snapshot.valid_for.isoformat() if snapshot.valid_for else None,
+            'source': snapshot.source,
+            'stale': self.is_stale(),
+            'age_hours': round(age / 3600, 1) if age != float('inf') else None,
+            'currencies': len(snapshot.rates),
+        }
+
+    async def _download(self) -> str:
+        timeout = aiohttp.ClientTimeout(total=10)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            async with session.get(self.url) as response:
+                response.raise_for_status()
+                return await response.text(encoding='utf-8')
+
+    def _retry_allowed(self) -> bool:
+        return self._last_attempt is None or datetime.now() - self._last_attempt >= self.retry_interval
+
+    def _load(self) -> Optional[RateSnapshot]:
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                snapshot = RateSnapshot.from_json(json.load(f))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, InvalidOperation) as e:
+            logger.warning(f"Uložený kurzovní lístek {self.path} nelze načíst: {str(e)}")
+            return None
+        logger.info(f"Kurzovní lístek ČNB z {snapshot.valid_for.isoformat()} načten z {self.path}")
+        return snapshot
+
+    def _save(self, snapshot: RateSnapshot) -> None:
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_name(self.path.name + '.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(snapshot.to_json(), f, ensure_ascii=False, indent=1)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Kurzovní lístek se nepodařilo uložit do {self.path}: {str(e)}")
+
+    def _fallback(self) -> RateSnapshot:
+        logger.warning("Žádný uložený kurzovní lístek ČNB - do stažení platí záložní kurzy")
+        return RateSnapshot(None, MappingProxyType(dict(FALLBACK_RATES)), datetime.now(), 'fallback')
+
+    def _update_metrics(self) -> None:
+        if METRICS_AVAILABLE:
+            CNB_RATES_STALE.set(1 if self.is_stale() else 0)
+            CNB_RATES_FALLBACK.set(1 if self.snapshot.source == 'fallback' else 0)
+
+
+# Globální instance sdílená všemi převodníky měn
+exchange_rate_service = ExchangeRateService()
+
+if METRICS_AVAILABLE:
+    # Stáří se počítá až při čtení /metrics, aby nezamrzlo mezi obnovami
+    CNB_RATES_AGE.set_function(exchange_rate_service.age_seconds)
@@ -0,0 +1,340 @@
+"""
+Předzpracování fotek účtenek pro OCR
+
+Pipeline nad NumPy/OpenCV: oprava EXIF orientace, výřez účtenky z fotky
+(perspektivní transformace), zmenšení na cílovou výšku textu (nebo DPI),
+vyrovnání náklonu a adaptivní prahování.
+JPEG fotky z telefonu (typicky 12 MPx) se dekódují rovnou ve zmenšeném
+měřítku a v odstínech šedi, takže plné barevné rozlišení se nikdy nedrží
+v paměti. Mezikroky zapisují do předalokovaných bufferů (parametr ``dst``).
+"""
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from PIL import Image
+
+try:
+    import cv2
+    import numpy as np
+    CV2_AVAILABLE = True
+except ImportError:
+    CV2_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# EXIF tag Orientation a transpozice, která obrázek narovná
+EXIF_ORIENTATION_TAG = 0x0112
+EXIF_TRANSPOSE = {
+    2: Image.FLIP_LEFT_RIGHT,
+    3: Image.ROTATE_180,
+    4: Image.FLIP_TOP_BOTTOM,
+    5: Image.TRANSPOSE,
+    6: Image.ROTATE_270,
+    7: Image.TRANSVERSE,
+    8: Image.ROTATE_90,
+}
+
+
+@dataclass(frozen=True)
+class PreprocessSettings:
+    """Nastavení předzpracování - výchozí hodnoty jsou laděné na účtenky"""
+    target_text_height: int = 32        # výška znaku v px, Tesseract je nejlepší kolem 25-35 px
+    target_dpi: Optional[int] = None    # pokud je nastaveno, škáluje se podle DPI místo výšky textu
+    receipt_width_mm: float = 80.0      # šířka termo účtenky pro přepočet DPI
+    max_long_side: int = 2400           # horní mez delší strany po zmenšení
+    min_long_side: int = 800            # pod tuto mez obrázek nezmenšujeme
+    max_upscale: float = 2.0
+    deskew: bool = True
+    max_skew_angle: float = 15.0        # větší náklon už je spíš rotace, ne šikmá fotka
+    adaptive_threshold: bool = True
+    adaptive_block_size: int = 31       # liché číslo, zhruba 1-2 výšky znaku
+    adaptive_c: int = 15
+    crop_receipt: bool = True
+    min_receipt_area: float = 0.15      # podíl plochy fotky, menší čtyřúhelník je spíš šum
+    max_receipt_area: float = 0.95      # větší = účtenka vyplňuje celou fotku, není co ořezat
+
+
+DEFAULT_SETTINGS = PreprocessSettings()
+
+
+@dataclass
+class PreprocessResult:
+    """Výsledek předzpracování včetně metrik pro logování a benchmark"""
+    image: Image.Image
+    original_size: tuple
+    decoded_size: tuple
+    final_size: tuple
+    scale: float = 1.0
+    text_height: Optional[float] = None
+    skew_angle: float = 0.0
+    receipt_quad: Optional[list] = None
+    timings_ms: Dict[str, float] = field(default_factory=dict)
+
+
+def get_exif_orientation(image: Image.Image) -> int:
+    """Vrátí EXIF orientaci (1 = bez otočení), čte jen hlavičku bez dekódování pixelů"""
+    try:
+        return int(image.getexif().get(EXIF_ORIENTATION_TAG, 1))
+    except Exception:
+        return 1
+
+
+def load_grayscale(image: Image.Image, max_long_side: int) -> Image.Image:
+    """
+    Načte obrázek v odstínech šedi se správnou orientací.
+    U JPEG využije draft režim dekodéru (škálování 1/2, 1/4, 1/8 už při dekódování).
+    """
+    orientation = get_exif_orientation(image)
+
+    width, height = image.size
+    factor = max_long_side / max(width, height)
+    if factor < 1 and image.format == 'JPEG':
+        # Draft vybere největší zmenšení, po kterém je obrázek pořád >= požadované velikosti
+        image.draft('L', (max(1, int(width * factor)), max(1, int(height * factor))))
+
+    if image.mode != 'L':
+        image = image.convert('L')
+
+    transpose = EXIF_TRANSPOSE.get(orientation)
+    if transpose is not None:
+        image = image.transpose(transpose)
+
+    return image
+
+
+def estimate_text_height(gray: "np.ndarray") -> Optional[float]:
+    """
+    Odhadne výšku znaku jako medián výšek souvislých komponent,
+    které tvarem odpovídají písmenům.
+    """
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    count, _, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+    if count < 2:
+        return None
+
+    heights = stats[1:, cv2.CC_STAT_HEIGHT]
+    widths = stats[1:, cv2.CC_STAT_WIDTH]
+    glyphs = (heights >= 6) & (heights <= gray.shape[0] // 8) & (widths <= heights * 2) & (widths >= 2)
+    if np.count_nonzero(glyphs) < 15:
+        return None
+
+    return float(np.median(heights[glyphs]))
+
+
+def compute_scale(gray: "np.ndarray", settings: PreprocessSettings) -> tuple:
+    """Vrátí (scale, text_height) pro zmenšení na cílovou velikost textu nebo DPI"""
+    height, width = gray.shape[:2]
+    long_side = max(height, width)
+    text_height = None
+
+    if settings.target_dpi:
+        target_width_px = settings.target_dpi * settings.receipt_width_mm / 25.4
+        scale = target_width_px / min(height, width)
+    else:
+        text_height = estimate_text_height(gray)
+        scale = settings.target_text_height / text_height if text_height else 1.0
+
+    scale = min(scale, settings.max_long_side / long_side, settings.max_upscale)
+    if long_side * scale < settings.min_long_side:
+        scale = min(settings.min_long_side / long_side, max(scale, 1.0))
+
+    return scale, text_height
+
+
+def estimate_skew_angle(binary_inv: "np.ndarray", max_angle: float) -> float:
+    """
+    Odhadne náklon řádků textu ve stupních (kladný = proti směru hodinových ručiček)
+    z obdélníku s minimální plochou kolem všech textových pixelů.
+    """
+    coords = cv2.findNonZero(binary_inv)
+    if coords is None or len(coords) < 100:
+        return 0.0
+
+    (_, _), (rect_w, rect_h), angle = cv2.minAreaRect(coords)
+    # Normalizace nezávislá na konvenci OpenCV verze: náklon delší strany k ose x
+    if rect_w < rect_h:
+        angle -= 90
+    angle = ((angle + 45) % 90) - 45
+
+    if abs(angle) > max_angle or abs(angle) < 0.3:
+        return 0.0
+    return -angle
+
+
+def detect_skew(gray: "np.ndarray", max_angle: float, work_size: int = 1000) -> float:
+    """Odhad náklonu na zmenšené kopii - na přesnost úhlu stačí ~1000 px"""
+    factor = min(1.0, work_size / max(gray.shape[:2]))
+    if factor < 1.0:
+        small = cv2.resize(gray, None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA)
+    else:
+        small = gray
+    _, binary_inv = cv2.threshold(small, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    return estimate_skew_angle(binary_inv, max_angle)
+
+
+def rotate(gray: "np.ndarray", angle: float) -> "np.ndarray":
+    """Otočí obrázek kolem středu, okraje doplní opakováním (bez černých rohů)"""
+    height, width = gray.shape[:2]
+    matrix = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+    return cv2.warpAffine(gray, matrix, (width, height), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+
+
+def order_quad(points: "np.ndarray") -> "np.ndarray":
+    """Seřadí 4 body čtyřúhelníku: levý horní, pravý horní, pravý dolní, levý dolní"""
+    points = points.reshape(4, 2).astype(np.float32)
+    sums = points.sum(axis=1)
+    diffs = np.diff(points, axis=1).ravel()
+    return np.array([
+        points[np.argmin(sums)],
+        points[np.argmin(diffs)],
+        points[np.argmax(sums)],
+        points[np.argmax(diffs)],
+    ], dtype=np.float32)
+
+
+def _quad_from_contour(contour: "np.ndarray") -> Optional["np.ndarray"]:
+    """Aproximuje kontur čtyřúhelníkem, pokud to jde bez velké ztráty plochy"""
+    perimeter = cv2.arcLength(contour, True)
+    approx = cv2.approxPolyDP(contour, 0.02 * perimeter, True)
+    if len(approx) == 4 and cv2.isContourConvex(approx):
+        return approx
+
+    # Zmačkaná účtenka nemá rovné hrany - stačí, když ji otočený obdélník dobře pokrývá
+    rect = cv2.minAreaRect(contour)
+    rect_area = rect[1][0] * rect[1][1]
+    if rect_area > 0 and cv2.contourArea(contour) / rect_area >= 0.85:
+        return cv2.boxPoints(rect)
+    return None
+
+
+def detect_receipt_region(gray: "np.ndarray", settings: PreprocessSettings = DEFAULT_SETTINGS,
+                          work_size: int = 500) -> Optional["np.ndarray"]:
+    """
+    Najde čtyřúhelník účtenky na fotce (hrany přes Canny, jinak světlá plocha papíru).
+
+    Returns:
+        4 body v souřadnicích vstupního obrázku (seřazené přes order_quad),
+        nebo None pokud si detekce není jistá - pak se zpracuje celý obrázek
+    """
+    height, width = gray.shape[:2]
+    factor = min(1.0, work_size / max(height, width))
+    small = cv2.resize(gray, None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA) if factor < 1.0 else gray
+    small = cv2.GaussianBlur(small, (5, 5), 0)
+    small_area = small.shape[0] * small.shape[1]
+
+    edges = cv2.Canny(small, 50, 150)
+    edges = cv2.dilate(edges, cv2.getStructuringElement(cv2.MORPH_RECT, (5, 5)))
+    _, paper = cv2.threshold(small, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+
+    for mask in (edges, paper):
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        for contour in sorted(contours, key=cv2.contourArea, reverse=True)[:5]:
+            area_ratio = cv2.contourArea(contour) / small_area
+            if area_ratio < settings.min_receipt_area:
+                break
+            if area_ratio > settings.max_receipt_area:
+                continue
+            quad = _quad_from_contour(contour)
+            if quad is None:
+                continue
+
+            # Účtenka je světlý papír - uvnitř musí být výrazně světleji než kolem
+            inside = np.zeros(small.shape, dtype=np.uint8)
+            cv2.fillConvexPoly(inside, quad.reshape(-1, 2).astype(np.int32), 255)
+            mean_inside = cv2.mean(small, mask=inside)[0]
+            mean_outside = cv2.mean(small, mask=cv2.bitwise_not(inside))[0]
+            if mean_inside - mean_outside < 25:
+                continue
+
+            return order_quad(quad) / factor
+
+    return None
+
+
+def warp_receipt(gray: "np.ndarray", quad: "np.ndarray") -> "np.ndarray":
+    """Perspektivní transformace čtyřúhelníku účtenky na obdélník"""
+    top_left, top_right, bottom_right, bottom_left = quad
+    width = int(max(np.linalg.norm(top_right - top_left), np.linalg.norm(bottom_right - bottom_left)))
+    height = int(max(np.linalg.norm(bottom_left - top_left), np.linalg.norm(bottom_right - top_right)))
+    target = np.array([[0, 0], [width - 1, 0], [width - 1, height - 1], [0, height - 1]], dtype=np.float32)
+    matrix = cv2.getPerspectiveTransform(quad.astype(np.float32), target)
+    return cv2.warpPerspective(gray, matrix, (width, height), flags=cv2.INTER_LINEAR,
+                               borderMode=cv2.BORDER_REPLICATE)
+
+
+def preprocess_for_ocr(image: Image.Image, settings: PreprocessSettings = DEFAULT_SETTINGS) -> PreprocessResult:
+    """
+    Kompletní předzpracování pro Tesseract
+
+    Args:
+        image: PIL obrázek otevřený přes Image.open (ještě nenačtený - kvůli draft režimu)
+        settings: parametry pipeline
+
+    Returns:
+        PreprocessResult s binarizovaným obrázkem a metrikami
+    """
+    timings = {}
+    original_size = image.size
+
+    started = time.perf_counter()
+    pil_gray = load_grayscale(image, settings.max_long_side)
+    gray = np.asarray(pil_gray)
+    decoded_size = pil_gray.size
+    timings['decode'] = (time.perf_counter() - started) * 1000
+
+    receipt_quad = None
+    if settings.crop_receipt:
+        started = time.perf_counter()
+        quad = detect_receipt_region(gray, settings)
+        if quad is not None:
+            gray = warp_receipt(gray, quad)
+            receipt_quad = quad.round().astype(int).tolist()
+        timings['crop'] = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    scale, text_height = compute_scale(gray, settings)
+    if abs(scale - 1.0) > 0.05:
+        new_size = (max(1, round(gray.shape[1] * scale)), max(1, round(gray.shape[0] * scale)))
+        interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_CUBIC
+        resized = np.empty((new_size[1], new_size[0]), dtype=np.uint8)
+        cv2.resize(gray, new_size, dst=resized, interpolation=interpolation)
+        gray = resized
+    else:
+        scale = 1.0
+    timings['resize'] = (time.perf_counter() - started) * 1000
+
+    skew_angle = 0.0
+    if settings.deskew:
+        started = time.perf_counter()
+        skew_angle = detect_skew(gray, settings.max_skew_angle)
+        if skew_angle:
+            gray = rotate(gray, -skew_angle)
+        timings['deskew'] = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    binary = np.empty_like(gray)
+    if settings.adaptive_threshold:
+        cv2.adaptiveThreshold(
+            gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY,
+            settings.adaptive_block_size, settings.adaptive_c, dst=binary
+        )
+    else:
+        cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU, dst=binary)
+    timings['threshold'] = (time.perf_counter() - started) * 1000
+
+    # fromarray nad souvislým uint8 polem sdílí paměť, nekopíruje
+    result_image = Image.fromarray(binary)
+
+    return PreprocessResult(
+        image=result_image,
+        original_size=original_size,
+        decoded_size=decoded_size,
+        final_size=result_image.size,
+        scale=scale,
+        text_height=text_height,
+        skew_angle=skew_angle,
+        receipt_quad=receipt_quad,
+        timings_ms=timings
+    )
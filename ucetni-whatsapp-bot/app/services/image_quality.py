@@ -0,0 +1,123 @@
+"""
+Rychlá kontrola kvality fotky účtenky před OCR
+
+Rozmazané, tmavé nebo přepálené fotky odmítneme dřív, než za ně zaplatíme
+celý průchod Tesseractem a volání LLM. Všechny metriky se počítají na
+zmenšené kopii (JPEG se rovnou dekóduje v draft režimu), takže kontrola
+trvá jednotky milisekund. Uživatel dostane konkrétní radu místo obecných tipů.
+"""
+import io
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from PIL import Image
+
+try:
+    import cv2
+    import numpy as np
+    CV2_AVAILABLE = True
+except ImportError:
+    CV2_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class QualityThresholds:
+    """Prahy kontroly kvality - kalibrované na pracovní velikost work_size"""
+    work_size: int = 640             # delší strana kopie, na které se měří
+    min_short_side: int = 480        # menší fotka nemá dost pixelů na znaky
+    min_blur_variance: float = 100.0 # rozptyl Laplaciánu, pod tím je text rozmazaný
+    min_brightness: float = 60.0     # průměrný jas 0-255
+    max_dark_ratio: float = 0.75     # podíl pixelů pod 40
+    max_bright_ratio: float = 0.60   # podíl přepálených pixelů nad 250
+    min_contrast: float = 25.0       # rozptyl jasu mezi 5. a 95. percentilem
+
+
+DEFAULT_THRESHOLDS = QualityThresholds()
+
+# Konkrétní rady pro jednotlivé problémy
+QUALITY_HINTS = {
+    'too_small': 'Fotka má příliš malé rozlišení. Pošlete ji prosím v plné kvalitě (ne jako náhled).',
+    'blurry': 'Fotka je rozmazaná. Podržte telefon v klidu a ťukněte na účtenku, aby zaostřil.',
+    'too_dark': 'Fotka je příliš tmavá. Vyfoťte účtenku u okna nebo pod lampou.',
+    'overexposed': 'Fotka je přesvícená (odlesk nebo blesk). Vypněte blesk a nakloňte účtenku mimo světlo.',
+    'low_contrast': ('Text na fotce je málo kontrastní. Položte účtenku na tmavší podklad '
+                     'a zajistěte rovnoměrné světlo.'),
+}
+
+
+@dataclass
+class QualityReport:
+    """Výsledek kontroly - ok, případně kód problému, rada a naměřené metriky"""
+    ok: bool
+    issue: Optional[str] = None
+    hint: Optional[str] = None
+    metrics: Dict[str, float] = field(default_factory=dict)
+
+
+def assess_quality(image_data: bytes, thresholds: QualityThresholds = DEFAULT_THRESHOLDS) -> QualityReport:
+    """
+    Změří ostrost, jas, kontrast a rozlišení fotky
+
+    Args:
+        image_data: obrázek jako bytes (dekóduje se samostatně, vstup se nemění)
+        thresholds: prahy pro odmítnutí
+
+    Returns:
+        QualityReport; bez OpenCV nebo při chybě dekódování vždy ok=True,
+        rozhodnutí pak nechá na OCR
+    """
+    if not CV2_AVAILABLE:
+        return QualityReport(ok=True)
+
+    started = time.perf_counter()
+    try:
+        image = Image.open(io.BytesIO(image_data))
+        width, height = image.size
+        if image.format == 'JPEG':
+            factor = thresholds.work_size / max(width, height)
+            if factor < 1:
+                image.draft('L', (int(width * factor), int(height * factor)))
+        gray = np.asarray(image.convert('L'))
+    except Exception as e:
+        logger.warning(f"Kontrola kvality nemohla načíst obrázek: {str(e)}")
+        return QualityReport(ok=True)
+
+    factor = thresholds.work_size / max(gray.shape)
+    if factor < 1:
+        gray = cv2.resize(gray, None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA)
+
+    histogram = np.bincount(gray.ravel(), minlength=256)
+    total = gray.size
+    cumulative = np.cumsum(histogram)
+    p5 = int(np.searchsorted(cumulative, total * 0.05))
+    p95 = int(np.searchsorted(cumulative, total * 0.95))
+
+    metrics = {
+        'width': width,
+        'height': height,
+        'blur_variance': round(float(cv2.Laplacian(gray, cv2.CV_32F).var()), 1),
+        'brightness': round(float(np.dot(histogram, np.arange(256)) / total), 1),
+        'contrast': p95 - p5,
+        'dark_ratio': round(float(histogram[:40].sum() / total), 3),
+        'bright_ratio': round(float(histogram[251:].sum() / total), 3),
+    }
+
+    if min(width, height) < thresholds.min_short_side:
+        issue = 'too_small'
+    elif metrics['brightness'] < thresholds.min_brightness or metrics['dark_ratio'] > thresholds.max_dark_ratio:
+        issue = 'too_dark'
+    elif metrics['bright_ratio'] > thresholds.max_bright_ratio:
+        issue = 'overexposed'
+    elif metrics['contrast'] < thresholds.min_contrast:
+        issue = 'low_contrast'
+    elif metrics['blur_variance'] < thresholds.min_blur_variance:
+        issue = 'blurry'
+    else:
+        issue = None
+
+    metrics['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    return QualityReport(ok=issue is None, issue=issue, hint=QUALITY_HINTS.get(issue), metrics=metrics)
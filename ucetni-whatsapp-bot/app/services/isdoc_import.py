@@ -0,0 +1,524 @@
+"""
+Import faktur ve formátu ISDOC
+
+ISDOC (český standard elektronické faktury) obsahuje všechno, co potřebuje
+Transaction a TransactionItem - IČO/DIČ dodavatele i odběratele, číslo
+dokladu, data, rekapitulaci DPH a položky. Nepotřebuje OCR ani AI.
+
+XML se čte proudově přes iterparse: hodnoty se berou podle cesty elementu
+a každý element se po přečtení zahodí, takže strom dokumentu v paměti
+nevzniká ani u faktury s tisíci položek. Podporuje .isdoc (XML) i .isdocx
+(ZIP s .isdoc uvnitř).
+"""
+import io
+import logging
+import zipfile
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from typing import BinaryIO, Dict, List, Optional, Tuple, Union
+from xml.etree.ElementTree import ParseError, iterparse
+
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database.models import Transaction, TransactionAttachment, TransactionItem
+from app.services.vendor_registry import vendor_registry
+
+logger = logging.getLogger(__name__)
+
+ISDOC_NAMESPACE_PREFIX = 'http://isdoc.cz/namespace/'
+ISDOC_ROOT = 'Invoice'
+ISDOC_CONTENT_TYPES = ('application/xml', 'text/xml', 'application/x-isdoc', 'application/x-isdocx',
+                       'application/zip', 'application/octet-stream')
+ZIP_MAGIC = b'PK\x03\x04'
+
+# Výchozí kategorie, když prodejce není v registru
+DEFAULT_EXPENSE_CATEGORY = ('549100', 'Ostatní provozní náklady')
+DEFAULT_INCOME_CATEGORY = ('602100', 'Tržby za služby')
+
+# DocumentType: 1 faktura, 2 dobropis, 3 vrubopis, 4 zálohová faktura, 5 daňový doklad k záloze, ...
+CREDIT_NOTE_TYPES = ('2', '6')
+
+# Cesta elementu (bez jmenného prostoru) -> pole hlavičky
+HEADER_FIELDS = {
+    'DocumentType': 'document_type',
+    'ID': 'document_number',
+    'UUID': 'uuid',
+    'IssueDate': 'issue_date',
+    'TaxPointDate': 'tax_point_date',
+    'VATApplicable': 'vat_applicable',
+    'LocalCurrencyCode': 'local_currency',
+    'ForeignCurrencyCode': 'foreign_currency',
+    'CurrRate': 'curr_rate',
+    'RefCurrRate': 'ref_curr_rate',
+    'LegalMonetaryTotal/TaxExclusiveAmount': 'total_without_vat',
+    'LegalMonetaryTotal/TaxInclusiveAmount': 'total_with_vat',
+    'LegalMonetaryTotal/TaxInclusiveAmountCurr': 'total_with_vat_curr',
+    'LegalMonetaryTotal/PayableAmount': 'payable_amount',
+    'PaymentMeans/Payment/PaymentMeansCode': 'payment_means_code',
+    'PaymentMeans/Payment/Details/PaymentDueDate': 'due_date',
+    'PaymentMeans/Payment/Details/ID': 'account_number',
+    'PaymentMeans/Payment/Details/BankCode': 'bank_code',
+    'PaymentMeans/Payment/Details/IBAN': 'iban',
+    'PaymentMeans/Payment/Details/VariableSymbol': 'variable_symbol',
+    'PaymentMeans/Payment/Details/ConstantSymbol': 'constant_symbol',
+    'PaymentMeans/Payment/Details/SpecificSymbol': 'specific_symbol',
+    'TaxTotal/TaxAmount': 'vat_total',
+}
+
+PARTIES = {'AccountingSupplierParty': 'supplier', 'AccountingCustomerParty': 'customer'}
+PARTY_FIELDS = {
+    'Party/PartyIdentification/ID': 'ico',
+    'Party/PartyName/Name': 'name',
+    'Party/PartyTaxScheme/CompanyID': 'dic',
+    'Party/PostalAddress/StreetName': 'street',
+    'Party/PostalAddress/BuildingNumber': 'building_number',
+    'Party/PostalAddress/CityName': 'city',
+    'Party/PostalAddress/PostalZone': 'postal_zone',
+    'Party/PostalAddress/Country/Name': 'country',
+}
+
+LINE_PATH = ('InvoiceLines', 'InvoiceLine')
+LINE_FIELDS = {
+    'InvoicedQuantity': 'quantity',
+    'LineExtensionAmount': 'total_without_vat',
+    'LineExtensionAmountTaxInclusive': 'total_with_vat',
+    'LineExtensionTaxAmount': 'vat_amount',
+    'UnitPrice': 'unit_price',
+    'UnitPriceTaxInclusive': 'unit_price_with_vat',
+    'ClassifiedTaxCategory/Percent': 'vat_rate',
+    'Item/Description': 'description',
+}
+
+SUBTOTAL_PATH = ('TaxTotal', 'TaxSubTotal')
+SUBTOTAL_FIELDS = {
+    'TaxableAmount': 'base',
+    'TaxAmount': 'vat',
+    'TaxInclusiveAmount': 'total',
+    'TaxCategory/Percent': 'rate',
+}
+
+AMOUNT_FIELDS = {
+    'curr_rate', 'ref_curr_rate', 'total_without_vat', 'total_with_vat', 'total_with_vat_curr',
+    'payable_amount', 'vat_total', 'quantity', 'unit_price', 'unit_price_with_vat', 'vat_amount',
+    'base', 'vat', 'total',
+}
+DATE_FIELDS = {'issue_date', 'tax_point_date', 'due_date'}
+
+
+class IsdocError(ValueError):
+    """Soubor není čitelná ISDOC faktura"""
+
+
+@dataclass
+class IsdocInvoice:
+    """Hodnoty přečtené z ISDOC - částky jako Decimal v lokální měně (CZK)"""
+    header: Dict = field(default_factory=dict)
+    supplier: Dict = field(default_factory=dict)
+    customer: Dict = field(default_factory=dict)
+    lines: List[Dict] = field(default_factory=list)
+    vat_rows: List[Dict] = field(default_factory=list)
+    version: Optional[str] = None
+
+    @property
+    def total(self) -> Optional[Decimal]:
+        total = self.header.get('total_with_vat')
+        if total is None and self.lines:
+            total = sum((line.get('total_with_vat') or Decimal('0') for line in self.lines), Decimal('0'))
+        return total
+
+
+def _local_name(tag: str) -> Tuple[Optional[str], str]:
+    """'{namespace}Name' -> (namespace, 'Name')"""
+    if tag.startswith('{'):
+        namespace, _, name = tag[1:].partition('}')
+        return namespace, name
+    return None, tag
+
+
+def _convert(name: str, text: str):
+    if name in AMOUNT_FIELDS:
+        try:
+            return Decimal(text)
+        except InvalidOperation:
+            raise IsdocError(f"Neplatná částka v poli {name}: {text!r}")
+    if name in DATE_FIELDS:
+        try:
+            return date.fromisoformat(text[:10])
+        except ValueError:
+            raise IsdocError(f"Neplatné datum v poli {name}: {text!r}")
+    if name == 'vat_rate' or name == 'rate':
+        try:
+            return int(Decimal(text))
+        except InvalidOperation:
+            raise IsdocError(f"Neplatná sazba DPH: {text!r}")
+    return text
+
+
+def _open_source(data: bytes) -> BinaryIO:
+    """XML přímo, nebo první .isdoc uvnitř .isdocx (ZIP)"""
+    if not data.startswith(ZIP_MAGIC):
+        return io.BytesIO(data)
+    try:
+        archive = zipfile.ZipFile(io.BytesIO(data))
+    except zipfile.BadZipFile as e:
+        raise IsdocError(f"Poškozený ISDOCX: {str(e)}")
+    names = [name for name in archive.namelist() if name.lower().endswith('.isdoc')]
+    if not names:
+        raise IsdocError("ISDOCX neobsahuje soubor .isdoc")
+    return archive.open(names[0])
+
+
+def is_isdoc(data: bytes) -> bool:
+    """Rychlý test obsahu - ZIP s .isdoc nebo XML s kořenem Invoice ve jmenném prostoru ISDOC"""
+    if data.startswith(ZIP_MAGIC):
+        try:
+            return any(name.lower().endswith('.isdoc') for name in zipfile.ZipFile(io.BytesIO(data)).namelist())
+        except zipfile.BadZipFile:
+            return False
+    head = data[:2048]
+    return b'<Invoice' in head and ISDOC_NAMESPACE_PREFIX.encode() in head
+
+
+def parse_isdoc(source: Union[bytes, BinaryIO]) -> IsdocInvoice:
+    """
+    Proudově přečte ISDOC fakturu
+
+    Args:
+        source: obsah souboru (XML nebo ISDOCX) nebo otevřený binární soubor s XML
+
+    Returns:
+        IsdocInvoice
+
+    Raises:
+        IsdocError: soubor není ISDOC nebo obsahuje neplatné hodnoty
+    """
+    stream = _open_source(source) if isinstance(source, bytes) else source
+    invoice = IsdocInvoice()
+    path: List[str] = []
+    elements = []
+    line: Optional[Dict] = None
+    subtotal: Optional[Dict] = None
+
+    try:
+        for event, element in iterparse(stream, events=('start', 'end')):
+            namespace, name = _local_name(element.tag)
+
+            if event == 'start':
+                if not elements:
+                    if name != ISDOC_ROOT or not (namespace or '').startswith(ISDOC_NAMESPACE_PREFIX):
+                        raise IsdocError(f"Kořenový element {name} není ISDOC faktura")
+                    invoice.version = element.get('version')
+                else:
+                    path.append(name)
+                    if tuple(path) == LINE_PATH:
+                        line = {}
+                    elif tuple(path) == SUBTOTAL_PATH:
+                        subtotal = {}
+                elements.append(element)
+                continue
+
+            # event == 'end'
+            elements.pop()
+            text = (element.text or '').strip()
+            key = None
+            target = None
+            if line is not None and tuple(path[:2]) == LINE_PATH:
+                if len(path) == 2:
+                    invoice.lines.append(line)
+                    line = None
+                else:
+                    relative = '/'.join(path[2:])
+                    key, target = LINE_FIELDS.get(relative), line
+                    if relative == 'InvoicedQuantity' and element.get('unitCode'):
+                        line.setdefault('unit', element.get('unitCode'))
+            elif subtotal is not None and tuple(path[:2]) == SUBTOTAL_PATH:
+                if len(path) == 2:
+                    invoice.vat_rows.append(subtotal)
+                    subtotal = None
+                else:
+                    key, target = SUBTOTAL_FIELDS.get('/'.join(path[2:])), subtotal
+            elif path and path[0] in PARTIES:
+                key, target = PARTY_FIELDS.get('/'.join(path[1:])), getattr(invoice, PARTIES[path[0]])
+            elif path:
+                key, target = HEADER_FIELDS.get('/'.join(path)), invoice.header
+
+            if key and text:
+                # První výskyt vyhrává (druhý účet, druhé DIČ ...)
+                target.setdefault(key, _convert(key, text))
+
+            # Přečtený element se zahodí - rodič drží nejvýše aktuální potomky
+            if elements:
+                elements[-1].remove(element)
+            if path:
+                path.pop()
+    except ParseError as e:
+        raise IsdocError(f"Neplatné XML: {str(e)}")
+
+    if invoice.total is None:
+        raise IsdocError("Faktura neobsahuje celkovou částku")
+    return invoice
+
+
+def _address(party: Dict) -> Optional[str]:
+    street = ' '.join(filter(None, [party.get('street'), party.get('building_number')]))
+    city = ' '.join(filter(None, [party.get('postal_zone'), party.get('city')]))
+    address = ', '.join(filter(None, [street, city]))
+    return address or None
+
+
+def _payment_method(header: Dict) -> Optional[str]:
+    # PaymentMeansCode: 10 hotově, 42 převodem, 48 kartou
+    code = header.get('payment_means_code')
+    if code == '10':
+        return 'cash'
+    if code == '48':
+        return 'card'
+    if code == '42' or header.get('account_number') or header.get('iban'):
+        return 'bank_transfer'
+    return None
+
+
+def _vat_rows(invoice: IsdocInvoice) -> List[Dict]:
+    """Řádky rekapitulace DPH se základem, sazba s největším základem první"""
+    rows = [row for row in invoice.vat_rows if row.get('base') is not None]
+    return sorted(rows, key=lambda row: row['base'], reverse=True)
+
+
+def _split_by_vat_rate(transaction: Dict, rows: List[Dict], sign: Decimal) -> List[Dict]:
+    """
+    Jedno zaúčtování na každou sazbu z rekapitulace DPH
+
+    Transaction nese jedinou sazbu a VatRecord, DP3 i KH sčítají DPH podle
+    ní - faktura s více sazbami proto musí být rozdělená. Doklad zůstává
+    jeden (stejné číslo dokladu, KH ho seskupí). Haléřový rozdíl mezi
+    součtem řádků a celkovou částkou faktury (zaokrouhlení) nese hlavní sazba.
+    """
+    bookings = []
+    for row in rows:
+        base = row['base'] * sign
+        vat = (row.get('vat') or Decimal('0')) * sign
+        amount = row['total'] * sign if row.get('total') is not None else base + vat
+        original_amount = amount
+        if transaction['original_currency'] != 'CZK':
+            original_amount = (amount / transaction['exchange_rate']).quantize(Decimal('0.01'))
+        bookings.append({
+            **transaction,
+            'amount_czk': amount,
+            'original_amount': original_amount,
+            'vat_rate': row.get('rate', 0),
+            'vat_base': base,
+            'vat_amount': vat,
+        })
+
+    main = bookings[0]
+    if transaction['amount_czk'] is not None:
+        main['amount_czk'] += transaction['amount_czk'] - sum(booking['amount_czk'] for booking in bookings)
+    if transaction['original_amount'] is not None:
+        booked = sum(booking['original_amount'] for booking in bookings)
+        main['original_amount'] += transaction['original_amount'] - booked
+    return bookings
+
+
+def invoice_to_records(invoice: IsdocInvoice, user_id: int,
+                       user_ico: Optional[str] = None) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Pole Transaction (jedno zaúčtování na sazbu DPH) a seznam polí TransactionItem
+
+    Args:
+        user_ico: IČO uživatele - je-li dodavatelem on, jde o vydanou fakturu (příjem)
+
+    Returns:
+        (transactions, item_rows) - hlavní sazba první, item_rows bez transaction_id
+    """
+    header = invoice.header
+    issued = bool(user_ico) and invoice.supplier.get('ico') == user_ico
+    counterparty = invoice.customer if issued else invoice.supplier
+    sign = Decimal('-1') if header.get('document_type') in CREDIT_NOTE_TYPES else Decimal('1')
+
+    vendor = None if issued else vendor_registry.by_ico(counterparty.get('ico'))
+    if vendor and vendor.category_code:
+        category = (vendor.category_code, vendor.category_name)
+    else:
+        category = DEFAULT_INCOME_CATEGORY if issued else DEFAULT_EXPENSE_CATEGORY
+
+    total = invoice.total * sign
+    vat_total = header.get('vat_total')
+    if vat_total is None and invoice.vat_rows:
+        vat_total = sum((row.get('vat') or Decimal('0') for row in invoice.vat_rows), Decimal('0'))
+    vat_rows = _vat_rows(invoice)
+    main_row = vat_rows[0] if vat_rows else None
+
+    exchange_rate = Decimal('1')
+    original_amount, original_currency = total, header.get('local_currency') or 'CZK'
+    if header.get('foreign_currency') and header.get('curr_rate'):
+        exchange_rate = header['curr_rate'] / (header.get('ref_curr_rate') or Decimal('1'))
+        original_currency = header['foreign_currency']
+        original_amount = None
+        if header.get('total_with_vat_curr') is not None:
+            original_amount = header['total_with_vat_curr'] * sign
+
+    account = header.get('account_number')
+    if account and header.get('bank_code'):
+        account = f"{account}/{header['bank_code']}"
+
+    document_number = header.get('document_number')
+    transaction = {
+        'user_id': user_id,
+        'type': 'income' if issued else 'expense',
+        'original_message': f"ISDOC: {document_number or ''}".strip(),
+        'description': f"Faktura {document_number} - {counterparty.get('name') or ''}".strip(' -')[:500],
+        'amount_czk': total,
+        'original_amount': original_amount,
+        'original_currency': original_currency,
+        'exchange_rate': exchange_rate,
+        'conversion_date': datetime.combine(header['tax_point_date'], datetime.min.time())
+        if original_currency != 'CZK' and header.get('tax_point_date') else None,
+        'category_code': category[0],
+        'category_name': category[1],
+        'auto_categorized': True,
+        'vat_rate': main_row.get('rate', 0) if main_row else 0,
+        'vat_base': header['total_without_vat'] * sign if header.get('total_without_vat') is not None else None,
+        'vat_amount': vat_total * sign if vat_total is not None else None,
+        'vat_included': True,
+        'document_number': document_number,
+        'document_date': header.get('issue_date'),
+        'due_date': header.get('due_date'),
+        'counterparty_name': counterparty.get('name'),
+        'counterparty_ico': counterparty.get('ico'),
+        'counterparty_dic': counterparty.get('dic'),
+        'counterparty_address': _address(counterparty),
+        'partner_name': counterparty.get('name'),
+        'partner_vat_id': counterparty.get('dic'),
+        'payment_method': _payment_method(header),
+        'bank_account': account or header.get('iban'),
+        'variable_symbol': header.get('variable_symbol'),
+        'constant_symbol': header.get('constant_symbol'),
+        'specific_symbol': header.get('specific_symbol'),
+        'processed_by_ai': False,
+        'ai_model_used': 'isdoc',
+        # Datum zdanitelného plnění rozhoduje o období DPH
+        'transaction_date': datetime.combine(header.get('tax_point_date') or header.get('issue_date') or date.today(),
+                                             datetime.min.time()),
+    }
+
+    items = []
+    for line in invoice.lines:
+        items.append({
+            'description': (line.get('description') or document_number or 'Položka')[:300],
+            'quantity': float(line['quantity']) if line.get('quantity') is not None else 1.0,
+            'unit': (line.get('unit') or 'ks')[:10],
+            'unit_price': line.get('unit_price'),
+            'unit_price_with_vat': line.get('unit_price_with_vat'),
+            'vat_rate': line.get('vat_rate', 0),
+            'total_without_vat': (
+                line['total_without_vat'] * sign if line.get('total_without_vat') is not None else None
+            ),
+            'vat_amount': line['vat_amount'] * sign if line.get('vat_amount') is not None else None,
+            'total_with_vat': line['total_with_vat'] * sign if line.get('total_with_vat') is not None else None,
+            'item_category_code': category[0],
+            'item_category_name': category[1],
+        })
+
+    if len(vat_rows) > 1:
+        return _split_by_vat_rate(transaction, vat_rows, sign), items
+    return [transaction], items
+
+
+async def import_isdoc(session: AsyncSession, user_id: int, data: bytes, user_ico: Optional[str] = None,
+                       file_name: Optional[str] = None, file_url: Optional[str] = None,
+                       uploaded_via: str = 'api') -> Dict:
+    """
+    Přečte ISDOC a uloží transakci, položky a přílohu v jedné databázové transakci
+
+    Returns:
+        {'success': True, 'transaction_id', 'items_count', 'transaction': pole transakce}
+        nebo {'success': False, 'error', 'message'} (neplatný soubor, duplicita)
+    """
+    try:
+        invoice = parse_isdoc(data)
+    except IsdocError as e:
+        logger.warning(f"Neplatný ISDOC od uživatele {user_id}: {str(e)}")
+        return {'success': False, 'error': str(e), 'message': 'Soubor není platná ISDOC faktura.'}
+
+    bookings, item_rows = invoice_to_records(invoice, user_id, user_ico)
+    transaction_fields = bookings[0]
+
+    # Stejná faktura od stejné protistrany už je zaúčtovaná
+    if transaction_fields['document_number']:
+        existing = await session.execute(
+            select(Transaction.id).where(
+                Transaction.user_id == user_id,
+                Transaction.document_number == transaction_fields['document_number'],
+                Transaction.counterparty_ico == transaction_fields['counterparty_ico']
+            ).order_by(Transaction.id).limit(1)
+        )
+        existing_id = existing.scalar()
+        if existing_id:
+            return {
+                'success': False,
+                'duplicate': True,
+                'duplicate_transaction_id': existing_id,
+                'error': 'Faktura už je zaúčtovaná',
+                'message': (f"Faktura {transaction_fields['document_number']} už je uložená "
+                            f"(transakce #{existing_id}).")
+            }
+
+    transactions = [Transaction(**fields) for fields in bookings]
+    session.add_all(transactions)
+    await session.flush()
+    transaction = transactions[0]
+
+    if item_rows:
+        # Položka patří k zaúčtování se stejnou sazbou DPH
+        by_rate = {booking.vat_rate: booking.id for booking in transactions}
+        await session.execute(insert(TransactionItem), [
+            {**row, 'transaction_id': by_rate.get(row['vat_rate'], transaction.id)} for row in item_rows
+        ])
+
+    session.add(TransactionAttachment(
+        transaction_id=transaction.id,
+        uploaded_by_user_id=user_id,
+        file_url=file_url,
+        file_name=file_name or f"{transaction_fields['document_number'] or 'faktura'}.isdoc",
+        original_name=file_name,
+        file_type='application/xml',
+        file_size=len(data),
+        uploaded_via=uploaded_via,
+        ocr_processed=False,
+        ocr_extracted_data={
+            'isdoc_version': invoice.version,
+            'uuid': invoice.header.get('uuid'),
+            'vat_rows': [{key: str(value) for key, value in row.items()} for row in invoice.vat_rows],
+            'transaction_ids': [booking.id for booking in transactions],
+        },
+        ai_processed=False,
+        processed_at=datetime.now(),
+    ))
+    await session.commit()
+
+    logger.info(
+        f"ISDOC {transaction_fields['document_number']} uložen jako transakce "
+        f"{', '.join(str(booking.id) for booking in transactions)} "
+        f"({len(item_rows)} položek) pro uživatele {user_id}"
+    )
+    return {
+        'success': True,
+        'transaction_id': transaction.id,
+        'transaction_ids': [booking.id for booking in transactions],
+        'items_count': len(item_rows),
+        'transaction': _invoice_summary(bookings),
+    }
+
+
+def _invoice_summary(bookings: List[Dict]) -> Dict:
+    """Pole hlavního zaúčtování s částkami za celou fakturu (pro odpověď uživateli)"""
+    def total(name: str) -> Optional[Decimal]:
+        values = [booking[name] for booking in bookings if booking[name] is not None]
+        return sum(values, Decimal('0')) if values else None
+
+    summary = dict(bookings[0])
+    for name in ('amount_czk', 'original_amount', 'vat_base', 'vat_amount'):
+        summary[name] = total(name)
+    return summary
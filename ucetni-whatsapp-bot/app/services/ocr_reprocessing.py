@@ -0,0 +1,314 @@
+"""
+Dávkové přepracování uložených příloh (TransactionAttachment) novým OCR
+
+Přílohy se čtou z databáze po dávkách (keyset stránkování podle id),
+OCR a extrakce běží v process poolu, po každé dávce se zapíše checkpoint,
+takže přerušený běh pokračuje tam, kde skončil. Změny polí proti uloženým
+datům se zapisují do JSONL reportu; s update=True se přepíší i řádky.
+"""
+import json
+import logging
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import requests
+from sqlalchemy import func, or_, select, update
+
+from app.database.models import TransactionAttachment
+from app.services.pdf_ingestion import PDF_CONTENT_TYPE, is_pdf
+
+logger = logging.getLogger(__name__)
+
+# Porovnávaná pole: nový klíč -> klíče, pod kterými je hodnota ve starých datech
+# (ocr_extracted_data má klíče OCR extrakce, ai_extracted_data klíče AI parseru)
+COMPARED_FIELDS = {
+    'total': ('total', 'amount'),
+    'date': ('date', 'document_date'),
+    'ico': ('ico', 'counterparty_ico'),
+    'dic': ('dic', 'counterparty_dic'),
+    'vendor': ('vendor', 'counterparty_name'),
+    'document_number': ('document_number',),
+    'vat_rate': ('vat_rate',),
+    'variable_symbol': ('variable_symbol',),
+    'items': ('items',),
+}
+
+# Přepracovávají se obrázky a PDF doklady
+IMAGE_TYPE_PREFIX = 'image/'
+
+
+@dataclass
+class ReprocessCheckpoint:
+    """Stav běhu - ukládá se po každé dokončené dávce"""
+    last_id: int = 0
+    processed: int = 0
+    changed: int = 0
+    errors: int = 0
+    updated: int = 0
+    field_changes: Dict[str, int] = field(default_factory=dict)
+    started_at: str = field(default_factory=lambda: datetime.now().isoformat())
+
+    @classmethod
+    def load(cls, path: Path) -> "ReprocessCheckpoint":
+        with open(path, encoding='utf-8') as f:
+            return cls(**json.load(f))
+
+    def save(self, path: Path) -> None:
+        tmp_path = path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(asdict(self), f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, path)
+
+
+def _normalize(name: str, value):
+    """Hodnoty do srovnatelného tvaru (počet položek, zaokrouhlená částka, text)"""
+    if value in (None, '', []):
+        return None
+    if name == 'items':
+        return len(value) if isinstance(value, list) else None
+    if name == 'total':
+        try:
+            return round(float(value), 2)
+        except (TypeError, ValueError):
+            return None
+    if name == 'vat_rate':
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+    return str(value).strip()
+
+
+def old_field_values(ocr_data: Optional[Dict], ai_data: Optional[Dict]) -> Dict:
+    """Původní hodnoty polí - přednost má uložená OCR extrakce, pak AI výsledek"""
+    values = {}
+    for name, keys in COMPARED_FIELDS.items():
+        value = None
+        for data in (ocr_data or {}, ai_data or {}):
+            for key in keys:
+                if data.get(key) not in (None, '', []):
+                    value = data[key]
+                    break
+            if value is not None:
+                break
+        values[name] = _normalize(name, value)
+    return values
+
+
+def diff_fields(old: Dict, new_data: Dict) -> Dict[str, List]:
+    """
+    Změněná pole {pole: [staré, nové]}; pole chybějící v obou se nevypisují
+    """
+    changes = {}
+    for name in COMPARED_FIELDS:
+        new_value = _normalize(name, new_data.get(name))
+        if old.get(name) != new_value:
+            changes[name] = [old.get(name), new_value]
+    return changes
+
+
+def load_attachment_bytes(file_url: Optional[str], file_name: Optional[str], media_dir: Optional[str]) -> bytes:
+    """
+    Obsah přílohy - z URL (Twilio média s autentizací) nebo z lokálního adresáře
+    """
+    if file_url and file_url.startswith(('http://', 'https://')):
+        auth = None
+        if 'twilio.com' in file_url:
+            auth = (os.getenv('TWILIO_ACCOUNT_SID'), os.getenv('TWILIO_AUTH_TOKEN'))
+        response = requests.get(file_url, auth=auth, timeout=30)
+        response.raise_for_status()
+        return response.content
+
+    path = Path(file_url or file_name or '')
+    if media_dir and not path.is_absolute():
+        path = Path(media_dir) / path
+    return path.read_bytes()
+
+
+_worker_service = None
+
+
+def _get_worker_service():
+    """OCR služba jednou na proces (načtení modelů a registru je drahé)"""
+    global _worker_service
+    if _worker_service is None:
+        from app.services.whatsapp_ocr_service import WhatsAppOCRService
+        _worker_service = WhatsAppOCRService()
+    return _worker_service
+
+
+def reprocess_job(job: Dict) -> Dict:
+    """
+    Zpracuje jednu přílohu v pracovním procesu
+
+    Args:
+        job: {'id', 'file_url', 'file_name', 'media_dir'}
+
+    Returns:
+        {'id', 'ocr_text', 'extracted_data', 'quality' / 'pages', 'elapsed_ms'} nebo {'id', 'error'}
+    """
+    started = time.perf_counter()
+    try:
+        image_data = load_attachment_bytes(job.get('file_url'), job.get('file_name'), job.get('media_dir'))
+        service = _get_worker_service()
+        result = service.extract_from_pdf(image_data) if is_pdf(image_data) else service.extract_from_image(image_data)
+        result['id'] = job['id']
+        result['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 1)
+        return result
+    except Exception as e:
+        return {'id': job['id'], 'error': f"{type(e).__name__}: {str(e)}"}
+
+
+def format_progress(done: int, total: int, elapsed: float) -> str:
+    """'1200/5000 (24.0 %) | 3.2 příloh/s | ETA 0:19:47'"""
+    rate = done / elapsed if elapsed > 0 else 0.0
+    percent = done / total * 100 if total else 100.0
+    if rate > 0 and total > done:
+        eta_seconds = int((total - done) / rate)
+        eta = f"{eta_seconds // 3600}:{eta_seconds % 3600 // 60:02d}:{eta_seconds % 60:02d}"
+    else:
+        eta = '-'
+    return f"{done}/{total} ({percent:.1f} %) | {rate:.1f} příloh/s | ETA {eta}"
+
+
+class AttachmentReprocessor:
+    """
+    Přepracuje přílohy po dávkách s checkpointem a reportem změn
+
+    Args:
+        session_factory: async context manager vracející AsyncSession (db_manager.get_session)
+        checkpoint_path: soubor se stavem běhu
+        report_path: JSONL report změn (při navázání se připisuje)
+        chunk_size: počet příloh načtených a odeslaných do poolu najednou
+        update: přepsat ocr_text / ocr_extracted_data / ocr_confidence v databázi
+        media_dir: adresář pro přílohy uložené jako relativní cesta
+    """
+
+    def __init__(self, session_factory: Callable, checkpoint_path: Path, report_path: Path,
+                 chunk_size: int = 100, update: bool = False, media_dir: Optional[str] = None,
+                 progress: Callable[[str], None] = print):
+        self.session_factory = session_factory
+        self.checkpoint_path = Path(checkpoint_path)
+        self.report_path = Path(report_path)
+        self.chunk_size = chunk_size
+        self.update = update
+        self.media_dir = media_dir
+        self.progress = progress
+
+    def _base_query(self, after_id: int):
+        file_type = func.lower(TransactionAttachment.file_type)
+        return select(TransactionAttachment).where(
+            TransactionAttachment.id > after_id,
+            or_(file_type.like(f"{IMAGE_TYPE_PREFIX}%"), file_type == PDF_CONTENT_TYPE)
+        )
+
+    async def count_remaining(self, after_id: int) -> int:
+        async with self.session_factory() as session:
+            subquery = self._base_query(after_id).with_only_columns(TransactionAttachment.id).subquery()
+            result = await session.execute(select(func.count()).select_from(subquery))
+            return result.scalar() or 0
+
+    async def _load_chunk(self, after_id: int) -> List[Dict]:
+        async with self.session_factory() as session:
+            query = self._base_query(after_id).order_by(TransactionAttachment.id).limit(self.chunk_size)
+            rows = (await session.execute(query)).scalars().all()
+            return [
+                {
+                    'id': row.id,
+                    'file_url': row.file_url,
+                    'file_name': row.file_name,
+                    'media_dir': self.media_dir,
+                    'old': old_field_values(row.ocr_extracted_data, row.ai_extracted_data),
+                    'old_text_length': len(row.ocr_text or ''),
+                }
+                for row in rows
+            ]
+
+    async def _save_results(self, results: List[Dict]) -> int:
+        async with self.session_factory() as session:
+            for result in results:
+                data = result['extracted_data']
+                await session.execute(
+                    update(TransactionAttachment)
+                    .where(TransactionAttachment.id == result['id'])
+                    .values(
+                        ocr_processed=True,
+                        ocr_text=result['ocr_text'],
+                        ocr_extracted_data={**data, 'quality': result.get('quality'),
+                                            **({'pdf_pages': result['pages']} if 'pages' in result else {})},
+                        ocr_confidence=min(round(float(data.get('confidence', 0)), 2), 1),
+                        processed_at=datetime.now()
+                    )
+                )
+            await session.commit()
+        return len(results)
+
+    async def run(self, executor: Executor, resume: bool = False, limit: Optional[int] = None) -> ReprocessCheckpoint:
+        """
+        Projde přílohy, vrátí konečný stav (stejný jako v checkpointu)
+
+        Args:
+            executor: pool, na kterém běží reprocess_job
+            resume: navázat na uložený checkpoint (jinak se začíná od začátku)
+            limit: zpracovat nejvýše tolik příloh
+        """
+        if resume and self.checkpoint_path.exists():
+            checkpoint = ReprocessCheckpoint.load(self.checkpoint_path)
+            self.progress(f"↩️ Navazuji od přílohy #{checkpoint.last_id} ({checkpoint.processed} hotovo)")
+        else:
+            checkpoint = ReprocessCheckpoint()
+            self.report_path.write_text('', encoding='utf-8')
+
+        total = await self.count_remaining(checkpoint.last_id)
+        if limit is not None:
+            total = min(total, limit)
+        self.progress(f"📎 Ke zpracování: {total} příloh")
+
+        started = time.perf_counter()
+        done = 0
+        while done < total:
+            chunk = await self._load_chunk(checkpoint.last_id)
+            chunk = chunk[:total - done]
+            if not chunk:
+                break
+
+            results = list(executor.map(reprocess_job, chunk))
+            successful = []
+            with open(self.report_path, 'a', encoding='utf-8') as report:
+                for job, result in zip(chunk, results):
+                    if 'error' in result:
+                        checkpoint.errors += 1
+                        report.write(json.dumps({'id': job['id'], 'error': result['error']}, ensure_ascii=False) + '\n')
+                        continue
+                    successful.append(result)
+                    changes = diff_fields(job['old'], result['extracted_data'])
+                    if changes:
+                        checkpoint.changed += 1
+                        for name in changes:
+                            checkpoint.field_changes[name] = checkpoint.field_changes.get(name, 0) + 1
+                        report.write(json.dumps({
+                            'id': job['id'],
+                            'changes': changes,
+                            'text_length': [job['old_text_length'], len(result['ocr_text'])],
+                            'elapsed_ms': result.get('elapsed_ms'),
+                        }, ensure_ascii=False) + '\n')
+
+            if self.update and successful:
+                checkpoint.updated += await self._save_results(successful)
+
+            done += len(chunk)
+            checkpoint.processed += len(chunk)
+            checkpoint.last_id = chunk[-1]['id']
+            checkpoint.save(self.checkpoint_path)
+            self.progress(f"⏳ {format_progress(done, total, time.perf_counter() - started)}")
+
+        return checkpoint
+
+
+def default_executor(workers: Optional[int] = None) -> Executor:
+    return ProcessPoolExecutor(max_workers=workers or os.cpu_count())
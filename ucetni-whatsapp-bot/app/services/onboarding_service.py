@@ -10,7 +10,9 @@ import re
 from sqlalchemy.orm import Session
 from app.database.models import User, UserSettings, BUSINESS_CATEGORIES_DATA
 from app.database.connection import get_db_session
-from app.services.ares_service import AresService
+from app.services.ares_service import AresService, ico_rejected
+from app.services.ares_prefetch import ares_prefetch
+from utils.ico import ico_checksum_valid
 
 logger = logging.getLogger(__name__)
 
@@ -199,68 +201,118 @@ class OnboardingService:
                 "next_step": "ico"
             }
         
-        # Validace IČO pomocí ARES
-        ares_result = await self.ares_service.validate_ico(ico)
-        
-        if not ares_result["valid"]:
+        if not ico_checksum_valid(ico):
             return {
                 "success": False,
-                "message": f"IČO {ico} není platné nebo nebylo nalezeno v registru. Zkuste znovu:",
+                "message": f"IČO {ico} není platné (nesedí kontrolní číslice). Zkuste znovu:",
                 "next_step": "ico"
             }
         
-        # Uložíme IČO a doplníme informace z ARES
+        # Údaje z ARES se načítají na pozadí, odpověď na ně nečeká
         user.ico = ico
-        if ares_result.get("business_name"):
-            user.business_name = ares_result["business_name"]
-        if ares_result.get("address"):
-            address_parts = ares_result["address"]
-            user.street = address_parts.get("street")
-            user.house_number = address_parts.get("house_number")
-            user.city = address_parts.get("city")
-            user.postal_code = address_parts.get("postal_code")
-        
         user.onboarding_step = 'dic'
         
         # Aktualizuj onboarding_data
-        onboarding_data = user.onboarding_data or {}
+        onboarding_data = dict(user.onboarding_data or {})
         onboarding_data['ico_completed'] = datetime.now().isoformat()
-        onboarding_data['ares_data'] = ares_result
+        onboarding_data.pop('ares_data', None)
         user.onboarding_data = onboarding_data
         
         db.commit()
         
-        business_info = f" ({ares_result['business_name']})" if ares_result.get('business_name') else ""
+        ares_prefetch.start(self._prefetch_key(user), ico, self._lookup_ares)
+        
         return {
             "success": True,
-            "message": f"Super! IČO {ico}{business_info} je platné. " + self._get_dic_prompt(),
+            "message": f"Super! IČO {ico} mám, údaje z ARES si mezitím dohledám. " + self._get_dic_prompt(),
             "next_step": "dic"
         }
     
+    def _prefetch_key(self, user: User):
+        return ('onboarding_service', user.id)
+
+    async def _lookup_ares(self, ico: str) -> Dict[str, Any]:
+        """Údaje z ARES i s DIČ - souhrn upozorní na DIČ, které uživatel nezadal"""
+        return await self.ares_service.validate_ico(ico, need_dic=True)
+    
+    async def _collect_ares_data(self, user: User, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Vyzvedne výsledek ARES načtený na pozadí, čeká jen omezeně"""
+        if not user.ico:
+            return None
+        if timeout == 0:
+            return ares_prefetch.peek(self._prefetch_key(user))
+        return await ares_prefetch.result(self._prefetch_key(user), user.ico, self._lookup_ares, timeout)
+    
+    @staticmethod
+    def _ares_data_usable(ares_result: Optional[Dict[str, Any]]) -> bool:
+        """Odpověď ARES s údaji o firmě (ne chyba ani náhradní výsledek při výpadku)"""
+        return bool(ares_result) and bool(ares_result.get("valid")) and not ares_result.get("warning")
+    
+    def _apply_ares_data(self, user: User, ares_result: Dict[str, Any]) -> None:
+        """Doplní uživateli název a adresu z ARES a uloží odpověď do onboarding_data"""
+        if ares_result.get("business_name"):
+            user.business_name = ares_result["business_name"]
+        if ares_result.get("address"):
+            address_parts = ares_result["address"]
+            user.street = address_parts.get("street")
+            user.house_number = address_parts.get("house_number")
+            user.city = address_parts.get("city")
+            user.postal_code = address_parts.get("postal_code")
+        
+        onboarding_data = dict(user.onboarding_data or {})
+        onboarding_data['ares_data'] = ares_result
+        user.onboarding_data = onboarding_data
+    
     async def _handle_dic_step(self, user: User, message: str, db: Session) -> Dict[str, Any]:
         """Zpracuje zadání DIČ"""
         dic = message.strip().replace(' ', '').upper()
         
+        skipped = dic.lower() in ['nemam', 'nemám', 'ne', 'zadne', 'žádné', 'skip']
+        
+        # Validace formátu DIČ
+        if not skipped and not re.match(r'^CZ\d{8,10}$', dic):
+            return {
+                "success": False,
+                "message": ("DIČ musí mít formát CZ12345678 nebo CZ1234567890. "
+                            "Pokud DIČ nemáte, napište 'nemám':"),
+                "next_step": "dic"
+            }
+        
+        # Výsledek ARES z kroku IČO - obvykle už je hotový
+        ares_result = await self._collect_ares_data(user)
+        if ico_rejected(ares_result):
+            ico = user.ico
+            user.ico = None
+            user.onboarding_step = 'ico'
+            db.commit()
+            return {
+                "success": False,
+                "message": f"IČO {ico} nebylo nalezeno v registru ARES. Zadejte prosím IČO znovu:",
+                "next_step": "ico"
+            }
+        
         # Pokud uživatel napsal "nemam" nebo podobně, přeskoč DIČ
-        if dic.lower() in ['nemam', 'nemám', 'ne', 'zadne', 'žádné', 'skip']:
+        if skipped:
             user.dic = None
             user.vat_payer = False
         else:
-            # Validace formátu DIČ
-            if not re.match(r'^CZ\d{8,10}$', dic):
-                return {
-                    "success": False,
-                    "message": "DIČ musí mít formát CZ12345678 nebo CZ1234567890. Pokud DIČ nemáte, napište 'nemám':",
-                    "next_step": "dic"
-                }
-            
             user.dic = dic
             user.vat_payer = True  # Pokud má DIČ, pravděpodobně je plátce DPH
         
         user.onboarding_step = 'business_type'
         
+        if self._ares_data_usable(ares_result):
+            self._apply_ares_data(user, ares_result)
+            ares_prefetch.discard(self._prefetch_key(user))
+        elif ares_result is not None:
+            # Výpadek ARES - onboarding pokračuje, údaje se zkusí načíst znovu do dokončení
+            reason = ares_result.get('error') or ares_result.get('warning')
+            logger.warning(f"ARES pro IČO {user.ico} nedostupný: {reason}")
+            ares_prefetch.discard(self._prefetch_key(user))
+            ares_prefetch.start(self._prefetch_key(user), user.ico, self._lookup_ares)
+        
         # Aktualizuj onboarding_data
-        onboarding_data = user.onboarding_data or {}
+        onboarding_data = dict(user.onboarding_data or {})
         onboarding_data['dic_completed'] = datetime.now().isoformat()
         user.onboarding_data = onboarding_data
         
@@ -268,10 +320,26 @@ class OnboardingService:
         
         return {
             "success": True,
-            "message": self._get_business_type_prompt(),
+            "message": self._get_ares_summary(user, ares_result) + self._get_business_type_prompt(),
             "next_step": "business_type"
         }
     
+    def _get_ares_summary(self, user: User, ares_result: Optional[Dict[str, Any]]) -> str:
+        """Shrnutí údajů z ARES před další otázkou"""
+        if ares_result is not None and not self._ares_data_usable(ares_result):
+            return "⚠️ ARES teď neodpovídá, údaje o firmě doplním později.\n\n"
+        if not ares_result or not ares_result.get("business_name"):
+            return ""
+        
+        summary = f"🏢 Z ARES: {ares_result['business_name']}"
+        address = self.ares_service.format_address(ares_result.get("address") or {})
+        if address:
+            summary += f", {address}"
+        if ares_result.get("dic") and not user.dic:
+            summary += (f"\n⚠️ ARES u vás eviduje DIČ {ares_result['dic']} - "
+                        "pokud jste plátce DPH, doplňte ho v nastavení.")
+        return summary + "\n\n"
+    
     async def _handle_business_type_step(self, user: User, message: str, db: Session) -> Dict[str, Any]:
         """Zpracuje výběr typu podnikání"""
         business_choice = message.strip().lower()
@@ -338,6 +406,13 @@ class OnboardingService:
             user.onboarding_completed = True
             user.onboarding_step = 'completed'
             
+            # ARES mohl v kroku DIČ nestihnout odpovědět - vezmi výsledek, pokud už je
+            if 'ares_data' not in (user.onboarding_data or {}):
+                ares_result = await self._collect_ares_data(user, timeout=0)
+                if self._ares_data_usable(ares_result):
+                    self._apply_ares_data(user, ares_result)
+            ares_prefetch.discard(self._prefetch_key(user))
+            
             # Vytvoř UserSettings s předvyplněnými údaji
             user_settings = UserSettings(
                 user_id=user.id,
@@ -493,6 +568,7 @@ Posílejte první účtenku! 📱"""
                 user.dic = None
                 user.business_type = None
                 user.vat_payer = False
+                ares_prefetch.discard(self._prefetch_key(user))
                 
                 # Smaž UserSettings pokud existuje
                 settings = db.query(UserSettings).filter(
@@ -0,0 +1,201 @@
+"""
+Čtení PDF faktur po stránkách
+
+Většina PDF faktur od dodavatelů má textovou vrstvu - ta se přečte přímo
+a OCR není potřeba. Jen stránka bez textu (sken) se vykreslí do obrázku
+a pošle do OCR poolu. Stránky se zpracovávají jako proud: vykreslí se
+vždy jen tolik stránek, kolik jich OCR pool právě zpracovává, takže
+ani 30stránkový sken není v paměti celý najednou. Výsledky se vrací
+v pořadí stránek.
+
+Vykreslování používá pypdfium2 (pip install pypdfium2). PDFium není
+bezpečné pro vlákna, proto stránky otevírá a vykresluje jen volající
+vlákno a do poolu jde až hotový obrázek.
+"""
+import logging
+import os
+import time
+from collections import deque
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Iterator, List, Optional
+
+from PIL import Image
+
+try:
+    import pypdfium2 as pdfium
+    PDF_AVAILABLE = True
+except ImportError:
+    PDF_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+PDF_CONTENT_TYPE = 'application/pdf'
+
+# Hlavička PDF smí podle specifikace ležet kdekoli v prvním kilobajtu
+PDF_MAGIC = b'%PDF-'
+PDF_HEADER_SEARCH = 1024
+
+# Sdílený OCR pool - Tesseract běží jako samostatný proces, pro souběžné stránky stačí vlákna
+ocr_pool = ThreadPoolExecutor(max_workers=int(os.getenv('OCR_WORKERS') or os.cpu_count() or 2),
+                              thread_name_prefix='ocr')
+
+
+@dataclass(frozen=True)
+class PdfSettings:
+    """Kdy se stránka OCRuje a v jakém rozlišení se vykreslí"""
+    min_text_chars: int = 20    # méně znaků v textové vrstvě = sken, stránka jde do OCR
+    dpi: int = 300              # rozlišení vykreslení pro OCR
+    max_pages: int = 50         # delší dokumenty se čtou jen do tohoto počtu stránek
+    max_in_flight: int = 0      # vykreslené stránky čekající na OCR, 0 = počet CPU
+
+
+DEFAULT_PDF_SETTINGS = PdfSettings()
+
+
+@dataclass
+class PdfPage:
+    """Text jedné stránky - source je 'text' (textová vrstva) nebo 'ocr'"""
+    index: int
+    text: str
+    source: str
+    elapsed_ms: float = 0.0
+    error: Optional[str] = None
+
+
+@dataclass
+class PdfText:
+    """Text celého dokumentu složený ze stránek"""
+    pages: List[PdfPage] = field(default_factory=list)
+
+    @property
+    def text(self) -> str:
+        return '\n'.join(page.text for page in self.pages if page.text.strip())
+
+    @property
+    def ocr_pages(self) -> int:
+        return sum(1 for page in self.pages if page.source == 'ocr')
+
+    def summary(self) -> List[dict]:
+        """Přehled stránek (bez textu) pro uložení k příloze"""
+        return [
+            {'page': page.index + 1, 'source': page.source, 'chars': len(page.text),
+             'elapsed_ms': page.elapsed_ms, **({'error': page.error} if page.error else {})}
+            for page in self.pages
+        ]
+
+
+def is_pdf(data: bytes) -> bool:
+    return PDF_MAGIC in data[:PDF_HEADER_SEARCH]
+
+
+def _page_text(page) -> str:
+    textpage = page.get_textpage()
+    try:
+        # PDFium odděluje řádky \r\n
+        return textpage.get_text_range().replace('\r\n', '\n').replace('\r', '\n')
+    finally:
+        textpage.close()
+
+
+def _render_page(page, dpi: int) -> Image.Image:
+    bitmap = page.render(scale=dpi / 72, grayscale=True)
+    try:
+        # Kopie - obrázek z to_pil sdílí paměť s bitmapou PDFia
+        return bitmap.to_pil().copy()
+    finally:
+        bitmap.close()
+
+
+def _ocr_job(index: int, image: Image.Image, ocr_page: Callable[[Image.Image], str]) -> PdfPage:
+    started = time.perf_counter()
+    try:
+        text = ocr_page(image)
+        error = None
+    except Exception as e:
+        text, error = '', f"{type(e).__name__}: {str(e)}"
+        logger.warning(f"OCR stránky {index + 1} selhalo: {error}")
+    return PdfPage(index=index, text=text, source='ocr',
+                   elapsed_ms=round((time.perf_counter() - started) * 1000, 1), error=error)
+
+
+def iter_pdf_pages(pdf_data: bytes, ocr_page: Callable[[Image.Image], str],
+                   executor: Optional[Executor] = None,
+                   settings: PdfSettings = DEFAULT_PDF_SETTINGS) -> Iterator[PdfPage]:
+    """
+    Postupně vrací stránky PDF v pořadí
+
+    Args:
+        pdf_data: obsah PDF
+        ocr_page: OCR jednoho vykresleného obrázku stránky -> text
+        executor: OCR pool; bez něj se stránky OCRují postupně ve volajícím vlákně
+        settings: prahy a rozlišení
+
+    Yields:
+        PdfPage; chyba OCR jedné stránky se zapíše do page.error a pokračuje se dál
+    """
+    if not PDF_AVAILABLE:
+        raise RuntimeError("Čtení PDF vyžaduje pypdfium2")
+
+    max_in_flight = settings.max_in_flight or os.cpu_count() or 1
+    pdf = pdfium.PdfDocument(pdf_data)
+    try:
+        page_count = min(len(pdf), settings.max_pages)
+        if len(pdf) > page_count:
+            logger.warning(f"PDF má {len(pdf)} stran, čtu jen prvních {page_count}")
+
+        pending = deque()
+        in_flight = 0
+        for index in range(page_count):
+            started = time.perf_counter()
+            page = pdf[index]
+            try:
+                text = _page_text(page)
+                if len(text.strip()) >= settings.min_text_chars:
+                    item = PdfPage(index=index, text=text, source='text',
+                                   elapsed_ms=round((time.perf_counter() - started) * 1000, 1))
+                else:
+                    image = _render_page(page, settings.dpi)
+                    if executor is None:
+                        item = _ocr_job(index, image, ocr_page)
+                    else:
+                        item = executor.submit(_ocr_job, index, image, ocr_page)
+                        in_flight += 1
+                    del image
+            finally:
+                page.close()
+            pending.append(item)
+
+            # Hotové stránky ven v pořadí; při plném poolu se čeká na nejstarší
+            while pending and (not isinstance(pending[0], Future) or pending[0].done() or in_flight >= max_in_flight):
+                item = pending.popleft()
+                if isinstance(item, Future):
+                    in_flight -= 1
+                    item = item.result()
+                yield item
+
+        while pending:
+            item = pending.popleft()
+            yield item.result() if isinstance(item, Future) else item
+    finally:
+        pdf.close()
+
+
+def extract_pdf_text(pdf_data: bytes, ocr_page: Callable[[Image.Image], str],
+                     executor: Optional[Executor] = None,
+                     settings: PdfSettings = DEFAULT_PDF_SETTINGS) -> PdfText:
+    """
+    Text celého PDF - textová vrstva, kde je, jinak OCR vykreslené stránky
+
+    Returns:
+        PdfText se stránkami v pořadí
+    """
+    started = time.perf_counter()
+    result = PdfText()
+    for page in iter_pdf_pages(pdf_data, ocr_page, executor, settings):
+        result.pages.append(page)
+    logger.info(
+        f"PDF: {len(result.pages)} stran, {result.ocr_pages} přes OCR, "
+        f"{len(result.text)} znaků za {(time.perf_counter() - started) * 1000:.0f} ms"
+    )
+    return result
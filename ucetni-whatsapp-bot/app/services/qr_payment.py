@@ -0,0 +1,223 @@
+"""
+Čtení QR Platby (SPAYD) a QR Faktury (SID) z fotky dokladu
+
+Faktury a složenky často nesou QR kód s přesnou částkou, účtem, variabilním
+symbolem a splatností. Dekódování QR je rychlejší a přesnější než OCR,
+takže se zkouší jako první a OCR pak doplňuje jen to, co v kódu není.
+
+Formát: SPD*1.0*ACC:CZ5855000000001265098001+RZBCCZPP*AM:480.50*CC:CZK*X-VS:1234567890*DT:20240415
+QR Faktura je buď samostatná (SID*1.0*...), nebo vložená v QR Platbě jako X-INV.
+"""
+import io
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional
+from urllib.parse import unquote
+
+from PIL import Image
+
+try:
+    import cv2
+    import numpy as np
+    CV2_AVAILABLE = True
+except ImportError:
+    CV2_AVAILABLE = False
+
+from app.services.image_preprocessing import load_grayscale
+
+logger = logging.getLogger(__name__)
+
+PAYMENT_HEADER = 'SPD'
+INVOICE_HEADER = 'SID'
+
+# Větší fotky se pro hledání QR zmenšují, modul kódu musí mít aspoň pár pixelů
+QR_MAX_LONG_SIDE = 1600
+
+
+@dataclass
+class QrPayment:
+    """Údaje z QR Platby / QR Faktury - chybějící pole jsou None"""
+    iban: Optional[str] = None
+    bic: Optional[str] = None
+    bank_account: Optional[str] = None       # český formát předčíslí-číslo/banka
+    amount: Optional[float] = None
+    currency: str = 'CZK'
+    variable_symbol: Optional[str] = None
+    constant_symbol: Optional[str] = None
+    specific_symbol: Optional[str] = None
+    due_date: Optional[str] = None           # YYYY-MM-DD
+    recipient_name: Optional[str] = None
+    message: Optional[str] = None
+    # QR Faktura
+    document_number: Optional[str] = None
+    document_date: Optional[str] = None
+    ico: Optional[str] = None
+    dic: Optional[str] = None
+    raw: str = ''
+    attributes: Dict[str, str] = field(default_factory=dict)
+
+    def to_receipt_fields(self) -> Dict:
+        """Pole ve stejném tvaru jako OCR extrakce (total, date, ico, ...)"""
+        fields = {
+            'total': self.amount,
+            'currency': self.currency,
+            'bank_account': self.bank_account,
+            'iban': self.iban,
+            'variable_symbol': self.variable_symbol,
+            'constant_symbol': self.constant_symbol,
+            'specific_symbol': self.specific_symbol,
+            'due_date': self.due_date,
+            'vendor': self.recipient_name,
+            'document_number': self.document_number,
+            'date': self.document_date,
+            'ico': self.ico,
+            'dic': self.dic,
+        }
+        return {key: value for key, value in fields.items() if value is not None}
+
+
+def iban_to_czech_account(iban: str) -> Optional[str]:
+    """
+    CZ IBAN na číslo účtu (CZkk BBBB PPPPPP NNNNNNNNNN -> předčíslí-číslo/banka)
+    """
+    iban = iban.replace(' ', '').upper()
+    if len(iban) != 24 or not iban.startswith('CZ') or not iban[2:].isdigit():
+        return None
+    bank, prefix, number = iban[4:8], iban[8:14].lstrip('0'), iban[14:].lstrip('0')
+    if not number:
+        return None
+    return f"{prefix}-{number}/{bank}" if prefix else f"{number}/{bank}"
+
+
+def _parse_date(value: Optional[str]) -> Optional[str]:
+    """YYYYMMDD na YYYY-MM-DD"""
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y%m%d').date().isoformat()
+    except ValueError:
+        return None
+
+
+def _parse_attributes(parts: List[str]) -> Dict[str, str]:
+    attributes = {}
+    for part in parts:
+        key, sep, value = part.partition(':')
+        if sep and key:
+            # Hodnoty mohou obsahovat %2A místo hvězdičky
+            attributes.setdefault(key.upper(), unquote(value))
+    return attributes
+
+
+def parse_spayd(text: str) -> Optional[QrPayment]:
+    """
+    Rozparsuje obsah QR kódu (QR Platba SPD nebo QR Faktura SID)
+
+    Returns:
+        QrPayment nebo None, pokud obsah není SPAYD/SID
+    """
+    if not text:
+        return None
+    parts = text.strip().split('*')
+    if len(parts) < 3 or parts[0].upper() not in (PAYMENT_HEADER, INVOICE_HEADER):
+        return None
+
+    attributes = _parse_attributes(parts[2:])
+    payment = QrPayment(raw=text, attributes=attributes)
+
+    if parts[0].upper() == PAYMENT_HEADER:
+        account = attributes.get('ACC', '')
+        iban, _, bic = account.partition('+')
+        if iban:
+            payment.iban = iban
+            payment.bic = bic or None
+            payment.bank_account = iban_to_czech_account(iban)
+        payment.recipient_name = attributes.get('RN') or None
+        payment.message = attributes.get('MSG') or None
+        payment.variable_symbol = attributes.get('X-VS') or None
+        payment.constant_symbol = attributes.get('X-KS') or None
+        payment.specific_symbol = attributes.get('X-SS') or None
+        invoice = attributes.get('X-INV')
+    else:
+        payment.variable_symbol = attributes.get('VS') or None
+        payment.constant_symbol = attributes.get('KS') or None
+        payment.specific_symbol = attributes.get('SS') or None
+        invoice = None
+
+    try:
+        payment.amount = round(float(attributes['AM']), 2) if attributes.get('AM') else None
+    except ValueError:
+        logger.warning(f"Neplatná částka v QR kódu: {attributes.get('AM')}")
+    payment.currency = (attributes.get('CC') or 'CZK').upper()
+    payment.due_date = _parse_date(attributes.get('DT'))
+
+    invoice_attributes = attributes if parts[0].upper() == INVOICE_HEADER else {}
+    if invoice:
+        invoice_parts = invoice.split('*')
+        if invoice_parts[0].upper() == INVOICE_HEADER:
+            invoice_attributes = _parse_attributes(invoice_parts[2:])
+
+    if invoice_attributes:
+        payment.document_number = invoice_attributes.get('ID') or None
+        payment.document_date = _parse_date(invoice_attributes.get('DD'))
+        payment.ico = invoice_attributes.get('INI') or None
+        payment.dic = invoice_attributes.get('VII') or None
+        if payment.amount is None and invoice_attributes.get('AM'):
+            try:
+                payment.amount = round(float(invoice_attributes['AM']), 2)
+            except ValueError:
+                pass
+        if payment.variable_symbol is None:
+            payment.variable_symbol = invoice_attributes.get('VS') or None
+
+    return payment
+
+
+def decode_qr_texts(image_data: bytes, max_long_side: int = QR_MAX_LONG_SIDE) -> List[str]:
+    """
+    Najde a dekóduje QR kód na obrázku (OpenCV QRCodeDetector)
+
+    Returns:
+        Seznam textů; prázdný bez OpenCV nebo když žádný kód není
+    """
+    if not CV2_AVAILABLE:
+        return []
+
+    started = time.perf_counter()
+    try:
+        image = load_grayscale(Image.open(io.BytesIO(image_data)), max_long_side)
+        full = np.asarray(image)
+    except Exception as e:
+        logger.warning(f"QR: nelze načíst obrázek: {str(e)}")
+        return []
+
+    factor = max_long_side / max(full.shape)
+    gray = cv2.resize(full, None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA) if factor < 1 else full
+
+    detector = cv2.QRCodeDetector()
+    texts = []
+    try:
+        # Levná detekce vyhledávacích čtverců - většina účtenek QR nemá
+        found, _ = detector.detect(gray)
+        if found:
+            text, _, _ = detector.detectAndDecode(gray)
+            if not text and gray is not full:
+                # Kód je vidět, ale moduly jsou po zmenšení moc malé - plné rozlišení
+                text, _, _ = detector.detectAndDecode(full)
+            texts = [text] if text else []
+    except cv2.error as e:
+        logger.debug(f"QR detekce selhala: {str(e)}")
+
+    logger.debug(f"QR dekódování: {len(texts)} kódů za {(time.perf_counter() - started) * 1000:.1f} ms")
+    return texts
+
+
+def read_qr_payment(image_data: bytes) -> Optional[QrPayment]:
+    """První QR Platba / QR Faktura nalezená na obrázku"""
+    for text in decode_qr_texts(image_data):
+        payment = parse_spayd(text)
+        if payment is not None:
+            return payment
+    return None
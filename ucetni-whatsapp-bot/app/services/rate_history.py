@@ -0,0 +1,252 @@
+"""
+Historické kurzy ČNB podle data
+
+Cizoměnový doklad se přepočítává kurzem ze dne uskutečnění, ne dnešním.
+Historie se plní hromadně z ročních souborů ČNB (rok.txt, jeden řádek
+na pracovní den) - scripts/import_cnb_rates.py je stáhne do
+CNB_HISTORY_DIR a aplikace je při prvním dotazu načte bez sítě.
+
+Každá měna má dvě kompaktní pole seřazená podle data (ordinal dne
+a kurz za 1 jednotku v miliontinách Kč). Kurzy ČNB mají 3 desetinná
+místa a množství nejvýš 1000 jednotek, takže celočíselný zápis je
+přesný. Dotaz je binární hledání: platí poslední kurz vyhlášený
+v den dokladu nebo před ním (víkend a svátek přebírají předchozí den).
+Pro reporty je k dispozici dávkový převod, s numpy vektorizovaný.
+"""
+import logging
+import os
+import threading
+from array import array
+from bisect import bisect_right
+from datetime import date, datetime, timedelta
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+CNB_YEAR_URL = ("https://www.cnb.cz/cs/financni-trhy/devizovy-trh/kurzy-devizoveho-trhu/"
+                "kurzy-devizoveho-trhu/rok.txt?rok={year}")
+DEFAULT_HISTORY_DIR = Path(__file__).resolve().parent.parent / 'data' / 'cnb_history'
+
+RATE_SCALE = 10 ** 6
+# Nejdelší mezera mezi lístky (Vánoce + víkend) - starší kurz už nepatří k datu dokladu
+MAX_GAP = timedelta(days=7)
+
+RateTable = Dict[str, Decimal]
+Series = Tuple[array, array]   # (ordinaly dnů, kurzy v miliontinách Kč)
+
+
+def parse_cnb_year(text: str) -> Iterator[Tuple[date, RateTable]]:
+    """
+    Parsuje roční soubor ČNB
+
+    Formát (hlavička se v roce opakuje, když se změní seznam měn):
+        Datum|1 AUD|1 BRL|...|100 JPY|...
+        02.01.2025|15,048|3,912|...|15,368|...
+
+    Yields:
+        (den, kurzy za 1 jednotku měny)
+    """
+    columns: List[Tuple[str, Decimal]] = []
+    for line in text.splitlines():
+        parts = [part.strip() for part in line.split('|')]
+        if not parts[0]:
+            continue
+        if parts[0].lower() == 'datum':
+            columns = []
+            for header in parts[1:]:
+                amount, _, code = header.partition(' ')
+                columns.append((code.strip(), Decimal(amount)))
+            continue
+        if not columns:
+            continue
+        try:
+            day = datetime.strptime(parts[0], '%d.%m.%Y').date()
+        except ValueError:
+            continue
+
+        rates = {}
+        for (code, amount), value in zip(columns, parts[1:]):
+            if not value:
+                continue
+            try:
+                rates[code] = Decimal(value.replace(',', '.')) / amount
+            except InvalidOperation:
+                continue
+        if rates:
+            yield day, rates
+
+
+def to_scaled(rate: Decimal) -> int:
+    return int((rate * RATE_SCALE).to_integral_value(rounding=ROUND_HALF_UP))
+
+
+def from_scaled(value: int) -> Decimal:
+    return Decimal(int(value)) / RATE_SCALE
+
+
+class RateHistory:
+    """Kurzy ČNB za libovolný den z uložených ročních souborů"""
+
+    def __init__(self, directory: Optional[Path] = None):
+        self.directory = Path(directory or os.getenv('CNB_HISTORY_DIR') or DEFAULT_HISTORY_DIR)
+        self._series: Optional[Dict[str, Series]] = None
+        self._pending: Dict[date, RateTable] = {}
+        self._lock = threading.Lock()
+
+    # --- Plnění ---
+
+    def import_year(self, year: int, text: str) -> int:
+        """Uloží roční soubor ČNB a přidá ho do historie, vrací počet dnů"""
+        tables = list(parse_cnb_year(text))
+        if not tables:
+            raise ValueError(f"Roční soubor ČNB pro rok {year} neobsahuje žádné kurzy")
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f"{year}.txt"
+        tmp_path = path.with_name(path.name + '.tmp')
+        tmp_path.write_text(text, encoding='utf-8')
+        os.replace(tmp_path, path)
+
+        self._merge(tables)
+        return len(tables)
+
+    def add_table(self, day: date, rates: RateTable) -> None:
+        """Přidá denní lístek (obnova ExchangeRateService) - historie se kvůli tomu nenačítá"""
+        with self._lock:
+            if self._series is None:
+                self._pending[day] = rates
+                return
+        self._merge([(day, rates)])
+
+    def _ensure_loaded(self) -> Dict[str, Series]:
+        series = self._series
+        if series is not None:
+            return series
+        with self._lock:
+            if self._series is None:
+                tables = []
+                for path in sorted(self.directory.glob('*.txt')):
+                    try:
+                        tables.extend(parse_cnb_year(path.read_text(encoding='utf-8')))
+                    except (OSError, UnicodeDecodeError) as e:
+                        logger.warning(f"Roční kurzy {path} nelze načíst: {str(e)}")
+                tables.extend(self._pending.items())
+                self._pending = {}
+                self._series = self._build({}, tables)
+                if tables:
+                    logger.info(f"Historie kurzů ČNB načtena: {len(tables)} dnů, {len(self._series)} měn")
+            return self._series
+
+    def _merge(self, tables: Iterable[Tuple[date, RateTable]]) -> None:
+        self._ensure_loaded()
+        with self._lock:
+            # Nový slovník a nová pole - souběžné čtení dál vidí ten starý celý
+            self._series = self._build(self._series, tables)
+
+    @staticmethod
+    def _build(existing: Dict[str, Series], tables: Iterable[Tuple[date, RateTable]]) -> Dict[str, Series]:
+        by_currency: Dict[str, Dict[int, int]] = {}
+        for day, rates in tables:
+            ordinal = day.toordinal()
+            for code, rate in rates.items():
+                if code != 'CZK':
+                    by_currency.setdefault(code, {})[ordinal] = to_scaled(rate)
+
+        series = dict(existing)
+        for code, values in by_currency.items():
+            if code in existing:
+                days, scaled = existing[code]
+                merged = dict(zip(days, scaled))
+                merged.update(values)
+                values = merged
+            ordered = sorted(values)
+            series[code] = (array('l', ordered), array('q', (values[d] for d in ordered)))
+        return series
+
+    # --- Dotazy ---
+
+    def currencies(self) -> List[str]:
+        return sorted(self._ensure_loaded())
+
+    def coverage(self) -> Optional[Tuple[date, date]]:
+        """První a poslední den v historii"""
+        series = self._ensure_loaded()
+        if not series:
+            return None
+        return (date.fromordinal(min(days[0] for days, _ in series.values())),
+                date.fromordinal(max(days[-1] for days, _ in series.values())))
+
+    def lookup(self, currency: str, on_date: date) -> Optional[Tuple[Decimal, date]]:
+        """
+        Kurz platný pro den dokladu
+
+        Returns:
+            (kurz za 1 jednotku, den vyhlášení), nebo None když historie den nepokrývá
+        """
+        if currency == 'CZK':
+            return Decimal('1.0'), on_date
+        series = self._ensure_loaded().get(currency)
+        if series is None:
+            return None
+
+        days, scaled = series
+        ordinal = on_date.toordinal()
+        index = bisect_right(days, ordinal) - 1
+        if index < 0 or ordinal - days[index] > MAX_GAP.days:
+            return None
+        return from_scaled(scaled[index]), date.fromordinal(days[index])
+
+    def convert_batch(self, currencies: Sequence[str], dates: Sequence[date],
+                      amounts: Sequence[Decimal]) -> List[Optional[Tuple[Decimal, Decimal, date]]]:
+        """
+        Převede mnoho částek najednou (reporty, přepočet starých dokladů)
+
+        Returns:
+            Pro každou částku (částka v CZK, kurz, den vyhlášení), nebo None bez kurzu
+        """
+        results: List[Optional[Tuple[Decimal, Decimal, date]]] = [None] * len(amounts)
+        groups: Dict[str, List[int]] = {}
+        for i, currency in enumerate(currencies):
+            groups.setdefault(currency, []).append(i)
+
+        series = self._ensure_loaded()
+        for currency, positions in groups.items():
+            if currency == 'CZK':
+                for i in positions:
+                    results[i] = (Decimal(amounts[i]), Decimal('1.0'), dates[i])
+                continue
+            if currency not in series:
+                continue
+
+            days, scaled = series[currency]
+            ordinals = [dates[i].toordinal() for i in positions]
+            if NUMPY_AVAILABLE:
+                found = self._search_numpy(days, ordinals)
+            else:
+                found = [bisect_right(days, ordinal) - 1 for ordinal in ordinals]
+
+            for i, ordinal, index in zip(positions, ordinals, found):
+                if index < 0 or ordinal - days[index] > MAX_GAP.days:
+                    continue
+                rate = from_scaled(scaled[index])
+                amount_czk = (Decimal(amounts[i]) * rate).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+                results[i] = (amount_czk, rate, date.fromordinal(days[index]))
+        return results
+
+    @staticmethod
+    def _search_numpy(days: array, ordinals: List[int]) -> List[int]:
+        """Binární hledání celé skupiny v jednom volání searchsorted"""
+        day_array = np.frombuffer(days, dtype=np.dtype(days.typecode))
+        return (np.searchsorted(day_array, np.asarray(ordinals, dtype=day_array.dtype), side='right') - 1).tolist()
+
+
+# Globální instance - načte se při prvním dotazu na historický kurz
+rate_history = RateHistory()
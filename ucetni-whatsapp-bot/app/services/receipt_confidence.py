@@ -0,0 +1,97 @@
+"""
+Skóre spolehlivosti pravidlové extrakce účtenky
+
+Rozhoduje, jestli je výsledek tokenizéru dost důvěryhodný na to, aby se
+transakce vytvořila bez volání LLM. Nestačí, že pole existují - musí
+spolu souhlasit: položky dávají dohromady celkovou částku, IČO má platný
+kontrolní součet a patří známému prodejci, kterého jmenuje i hlavička
+účtenky. Co chybí nebo nesouhlasí, se vrací jako seznam polí pro
+zkrácený AI prompt.
+"""
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from app.services.vendor_registry import Vendor, vendor_registry
+from utils.ico import ico_checksum_valid
+
+# Hotovostní platby se zaokrouhlují na celé koruny
+ITEMS_SUM_TOLERANCE = 0.5
+
+# Zdroje celkové částky, které jsou ověřené jinak než součtem položek
+VERIFIED_TOTAL_SOURCES = ('qr', 'template')
+
+# Váhy jednotlivých kontrol pro výsledné skóre 0-1
+CHECK_WEIGHTS = {
+    'total': 0.25,
+    'date': 0.1,
+    'ico_checksum': 0.15,
+    'vendor_known': 0.15,
+    'vendor_consistent': 0.1,
+    'items_sum': 0.25,
+}
+
+# Pole, která umí doplnit zkrácený AI prompt
+AI_FIELDS = ('amount', 'date', 'ico', 'vendor', 'category', 'description')
+
+
+@dataclass
+class ConfidenceReport:
+    """Výsledek kontrol - skóre, jednotlivé kontroly a pole k doplnění"""
+    score: float
+    checks: Dict[str, bool]
+    missing: List[str] = field(default_factory=list)
+    vendor: Optional[Vendor] = None
+
+    @property
+    def confident(self) -> bool:
+        return all(self.checks.values())
+
+
+def score_receipt_fields(data: Dict, text: str = "") -> ConfidenceReport:
+    """
+    Ohodnotí pole vytažená z OCR textu
+
+    Args:
+        data: výsledek extract_receipt_fields
+        text: OCR text (hlavička se porovná s prodejcem podle IČO)
+
+    Returns:
+        ConfidenceReport; confident=True jen když projdou všechny kontroly
+    """
+    total = data.get('total')
+    items = data.get('items') or []
+    ico = data.get('ico')
+
+    vendor = vendor_registry.by_ico(ico)
+    header = '\n'.join(text.strip().split('\n')[:5])
+    header_match = vendor_registry.find_in_text(header) if header else None
+    header_vendor = header_match[1] if header_match else None
+
+    checks = {
+        'total': bool(total and total > 0),
+        'date': bool(data.get('date')),
+        'ico_checksum': ico_checksum_valid(ico),
+        'vendor_known': vendor is not None,
+        # Hlavička nesmí jmenovat jiného prodejce, než komu patří IČO
+        'vendor_consistent': vendor is not None and header_vendor in (None, vendor),
+        # Částka z QR kódu nebo ověřená rekapitulací DPH v šabloně - položky pak nemusí sedět
+        'items_sum': bool(total) and (data.get('total_source') in VERIFIED_TOTAL_SOURCES or bool(items) and abs(
+            sum(item.get('price', 0) for item in items) - total
+        ) <= ITEMS_SUM_TOLERANCE),
+    }
+    score = round(sum(CHECK_WEIGHTS[name] for name, passed in checks.items() if passed), 2)
+
+    missing = []
+    if not checks['total'] or not checks['items_sum']:
+        missing.append('amount')
+    if not checks['date']:
+        missing.append('date')
+    if not checks['ico_checksum'] or not checks['vendor_consistent']:
+        missing.append('ico')
+    if not checks['vendor_known'] or not checks['vendor_consistent']:
+        missing.append('vendor')
+    if vendor is None or not vendor.category_code or not checks['vendor_consistent']:
+        missing.extend(['category', 'description'])
+
+    return ConfidenceReport(score=score, checks=checks, missing=missing,
+                            vendor=vendor if checks['vendor_consistent'] else None)
@@ -0,0 +1,205 @@
+"""
+Deduplikace opakovaně poslaných účtenek
+
+Uživatelé často pošlou stejnou fotku znovu nebo ji přepošlou jako dokument.
+Pro každého uživatele držíme malý index zpracovaných obrázků: přesné klíče
+(MediaUrl, SHA-256 dat) a 64bitový perceptuální hash (pHash), který přežije
+překomprimování, změnu velikosti i převod na dokument. Při přesné shodě se
+přeskočí OCR i AI a vrátí se uložený výsledek s varováním o duplicitě.
+Shoda jen podle pHash nic neblokuje - dvě účtenky téhož obchodu vypadají
+podobně, účtenka se zpracuje a transakce se označí jako možná duplicita.
+
+Index je v paměti a omezený - počet uživatelů i záznamů na uživatele
+(nejdéle nepoužité se zahazují).
+"""
+import hashlib
+import io
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from PIL import Image
+
+try:
+    import cv2
+    import numpy as np
+    CV2_AVAILABLE = True
+except ImportError:
+    CV2_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Hammingova vzdálenost pHash, do které bereme obrázky jako stejnou účtenku
+DEFAULT_MAX_DISTANCE = 8
+
+
+def sha256_digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _small_grayscale(image: Image.Image, size: int) -> Image.Image:
+    # draft() u JPEG dekóduje rovnou zmenšeně - na hash stačí pár desítek pixelů
+    if image.format == 'JPEG':
+        image.draft('L', (size * 4, size * 4))
+    return image.convert('L').resize((size, size), Image.LANCZOS)
+
+
+def compute_dhash(image: Image.Image, hash_size: int = 8) -> int:
+    """Rozdílový hash - porovnání sousedních pixelů v řádku (rychlý, bez numpy)"""
+    if image.format == 'JPEG':
+        image.draft('L', (hash_size * 8, hash_size * 8))
+    small = image.convert('L').resize((hash_size + 1, hash_size), Image.LANCZOS)
+    pixels = list(small.getdata())
+
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def compute_phash(image: Image.Image, hash_size: int = 8, highfreq_factor: int = 4) -> int:
+    """
+    Perceptuální hash - znaménka nízkých frekvencí DCT vůči mediánu.
+    Bez OpenCV spadne na dHash.
+    """
+    if not CV2_AVAILABLE:
+        return compute_dhash(image, hash_size)
+
+    size = hash_size * highfreq_factor
+    pixels = np.asarray(_small_grayscale(image, size), dtype=np.float32)
+    low = cv2.dct(pixels)[:hash_size, :hash_size]
+    # Stejnosměrnou složku (průměrný jas) do mediánu nepočítáme
+    median = np.median(low.ravel()[1:])
+    bits = (low > median).ravel()
+
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return value
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+@dataclass
+class DedupEntry:
+    """Jeden zpracovaný obrázek uživatele"""
+    sha256: str
+    phash: Optional[int]      # None u PDF - hledá se jen přesná shoda
+    result: Dict
+    media_url: Optional[str] = None
+    transaction_id: Optional[int] = None
+    created_at: float = field(default_factory=time.time)
+
+
+@dataclass
+class DedupMatch:
+    """Nalezená shoda - match_type je 'media_url', 'sha256' nebo 'phash'"""
+    entry: DedupEntry
+    match_type: str
+    distance: int = 0
+
+
+class ReceiptDedupCache:
+    """
+    Omezený index zpracovaných obrázků po uživatelích (LRU na obou úrovních)
+    """
+
+    def __init__(self, max_entries_per_user: int = 200, max_users: int = 5000,
+                 max_distance: int = DEFAULT_MAX_DISTANCE):
+        self.max_entries_per_user = max_entries_per_user
+        self.max_users = max_users
+        self.max_distance = max_distance
+        # user_id -> OrderedDict[sha256 -> DedupEntry]
+        self._users: "OrderedDict[int, OrderedDict[str, DedupEntry]]" = OrderedDict()
+        self.stats = {'hits_exact': 0, 'hits_phash': 0, 'misses': 0}
+
+    def _user_entries(self, user_id: int, create: bool = False) -> Optional["OrderedDict[str, DedupEntry]"]:
+        entries = self._users.get(user_id)
+        if entries is None and create:
+            entries = self._users[user_id] = OrderedDict()
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        if entries is not None:
+            self._users.move_to_end(user_id)
+        return entries
+
+    def find_exact(self, user_id: int, sha256: str, media_url: Optional[str] = None) -> Optional[DedupMatch]:
+        """Přesná shoda podle SHA-256 dat nebo MediaUrl - bez dekódování obrázku"""
+        entries = self._user_entries(user_id)
+        if not entries:
+            return None
+
+        entry = entries.get(sha256)
+        if entry is not None:
+            entries.move_to_end(sha256)
+            self.stats['hits_exact'] += 1
+            return DedupMatch(entry, 'sha256')
+
+        if media_url:
+            for key, entry in entries.items():
+                if entry.media_url == media_url:
+                    entries.move_to_end(key)
+                    self.stats['hits_exact'] += 1
+                    return DedupMatch(entry, 'media_url')
+        return None
+
+    def find_similar(self, user_id: int, phash: int) -> Optional[DedupMatch]:
+        """Nejbližší uložený obrázek v Hammingově vzdálenosti do max_distance (jen podezření na duplicitu)"""
+        entries = self._user_entries(user_id)
+        best = None
+        if entries:
+            for key, entry in entries.items():
+                if entry.phash is None:
+                    continue
+                distance = hamming_distance(phash, entry.phash)
+                if distance <= self.max_distance and (best is None or distance < best[2]):
+                    best = (key, entry, distance)
+
+        if best is None:
+            self.stats['misses'] += 1
+            return None
+
+        key, entry, distance = best
+        entries.move_to_end(key)
+        self.stats['hits_phash'] += 1
+        return DedupMatch(entry, 'phash', distance)
+
+    def add(self, user_id: int, sha256: str, phash: Optional[int], result: Dict,
+            media_url: Optional[str] = None) -> DedupEntry:
+        entries = self._user_entries(user_id, create=True)
+        entry = DedupEntry(sha256=sha256, phash=phash, result=result, media_url=media_url)
+        entries[sha256] = entry
+        entries.move_to_end(sha256)
+        while len(entries) > self.max_entries_per_user:
+            entries.popitem(last=False)
+        return entry
+
+    def set_transaction(self, user_id: int, sha256: str, transaction_id: int) -> None:
+        """Zapamatuje si transakci vytvořenou z obrázku (pro odkaz ve varování)"""
+        entries = self._user_entries(user_id)
+        if entries and sha256 in entries:
+            entries[sha256].transaction_id = transaction_id
+
+    def discard(self, user_id: int, sha256: str) -> None:
+        """Zapomene obrázek - transakce z něj se nepodařilo uložit, opakované poslání se zpracuje znovu"""
+        entries = self._user_entries(user_id)
+        if entries:
+            entries.pop(sha256, None)
+
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self._users.values())
+
+
+def image_phash(image_data: bytes) -> Optional[int]:
+    """pHash z bytes obrázku, None pokud obrázek nejde dekódovat"""
+    try:
+        return compute_phash(Image.open(io.BytesIO(image_data)))
+    except Exception as e:
+        logger.warning(f"Nepodařilo se spočítat pHash: {str(e)}")
+        return None
@@ -0,0 +1,339 @@
+"""
+Šablony rozložení účtenek podle prodejce
+
+Účtenky velkých řetězců mají stálé rozložení - hlavička s IČO nahoře,
+CELKEM, rekapitulace DPH a datum v patičce. Z účtenek, které obecná
+extrakce zpracovala spolehlivě, se pro každé IČO učí, kde tyto řádky leží.
+Poloha se měří ve výškách textu od horního i dolního okraje (předzpracovaný
+obrázek má normalizovanou výšku písma); jako kotva se použije ta vzdálenost,
+která se mezi účtenkami mění nejméně - patička je stálá odspodu, i když
+je účtenka různě dlouhá podle počtu položek.
+
+Známá šablona pak umožní OCR jen vybraných pásů místo celé účtenky.
+"""
+import json
+import logging
+import os
+import threading
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from app.services.receipt_tokenizer import (
+    PAYABLE_KEYWORD, TOTAL_KEYWORDS, VAT_KEYWORDS, parse_date, tokenize_line
+)
+from utils.ico import ico_checksum_valid
+
+logger = logging.getLogger(__name__)
+
+# Zaokrouhlení DPH na řádku rekapitulace a celkové částky (hotovost na koruny)
+VAT_ROUNDING_TOLERANCE = 0.1
+TOTAL_TOLERANCE = 1.0
+
+
+@dataclass(frozen=True)
+class TemplateSettings:
+    """Kdy je šablona použitelná a jak široké pásy se čtou"""
+    min_samples: int = 2        # kolik spolehlivých účtenek je potřeba
+    max_spread: float = 1.5     # max. rozptyl polohy řádku mezi účtenkami (ve výškách textu)
+    margin: float = 1.0         # přesah čteného pásu nad a pod řádek
+    max_failures: int = 3       # po tolika neúspěších v řadě se šablona vypne až do dalšího učení
+    header_lines: int = 14      # výška pásu hlavičky pro přečtení IČO
+
+
+DEFAULT_TEMPLATE_SETTINGS = TemplateSettings()
+
+
+@dataclass
+class RegionStats:
+    """Poloha jednoho řádku (pole) napříč účtenkami, ve výškách textu"""
+    top_min: float
+    top_max: float
+    bottom_min: float
+    bottom_max: float
+    height: float
+    samples: int = 1
+
+    def observe(self, top: float, bottom: float, height: float) -> None:
+        self.top_min = min(self.top_min, top)
+        self.top_max = max(self.top_max, top)
+        self.bottom_min = min(self.bottom_min, bottom)
+        self.bottom_max = max(self.bottom_max, bottom)
+        self.height = max(self.height, height)
+        self.samples += 1
+
+    @property
+    def anchor(self) -> str:
+        return 'top' if self.top_max - self.top_min <= self.bottom_max - self.bottom_min else 'bottom'
+
+    @property
+    def spread(self) -> float:
+        return min(self.top_max - self.top_min, self.bottom_max - self.bottom_min)
+
+    def band(self, image_height: int, unit: float, margin: float) -> Tuple[int, int]:
+        """Svislý pás (y0, y1) v pixelech, kde řádek na této účtence leží"""
+        if self.anchor == 'top':
+            y0 = self.top_min * unit
+            y1 = (self.top_max + self.height) * unit
+        else:
+            y0 = image_height - (self.bottom_max + self.height) * unit
+            y1 = image_height - self.bottom_min * unit
+        y0 -= margin * unit
+        y1 += margin * unit
+        return max(0, int(y0)), min(image_height, int(y1 + 0.5))
+
+
+@dataclass
+class ReceiptTemplate:
+    ico: str
+    vendor: Optional[str] = None
+    regions: Dict[str, RegionStats] = field(default_factory=dict)
+    samples: int = 0
+    hits: int = 0
+    failures: int = 0
+    consecutive_failures: int = 0
+
+    def usable(self, settings: TemplateSettings) -> bool:
+        total = self.regions.get('total')
+        return (
+            self.samples >= settings.min_samples
+            and self.consecutive_failures < settings.max_failures
+            and total is not None and total.spread <= settings.max_spread
+        )
+
+    def stable_regions(self, settings: TemplateSettings) -> Dict[str, RegionStats]:
+        """Pole, jejichž poloha se mezi účtenkami drží (ostatní se nečtou)"""
+        return {name: region for name, region in self.regions.items()
+                if region.samples >= settings.min_samples and region.spread <= settings.max_spread}
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "ReceiptTemplate":
+        regions = {name: RegionStats(**region) for name, region in data.get('regions', {}).items()}
+        return cls(**{**data, 'regions': regions})
+
+
+def layout_lines(layout: Dict) -> List[Tuple[str, int, int]]:
+    """
+    Řádky z výstupu image_to_data - (text, top, bottom) v pořadí čtení
+    """
+    lines: Dict[Tuple, List[int]] = {}
+    for i, word in enumerate(layout['text']):
+        if word and word.strip():
+            key = (layout['block_num'][i], layout['par_num'][i], layout['line_num'][i])
+            lines.setdefault(key, []).append(i)
+
+    return [
+        (
+            ' '.join(layout['text'][i].strip() for i in indexes),
+            min(layout['top'][i] for i in indexes),
+            max(layout['top'][i] + layout['height'][i] for i in indexes)
+        )
+        for indexes in lines.values()
+    ]
+
+
+def complete_lines(layout: Dict, band_end: int, margin: int = 0) -> Tuple[int, Dict]:
+    """
+    Jen celé řádky z OCR pásu - řádek končící u dolního okraje pásu může být přeříznutý
+
+    Returns:
+        (y pod posledním celým řádkem, layout jen s jeho slovy); (0, prázdný) bez celého řádku
+    """
+    bottoms: Dict[Tuple, int] = {}
+    for i, word in enumerate(layout['text']):
+        if word and word.strip():
+            key = (layout['block_num'][i], layout['par_num'][i], layout['line_num'][i])
+            bottoms[key] = max(bottoms.get(key, 0), layout['top'][i] + layout['height'][i])
+
+    kept = {key for key, bottom in bottoms.items() if bottom <= band_end - margin}
+    indexes = [
+        i for i, word in enumerate(layout['text'])
+        if word and word.strip()
+        and (layout['block_num'][i], layout['par_num'][i], layout['line_num'][i]) in kept
+    ]
+    split = max((bottoms[key] for key in kept), default=0)
+    return split, {name: [values[i] for i in indexes] for name, values in layout.items()}
+
+
+def merge_layouts(first: Dict, second: Dict) -> Dict:
+    """Spojí výstupy image_to_data dvou pásů pod sebou; bloky druhého se přečíslují"""
+    offset = max(first['block_num'], default=0)
+    merged = {name: list(values) + list(second.get(name, [])) for name, values in first.items()}
+    merged['block_num'] = list(first['block_num']) + [block + offset for block in second['block_num']]
+    return merged
+
+
+def locate_fields(layout: Dict, data: Dict) -> Dict[str, Tuple[int, int]]:
+    """
+    Najde řádky, ze kterých obecná extrakce vzala IČO, celkovou částku,
+    datum a rekapitulaci DPH
+
+    Returns:
+        {pole: (top, bottom)} v pixelech; DPH je pás přes všechny řádky sazeb
+    """
+    found: Dict[str, Tuple[int, int]] = {}
+    vat_top, vat_bottom = None, None
+
+    for text, top, bottom in layout_lines(layout):
+        line = tokenize_line(text)
+        keywords = line.keywords()
+        values = [token.value for token in line.tokens]
+
+        if 'ico' not in found and data.get('ico') and any(token.text == data['ico'] for token in line.tokens):
+            found['ico'] = (top, bottom)
+        if 'total' not in found and keywords & (TOTAL_KEYWORDS | {PAYABLE_KEYWORD}) and data.get('total') in values:
+            found['total'] = (top, bottom)
+        if 'date' not in found and data.get('date') and any(
+                token.kind == 'date' and parse_date(token.text) == data['date'] for token in line.tokens):
+            found['date'] = (top, bottom)
+        if keywords & VAT_KEYWORDS and any(token.kind == 'percent' for token in line.tokens):
+            vat_top = top if vat_top is None else min(vat_top, top)
+            vat_bottom = bottom if vat_bottom is None else max(vat_bottom, bottom)
+
+    if vat_top is not None:
+        found['vat'] = (vat_top, vat_bottom)
+    return found
+
+
+def validate_template_fields(data: Dict, vat_rows: List[Dict], template: ReceiptTemplate,
+                             regions: Dict[str, RegionStats]) -> Optional[str]:
+    """
+    Kontrola výsledku šablonové extrakce
+
+    Returns:
+        None pokud je výsledek v pořádku, jinak název pole, které neprošlo
+    """
+    if data.get('ico') != template.ico or not ico_checksum_valid(data.get('ico')):
+        return 'ico'
+    total = data.get('total')
+    if not total:
+        return 'total'
+    if 'date' in regions and not data.get('date'):
+        return 'date'
+
+    if 'vat' in regions:
+        if not vat_rows:
+            return 'vat'
+        for row in vat_rows:
+            if 'base' in row and abs(row['base'] * row['rate'] / 100 - row['vat']) > VAT_ROUNDING_TOLERANCE:
+                return 'vat'
+        if all('base' in row for row in vat_rows):
+            gross = sum(row['base'] + row['vat'] for row in vat_rows)
+            if abs(gross - total) > TOTAL_TOLERANCE:
+                return 'vat'
+        else:
+            # Jen částky daně - hrubý obrat podle sazeb nesmí přesáhnout celkovou částku
+            gross = sum(row['vat'] * (100 + row['rate']) / row['rate'] for row in vat_rows if row['rate'])
+            if gross > total + TOTAL_TOLERANCE:
+                return 'vat'
+
+    return None
+
+
+class ReceiptTemplateStore:
+    """
+    Šablony rozložení podle IČO prodejce
+
+    S cestou k souboru se šablony načtou při startu a ukládají po každém
+    učení, bez ní žijí jen v paměti procesu.
+    """
+
+    def __init__(self, path: Optional[Path] = None, settings: TemplateSettings = DEFAULT_TEMPLATE_SETTINGS):
+        self.path = Path(path) if path else None
+        self.settings = settings
+        self._templates: Dict[str, ReceiptTemplate] = {}
+        self._lock = threading.Lock()
+        if self.path and self.path.exists():
+            self.load()
+
+    def load(self) -> None:
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+            self._templates = {ico: ReceiptTemplate.from_dict(item) for ico, item in data.items()}
+            logger.info(f"Načteno {len(self._templates)} šablon účtenek z {self.path}")
+        except Exception as e:
+            logger.warning(f"Nepodařilo se načíst šablony účtenek: {str(e)}")
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        with self._lock:
+            data = {ico: template.to_dict() for ico, template in self._templates.items()}
+        tmp_path = self.path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.path)
+
+    def has_templates(self) -> bool:
+        return any(template.usable(self.settings) for template in self._templates.values())
+
+    def get(self, ico: Optional[str]) -> Optional[ReceiptTemplate]:
+        """Použitelná šablona pro IČO, jinak None"""
+        template = self._templates.get(ico) if ico else None
+        if template is None or not template.usable(self.settings):
+            return None
+        return template
+
+    def learn(self, ico: str, vendor: Optional[str], layout: Dict, image_height: int,
+              unit: float, data: Dict) -> bool:
+        """
+        Zapíše polohu polí ze spolehlivě zpracované účtenky
+
+        Args:
+            layout: výstup pytesseract.image_to_data pro předzpracovaný obrázek
+            image_height: výška předzpracovaného obrázku v pixelech
+            unit: výška textu v pixelech (jednotka polohy)
+            data: výsledek obecné extrakce, ze kterého se hledají řádky
+
+        Returns:
+            True pokud se podařilo najít aspoň řádek celkové částky
+        """
+        fields = locate_fields(layout, data)
+        if 'total' not in fields:
+            return False
+
+        with self._lock:
+            template = self._templates.setdefault(ico, ReceiptTemplate(ico=ico))
+            template.vendor = vendor or template.vendor
+            for name, (top, bottom) in fields.items():
+                position = (top / unit, (image_height - bottom) / unit, (bottom - top) / unit)
+                region = template.regions.get(name)
+                if region is None:
+                    from_top, from_bottom, height = position
+                    template.regions[name] = RegionStats(from_top, from_top, from_bottom, from_bottom, height)
+                else:
+                    region.observe(*position)
+            template.samples += 1
+            template.consecutive_failures = 0
+
+        self.save()
+        return True
+
+    def record_hit(self, ico: str) -> None:
+        with self._lock:
+            template = self._templates.get(ico)
+            if template:
+                template.hits += 1
+                template.consecutive_failures = 0
+
+    def record_failure(self, ico: str, reason: str) -> None:
+        with self._lock:
+            template = self._templates.get(ico)
+            if template:
+                template.failures += 1
+                template.consecutive_failures += 1
+                logger.info(f"Šablona {ico} neprošla kontrolou ({reason}), "
+                            f"{template.consecutive_failures}. neúspěch v řadě")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'templates': len(self._templates),
+                'usable': sum(1 for template in self._templates.values() if template.usable(self.settings)),
+                'hits': sum(template.hits for template in self._templates.values()),
+                'failures': sum(template.failures for template in self._templates.values()),
+            }
@@ -0,0 +1,368 @@
+"""
+Jednoprůchodový tokenizér OCR textu účtenek
+
+Místo desítek samostatných re.search/re.findall přes celý text projde každý
+řádek jeden předkompilovaný regex a vydá typované tokeny (částka, datum, čas,
+procento, DIČ, klíčové slovo, slovo) s pozicí v řádku. Pole účtenky se pak
+vybírají podle rozložení - např. celková částka je částka na řádku
+K ÚHRADĚ/CELKEM, ne prostě největší číslo na účtence.
+"""
+import re
+import unicodedata
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+# Větve jsou hlídané prvním znakem (lookahead), aby se u běžných slov
+# nezkoušely všechny alternativy; case-insensitive jsou jen klíčová slova.
+TOKEN_PATTERN = re.compile(r"""
+      (?=\d)(?:
+          (?P<date>(?:\d{1,2}[.\-/]\d{1,2}[.\-/](?:\d{4}|\d{2})|\d{4}[.\-/]\d{1,2}[.\-/]\d{1,2})(?![\d.,]\d))
+        | (?P<time>\d{1,2}:\d{2}(?::\d{2})?(?!\d))
+        | (?P<percent>\d{1,2}\s?%)
+        | (?P<amount>(?:\d{1,3}(?:[ \u00a0]\d{3})+[.,]\d{2}|\d+(?:[.,]\d{1,2})?)(?!\d))
+          (?P<currency>\s*(?:[Kk][čc]|CZK|,-))?
+      )
+    | (?P<dic>CZ\d{8,10}(?!\d))
+    | (?=[KkCcTtSsDdIiVvRrBbPpÚúČč№])
+      (?P<keyword>(?i:K\s+ÚHRADĚ|K\s+UHRADE|CELKEM|TOTAL|SUMA|DIČ|DIC|IČO|IČ|ICO|IC|DPH|VAT|SAZBA
+                     |TAX\s*ID|ČÍSLO|CISLO|Č\.|DOKLAD|ÚČTENKA|UCTENKA|RECEIPT|BL|PD|№)(?=[\s:#.\d]|$))
+    | (?P<times>[x×*](?=\s*\d))
+    | (?P<sep>[:;#=|]+)
+    | (?P<word>[^\s:;#=|]+)
+""", re.VERBOSE)
+
+TOTAL_KEYWORDS = {'CELKEM', 'TOTAL'}
+PAYABLE_KEYWORD = 'K UHRADE'
+ICO_KEYWORDS = {'ICO', 'IC'}
+DIC_KEYWORDS = {'DIC', 'TAX ID'}
+VAT_KEYWORDS = {'DPH', 'VAT', 'SAZBA'}
+DOCUMENT_KEYWORDS = {'CISLO', 'C.', 'DOKLAD', 'UCTENKA', 'RECEIPT', 'BL', 'PD', '№'}
+# Řádky s těmito slovy nejsou položky (součty, DPH, platba)
+NON_ITEM_PATTERN = re.compile(
+    r'\b(?:CELKEM|TOTAL|DPH|VAT|SUMA|[UÚ]HRAD[EĚ]|MEZISOU[CČ]ET|P[RŘ]IJATO|VR[AÁ]CENO|HOTOV[EĚ]|PLATBA)\b',
+    re.IGNORECASE
+)
+
+DOCUMENT_NUMBER_PATTERN = re.compile(r'^[A-Z0-9\-/]{3,}$', re.IGNORECASE)
+# Cena zarovnaná do sloupce - před ní aspoň tři mezery
+COLUMN_GAP_PATTERN = re.compile(r'\S\s{3,}$')
+
+
+def strip_diacritics(text: str) -> str:
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(c for c in decomposed if not unicodedata.combining(c))
+
+
+@lru_cache(maxsize=256)
+def normalize_keyword(text: str) -> str:
+    """'K  úhradě' -> 'K UHRADE' (klíčových slov je pár, proto cache)"""
+    return ' '.join(strip_diacritics(text).upper().split())
+
+
+@dataclass(slots=True)
+class Token:
+    """Typovaný token s pozicí v řádku"""
+    kind: str
+    text: str
+    line: int
+    start: int
+    end: int
+    value: object = None
+    currency: bool = False
+
+
+@dataclass
+class ReceiptLine:
+    number: int
+    text: str
+    tokens: List[Token] = field(default_factory=list)
+
+    def keywords(self) -> set:
+        return {token.value for token in self.tokens if token.kind == 'keyword'}
+
+
+
+def tokenize_line(text: str, number: int = 0) -> ReceiptLine:
+    """Rozloží jeden řádek na tokeny jedním průchodem regexu"""
+    line = ReceiptLine(number=number, text=text)
+
+    for match in TOKEN_PATTERN.finditer(text):
+        kind = match.lastgroup
+        if kind == 'sep':
+            continue
+
+        if kind == 'currency':
+            token_text = match.group('amount')
+            token = Token('amount', token_text, number, match.start(), match.end(),
+                          float(token_text.replace(' ', '').replace('\u00a0', '').replace(',', '.')), True)
+        else:
+            token_text = match.group()
+            if kind == 'amount':
+                value = float(token_text.replace(' ', '').replace('\u00a0', '').replace(',', '.'))
+            elif kind == 'keyword':
+                value = normalize_keyword(token_text)
+            elif kind == 'percent':
+                value = int(token_text.rstrip('% '))
+            elif kind == 'dic':
+                value = token_text.upper()
+            else:
+                value = token_text
+            token = Token(kind, token_text, number, match.start(), match.end(), value)
+
+        line.tokens.append(token)
+
+    return line
+
+
+def tokenize(text: str) -> List[ReceiptLine]:
+    return [tokenize_line(line, number) for number, line in enumerate(text.split('\n'))]
+
+
+def parse_date(text: str) -> Optional[str]:
+    """Převede DD.MM.YYYY, DD.MM.YY nebo YYYY-MM-DD na ISO formát, nevalidní datum vrací None"""
+    parts = re.split(r'[.\-/]', text)
+    try:
+        if len(parts[0]) == 4:
+            year, month, day = (int(part) for part in parts)
+        else:
+            day, month, year = (int(part) for part in parts)
+            if len(parts[2]) == 2:
+                # Do 5 let dopředu = 20xx, jinak 19xx
+                year += 2000 if year <= (datetime.now().year % 100) + 5 else 1900
+        return date(year, month, day).strftime('%Y-%m-%d')
+    except ValueError:
+        return None
+
+
+def _is_ico_number(token: Token) -> bool:
+    return token.kind == 'amount' and not token.currency and len(token.text) == 8 and token.text.isdigit()
+
+
+def _line_amount_after(line: ReceiptLine, keyword_index: int) -> Optional[Token]:
+    """Poslední částka za klíčovým slovem na stejném řádku"""
+    amounts = [token for token in line.tokens[keyword_index + 1:] if token.kind == 'amount']
+    return amounts[-1] if amounts else None
+
+
+def _find_total(lines: List[ReceiptLine]) -> Optional[float]:
+    """
+    Celková částka podle rozložení - K ÚHRADĚ má přednost, jinak největší
+    z řádků CELKEM/TOTAL (řádky 'celkem bez DPH' a 'DPH celkem' jsou menší).
+    Když je částka až na dalším řádku (sloupcové OCR), vezme se odtamtud.
+    """
+    payable = []
+    totals = []
+
+    for i, line in enumerate(lines):
+        keywords = line.keywords()
+        if PAYABLE_KEYWORD in keywords:
+            target, wanted = payable, {PAYABLE_KEYWORD}
+        elif keywords & TOTAL_KEYWORDS:
+            target, wanted = totals, TOTAL_KEYWORDS
+        else:
+            continue
+
+        index = next(k for k, token in enumerate(line.tokens) if token.kind == 'keyword' and token.value in wanted)
+        amount = _line_amount_after(line, index)
+        if amount is None and i + 1 < len(lines) and not lines[i + 1].keywords():
+            following = [token for token in lines[i + 1].tokens if token.kind == 'amount']
+            amount = following[0] if following else None
+        if amount is not None:
+            target.append(amount.value)
+
+    if payable:
+        return payable[0]
+    if totals:
+        return max(totals)
+    return None
+
+
+def extract_items(lines: List[ReceiptLine]) -> List[Dict]:
+    """
+    Položky účtenky z řádků: 'název cena Kč', 'název množství x cena = celkem'
+    a 'název   cena' (cena oddělená aspoň třemi mezerami)
+    """
+    items = []
+
+    for line in lines:
+        text = line.text.strip()
+        tokens = line.tokens
+        if len(text) < 3 or len(tokens) < 2:
+            continue
+
+        last = tokens[-1]
+        if last.kind != 'amount':
+            continue
+
+        description = None
+        item = None
+
+        if last.currency:
+            description = line.text[:tokens[-1].start]
+            item = {'price': last.value, 'quantity': 1}
+        else:
+            times_index = next((i for i, t in enumerate(tokens) if t.kind == 'times'), None)
+            if (times_index is not None and 0 < times_index < len(tokens) - 2
+                    and tokens[times_index - 1].kind == 'amount' and tokens[times_index + 1].kind == 'amount'):
+                quantity = tokens[times_index - 1]
+                description = line.text[:quantity.start]
+                item = {'quantity': quantity.value, 'unit_price': tokens[times_index + 1].value, 'price': last.value}
+                if not all(value > 0 for value in item.values()):
+                    continue
+            elif COLUMN_GAP_PATTERN.search(line.text, 0, last.start):
+                description = line.text[:last.start]
+                if len(description.strip()) < 5:
+                    continue
+                item = {'price': last.value, 'quantity': 1}
+
+        if item is None:
+            continue
+
+        description = description.strip()
+        if (len(description) < 2 or description.isdigit() or
+                NON_ITEM_PATTERN.search(description)):
+            continue
+        if item['price'] <= 0:
+            continue
+
+        items.append({'description': description, **item})
+
+    # Seřaď podle ceny (nejvyšší první) a omez na 10
+    items.sort(key=lambda x: x.get('price', 0), reverse=True)
+    return items[:10]
+
+
+def extract_vat_breakdown(lines: List[ReceiptLine]) -> List[Dict]:
+    """
+    Rekapitulace DPH - řádky s klíčovým slovem DPH/VAT a sazbou v procentech
+
+    Částky za sazbou: jedna = daň, dvě = základ a daň, tři = základ, daň, celkem.
+    """
+    rows = []
+    for line in lines:
+        if not line.keywords() & VAT_KEYWORDS:
+            continue
+        percent_index = next((i for i, token in enumerate(line.tokens) if token.kind == 'percent'), None)
+        if percent_index is None:
+            continue
+        amounts = [token.value for token in line.tokens[percent_index + 1:] if token.kind == 'amount']
+        if not amounts:
+            continue
+        row = {'rate': line.tokens[percent_index].value}
+        if len(amounts) == 1:
+            row['vat'] = amounts[0]
+        else:
+            row['base'], row['vat'] = amounts[0], amounts[1]
+            if len(amounts) > 2:
+                row['total'] = amounts[2]
+        rows.append(row)
+    return rows
+
+
+def extract_receipt_fields(text: str) -> Dict:
+    """
+    Extrahuje pole účtenky z OCR textu
+
+    Returns:
+        dict se stejnými klíči jako dřívější regexová extrakce
+        (ico, dic, total, amounts, date, time, vat_rates, vat_rate,
+        document_number, items, confidence)
+    """
+    lines = tokenize(text)
+    data = {'confidence': 0.6}  # Začínáme s nižší confidence pro OCR
+
+    ico = None
+    dic = None
+    first_date = {4: None, 2: None}
+    first_time = None
+    document_number = None
+    currency_amounts = []
+    vat_rates = []
+
+    for line in lines:
+        tokens = line.tokens
+        line_keywords = line.keywords()
+
+        for i, token in enumerate(tokens):
+            kind = token.kind
+            following = tokens[i + 1] if i + 1 < len(tokens) else None
+
+            if kind == 'keyword':
+                if ico is None and token.value in ICO_KEYWORDS and following is not None and _is_ico_number(following):
+                    ico = following.text
+                elif dic is None and token.value in DIC_KEYWORDS and following is not None and following.kind == 'dic':
+                    dic = following.value
+                elif document_number is None and token.value in DOCUMENT_KEYWORDS:
+                    document_number = _document_number_after(line, tokens[i + 1:])
+                if ico is None and token.value in DIC_KEYWORDS and i > 0 and _is_ico_number(tokens[i - 1]):
+                    # IČO bez popisku těsně před DIČ
+                    ico = tokens[i - 1].text
+            elif kind == 'amount':
+                if token.currency and token.value > 1:
+                    currency_amounts.append(token.value)
+            elif kind == 'date':
+                year_digits = 4 if re.search(r'\d{4}', token.text) else 2
+                if first_date[year_digits] is None:
+                    first_date[year_digits] = parse_date(token.text)
+            elif kind == 'time':
+                if first_time is None:
+                    first_time = token.text
+            elif kind == 'percent':
+                if line_keywords & VAT_KEYWORDS:
+                    vat_rates.append(token.value)
+
+    if dic is None:
+        # DIČ má jednoznačný formát - vezmi ho i bez (špatně přečteného) popisku
+        dic = next((token.value for line in lines for token in line.tokens if token.kind == 'dic'), None)
+
+    if ico:
+        data['ico'] = ico
+        data['confidence'] += 0.1
+
+    if dic:
+        data['dic'] = dic
+        data['confidence'] += 0.1
+
+    total = _find_total(lines)
+    amounts = currency_amounts + ([total] if total is not None else [])
+    if amounts:
+        data['total'] = total if total is not None else max(amounts)
+        data['amounts'] = sorted(set(amounts), reverse=True)
+        data['confidence'] += 0.2
+
+    receipt_date = first_date[4] or first_date[2]
+    if receipt_date:
+        data['date'] = receipt_date
+        data['confidence'] += 0.1
+
+    if first_time:
+        data['time'] = first_time
+
+    if vat_rates:
+        data['vat_rates'] = list(set(vat_rates))
+        data['vat_rate'] = 21 if 21 in vat_rates else max(vat_rates)
+
+    if document_number:
+        data['document_number'] = document_number
+        data['confidence'] += 0.1
+
+    items = extract_items(lines)
+    if items:
+        data['items'] = items
+        data['confidence'] += 0.1
+
+    return data
+
+
+def _document_number_after(line: ReceiptLine, tokens: List[Token]) -> Optional[str]:
+    """Číslo dokladu = první celé slovo za klíčovým slovem, které obsahuje číslici"""
+    for token in tokens:
+        if token.kind == 'keyword':
+            continue
+        chunk = line.text[token.start:].split(None, 1)[0].strip('.,:;')
+        if DOCUMENT_NUMBER_PATTERN.match(chunk) and any(c.isdigit() for c in chunk):
+            return chunk
+        return None
+    return None
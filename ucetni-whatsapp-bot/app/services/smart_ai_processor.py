@@ -7,6 +7,7 @@ from datetime import datetime
 import re
 
 from app.database.models import User, Transaction
+from app.services.counterparty_enrichment import counterparty_enricher
 from app.services.tax_evidence_validator import TaxEvidenceValidator
 
 logger = logging.getLogger(__name__)
@@ -300,21 +301,10 @@ Podívejte se na účtenku - IČO je obvykle uvedeno dole.
         
         # Pokus o extrakci dodavatele z zprávy
         message_lower = message.lower()
-        known_vendors = self.validator._find_known_vendor(message_lower)
-        if known_vendors:
-            data['counterparty_name'] = known_vendors['name']
-            data['counterparty_ico'] = known_vendors['ico']
-        else:
-            # Heuristic - hledej známé názvy
-            vendor_hints = ['shell', 'benzina', 'omv', 'mol', 'alza', 'kaufland', 'lidl', 'albert', 'billa', 'tesco']
-            for hint in vendor_hints:
-                if hint in message_lower:
-                    # Najdi odpovídající vendor
-                    vendor_info = self.validator.KNOWN_VENDORS.get(hint)
-                    if vendor_info:
-                        data['counterparty_name'] = vendor_info['name']
-                        data['counterparty_ico'] = vendor_info['ico']
-                        break
+        known_vendor = self.validator._find_known_vendor(message_lower)
+        if known_vendor:
+            data['counterparty_name'] = known_vendor['name']
+            data['counterparty_ico'] = known_vendor['ico']
         
         # Extrakce IČO pokud je v zpráve
         ico_match = re.search(r'ičo[:\s]*(\d{8})|ico[:\s]*(\d{8})|(\d{8})', message_lower)
@@ -390,6 +380,10 @@ Podívejte se na účtenku - IČO je obvykle uvedeno dole.
             await db.refresh(transaction)
             
             logger.info(f"Transaction saved with compliance data: {transaction.id} - score {validation_result['completeness']}% - risk {validation_result['risk_level']}")
+            
+            # Protistranu z ARES doplní úloha na pozadí, odpověď na ni nečeká
+            if transaction.counterparty_ico:
+                counterparty_enricher.schedule(transaction.id)
             return transaction
     
     def _format_excellent_response(self, transaction, validation: Dict) -> str:
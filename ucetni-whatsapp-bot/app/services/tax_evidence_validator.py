@@ -6,6 +6,7 @@ import logging
 from typing import Dict, List, Optional
 from datetime import datetime, timedelta
 from app.database.models import User, Transaction
+from app.services.vendor_registry import vendor_registry
 
 logger = logging.getLogger(__name__)
 
@@ -29,20 +30,6 @@ class TaxEvidenceValidator:
         }
     }
     
-    # Známí prodejci s IČO pro rychlé doplnění
-    KNOWN_VENDORS = {
-        'shell': {'ico': '60193328', 'name': 'Shell Czech Republic a.s.'},
-        'benzina': {'ico': '60193531', 'name': 'BENZINA, s.r.o.'},
-        'omv': {'ico': '25938037', 'name': 'OMV Česká republika, s.r.o.'},
-        'mol': {'ico': '49240480', 'name': 'MOL Česká republika, s.r.o.'},
-        'kaufland': {'ico': '25110161', 'name': 'Kaufland Česká republika v.o.s.'},
-        'lidl': {'ico': '26178541', 'name': 'Lidl Česká republika v.o.s.'},
-        'albert': {'ico': '44012373', 'name': 'Albert Česká republika, s.r.o.'},
-        'billa': {'ico': '00685976', 'name': 'BILLA, s.r.o.'},
-        'tesco': {'ico': '00677575', 'name': 'Tesco Stores ČR a.s.'},
-        'penny': {'ico': '47115432', 'name': 'PENNY MARKET s.r.o.'}
-    }
-    
     def __init__(self):
         self.min_completeness_threshold = 60  # Minimální % pro přijetí
         self.recommended_threshold = 80      # Doporučená úroveň
@@ -204,42 +191,35 @@ class TaxEvidenceValidator:
         
         return suggestions
     
+    # Klíčová slova popisu -> skupina prodejců v registru pro rychlé volby
+    QUICK_OPTION_GROUPS = {
+        'fuel': ['benzín', 'nafta', 'palivo', 'tank'],
+        'groceries': ['potraviny', 'nákup', 'jídlo', 'supermarket'],
+    }
+    
     def _find_known_vendor(self, vendor_name: str) -> Optional[Dict]:
-        """Najde známého prodejce v databázi"""
+        """Najde známého prodejce v registru (toleruje překlepy a skloňování)"""
         if not vendor_name:
             return None
         
-        vendor_name = vendor_name.lower().strip()
-        
-        for key, vendor_info in self.KNOWN_VENDORS.items():
-            if key in vendor_name or vendor_name in key:
-                return vendor_info
+        vendor = vendor_registry.find_by_name(vendor_name)
+        if not vendor or not vendor.ico:
+            return None
         
-        return None
+        return {'ico': vendor.ico, 'name': vendor.name, 'dic': vendor.dic}
     
     def get_quick_vendor_options(self, description: str) -> List[Dict]:
         """Vrátí rychlé možnosti prodejců podle popisu"""
         description = description.lower()
-        options = []
-        
-        if any(word in description for word in ['benzín', 'nafta', 'palivo', 'tank']):
-            options.extend([
-                {'name': 'Shell', 'ico': '60193328'},
-                {'name': 'Benzina', 'ico': '60193531'},
-                {'name': 'OMV', 'ico': '25938037'},
-                {'name': 'MOL', 'ico': '49240480'}
-            ])
-        
-        elif any(word in description for word in ['potraviny', 'nákup', 'jídlo', 'supermarket']):
-            options.extend([
-                {'name': 'Kaufland', 'ico': '25110161'},
-                {'name': 'Lidl', 'ico': '26178541'},
-                {'name': 'Albert', 'ico': '44012373'},
-                {'name': 'Billa', 'ico': '00685976'},
-                {'name': 'Tesco', 'ico': '00677575'}
-            ])
-        
-        return options[:4]  # Max 4 možnosti
+        
+        for group, keywords in self.QUICK_OPTION_GROUPS.items():
+            if any(word in description for word in keywords):
+                return [
+                    {'name': vendor.short_name, 'ico': vendor.ico}
+                    for vendor in vendor_registry.by_group(group)
+                ][:4]  # Max 4 možnosti
+        
+        return []
     
     def format_validation_message(self, validation_result: Dict, data: Dict) -> str:
         """Formátuje zprávu o validaci pro uživatele"""
@@ -0,0 +1,407 @@
+"""
+Hromadný export DPH k termínu podání
+
+Jednou měsíčně (cron, scripts/export_vat_batch.py) vygeneruje DP3 a KH1
+všem měsíčním plátcům DPH za předchozí měsíc. Hlavní proces čte z databáze
+jen průběžné součty (VatRecord) a doklady nad limitem KH; zápis XML
+a kontrola podle XSD běží v poolu procesů - každý proces si schémata
+zkompiluje jednou při startu.
+
+Každý hotový uživatel se zapíše do ExportHistory a do checkpointu
+(JSON vedle exportů). Přerušený běh pokračuje od posledního hotového
+uživatele, neúspěšní se zkusí znovu. Zápis do ExportHistory je
+idempotentní (jeden řádek na typ a období).
+"""
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database.models import ExportHistory, User, UserSettings
+from app.services.epo_schema import epo_schema_validator
+from app.services.vat_period import load_export_checks, load_period_totals, period_bounds, stream_kh_documents
+from utils.vat_calculator import VatPeriodData
+from utils.vat_xml_generator import KhDocument, VatXmlGenerator
+
+logger = logging.getLogger(__name__)
+
+EXPORT_RETENTION = timedelta(days=90)
+EXPORT_TYPES = {'dp3': 'xml_dp3', 'kh1': 'xml_kh1'}
+SCHEMA_DOCUMENTS = {'dp3': 'DP3', 'kh1': 'KH1'}
+
+Notifier = Callable[[User, str], Awaitable[bool]]
+SessionFactory = Callable[[], Any]
+
+
+def export_dir() -> str:
+    """Kořenový adresář exportů DPH (VAT_EXPORT_DIR)"""
+    return os.getenv('VAT_EXPORT_DIR') or os.path.join(tempfile.gettempdir(), 'ucetnibot_dph')
+
+
+def export_file_paths(user_id: int, month: int, year: int) -> Dict[str, str]:
+    """Cesty k DP3 a KH1 uživatele za období"""
+    user_dir = os.path.join(export_dir(), str(user_id))
+    return {
+        'dp3': os.path.join(user_dir, f"dph_priznani_{month}_{year}.xml"),
+        'kh1': os.path.join(user_dir, f"kontrolni_hlaseni_{month}_{year}.xml")
+    }
+
+
+def previous_period(today: Optional[datetime] = None) -> tuple:
+    """Období, za které se k termínu podává - předchozí měsíc jako (month, year)"""
+    today = today or datetime.now()
+    return (12, today.year - 1) if today.month == 1 else (today.month - 1, today.year)
+
+
+def user_export_settings(user: User, settings: Optional[UserSettings]) -> Dict[str, Any]:
+    """Údaje plátce pro VatXmlGenerator - přednost má UserSettings, jinak profil uživatele"""
+    values = {
+        'dic': user.dic,
+        'street': user.street,
+        'house_number': user.house_number,
+        'city': user.city,
+        'postal_code': user.postal_code,
+        'email': user.email,
+    }
+    if user.full_name:
+        first_name, _, last_name = user.full_name.partition(' ')
+        values.update(first_name=first_name, last_name=last_name)
+    if settings is not None:
+        for key in ('first_name', 'last_name', 'dic', 'street', 'house_number', 'city', 'postal_code',
+                    'email', 'phone', 'tax_office_code', 'tax_office_workplace', 'okec_code'):
+            value = getattr(settings, key)
+            if value:
+                values[key] = value
+    values['vat_payer'] = True
+    # VatXmlGenerator doplní výchozí hodnoty jen za chybějící klíče
+    return {key: value for key, value in values.items() if value is not None}
+
+
+@dataclass
+class ExportJob:
+    """Vstup pro proces poolu - jen data, žádné spojení do databáze"""
+    user_id: int
+    settings: Dict[str, Any]
+    period_data: VatPeriodData
+    documents: List[KhDocument]
+    file_paths: Dict[str, str]
+
+
+@dataclass
+class ExportResult:
+    """Výsledek exportu jednoho uživatele z procesu poolu"""
+    user_id: int
+    ok: bool
+    file_paths: Dict[str, str] = field(default_factory=dict)
+    file_sizes: Dict[str, int] = field(default_factory=dict)
+    errors: List[str] = field(default_factory=list)
+    summary: str = ''
+    kh_rows: int = 0
+    elapsed: float = 0.0
+
+
+def _init_worker() -> None:
+    # Schémata EPO se zkompilují jednou na proces, ne pro každý soubor
+    epo_schema_validator.preload()
+
+
+def run_export_job(job: ExportJob) -> ExportResult:
+    """Zapíše a zkontroluje DP3 a KH1 jednoho uživatele (běží v procesu poolu)"""
+    started = time.perf_counter()
+    generator = VatXmlGenerator(job.settings)
+    try:
+        os.makedirs(os.path.dirname(job.file_paths['dp3']), exist_ok=True)
+        with open(job.file_paths['dp3'], 'w', encoding='utf-8') as out:
+            generator.write_dph_priznani(out, job.period_data)
+        with open(job.file_paths['kh1'], 'w', encoding='utf-8') as out:
+            writer = generator.kontrolni_hlaseni_writer(out, job.period_data)
+            writer.begin()
+            for document in job.documents:
+                writer.add(document)
+            writer.finish()
+
+        errors = []
+        for key, document in SCHEMA_DOCUMENTS.items():
+            validation = epo_schema_validator.validate_file(job.file_paths[key], document)
+            if not validation.valid:
+                errors.extend(f"{document}: {error}" for error in validation.errors[:3])
+        if errors:
+            return ExportResult(job.user_id, ok=False, errors=errors,
+                                elapsed=time.perf_counter() - started)
+
+        return ExportResult(
+            job.user_id, ok=True, file_paths=job.file_paths,
+            file_sizes={key: os.path.getsize(path) for key, path in job.file_paths.items()},
+            summary=generator.generate_export_summary(job.period_data, job.file_paths),
+            kh_rows=writer.rows, elapsed=time.perf_counter() - started
+        )
+    except Exception as e:
+        # Chyba jednoho uživatele nesmí shodit celý běh - vrátí se jako jeho neúspěch
+        return ExportResult(job.user_id, ok=False, errors=[f"{type(e).__name__}: {str(e)}"],
+                            elapsed=time.perf_counter() - started)
+
+
+class ExportCheckpoint:
+    """Stav běhu za období v JSON souboru - hotoví a neúspěšní uživatelé"""
+
+    def __init__(self, path: Path, month: int, year: int):
+        self.path = path
+        self.month = month
+        self.year = year
+        self.completed: Set[int] = set()
+        self.failed: Dict[int, str] = {}
+
+    @classmethod
+    def load(cls, path: Path, month: int, year: int) -> 'ExportCheckpoint':
+        checkpoint = cls(path, month, year)
+        try:
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return checkpoint
+        except (OSError, ValueError) as e:
+            logger.warning(f"Checkpoint {path} nelze načíst, začínám znovu: {str(e)}")
+            return checkpoint
+        if (data.get('month'), data.get('year')) == (month, year):
+            checkpoint.completed = set(data.get('completed', []))
+            checkpoint.failed = {int(user_id): reason for user_id, reason in data.get('failed', {}).items()}
+        return checkpoint
+
+    def mark(self, user_id: int, error: Optional[str] = None) -> None:
+        if error is None:
+            self.completed.add(user_id)
+            self.failed.pop(user_id, None)
+        else:
+            self.failed[user_id] = error
+        self.save()
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'month': self.month,
+                'year': self.year,
+                'completed': sorted(self.completed),
+                'failed': {str(user_id): reason for user_id, reason in sorted(self.failed.items())},
+                'updated_at': datetime.now().isoformat(),
+            }, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.path)
+
+
+@dataclass
+class BatchExportReport:
+    """Souhrn běhu a propustnost"""
+    month: int
+    year: int
+    users: int = 0
+    resumed: int = 0
+    quarterly_skipped: int = 0
+    exported: int = 0
+    failed: int = 0
+    notified: int = 0
+    files: int = 0
+    bytes_written: int = 0
+    kh_rows: int = 0
+    load_seconds: float = 0.0
+    worker_seconds: float = 0.0
+    elapsed: float = 0.0
+
+    @property
+    def users_per_second(self) -> float:
+        return (self.exported + self.failed) / self.elapsed if self.elapsed else 0.0
+
+    def format(self) -> str:
+        return (
+            f"Export DPH {self.month}/{self.year}: {self.exported} hotovo, {self.failed} chyb, "
+            f"{self.resumed} přeskočeno z checkpointu, {self.quarterly_skipped} čtvrtletních plátců "
+            f"z {self.users} plátců\n"
+            f"{self.files} souborů ({self.bytes_written / 1024 / 1024:.1f} MB, {self.kh_rows} řádků KH), "
+            f"{self.notified} upozornění\n"
+            f"{self.elapsed:.1f} s, {self.users_per_second:.1f} uživatelů/s "
+            f"(načtení z DB {self.load_seconds:.1f} s, generování v procesech {self.worker_seconds:.1f} s)"
+        )
+
+
+async def whatsapp_notifier(user: User, message: str) -> bool:
+    """Výchozí upozornění - WhatsApp zpráva přes Twilio"""
+    if not user.whatsapp_number:
+        return False
+    from app.services.whatsapp import send_whatsapp_message
+    return await send_whatsapp_message(user.whatsapp_number, message)
+
+
+class VatBatchExporter:
+    """Hromadný export DP3/KH1 všem plátcům DPH za jedno období"""
+
+    def __init__(self, session_factory: SessionFactory, workers: Optional[int] = None,
+                 notifier: Optional[Notifier] = whatsapp_notifier, checkpoint_path: Optional[Path] = None):
+        self.session_factory = session_factory
+        self.workers = workers or os.cpu_count() or 2
+        self.notifier = notifier
+        self.checkpoint_path = checkpoint_path
+
+    async def run(self, month: int, year: int, resume: bool = True) -> BatchExportReport:
+        started = time.perf_counter()
+        report = BatchExportReport(month, year)
+        checkpoint_path = self.checkpoint_path or Path(export_dir()) / f"batch_{year}_{month:02d}.json"
+        checkpoint = (ExportCheckpoint.load(checkpoint_path, month, year) if resume
+                      else ExportCheckpoint(checkpoint_path, month, year))
+
+        async with self.session_factory() as session:
+            payers = await self._load_payers(session)
+        report.users = len(payers)
+        pending = []
+        for user, settings in payers:
+            if settings is not None and settings.vat_monthly is False:
+                report.quarterly_skipped += 1
+            elif user.id in checkpoint.completed:
+                report.resumed += 1
+            else:
+                pending.append((user, settings))
+        logger.info(f"Export DPH {month}/{year}: {len(pending)} plátců ke zpracování, {self.workers} procesů")
+
+        loop = asyncio.get_running_loop()
+        users = {user.id: user for user, _ in pending}
+        # future -> user_id, aby šla výjimka z procesu přiřadit uživateli
+        in_flight: Dict[asyncio.Future, int] = {}
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker) as pool:
+            for user, settings in pending:
+                load_started = time.perf_counter()
+                try:
+                    job = await self._prepare(user, settings, month, year, report, checkpoint)
+                    if job is not None:
+                        in_flight[loop.run_in_executor(pool, run_export_job, job)] = user.id
+                except Exception as e:
+                    logger.exception(f"Příprava exportu DPH pro uživatele {user.id} selhala")
+                    await self._fail(user, [f"{type(e).__name__}: {str(e)}"], report, checkpoint, notify=False)
+                report.load_seconds += time.perf_counter() - load_started
+                # Nenačítáme dopředu víc, než pool stihne - doklady drží paměť
+                if len(in_flight) >= self.workers * 2:
+                    await self._collect(in_flight, users, month, year, report, checkpoint)
+            while in_flight:
+                await self._collect(in_flight, users, month, year, report, checkpoint)
+
+        report.elapsed = time.perf_counter() - started
+        logger.info(report.format())
+        return report
+
+    async def _load_payers(self, session: AsyncSession) -> list:
+        result = await session.execute(
+            select(User, UserSettings)
+            .outerjoin(UserSettings, UserSettings.user_id == User.id)
+            .where(or_(User.vat_payer.is_(True), UserSettings.vat_payer.is_(True)))
+            .order_by(User.id)
+        )
+        return [(user, settings) for user, settings in result]
+
+    async def _prepare(self, user: User, settings: Optional[UserSettings], month: int, year: int,
+                       report: BatchExportReport, checkpoint: ExportCheckpoint) -> Optional[ExportJob]:
+        """Načte součty a doklady a zkontroluje, že jde export vůbec vytvořit"""
+        export_settings = user_export_settings(user, settings)
+        generator = VatXmlGenerator(export_settings)
+        async with self.session_factory() as session:
+            period_data = await load_period_totals(session, user.id, month, year)
+            checks = await load_export_checks(session, user.id, month, year)
+            validation = generator.validate_period(period_data, **checks)
+            if not validation['valid']:
+                await self._fail(user, validation['issues'], report, checkpoint, notify=True)
+                return None
+            documents = [d async for d in stream_kh_documents(session, user.id, month, year)]
+        return ExportJob(user.id, export_settings, period_data, documents,
+                         export_file_paths(user.id, month, year))
+
+    async def _collect(self, in_flight: Dict[asyncio.Future, int], users: Dict[int, User], month: int, year: int,
+                       report: BatchExportReport, checkpoint: ExportCheckpoint) -> None:
+        """Počká na první dokončené joby a zpracuje je; výjimka se zapíše jako neúspěch uživatele"""
+        done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+        for future in done:
+            user_id = in_flight.pop(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                # Např. BrokenProcessPool nebo chyba při přenosu výsledku z procesu
+                logger.exception(f"Export DPH pro uživatele {user_id} skončil výjimkou")
+                result = ExportResult(user_id, ok=False, errors=[f"{type(e).__name__}: {str(e)}"])
+            try:
+                await self._finish(result, users, month, year, report, checkpoint)
+            except Exception as e:
+                logger.exception(f"Uložení exportu DPH pro uživatele {user_id} selhalo")
+                await self._fail(users[user_id], [f"{type(e).__name__}: {str(e)}"], report, checkpoint,
+                                 notify=False)
+
+    async def _finish(self, result: ExportResult, users: Dict[int, User], month: int, year: int,
+                      report: BatchExportReport, checkpoint: ExportCheckpoint) -> None:
+        user = users[result.user_id]
+        report.worker_seconds += result.elapsed
+        if not result.ok:
+            logger.error(f"Export DPH pro uživatele {user.id} selhal: {result.errors}")
+            await self._fail(user, result.errors, report, checkpoint, notify=False)
+            return
+
+        async with self.session_factory() as session:
+            await save_export_history(session, user.id, month, year, result)
+            await session.commit()
+        report.exported += 1
+        report.files += len(result.file_paths)
+        report.bytes_written += sum(result.file_sizes.values())
+        report.kh_rows += result.kh_rows
+        checkpoint.mark(user.id)
+        if await self._notify(user, result.summary):
+            report.notified += 1
+
+    async def _fail(self, user: User, errors: List[str], report: BatchExportReport,
+                    checkpoint: ExportCheckpoint, notify: bool) -> None:
+        report.failed += 1
+        checkpoint.mark(user.id, "; ".join(errors)[:500])
+        # Chyby v datech opraví uživatel, chyby generování řeší podpora
+        if notify:
+            message = "❌ *Nelze připravit XML pro DPH*\n\n" + "\n".join(errors)
+            if await self._notify(user, message):
+                report.notified += 1
+
+    async def _notify(self, user: User, message: str) -> bool:
+        if self.notifier is None:
+            return False
+        try:
+            return bool(await self.notifier(user, message))
+        except Exception as e:
+            logger.error(f"Upozornění na export DPH pro uživatele {user.id} se nepodařilo odeslat: {str(e)}")
+            return False
+
+
+async def save_export_history(session: AsyncSession, user_id: int, month: int, year: int,
+                              result: ExportResult) -> None:
+    """Zapíše nebo obnoví řádky ExportHistory pro DP3 a KH1 za období"""
+    period_start, period_end = period_bounds(month, year)
+    existing = {
+        row.export_type: row
+        for row in (await session.execute(
+            select(ExportHistory).where(
+                ExportHistory.user_id == user_id,
+                ExportHistory.period_start == period_start,
+                ExportHistory.export_type.in_(EXPORT_TYPES.values())
+            )
+        )).scalars()
+    }
+    for key, export_type in EXPORT_TYPES.items():
+        row = existing.get(export_type)
+        if row is None:
+            row = ExportHistory(user_id=user_id, export_type=export_type, period_start=period_start)
+            session.add(row)
+        row.period_end = period_end - timedelta(seconds=1)
+        row.file_path = result.file_paths[key]
+        row.file_name = os.path.basename(result.file_paths[key])
+        row.file_size = result.file_sizes[key]
+        row.expires_at = datetime.now() + EXPORT_RETENTION
+        row.status = 'ready'
@@ -0,0 +1,283 @@
+"""
+Data DPH za období přímo z databáze
+
+Souhrn za měsíc sčítá jeden SQL dotaz GROUP BY typ a sazba nad
+rozsahem transaction_date [1. den měsíce, 1. den dalšího měsíce) -
+rozsah na holém sloupci použije index ix_transactions_user_date
+(extract('month', ...) by index obešel). Do Pythonu se vrací nejvýš
+šest řádků místo všech transakcí období.
+
+/dph a export čtou průběžné součty z VatRecord (app.database.vat_totals),
+jeden řádek na období. Úplný přepočet slouží k jejich rekonciliaci.
+
+Kontrolní hlášení potřebuje doklady: ty seskupí SQL podle DIČ a čísla
+dokladu a limit 10 000 Kč ověří v HAVING, řádky se pak čtou proudově.
+"""
+import logging
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, TextIO, Tuple
+
+from sqlalchemy import String, case, cast, extract, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database.models import Transaction, VatRecord
+from app.database.vat_totals import PeriodKey
+from utils.money import ZERO, money_sum
+from utils.vat_calculator import VAT_TOTAL_FIELDS, VatPeriodData
+from utils.vat_xml_generator import KH_THRESHOLD, KhDocument, VatXmlGenerator
+
+logger = logging.getLogger(__name__)
+
+VAT_RATES = (21, 12, 0)
+KH_BATCH_SIZE = 1000
+MISSING_DIC_LIMIT = 50
+
+
+def period_bounds(month: int, year: int) -> Tuple[datetime, datetime]:
+    """Začátek období a začátek následujícího (polootevřený interval)"""
+    start = datetime(year, month, 1)
+    end = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+    return start, end
+
+
+def _period_filter(user_id: int, month: int, year: int) -> list:
+    start, end = period_bounds(month, year)
+    return [
+        Transaction.user_id == user_id,
+        Transaction.transaction_date >= start,
+        Transaction.transaction_date < end,
+        Transaction.vat_rate.in_(VAT_RATES),
+    ]
+
+
+async def load_period_vat(session: AsyncSession, user_id: int, month: int, year: int) -> VatPeriodData:
+    """
+    Souhrn DPH za měsíc agregovaný v databázi
+
+    Returns:
+        VatPeriodData ve stejném tvaru jako VatCalculator.calculate_period_vat
+    """
+    result = await session.execute(
+        select(
+            Transaction.type,
+            Transaction.vat_rate,
+            money_sum(Transaction.vat_base).label('base'),
+            money_sum(Transaction.vat_amount).label('vat')
+        )
+        .where(*_period_filter(user_id, month, year))
+        .group_by(Transaction.type, Transaction.vat_rate)
+    )
+
+    period_data = VatPeriodData(month=month, year=year)
+    for row in result:
+        period_data.add(row.type, row.vat_rate, row.base, row.vat)
+    return period_data
+
+
+def _documents_stmt(user_id: int, month: int, year: int):
+    """Doklady za období seskupené podle typu, DIČ protistrany a čísla dokladu"""
+    dic = func.coalesce(Transaction.partner_vat_id, Transaction.counterparty_dic)
+    # Transakce bez čísla dokladu je samostatný doklad
+    number = func.coalesce(Transaction.document_number, 'ID' + cast(Transaction.id, String))
+
+    def by_rate(rate, column):
+        return money_sum(case((Transaction.vat_rate == rate, column), else_=0))
+
+    total = money_sum(func.coalesce(Transaction.vat_base, 0) + func.coalesce(Transaction.vat_amount, 0))
+    stmt = (
+        select(
+            Transaction.type,
+            dic.label('dic'),
+            number.label('document_number'),
+            func.min(Transaction.document_date).label('document_date'),
+            func.min(Transaction.transaction_date).label('transaction_date'),
+            func.min(Transaction.description).label('description'),
+            by_rate(21, Transaction.vat_base).label('base_21'),
+            by_rate(21, Transaction.vat_amount).label('vat_21'),
+            by_rate(12, Transaction.vat_base).label('base_12'),
+            by_rate(12, Transaction.vat_amount).label('vat_12')
+        )
+        .where(
+            *_period_filter(user_id, month, year),
+            Transaction.vat_rate.in_((21, 12)),
+            Transaction.type.in_(('income', 'expense'))
+        )
+        .group_by(Transaction.type, dic, number)
+    )
+    return stmt, dic, total
+
+
+def _kh_document(row) -> KhDocument:
+    when = row.document_date or row.transaction_date
+    if isinstance(when, datetime):
+        when = when.date()
+    return KhDocument(
+        type=row.type, dic=row.dic, document_number=row.document_number, document_date=when,
+        base_21=row.base_21, vat_21=row.vat_21, base_12=row.base_12, vat_12=row.vat_12,
+        description=row.description or ''
+    )
+
+
+async def stream_kh_documents(session: AsyncSession, user_id: int,
+                              month: int, year: int) -> AsyncIterator[KhDocument]:
+    """
+    Doklady pro řádky A.4/B.2 kontrolního hlášení
+
+    Limit 10 000 Kč a DIČ filtruje HAVING v databázi, výsledek se čte
+    proudově - do Pythonu nikdy nejdou všechny transakce období.
+    Pořadí: výdaje (A.4), potom příjmy (B.2).
+    """
+    stmt, dic, total = _documents_stmt(user_id, month, year)
+    stmt = (
+        stmt.having(dic.isnot(None), total > KH_THRESHOLD)
+        .order_by(Transaction.type, dic, 'document_number')
+        .execution_options(yield_per=KH_BATCH_SIZE)
+    )
+    result = await session.stream(stmt)
+    async for row in result:
+        yield _kh_document(row)
+
+
+async def load_export_checks(session: AsyncSession, user_id: int, month: int, year: int) -> Dict[str, Any]:
+    """
+    Kontroly před exportem spočítané v databázi
+
+    Returns:
+        {'missing_dic': popisy dokladů nad limitem bez DIČ,
+         'missing_document_numbers': počet transakcí s DPH bez čísla dokladu}
+        - argumenty pro VatXmlGenerator.validate_period
+    """
+    stmt, dic, total = _documents_stmt(user_id, month, year)
+    missing = await session.execute(
+        stmt.having(dic.is_(None), total > KH_THRESHOLD).order_by('document_number').limit(MISSING_DIC_LIMIT)
+    )
+    missing_dic = [row.description or row.document_number for row in missing]
+
+    missing_numbers = await session.scalar(
+        select(func.count(Transaction.id)).where(
+            *_period_filter(user_id, month, year),
+            Transaction.vat_amount > 0,
+            Transaction.document_number.is_(None)
+        )
+    )
+    return {'missing_dic': missing_dic, 'missing_document_numbers': missing_numbers or 0}
+
+
+async def write_kontrolni_hlaseni(session: AsyncSession, generator: VatXmlGenerator,
+                                  period_data: VatPeriodData, user_id: int, out: TextIO) -> int:
+    """
+    Zapíše KH1 za období proudově z databáze
+
+    Returns:
+        Počet jednotlivě uvedených dokladů (A.4 + B.2)
+    """
+    writer = generator.kontrolni_hlaseni_writer(out, period_data)
+    writer.begin()
+    async for document in stream_kh_documents(session, user_id, period_data.month, period_data.year):
+        writer.add(document)
+    writer.finish()
+    return writer.rows
+
+
+async def load_period_totals(session: AsyncSession, user_id: int, month: int, year: int) -> VatPeriodData:
+    """
+    Souhrn DPH za měsíc z průběžných součtů (jeden řádek VatRecord)
+
+    Returns:
+        VatPeriodData, prázdné když za období není žádná transakce s DPH
+    """
+    record = (await session.execute(
+        select(VatRecord).where(
+            VatRecord.user_id == user_id,
+            VatRecord.period_year == year,
+            VatRecord.period_month == month
+        )
+    )).scalar_one_or_none()
+
+    period_data = VatPeriodData(month=month, year=year)
+    if record is not None:
+        for field in VAT_TOTAL_FIELDS:
+            setattr(period_data, field, getattr(record, field) or ZERO)
+    return period_data
+
+
+async def recompute_period_totals(session: AsyncSession,
+                                  user_id: Optional[int] = None) -> Dict[PeriodKey, VatPeriodData]:
+    """Úplný přepočet součtů DPH ze všech transakcí (pro rekonciliaci)"""
+    year = extract('year', Transaction.transaction_date)
+    month = extract('month', Transaction.transaction_date)
+    stmt = (
+        select(
+            Transaction.user_id,
+            year.label('year'),
+            month.label('month'),
+            Transaction.type,
+            Transaction.vat_rate,
+            money_sum(Transaction.vat_base).label('base'),
+            money_sum(Transaction.vat_amount).label('vat')
+        )
+        .where(Transaction.vat_rate.in_(VAT_RATES), Transaction.transaction_date.isnot(None))
+        .group_by(Transaction.user_id, year, month, Transaction.type, Transaction.vat_rate)
+    )
+    if user_id is not None:
+        stmt = stmt.where(Transaction.user_id == user_id)
+
+    periods: Dict[PeriodKey, VatPeriodData] = {}
+    for row in await session.execute(stmt):
+        key = (row.user_id, int(row.year), int(row.month))
+        if key not in periods:
+            periods[key] = VatPeriodData(month=key[2], year=key[1])
+        periods[key].add(row.type, row.vat_rate, row.base, row.vat)
+    return periods
+
+
+async def reconcile_vat_totals(session: AsyncSession, user_id: Optional[int] = None,
+                               fix: bool = False) -> List[Dict[str, Any]]:
+    """
+    Porovná průběžné součty ve VatRecord s úplným přepočtem
+
+    Args:
+        user_id: Jen jeden uživatel (jinak všichni)
+        fix: Přepsat rozdílné součty přepočtenými hodnotami a commitnout
+
+    Returns:
+        Seznam rozdílů {user_id, year, month, field, stored, expected}
+    """
+    expected = await recompute_period_totals(session, user_id)
+
+    stmt = select(VatRecord)
+    if user_id is not None:
+        stmt = stmt.where(VatRecord.user_id == user_id)
+    records = {
+        (record.user_id, record.period_year, record.period_month): record
+        for record in (await session.execute(stmt)).scalars()
+    }
+
+    drift = []
+    for key in sorted(set(expected) | set(records)):
+        period_data = expected.get(key) or VatPeriodData(month=key[2], year=key[1])
+        record = records.get(key)
+        period_drift = []
+        for field in VAT_TOTAL_FIELDS + ('vat_liability',):
+            stored = (getattr(record, field) or ZERO) if record is not None else ZERO
+            value = getattr(period_data, field)
+            if stored != value:
+                period_drift.append({
+                    'user_id': key[0], 'year': key[1], 'month': key[2],
+                    'field': field, 'stored': stored, 'expected': value
+                })
+        drift.extend(period_drift)
+
+        if fix and period_drift:
+            if record is None:
+                record = VatRecord(user_id=key[0], period_year=key[1], period_month=key[2])
+                session.add(record)
+            for field in VAT_TOTAL_FIELDS:
+                setattr(record, field, getattr(period_data, field))
+            record.vat_liability = period_data.vat_liability
+
+    if drift:
+        logger.warning(f"Rekonciliace DPH: {len(drift)} rozdílů v průběžných součtech")
+    if fix:
+        await session.commit()
+    return drift
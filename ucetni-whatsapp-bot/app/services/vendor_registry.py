@@ -0,0 +1,233 @@
+"""
+Registr známých prodejců
+
+Jediný zdroj údajů o prodejcích (IČO, DIČ, název, aliasy, výchozí kategorie)
+načítaný z app/data/vendors.json. Hledání podle IČO je přes hash index,
+podle názvu přes BK-strom nad aliasy, takže projdou i OCR překlepy typu
+"KAUFLAMD" nebo české skloňování ("v lidlu").
+"""
+import json
+import logging
+import re
+import unicodedata
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_VENDORS_PATH = Path(__file__).resolve().parent.parent / "data" / "vendors.json"
+
+WORD_PATTERN = re.compile(r'[a-z0-9]+(?:\.[a-z]{2,3})?')
+
+
+def normalize_name(text: str) -> str:
+    """Malá písmena bez diakritiky, jen písmena, číslice, tečky a mezery"""
+    decomposed = unicodedata.normalize('NFKD', text.lower())
+    stripped = ''.join(c for c in decomposed if not unicodedata.combining(c))
+    return ' '.join(WORD_PATTERN.findall(stripped))
+
+
+def levenshtein(a: str, b: str, limit: int) -> int:
+    """Editační vzdálenost; jakmile řádek překročí limit, vrátí limit + 1"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char_a != char_b)
+            ))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+# Koncovky pádů, které se zkusí odříznout ("v lidlu", "z kauflandu", "od alberta")
+CZECH_SUFFIXES = ('ovi', 'em', 'u', 'a', 'e', 'y')
+
+
+def max_typos(word: str) -> int:
+    """Povolený počet překlepů podle délky - krátká slova (MOL, Lidl) jen přesně"""
+    if len(word) <= 4:
+        return 0
+    if len(word) <= 7:
+        return 1
+    return 2
+
+
+class BKTree:
+    """BK-strom pro vyhledání slov v dané editační vzdálenosti"""
+
+    def __init__(self):
+        self._root: Optional[Tuple[str, Dict[int, tuple]]] = None
+
+    def add(self, word: str) -> None:
+        if self._root is None:
+            self._root = (word, {})
+            return
+        node = self._root
+        while True:
+            distance = levenshtein(word, node[0], len(word) + len(node[0]))
+            if distance == 0:
+                return
+            child = node[1].get(distance)
+            if child is None:
+                node[1][distance] = (word, {})
+                return
+            node = child
+
+    def search(self, word: str, max_distance: int) -> List[Tuple[int, str]]:
+        """Všechna slova do vzdálenosti max_distance, seřazená podle vzdálenosti"""
+        if self._root is None:
+            return []
+        results = []
+        stack = [self._root]
+        while stack:
+            candidate, children = stack.pop()
+            distance = levenshtein(word, candidate, max_distance + len(word))
+            if distance <= max_distance:
+                results.append((distance, candidate))
+            for child_distance, child in children.items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    stack.append(child)
+        return sorted(results)
+
+
+@dataclass(frozen=True)
+class Vendor:
+    key: str
+    name: str                 # oficiální název
+    short_name: str           # název pro zobrazení uživateli
+    ico: Optional[str]
+    dic: Optional[str]
+    aliases: Tuple[str, ...]
+    group: Optional[str]
+    category_code: Optional[str]
+    category_name: Optional[str]
+
+    def to_dict(self) -> Dict:
+        return {
+            'key': self.key,
+            'name': self.name,
+            'short_name': self.short_name,
+            'ico': self.ico,
+            'dic': self.dic,
+            'category_code': self.category_code,
+            'category_name': self.category_name,
+        }
+
+
+class VendorRegistry:
+    """Index prodejců podle IČO a (fuzzy) podle názvu"""
+
+    def __init__(self, vendors: Iterable[Vendor]):
+        self.vendors: List[Vendor] = list(vendors)
+        self._by_ico: Dict[str, Vendor] = {}
+        self._by_alias: Dict[str, Vendor] = {}
+        self._tree = BKTree()
+        self._max_alias_words = 1
+
+        for vendor in self.vendors:
+            if vendor.ico:
+                if vendor.ico in self._by_ico:
+                    logger.warning(f"Duplicitní IČO {vendor.ico} v registru prodejců ({vendor.key})")
+                self._by_ico[vendor.ico] = vendor
+            for alias in vendor.aliases:
+                alias = normalize_name(alias)
+                self._by_alias[alias] = vendor
+                self._max_alias_words = max(self._max_alias_words, alias.count(' ') + 1)
+                if ' ' not in alias:
+                    self._tree.add(alias)
+
+    @classmethod
+    def load(cls, path: Path = DEFAULT_VENDORS_PATH) -> "VendorRegistry":
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+
+        categories = data.get('categories', {})
+        vendors = []
+        for item in data['vendors']:
+            category = categories.get(item.get('group'), {})
+            vendors.append(Vendor(
+                key=item['key'],
+                name=item['name'],
+                short_name=item.get('short_name') or item['name'],
+                ico=item.get('ico'),
+                dic=item.get('dic'),
+                aliases=tuple(item.get('aliases', [])) or (item['key'],),
+                group=item.get('group'),
+                category_code=item.get('category_code', category.get('category_code')),
+                category_name=item.get('category_name', category.get('category_name')),
+            ))
+        return cls(vendors)
+
+    def by_ico(self, ico: Optional[str]) -> Optional[Vendor]:
+        if not ico:
+            return None
+        return self._by_ico.get(ico.strip())
+
+    def by_group(self, group: str) -> List[Vendor]:
+        return [vendor for vendor in self.vendors if vendor.group == group and vendor.ico]
+
+    def _match_word(self, word: str) -> Optional[Tuple[int, Vendor]]:
+        vendor = self._by_alias.get(word)
+        if vendor is not None:
+            return 0, vendor
+        if len(word) >= 5:
+            for suffix in CZECH_SUFFIXES:
+                if word.endswith(suffix) and word[:-len(suffix)] in self._by_alias:
+                    return 0, self._by_alias[word[:-len(suffix)]]
+        limit = max_typos(word)
+        if limit == 0:
+            return None
+        matches = self._tree.search(word, limit)
+        if not matches:
+            return None
+        distance, alias = matches[0]
+        # Alias musí být také dost dlouhý - "mol" nesmí chytit "mols"
+        if distance > max_typos(alias):
+            return None
+        return distance, self._by_alias[alias]
+
+    def find_by_name(self, name: str) -> Optional[Vendor]:
+        """Prodejce podle názvu (celý název, pak jednotlivá slova s tolerancí překlepů)"""
+        match = self.find_in_text(name)
+        return match[1] if match else None
+
+    def find_in_text(self, text: str) -> Optional[Tuple[int, Vendor]]:
+        """
+        Najde prodejce ve volném textu (OCR, zpráva uživatele)
+
+        Returns:
+            (vzdálenost, Vendor) nejlepší shody, přednost mají víceslovné
+            aliasy a menší vzdálenost; None pokud nic neodpovídá
+        """
+        if not text:
+            return None
+        words = normalize_name(text).split()
+
+        best = None
+        for size in range(min(self._max_alias_words, len(words)), 1, -1):
+            for start in range(len(words) - size + 1):
+                vendor = self._by_alias.get(' '.join(words[start:start + size]))
+                if vendor is not None:
+                    return 0, vendor
+
+        for word in words:
+            match = self._match_word(word)
+            if match is None:
+                continue
+            if match[0] == 0:
+                return match
+            if best is None or match[0] < best[0]:
+                best = match
+        return best
+
+
+# Globální instance
+vendor_registry = VendorRegistry.load()
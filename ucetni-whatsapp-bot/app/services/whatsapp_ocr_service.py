@@ -4,6 +4,7 @@ WhatsApp OCR Service pro zpracování obrázků účtenek
 import io
 import re
 import os
+import asyncio
 import logging
 from PIL import Image
 from typing import Dict, List, Optional, Tuple
@@ -23,70 +24,92 @@ except ImportError:
     OCR_AVAILABLE = False
     OCR_FUNCTIONAL = False
 
-# Image processing
-try:
-    import cv2
-    import numpy as np
-    CV2_AVAILABLE = True
-except ImportError:
-    CV2_AVAILABLE = False
-
 from app.ai_processor import AIProcessor
-from utils.ares_validator import AresValidator
+from app.services.image_preprocessing import CV2_AVAILABLE, DEFAULT_SETTINGS, PreprocessSettings, preprocess_for_ocr
+from app.services.image_quality import DEFAULT_THRESHOLDS, QualityThresholds, assess_quality
+from app.services.pdf_ingestion import (
+    DEFAULT_PDF_SETTINGS, PDF_AVAILABLE, PdfSettings, extract_pdf_text, is_pdf, ocr_pool
+)
+from app.services.qr_payment import read_qr_payment
+from app.services.receipt_confidence import ITEMS_SUM_TOLERANCE, score_receipt_fields
+from app.services.receipt_dedup import DedupMatch, ReceiptDedupCache, image_phash, sha256_digest
+from app.services.receipt_templates import (
+    ReceiptTemplate, ReceiptTemplateStore, complete_lines, merge_layouts, validate_template_fields
+)
+from app.services.receipt_tokenizer import extract_receipt_fields, extract_vat_breakdown, strip_diacritics, tokenize
+from app.services.vendor_registry import vendor_registry
 
 logger = logging.getLogger(__name__)
 
 class WhatsAppOCRService:
     def __init__(self):
         self.ai_processor = AIProcessor()
-        self.ares_validator = AresValidator()
-        
-        # Známé obchodní řetězce a jejich IČA
-        self.known_vendors = {
-            '26185610': 'Lidl',
-            '44012373': 'Kaufland', 
-            '26178176': 'Penny Market',
-            '45308314': 'Billa',
-            '26941514': 'Tesco',
-            '27082440': 'Alza.cz',
-            '47666897': 'Albert',
-            '25215612': 'COOP',
-            '64939219': 'Globus',
-            '25960059': 'IKEA',
-            '47910666': 'Datart'
-        }
-        
-        # Klíčová slova pro rozpoznání obchodů
-        self.vendor_keywords = {
-            'LIDL': 'Lidl',
-            'KAUFLAND': 'Kaufland',
-            'PENNY': 'Penny Market',
-            'BILLA': 'Billa', 
-            'TESCO': 'Tesco',
-            'ALZA': 'Alza.cz',
-            'ALBERT': 'Albert',
-            'GLOBUS': 'Globus',
-            'MAKRO': 'Makro',
-            'IKEA': 'IKEA',
-            'DATART': 'Datart',
-            'ROHLIK': 'Rohlík.cz',
-            'KOSIK': 'Košík.cz',
-            'SHELL': 'Shell',
-            'OMV': 'OMV',
-            'BENZINA': 'Benzina',
-            'MOL': 'MOL'
-        }
+        self.preprocess_settings: PreprocessSettings = DEFAULT_SETTINGS
+        self.total_line_pass = True  # druhý OCR průchod řádku CELKEM s whitelistem číslic
+        self.dedup_cache = ReceiptDedupCache()
+        self.quality_thresholds: QualityThresholds = DEFAULT_THRESHOLDS
+        self.qr_fast_path = True  # QR Platba / QR Faktura se čte před OCR
+        self.template_store = ReceiptTemplateStore(os.getenv('RECEIPT_TEMPLATES_PATH') or None)
+        self.pdf_settings: PdfSettings = DEFAULT_PDF_SETTINGS
+        self.ocr_pool = ocr_pool  # OCR stránek PDF bez textové vrstvy
 
     async def process_receipt_from_whatsapp(
         self, 
         image_data: bytes, 
         user_message: str = "", 
-        user_id: int = None
+        user_id: int = None,
+        media_url: Optional[str] = None
     ) -> Dict:
         """
         Hlavní funkce pro zpracování účtenky z WhatsApp
+        
+        Stejný soubor poslaný znovu se pozná podle MediaUrl nebo SHA-256 -
+        vrátí se uložený výsledek s příznakem 'duplicate' bez dalšího OCR a AI.
+        Podobný obrázek (pHash) může být i jiná účtenka stejného obchodu -
+        zpracuje se normálně a výsledek nese 'possible_duplicate'.
+        PDF faktura se čte po stránkách (viz _process_pdf).
         """
         try:
+            image_sha256 = sha256_digest(image_data)
+            pdf = is_pdf(image_data)
+            phash = None
+            similar = None
+            if user_id:
+                match = self.dedup_cache.find_exact(user_id, image_sha256, media_url)
+                if match is not None:
+                    logger.info(f"Duplicitní účtenka uživatele {user_id} ({match.match_type}) - přeskakuji OCR")
+                    return self._duplicate_result(match)
+                if not pdf:
+                    phash = image_phash(image_data)
+                    if phash is not None:
+                        similar = self.dedup_cache.find_similar(user_id, phash)
+                if similar is not None:
+                    logger.info(
+                        f"Možná duplicitní účtenka uživatele {user_id} (vzdálenost {similar.distance}) "
+                        "- zpracuji a označím"
+                    )
+            
+            if pdf:
+                return await self._process_pdf(image_data, user_message, user_id, image_sha256, media_url)
+            
+            # QR Platba / QR Faktura - přesná částka, účet a VS bez OCR
+            qr_fields = self._read_qr_fields(image_data) if self.qr_fast_path else {}
+            if qr_fields and (score_receipt_fields(qr_fields).confident or
+                              (not OCR_FUNCTIONAL and qr_fields.get('total'))):
+                logger.info(f"Údaje převzaty z QR kódu, OCR přeskočeno: {qr_fields}")
+                final_result, _ = await self._complete_receipt_fields(qr_fields, "", user_message)
+                result = {
+                    'success': True,
+                    'ocr_text': '',
+                    'ocr_confidence': 1.0,
+                    'ai_processed': False,
+                    'image_sha256': image_sha256,
+                    **final_result
+                }
+                self._flag_possible_duplicate(result, similar)
+                self._remember_result(user_id, image_data, image_sha256, phash, result, media_url)
+                return result
+
             if not OCR_AVAILABLE:
                 logger.warning("OCR není dostupné - chybí pytesseract")
                 return {
@@ -105,6 +128,18 @@ class WhatsAppOCRService:
 
             logger.info(f"Zpracovávám obrázek účtenky pro uživatele {user_id}, velikost: {len(image_data)} bytes")
             
+            # Rychlá kontrola kvality - nečitelnou fotku odmítni ještě před OCR
+            quality = assess_quality(image_data, self.quality_thresholds)
+            logger.info(f"Kvalita fotky: {quality.issue or 'ok'} {quality.metrics}")
+            if not quality.ok:
+                return {
+                    'success': False,
+                    'error': f'Nekvalitní fotka: {quality.issue}',
+                    'message': quality.hint,
+                    'quality_issue': quality.issue,
+                    'quality': quality.metrics
+                }
+            
             # Převeď bytes na PIL Image
             try:
                 image = Image.open(io.BytesIO(image_data))
@@ -120,31 +155,41 @@ class WhatsAppOCRService:
             # Předprocessing pro lepší OCR
             processed_image = self._preprocess_image(image)
             
-            # OCR s českým a anglickým jazykem
-            try:
-                ocr_text = pytesseract.image_to_string(
-                    processed_image,
-                    lang='ces+eng',
-                    config='--psm 4'  # Assume single column of text
-                )
-                logger.info(f"OCR text extrahován: {len(ocr_text)} znaků")
-            except Exception as e:
-                logger.error(f"Chyba při OCR: {str(e)}")
-                return {
-                    'success': False,
-                    'error': f'Chyba při rozpoznávání textu: {str(e)}',
-                    'message': 'Nepodařilo se rozpoznat text z obrázku.'
-                }
+            # Známý prodejce se šablonou - OCR jen pásů s IČO, celkem, datem a DPH.
+            # O šabloně rozhodne IČO z QR kódu, jinak z hlavičky, kterou už obecná cesta nečte znovu
+            template_data = None
+            header = None
+            if CV2_AVAILABLE and self.template_store.has_templates():
+                template, header = self._find_template(processed_image, qr_fields.get('ico'))
+                if template is not None:
+                    template_data = self._extract_with_template(processed_image, template, header)
             
-            if not ocr_text.strip():
-                return {
-                    'success': False,
-                    'error': 'Žádný text nerozpoznán',
-                    'message': 'Z obrázku se nepodařilo rozpoznat žádný text. Zkuste ostřejší fotografii.'
-                }
+            ocr_layout = None
+            if template_data:
+                ocr_text, extracted_data = template_data
+            else:
+                try:
+                    ocr_text, ocr_layout, extracted_data = self._ocr_and_extract(
+                        processed_image, verify_total=not qr_fields.get('total'), header=header
+                    )
+                    logger.info(f"OCR text extrahován: {len(ocr_text)} znaků")
+                except Exception as e:
+                    logger.error(f"Chyba při OCR: {str(e)}")
+                    return {
+                        'success': False,
+                        'error': f'Chyba při rozpoznávání textu: {str(e)}',
+                        'message': 'Nepodařilo se rozpoznat text z obrázku.'
+                    }
+                
+                if not ocr_text.strip():
+                    return {
+                        'success': False,
+                        'error': 'Žádný text nerozpoznán',
+                        'message': 'Z obrázku se nepodařilo rozpoznat žádný text. Zkuste ostřejší fotografii.'
+                    }
             
-            # Extrahuj základní data z OCR textu
-            extracted_data = self._extract_receipt_data(ocr_text)
+            # Hodnoty z QR kódu mají přednost před OCR
+            extracted_data.update(qr_fields)
             logger.info(f"Extrahovaná data: {extracted_data}")
             
             # Pokus se identifikovat obchod
@@ -152,40 +197,33 @@ class WhatsAppOCRService:
             if vendor:
                 extracted_data['vendor'] = vendor
             
-            # Validuj IČO přes ARES pokud bylo nalezeno
-            if extracted_data.get('ico'):
-                try:
-                    ares_data = self.ares_validator.validate_ico(extracted_data['ico'])
-                    if ares_data:
-                        extracted_data['vendor_verified'] = ares_data.get('obchodni_firma', '')
-                        extracted_data['vendor_address'] = ares_data.get('sidlo', '')
-                except Exception as e:
-                    logger.warning(f"ARES validace selhala: {str(e)}")
+            # Údaje z ARES doplní až counterparty_enricher po uložení transakce
             
-            # Použij AI processor pro další zpracování pokud je dostupný
-            ai_result = None
-            if self.ai_processor.client:
-                try:
-                    combined_text = f"{user_message}\n\nOCR text:\n{ocr_text}" if user_message else ocr_text
-                    ai_result = await self.ai_processor.process_enhanced_message(
-                        message=combined_text,
-                        ocr_text=ocr_text
-                    )
-                    logger.info(f"AI zpracování úspěšné: {bool(ai_result)}")
-                except Exception as e:
-                    logger.warning(f"AI zpracování selhalo: {str(e)}")
+            # Kaskáda - AI jen pro pole, která pravidla nenašla nebo nesouhlasí
+            final_result, ai_result = await self._complete_receipt_fields(extracted_data, ocr_text, user_message)
             
-            # Kombinuj OCR a AI výsledky
-            final_result = self._combine_ocr_and_ai_results(extracted_data, ai_result)
+            # Spolehlivě přečtená účtenka známého prodejce zpřesní jeho šablonu
+            checks = final_result.get('extraction_checks')
+            if ocr_layout is not None and CV2_AVAILABLE and checks and all(checks.values()):
+                self.template_store.learn(
+                    final_result['ico'], final_result.get('vendor'), ocr_layout,
+                    processed_image.size[1], self.preprocess_settings.target_text_height, final_result
+                )
             
-            return {
+            result = {
                 'success': True,
                 'ocr_text': ocr_text,
                 'ocr_confidence': extracted_data.get('confidence', 0.7),
                 'ai_processed': ai_result is not None,
+                'image_sha256': image_sha256,
+                'quality': quality.metrics,
                 **final_result
             }
             
+            self._flag_possible_duplicate(result, similar)
+            self._remember_result(user_id, image_data, image_sha256, phash, result, media_url)
+            return result
+            
         except Exception as e:
             logger.error(f"Neočekávaná chyba při zpracování účtenky: {str(e)}")
             return {
@@ -194,9 +232,213 @@ class WhatsAppOCRService:
                 'message': 'Nastala neočekávaná chyba. Zkuste to znovu nebo zadejte údaje ručně.'
             }
 
+    def _ocr_and_extract(self, processed_image: Image, verify_total: bool = True,
+                         header: Optional[Tuple[int, Dict]] = None) -> Tuple[str, Dict, Dict]:
+        """
+        Obecná cesta - OCR celé účtenky a extrakce polí
+        
+        Args:
+            header: už přečtená hlavička (_read_header) - OCR pak začne až pod ní
+        
+        Returns:
+            (OCR text, layout z image_to_data, extrahovaná data)
+        """
+        # OCR s českým a anglickým jazykem - image_to_data vrací i pozice slov
+        top = header[0] if header else 0
+        ocr_layout = self._ocr_band_layout(processed_image, top, processed_image.size[1], psm=4)
+        if header:
+            ocr_layout = merge_layouts(header[1], ocr_layout)
+        ocr_text = self._layout_to_text(ocr_layout)
+        if not ocr_text.strip():
+            return ocr_text, ocr_layout, {}
+        
+        # Extrahuj základní data z OCR textu
+        extracted_data = self._extract_receipt_data(ocr_text)
+        
+        # Druhý přesnější průchod jen přes řádek s celkovou částkou
+        if self.total_line_pass and verify_total:
+            self._verify_total_from_line(processed_image, ocr_layout, extracted_data)
+        
+        return ocr_text, ocr_layout, extracted_data
+
+    def extract_from_image(self, image_data: bytes) -> Dict:
+        """
+        Synchronní OCR a pravidlová extrakce bez AI, cache duplicit a šablon
+        
+        Pro dávkové přepracování uložených příloh - stejný preprocessing,
+        QR kód a extrakce jako u WhatsApp zprávy.
+        
+        Returns:
+            {'ocr_text', 'extracted_data', 'quality'}; chyby OCR vyhodí volajícímu
+        """
+        quality = assess_quality(image_data, self.quality_thresholds)
+        qr_fields = self._read_qr_fields(image_data) if self.qr_fast_path else {}
+        
+        processed_image = self._preprocess_image(Image.open(io.BytesIO(image_data)))
+        ocr_text, _, extracted_data = self._ocr_and_extract(processed_image, verify_total=not qr_fields.get('total'))
+        extracted_data.update(qr_fields)
+        
+        vendor = self._identify_vendor(ocr_text, extracted_data.get('ico'))
+        if vendor:
+            extracted_data['vendor'] = vendor
+        
+        return {
+            'ocr_text': ocr_text,
+            'extracted_data': extracted_data,
+            'quality': quality.metrics,
+        }
+
+    async def _process_pdf(self, pdf_data: bytes, user_message: str, user_id: Optional[int],
+                           image_sha256: str, media_url: Optional[str]) -> Dict:
+        """
+        PDF faktura - textová vrstva nebo OCR stránek, pak stejná extrakce jako u fotky
+        """
+        if not PDF_AVAILABLE:
+            logger.warning("Čtení PDF není dostupné - chybí pypdfium2")
+            return {
+                'success': False,
+                'error': 'Čtení PDF není dostupné',
+                'message': 'PDF zatím neumím přečíst. Pošlete prosím fotku nebo snímek obrazovky dokladu.'
+            }
+        
+        logger.info(f"Zpracovávám PDF doklad pro uživatele {user_id}, velikost: {len(pdf_data)} bytes")
+        try:
+            # Stránky se čtou blokujícím voláním - mimo event loop
+            loop = asyncio.get_running_loop()
+            extraction = await loop.run_in_executor(None, self.extract_from_pdf, pdf_data)
+        except Exception as e:
+            logger.error(f"Chyba při čtení PDF: {str(e)}")
+            return {
+                'success': False,
+                'error': f'Chyba při čtení PDF: {str(e)}',
+                'message': 'PDF se nepodařilo otevřít. Zkuste ho poslat znovu nebo jako obrázek.'
+            }
+        
+        ocr_text = extraction['ocr_text']
+        if not ocr_text.strip():
+            return {
+                'success': False,
+                'error': 'Žádný text nerozpoznán',
+                'message': 'V PDF se nepodařilo najít žádný text. Zkuste ostřejší sken nebo fotografii.'
+            }
+        
+        final_result, ai_result = await self._complete_receipt_fields(
+            extraction['extracted_data'], ocr_text, user_message
+        )
+        result = {
+            'success': True,
+            'ocr_text': ocr_text,
+            'ocr_confidence': extraction['extracted_data'].get('confidence', 0.7),
+            'ai_processed': ai_result is not None,
+            'image_sha256': image_sha256,
+            'pdf_pages': extraction['pages'],
+            **final_result
+        }
+        if user_id:
+            # pHash z PDF nejde - duplicity jen podle SHA-256 a MediaUrl
+            self.dedup_cache.add(user_id, image_sha256, None, result, media_url)
+        return result
+
+    def extract_from_pdf(self, pdf_data: bytes) -> Dict:
+        """
+        Synchronní extrakce z PDF - stránky bez textové vrstvy OCRuje ocr_pool
+        
+        Returns:
+            {'ocr_text', 'extracted_data', 'pages'}; chyby otevření PDF vyhodí volajícímu
+        """
+        pdf_text = extract_pdf_text(pdf_data, self._ocr_page_text, self.ocr_pool, self.pdf_settings)
+        ocr_text = pdf_text.text
+        extracted_data = self._extract_receipt_data(ocr_text) if ocr_text.strip() else {}
+        
+        vendor = self._identify_vendor(ocr_text, extracted_data.get('ico'))
+        if vendor:
+            extracted_data['vendor'] = vendor
+        if pdf_text.ocr_pages < len(pdf_text.pages):
+            extracted_data['text_layer'] = True
+        
+        return {
+            'ocr_text': ocr_text,
+            'extracted_data': extracted_data,
+            'pages': pdf_text.summary(),
+        }
+
+    def _ocr_page_text(self, image: Image) -> str:
+        """OCR vykreslené stránky PDF (běží v ocr_pool)"""
+        if not OCR_FUNCTIONAL:
+            raise RuntimeError('Tesseract OCR není nainstalován')
+        processed_image = self._preprocess_image(image)
+        # Faktury mají sloupce (dodavatel / odběratel) - automatická segmentace stránky
+        layout = pytesseract.image_to_data(
+            processed_image, lang='ces+eng', config='--psm 3', output_type=pytesseract.Output.DICT
+        )
+        return self._layout_to_text(layout)
+
+    def _remember_result(self, user_id: Optional[int], image_data: bytes, image_sha256: str,
+                         phash: Optional[int], result: Dict, media_url: Optional[str]) -> None:
+        """
+        Uloží výsledek do cache duplicit - SHA-256 a MediaUrl vždy, pHash jen když jde spočítat
+        """
+        if not user_id:
+            return
+        if phash is None:
+            phash = image_phash(image_data)
+        self.dedup_cache.add(user_id, image_sha256, phash, result, media_url)
+
+    def _read_qr_fields(self, image_data: bytes) -> Dict:
+        """
+        Pole z QR Platby / QR Faktury ve tvaru OCR extrakce, prázdný dict bez QR
+        """
+        try:
+            payment = read_qr_payment(image_data)
+        except Exception as e:
+            logger.warning(f"Čtení QR kódu selhalo: {str(e)}")
+            return {}
+        if payment is None:
+            return {}
+        
+        fields = payment.to_receipt_fields()
+        if payment.currency != 'CZK':
+            # Přepočet měn řeší až AI/převodník, částku v cizí měně nebereme jako Kč
+            fields.pop('total', None)
+        if fields.get('total'):
+            fields['total_source'] = 'qr'
+        fields['qr_payment'] = True
+        
+        vendor = vendor_registry.by_ico(fields.get('ico')) or vendor_registry.find_by_name(fields.get('vendor', ''))
+        if vendor:
+            fields.setdefault('ico', vendor.ico)
+            fields['vendor'] = vendor.short_name
+        return fields
+
+    def _duplicate_result(self, match: DedupMatch) -> Dict:
+        """
+        Výsledek pro již zpracovanou účtenku - kopie uložené extrakce s varováním
+        """
+        result = dict(match.entry.result)
+        result['duplicate'] = True
+        result['duplicate_match'] = match.match_type
+        result['duplicate_transaction_id'] = match.entry.transaction_id
+        result['duplicate_processed_at'] = datetime.fromtimestamp(match.entry.created_at).isoformat()
+        return result
+
+    def _flag_possible_duplicate(self, result: Dict, similar: Optional[DedupMatch]) -> None:
+        """
+        Označí výsledek podobný dříve zpracované účtence (shoda jen podle pHash)
+        """
+        if similar is None:
+            return
+        result['possible_duplicate'] = True
+        result['possible_duplicate_distance'] = similar.distance
+        result['possible_duplicate_transaction_id'] = similar.entry.transaction_id
+        result['possible_duplicate_processed_at'] = datetime.fromtimestamp(similar.entry.created_at).isoformat()
+
     def _preprocess_image(self, image: Image) -> Image:
         """
         Vylepší kvalitu obrázku pro lepší OCR
+        
+        Obrázek se zmenší na cílovou výšku textu, narovná a binarizuje
+        (viz app.services.image_preprocessing). Očekává ještě nenačtený
+        obrázek z Image.open, aby šlo JPEG dekódovat rovnou zmenšený.
         """
         try:
             if not CV2_AVAILABLE:
@@ -205,289 +447,320 @@ class WhatsAppOCRService:
                     image = image.convert('RGB')
                 return image
             
-            # Pokročilý preprocessing s OpenCV
-            img_array = np.array(image)
-            
-            # Převeď na šedou pokud je barevný
-            if len(img_array.shape) == 3:
-                gray = cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY)
-            else:
-                gray = img_array
-            
-            # Odstranění šumu
-            denoised = cv2.fastNlMeansDenoising(gray)
-            
-            # Zvýšení kontrastu
-            enhanced = cv2.equalizeHist(denoised)
-            
-            # Threshold pro čistší text
-            _, binary = cv2.threshold(enhanced, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-            
-            return Image.fromarray(binary)
+            result = preprocess_for_ocr(image, self.preprocess_settings)
+            logger.info(
+                f"Preprocessing: {result.original_size} -> {result.final_size}, "
+                f"náklon {result.skew_angle:.1f}°, {sum(result.timings_ms.values()):.0f} ms"
+            )
+            return result.image
             
         except Exception as e:
             logger.warning(f"Preprocessing selhal, používám původní obrázek: {str(e)}")
             return image.convert('RGB') if image.mode != 'RGB' else image
 
-    def _extract_receipt_data(self, text: str) -> Dict:
+    def _ocr_band(self, image: Image, y0: int, y1: int) -> str:
+        """OCR vodorovného pásu účtenky (celá šířka)"""
+        band = image.crop((0, y0, image.size[0], y1))
+        return pytesseract.image_to_string(band, lang='ces+eng', config='--psm 6')
+
+    def _ocr_band_layout(self, image: Image, y0: int, y1: int, psm: int = 6) -> Dict:
+        """image_to_data vodorovného pásu (celá šířka), pozice slov v souřadnicích celého obrázku"""
+        band = image if (y0, y1) == (0, image.size[1]) else image.crop((0, y0, image.size[0], y1))
+        layout = pytesseract.image_to_data(
+            band, lang='ces+eng', config=f'--psm {psm}', output_type=pytesseract.Output.DICT
+        )
+        if y0:
+            layout['top'] = [top + y0 for top in layout['top']]
+        return layout
+
+    def _read_header(self, image: Image) -> Optional[Tuple[int, Dict]]:
         """
-        Inteligentní extrakce dat z OCR textu
+        OCR pásu hlavičky, ze které se čte IČO pro výběr šablony
+        
+        Řádek přeříznutý dolním okrajem pásu se zahodí, obecná cesta
+        i pásy šablony ho přečtou celý.
+        
+        Returns:
+            (y pod posledním celým řádkem, layout celých řádků) nebo None
         """
-        data = {'confidence': 0.6}  # Začínáme s nižší confidence pro OCR
-        
-        # IČO/IČ - různé formáty
-        ico_patterns = [
-            r'IČO?:?\s*(\d{8})',
-            r'IČ:?\s*(\d{8})', 
-            r'IC\s*:?\s*(\d{8})',
-            r'(\d{8})(?=\s*DIČ)',  # IČO před DIČ
-        ]
-        for pattern in ico_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                ico = match.group(1)
-                if len(ico) == 8 and ico.isdigit():
-                    data['ico'] = ico
-                    data['confidence'] += 0.1
-                    break
-        
-        # DIČ
-        dic_patterns = [
-            r'DIČ:?\s*(CZ\d{8,10})',
-            r'DIC\s*:?\s*(CZ\d{8,10})',
-            r'Tax\s*ID\s*:?\s*(CZ\d{8,10})'
-        ]
-        for pattern in dic_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                data['dic'] = match.group(1)
-                data['confidence'] += 0.1
-                break
-        
-        # Částky - hledej všechny možné formáty
-        amount_patterns = [
-            r'CELKEM\s*:?\s*(\d+(?:[.,]\d{1,2})?)\s*(?:Kč|CZK|,-)?',
-            r'TOTAL\s*:?\s*(\d+(?:[.,]\d{1,2})?)\s*(?:Kč|CZK|,-)?',
-            r'K\s*ÚHRADĚ\s*:?\s*(\d+(?:[.,]\d{1,2})?)\s*(?:Kč|CZK|,-)?',
-            r'(\d+(?:[.,]\d{1,2})?)\s*(?:Kč|CZK|,-)\s*(?:CELKEM|TOTAL)',
-        ]
-        
-        amounts = []
-        for pattern in amount_patterns:
-            matches = re.findall(pattern, text, re.IGNORECASE)
-            for match in matches:
-                try:
-                    clean_amount = match.replace(',', '.').replace(' ', '')
-                    amounts.append(float(clean_amount))
-                except:
-                    continue
-        
-        # Také hledej všechny částky v textu
-        all_amounts = re.findall(r'(\d+(?:[.,]\d{1,2})?)\s*(?:Kč|CZK|,-)', text)
-        for amount in all_amounts:
-            try:
-                clean_amount = amount.replace(',', '.').replace(' ', '')
-                amount_float = float(clean_amount)
-                if amount_float > 1:  # Ignoruj nesmyslně malé částky
-                    amounts.append(amount_float)
-            except:
+        unit = self.preprocess_settings.target_text_height
+        height = image.size[1]
+        header_end = min(height, int(self.template_store.settings.header_lines * unit))
+        try:
+            layout = self._ocr_band_layout(image, 0, header_end)
+        except Exception as e:
+            logger.warning(f"OCR hlavičky selhalo: {str(e)}")
+            return None
+        # Na okraji pásu (ne na konci obrázku) může být řádek přeříznutý
+        return complete_lines(layout, header_end, unit // 4 if header_end < height else 0)
+
+    def _find_template(self, image: Image,
+                       ico: Optional[str]) -> Tuple[Optional[ReceiptTemplate], Optional[Tuple[int, Dict]]]:
+        """
+        Šablona prodejce pro účtenku - IČO z QR kódu rozhodne bez OCR, jinak se přečte hlavička
+        
+        Returns:
+            (šablona nebo None, přečtená hlavička nebo None)
+        """
+        header = None
+        if not ico:
+            header = self._read_header(image)
+            ico = extract_receipt_fields(self._layout_to_text(header[1])).get('ico') if header else None
+        return self.template_store.get(ico), header
+
+    def _extract_with_template(self, image: Image, template: ReceiptTemplate,
+                               header: Optional[Tuple[int, Dict]] = None) -> Optional[Tuple[str, Dict]]:
+        """
+        Extrakce podle šablony prodejce - OCR jen hlavičky a naučených pásů
+        
+        Přečte hlavičku (pokud ji volající ještě nečetl) a pásy s celkovou
+        částkou, datem a rekapitulací DPH. Výsledek musí projít kontrolou
+        (IČO, částka, DPH sedí na celkovou částku), jinak se vrátí None
+        a účtenka jde obecnou cestou.
+        
+        Returns:
+            (text, extrahovaná data) nebo None
+        """
+        settings = self.template_store.settings
+        unit = self.preprocess_settings.target_text_height
+        height = image.size[1]
+        header = header or self._read_header(image)
+        if header is None:
+            return None
+        header_end, header_layout = header
+        header_text = self._layout_to_text(header_layout)
+        
+        regions = template.stable_regions(settings)
+        bands = sorted(
+            region.band(height, unit, settings.margin)
+            for name, region in regions.items() if name != 'ico'
+        )
+        # Překrývající se pásy slouč a hlavičku už nečti znovu
+        merged: List[List[int]] = []
+        for y0, y1 in bands:
+            y0 = max(y0, header_end)
+            if y1 <= y0:
                 continue
+            if merged and y0 <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], y1)
+            else:
+                merged.append([y0, y1])
+        
+        try:
+            texts = [header_text] + [self._ocr_band(image, y0, y1) for y0, y1 in merged]
+        except Exception as e:
+            logger.warning(f"OCR pásů šablony selhalo: {str(e)}")
+            return None
         
-        if amounts:
-            # Vyber největší částku jako celkovou
-            data['total'] = max(amounts)
-            data['amounts'] = sorted(list(set(amounts)), reverse=True)
-            data['confidence'] += 0.2
-        
-        # Datum - různé formáty
-        date_patterns = [
-            r'(\d{1,2})[.\-/](\d{1,2})[.\-/](\d{4})',  # DD.MM.YYYY
-            r'(\d{4})[.\-/](\d{1,2})[.\-/](\d{1,2})',  # YYYY-MM-DD
-            r'(\d{1,2})[.\-/](\d{1,2})[.\-/](\d{2})',   # DD.MM.YY
-        ]
-        
-        for pattern in date_patterns:
-            matches = re.findall(pattern, text)
-            for match in matches:
-                formatted_date = self._format_date(match, pattern)
-                if formatted_date:
-                    data['date'] = formatted_date
-                    data['confidence'] += 0.1
-                    break
-            if 'date' in data:
-                break
-        
-        # Čas
-        time_match = re.search(r'(\d{1,2}):(\d{2})(?::(\d{2}))?', text)
-        if time_match:
-            data['time'] = f"{time_match.group(1)}:{time_match.group(2)}"
-            if time_match.group(3):
-                data['time'] += f":{time_match.group(3)}"
-        
-        # DPH informace
-        vat_patterns = [
-            r'DPH\s*(\d+)\s*%',
-            r'(\d+)\s*%\s*DPH',
-            r'sazba\s*(\d+)\s*%',
-            r'VAT\s*(\d+)\s*%'
-        ]
-        
-        vat_rates = []
-        for pattern in vat_patterns:
-            matches = re.findall(pattern, text, re.IGNORECASE)
-            vat_rates.extend([int(m) for m in matches if m.isdigit()])
-        
-        if vat_rates:
-            data['vat_rates'] = list(set(vat_rates))
-            if 21 in vat_rates:
-                data['vat_rate'] = 21
-            elif vat_rates:
-                data['vat_rate'] = max(vat_rates)  # Použij nejvyšší sazbu
-        
-        # Číslo dokladu
-        doc_patterns = [
-            r'(?:číslo|č\.?|doklad|účtenka|receipt)\s*[:\s#]*([A-Z0-9\-/]{3,})',
-            r'BL\s*[:\s]*([A-Z0-9\-/]{3,})',
-            r'PD\s*[:\s]*([A-Z0-9\-/]{3,})',
-            r'№\s*([A-Z0-9\-/]{3,})',
-        ]
-        
-        for pattern in doc_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                doc_num = match.group(1).strip()
-                if len(doc_num) >= 3:  # Minimální délka čísla dokladu
-                    data['document_number'] = doc_num
-                    data['confidence'] += 0.1
-                    break
-        
-        # Základní položky
-        items = self._extract_items(text)
-        if items:
-            data['items'] = items
-            data['confidence'] += 0.1
-        
-        return data
+        text = '\n'.join(texts)
+        data = extract_receipt_fields(text)
+        reason = validate_template_fields(data, extract_vat_breakdown(tokenize(text)), template, regions)
+        if reason:
+            self.template_store.record_failure(template.ico, reason)
+            return None
+        
+        self.template_store.record_hit(template.ico)
+        data['total_source'] = 'template'
+        data['template'] = True
+        logger.info(f"Účtenka {template.vendor or template.ico} přečtena podle šablony ({len(merged)} pásů)")
+        return text, data
 
-    def _extract_items(self, text: str) -> List[Dict]:
+    def _layout_to_text(self, layout: Dict) -> str:
         """
-        Pokusí se extrahovat jednotlivé položky z účtenky
+        Složí text z výstupu image_to_data - slova po řádcích, bloky oddělené prázdným řádkem
         """
-        items = []
-        lines = text.split('\n')
+        lines = []
+        current_key = None
+        current_words = []
         
-        for line in lines:
-            line = line.strip()
-            if len(line) < 3:
+        for i, word in enumerate(layout['text']):
+            if not word or not word.strip():
                 continue
-            
-            # Různé patterny pro položky
-            patterns = [
-                # Název ... cena Kč
-                r'^(.+?)\s+(\d+(?:[.,]\d{1,2})?)\s*(?:Kč|CZK|,-)\s*$',
-                # Název množství x jednotková_cena = celková_cena
-                r'^(.+?)\s+(\d+(?:[.,]\d{1,2})?)\s*x\s*(\d+(?:[.,]\d{1,2})?)\s*=?\s*(\d+(?:[.,]\d{1,2})?)',
-                # Název [tab/spaces] cena
-                r'^(.{5,}?)\s{3,}(\d+(?:[.,]\d{1,2})?)\s*$',
-            ]
-            
-            for i, pattern in enumerate(patterns):
-                match = re.match(pattern, line, re.IGNORECASE)
-                if match:
-                    try:
-                        description = match.group(1).strip()
-                        
-                        # Vyfiltruj evidentní nesmysly
-                        if (len(description) < 2 or 
-                            any(word in description.upper() for word in ['CELKEM', 'TOTAL', 'DPH', 'VAT', 'SUMA']) or
-                            description.isdigit()):
-                            break
-                        
-                        if i == 0:  # Název ... cena
-                            price = float(match.group(2).replace(',', '.'))
-                            if price > 0:
-                                items.append({
-                                    'description': description,
-                                    'price': price,
-                                    'quantity': 1
-                                })
-                                
-                        elif i == 1:  # Název množství x cena = celkem
-                            quantity = float(match.group(2).replace(',', '.'))
-                            unit_price = float(match.group(3).replace(',', '.'))
-                            total_price = float(match.group(4).replace(',', '.'))
-                            
-                            if all(x > 0 for x in [quantity, unit_price, total_price]):
-                                items.append({
-                                    'description': description,
-                                    'quantity': quantity,
-                                    'unit_price': unit_price,
-                                    'price': total_price
-                                })
-                                
-                        elif i == 2:  # Název [mezery] cena  
-                            price = float(match.group(2).replace(',', '.'))
-                            if price > 0:
-                                items.append({
-                                    'description': description,
-                                    'price': price,
-                                    'quantity': 1
-                                })
-                        
-                        break
-                        
-                    except (ValueError, IndexError):
+            key = (layout['block_num'][i], layout['par_num'][i], layout['line_num'][i])
+            if key != current_key:
+                if current_words:
+                    lines.append(' '.join(current_words))
+                if current_key is not None and key[0] != current_key[0]:
+                    lines.append('')
+                current_key = key
+                current_words = []
+            current_words.append(word.strip())
+        
+        if current_words:
+            lines.append(' '.join(current_words))
+        
+        return '\n'.join(lines)
+
+    def _find_total_line_box(self, layout: Dict) -> Optional[Tuple[int, int, int, int]]:
+        """
+        Najde řádek s K ÚHRADĚ / CELKEM a vrátí box (left, top, right, bottom)
+        části řádku za klíčovým slovem, kde je částka
+        """
+        lines: Dict[Tuple, List[int]] = {}
+        for i, word in enumerate(layout['text']):
+            if word and word.strip():
+                key = (layout['block_num'][i], layout['par_num'][i], layout['line_num'][i])
+                lines.setdefault(key, []).append(i)
+        
+        def normalize(word: str) -> str:
+            return strip_diacritics(word.upper()).strip(':.')
+        
+        # K ÚHRADĚ má přednost - CELKEM bývá i u mezisoučtů a rekapitulace DPH
+        for keyword in (('K', 'UHRADE'), ('CELKEM',)):
+            for indexes in lines.values():
+                words = [normalize(layout['text'][i]) for i in indexes]
+                for pos in range(len(words) - len(keyword) + 1):
+                    if tuple(words[pos:pos + len(keyword)]) != keyword:
                         continue
+                    amount_words = indexes[pos + len(keyword):]
+                    if not amount_words:
+                        continue
+                    keyword_end = max(layout['left'][i] + layout['width'][i]
+                                      for i in indexes[pos:pos + len(keyword)])
+                    return (
+                        keyword_end,
+                        min(layout['top'][i] for i in indexes),
+                        max(layout['left'][i] + layout['width'][i] for i in amount_words),
+                        max(layout['top'][i] + layout['height'][i] for i in indexes)
+                    )
         
-        # Seřaď podle ceny (nejvyšší první) a omeз na 10
-        items.sort(key=lambda x: x.get('price', 0), reverse=True)
-        return items[:10]
+        return None
 
-    def _format_date(self, match: Tuple, pattern: str) -> Optional[str]:
+    def _verify_total_from_line(self, image: Image, layout: Dict, data: Dict) -> None:
         """
-        Formátuje rozpoznané datum do standardního formátu
+        Přečte znovu jen oblast s celkovou částkou (psm 7 + whitelist číslic)
+
+        Přečtená částka přepíše heuristicky odhadnutý total jen tehdy, když
+        ji potvrdí první průchod (je mezi nalezenými částkami) nebo součet
+        položek. Jinak total zůstane a sníží se confidence - psm 7 na jednom
+        řádku umí splést desetinnou čárku nebo číslici.
         """
+        box = self._find_total_line_box(layout)
+        if not box:
+            return
+        
         try:
-            if 'YYYY' in pattern:  # YYYY-MM-DD formát
-                year, month, day = match
-                if len(year) == 4:
-                    date_obj = date(int(year), int(month), int(day))
-                else:
-                    return None
-            else:  # DD.MM.YYYY nebo DD.MM.YY formát
-                day, month, year = match
-                if len(year) == 2:
-                    # Rozpoznej století pro dvouciferný rok
-                    year_int = int(year)
-                    current_year = datetime.now().year
-                    if year_int <= (current_year % 100) + 5:  # Do 5 let dopředu = 20xx
-                        year = f"20{year}"
-                    else:
-                        year = f"19{year}"
-                
-                date_obj = date(int(year), int(month), int(day))
-            
-            return date_obj.strftime('%Y-%m-%d')
+            left, top, right, bottom = box
+            padding = max(4, (bottom - top) // 3)
+            crop = image.crop((
+                max(0, left - padding), max(0, top - padding),
+                min(image.width, right + padding), min(image.height, bottom + padding)
+            ))
+            if crop.height < 48:
+                factor = 48 / crop.height
+                crop = crop.resize((int(crop.width * factor), 48), Image.LANCZOS)
             
-        except (ValueError, TypeError):
-            return None
+            line_text = pytesseract.image_to_string(
+                crop,
+                config='--psm 7 -c tessedit_char_whitelist=0123456789,.'
+            )
+        except Exception as e:
+            logger.warning(f"Druhý průchod řádku CELKEM selhal: {str(e)}")
+            return
+        
+        matches = re.findall(r'\d+[.,]\d{2}', line_text.replace(' ', ''))
+        if not matches:
+            return
+        
+        total = float(matches[-1].replace(',', '.'))
+        if total <= 0:
+            return
+        
+        items = data.get('items') or []
+        confirmed = any(abs(amount - total) < 0.005 for amount in data.get('amounts', [])) or (
+            bool(items) and abs(sum(item.get('price', 0) for item in items) - total) <= ITEMS_SUM_TOLERANCE
+        )
+        if not confirmed and 'total' in data:
+            logger.info(
+                f"Řádek CELKEM: {total} nesouhlasí s prvním průchodem ani položkami, ponechávám {data['total']}"
+            )
+            data['confidence'] -= 0.1
+            return
+        
+        if 'total' not in data:
+            data['confidence'] += 0.2 if confirmed else 0.1
+        elif data['total'] != total:
+            logger.info(f"Řádek CELKEM: {total} (původně {data['total']})")
+        data['total'] = total
+        data['total_source'] = 'total_line'
+        data['amounts'] = sorted(set(data.get('amounts', [])) | {total}, reverse=True)
+
+    def _extract_receipt_data(self, text: str) -> Dict:
+        """
+        Inteligentní extrakce dat z OCR textu
+        
+        Text projde jednou předkompilovaný tokenizér (viz app.services.receipt_tokenizer),
+        pole se vybírají podle rozložení řádků.
+        """
+        return extract_receipt_fields(text)
 
     def _identify_vendor(self, text: str, ico: Optional[str] = None) -> Optional[str]:
         """
         Pokusí se identifikovat obchod podle IČO nebo názvu
         """
         # Nejdřív zkus podle IČO
-        if ico and ico in self.known_vendors:
-            return self.known_vendors[ico]
+        vendor = vendor_registry.by_ico(ico)
+        if vendor:
+            return vendor.short_name
         
-        # Potom podle klíčových slov v textu
-        text_upper = text.upper()
-        for keyword, vendor_name in self.vendor_keywords.items():
-            if keyword in text_upper:
-                return vendor_name
+        # Potom podle názvu - hlavička účtenky má přednost (položka "Rohlík" není Rohlík.cz)
+        header = '\n'.join(text.strip().split('\n')[:5])
+        match = vendor_registry.find_in_text(header) or vendor_registry.find_in_text(text)
+        if match:
+            return match[1].short_name
         
         return None
 
+    async def _complete_receipt_fields(self, extracted_data: Dict, ocr_text: str,
+                                       user_message: str = "") -> Tuple[Dict, Optional[Dict]]:
+        """
+        Doplní pole účtenky - AI se volá jen když pravidlová extrakce nestačí
+        
+        Pokud položky dávají celkovou částku, IČO má platný kontrolní součet
+        a patří známému prodejci, transakce vznikne bez volání Groq. Jinak
+        se zkráceným promptem doplní jen chybějící pole.
+        
+        Returns:
+            (výsledek, odpověď AI nebo None)
+        """
+        report = score_receipt_fields(extracted_data, ocr_text)
+        data = dict(extracted_data)
+        data['extraction_score'] = report.score
+        data['extraction_checks'] = report.checks
+        
+        if report.vendor:
+            data.setdefault('type', 'expense')
+            if report.vendor.category_code:
+                data['category'] = report.vendor.category_code
+                data['category_name'] = report.vendor.category_name
+            data['description'] = user_message.strip()[:50] or f"Nákup {report.vendor.short_name}"
+        
+        if report.confident:
+            logger.info(f"Pravidlová extrakce spolehlivá (skóre {report.score}) - AI přeskočena")
+            data['amount'] = float(data['total'])
+            data['amount_source'] = 'ocr'
+            data['ai_model'] = 'rules'
+            data['ai_confidence'] = report.score
+            return data, None
+        
+        ai_result = None
+        if self.ai_processor.client and (ocr_text or user_message):
+            try:
+                combined_text = f"{user_message}\n\nOCR text:\n{ocr_text}" if user_message else ocr_text
+                ai_result = await self.ai_processor.process_missing_fields(
+                    combined_text, report.missing, extracted_data
+                )
+                logger.info(f"AI doplnila pole {report.missing}: {bool(ai_result)}")
+            except Exception as e:
+                logger.warning(f"AI zpracování selhalo: {str(e)}")
+        
+        if ai_result:
+            for key in ('date', 'ico', 'vendor'):
+                if ai_result.get(key):
+                    data[key] = ai_result[key]
+        
+        return self._combine_ocr_and_ai_results(data, ai_result), ai_result
+
     def _combine_ocr_and_ai_results(self, ocr_data: Dict, ai_data: Optional[Dict]) -> Dict:
         """
         Kombinuje výsledky OCR a AI zpracování
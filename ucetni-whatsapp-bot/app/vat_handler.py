@@ -1,20 +1,36 @@
-from typing import Dict, Any, List, Optional, Tuple
+from typing import Dict, Any, Callable, List, Optional, Tuple
 from datetime import datetime, timedelta
+import asyncio
 import tempfile
 import os
 import logging
 from decimal import Decimal
 
 from utils.vat_calculator import VatCalculator, VatPeriodData
-from utils.vat_xml_generator import VatXmlGenerator
+from utils.vat_xml_generator import VatXmlGenerator, kh_documents
+from app.services.epo_schema import epo_schema_validator
+from app.services.vat_batch_export import export_file_paths
+from app.services.vat_period import load_export_checks, load_period_totals, write_kontrolni_hlaseni
 
 logger = logging.getLogger(__name__)
 
+
+def _default_session_factory():
+    from app.database.connection import db_manager
+    return db_manager.get_session() if db_manager.is_initialized else None
+
+
 class VatHandler:
     """Handler pro DPH funkcionalita"""
     
-    def __init__(self):
+    def __init__(self, session_factory: Optional[Callable[[], Any]] = _default_session_factory):
+        """
+        Args:
+            session_factory: Vrací async context manager se session, nebo None
+                bez databáze (pak se počítá z ukázkových transakcí)
+        """
         self.vat_calculator = VatCalculator()
+        self.session_factory = session_factory
     
     async def handle_vat_command(self, command: str, user_id: int, 
                                 user_settings: Dict[str, Any]) -> str:
@@ -57,13 +73,8 @@ class VatHandler:
         # Pro demo použijeme aktuální měsíc
         now = datetime.now()
         
-        # Mock data pro testování
-        mock_transactions = await self._get_mock_vat_transactions(user_id, now.month, now.year)
-        
         # Vypočítáme DPH za období
-        period_data = self.vat_calculator.calculate_period_vat(
-            mock_transactions, now.month, now.year
-        )
+        period_data = await self._load_period(user_id, now.month, now.year)
         
         # Naformátujeme souhrn
         summary = self.vat_calculator.format_vat_summary(period_data)
@@ -75,16 +86,32 @@ class VatHandler:
         
         now = datetime.now()
         
-        # Získáme data za aktuální období
-        mock_transactions = await self._get_mock_vat_transactions(user_id, now.month, now.year)
+        session_cm = self.session_factory() if self.session_factory else None
+        if session_cm is None:
+            return await self._export_period(None, user_id, user_settings, now.month, now.year)
         
-        period_data = self.vat_calculator.calculate_period_vat(
-            mock_transactions, now.month, now.year
-        )
+        async with session_cm as session:
+            return await self._export_period(session, user_id, user_settings, now.month, now.year)
+    
+    async def _export_period(self, session, user_id: int, user_settings: Dict[str, Any],
+                             month: int, year: int) -> str:
+        """
+        Validace a zápis DP3 a KH1 za období
         
-        # Validace před exportem
+        S databází se kontroly i řádky KH počítají v SQL a KH se zapisuje
+        proudově do souboru. Bez databáze (session None) ukázková data.
+        """
         xml_generator = VatXmlGenerator(user_settings)
-        validation = xml_generator.validate_before_export(period_data, mock_transactions)
+        
+        # Validace před exportem
+        if session is None:
+            transactions = await self._get_mock_vat_transactions(user_id, month, year)
+            period_data = self.vat_calculator.calculate_period_vat(transactions, month, year)
+            validation = xml_generator.validate_before_export(period_data, transactions)
+        else:
+            period_data = await load_period_totals(session, user_id, month, year)
+            checks = await load_export_checks(session, user_id, month, year)
+            validation = xml_generator.validate_period(period_data, **checks)
         
         if not validation['valid']:
             error_msg = "❌ *Nelze exportovat XML*\\n\\n"
@@ -94,16 +121,30 @@ class VatHandler:
                 error_msg += "\\n".join(validation['warnings'])
             return error_msg
         
+        file_paths = export_file_paths(user_id, month, year)
+        
         try:
-            # Generujeme XML soubory
-            dp3_xml = xml_generator.generate_dph_priznani(period_data)
-            kh1_xml = xml_generator.generate_kontrolni_hlaseni(period_data, mock_transactions)
+            # Generujeme XML soubory rovnou na disk
+            os.makedirs(os.path.dirname(file_paths['dp3']), exist_ok=True)
+            with open(file_paths['dp3'], 'w', encoding='utf-8') as out:
+                xml_generator.write_dph_priznani(out, period_data)
             
-            # Pro demo pouze simulujeme uložení souborů
-            file_paths = {
-                'dp3': f"dph_priznani_{now.month}_{now.year}.xml",
-                'kh1': f"kontrolni_hlaseni_{now.month}_{now.year}.xml"
-            }
+            with open(file_paths['kh1'], 'w', encoding='utf-8') as out:
+                if session is None:
+                    documents = [d for d in kh_documents(transactions) if d.reported_individually]
+                    xml_generator.write_kontrolni_hlaseni(out, period_data, documents)
+                else:
+                    await write_kontrolni_hlaseni(session, xml_generator, period_data, user_id, out)
+            
+            # Kontrola podle XSD EPO (zkompilovaná schémata, proudové čtení)
+            schema_errors = []
+            for document, key in (('DP3', 'dp3'), ('KH1', 'kh1')):
+                result = await asyncio.to_thread(epo_schema_validator.validate_file, file_paths[key], document)
+                if not result.valid:
+                    logger.error(f"{document} pro uživatele {user_id} neprošlo kontrolou XSD: {result.errors[:3]}")
+                    schema_errors.extend(f"• {document}: {error}" for error in result.errors[:3])
+            if schema_errors:
+                return "❌ *XML neprošlo kontrolou podle schématu EPO*\n\n" + "\n".join(schema_errors)
             
             # Generujeme souhrn pro uživatele
             summary = xml_generator.generate_export_summary(period_data, file_paths)
@@ -204,6 +245,21 @@ Napiš `/nastaveni` a změň DPH status.
 • Termín podání: do 25. dne následujícího měsíce
 • Nezapomeň zaplatit daň do konce měsíce"""
     
+    async def _load_period(self, user_id: int, month: int, year: int) -> VatPeriodData:
+        """
+        Souhrn DPH za období
+        
+        S databází čte průběžné součty (jeden řádek VatRecord),
+        bez databáze se použijí ukázková data.
+        """
+        session_cm = self.session_factory() if self.session_factory else None
+        if session_cm is None:
+            mock_transactions = await self._get_mock_vat_transactions(user_id, month, year)
+            return self.vat_calculator.calculate_period_vat(mock_transactions, month, year)
+        
+        async with session_cm as session:
+            return await load_period_totals(session, user_id, month, year)
+    
     async def _get_mock_vat_transactions(self, user_id: int, month: int, year: int) -> List[Dict[str, Any]]:
         """Generuje mock transakce pro testování"""
         
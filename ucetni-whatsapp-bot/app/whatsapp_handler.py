@@ -2,6 +2,8 @@ from app.ai_processor import AIProcessor
 # Database import removed - using new SQLAlchemy services
 from utils.twilio_client import TwilioClient
 from utils.currency_converter import CurrencyConverter
+from app.services.exchange_rates import exchange_rate_service
+from app.services.rate_history import rate_history
 import logging
 from typing import Dict, Any, Optional
 from datetime import datetime
@@ -12,7 +14,7 @@ class WhatsAppHandler:
     def __init__(self):
         self.ai_processor = AIProcessor()
         self.twilio_client = TwilioClient()
-        self.currency_converter = CurrencyConverter()
+        self.currency_converter = CurrencyConverter(exchange_rate_service, rate_history)
 
     async def process_transaction(self, message: str, user_id: int, user_number: str) -> str:
         try:
@@ -44,12 +46,13 @@ class WhatsAppHandler:
             czk_amount = transaction_data['amount']
             czk_formatted = self._format_currency(czk_amount)
             exchange_rate = transaction_data.get('exchange_rate', 1.0)
+            rate_date = transaction_data.get('conversion_date') or datetime.now()
             
             response = f"""✅ *Zaznamenal jsem {trans_type}*
 
 {emoji} *Typ:* {trans_type.capitalize()}
 💰 *Částka:* {original_formatted} ({czk_formatted} Kč)
-💱 *Kurz:* 1 {original_currency} = {exchange_rate:.2f} Kč (ČNB {datetime.now().strftime('%d.%m.%Y')})
+💱 *Kurz:* 1 {original_currency} = {exchange_rate:.2f} Kč (ČNB {rate_date.strftime('%d.%m.%Y')})
 📁 *Kategorie:* {transaction_data.get('category_name', 'Nezařazeno')}
 📝 *Popis:* {transaction_data.get('description', 'Bez popisu')}
 🔢 *ID transakce:* #{transaction_id}"""
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Převede peněžní sloupce transakcí, položek a VatRecord z NUMERIC(12,2)
+na BIGINT v celých haléřích (utils.money.MoneyType)
+
+Každý sloupec se převede jen jednou - hotové sloupce eviduje tabulka
+money_halere_migrations a celočíselné sloupce (tabulky vytvořené už
+s MoneyType) se přeskočí, opakované spuštění je bezpečné. Dokud převod
+neproběhne, init_database odmítne start aplikace.
+"""
+import asyncio
+import sys
+import os
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.database.connection import init_database, db_manager
+from app.database.money_columns import MIGRATIONS_TABLE, MONEY_COLUMNS, unconverted_money_columns
+from app.services.vat_period import reconcile_vat_totals
+from sqlalchemy import text
+
+async def convert_money_to_halere():
+    """NUMERIC(12,2) -> BIGINT haléřů pro všechny peněžní sloupce v CZK"""
+
+    # Inicializuj databázi - kontrola haléřů by start odmítla, převod ji teprve splní
+    await init_database(check_money=False)
+
+    print("🔧 ČÁSTKY V HALÉŘÍCH")
+    print("=" * 50)
+
+    async with db_manager.get_session() as db:
+        is_postgres = db.bind.dialect.name == 'postgresql'
+        await db.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {MIGRATIONS_TABLE} ("
+            "table_name VARCHAR(100) NOT NULL, column_name VARCHAR(100) NOT NULL, "
+            "migrated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, PRIMARY KEY (table_name, column_name))"
+        ))
+        await db.commit()
+        # Zapsané v tabulce převodů nebo už celočíselné (tabulka vytvořená novým kódem)
+        connection = await db.connection()
+        pending = set(await connection.run_sync(unconverted_money_columns))
+        await db.commit()
+
+        for table, columns in MONEY_COLUMNS.items():
+            for column in columns:
+                if (table, column) not in pending:
+                    print(f"⏭️  {table}.{column} už je v haléřích")
+                    continue
+
+                if is_postgres:
+                    # Převod a změna typu v jednom kroku
+                    statement = (f"ALTER TABLE {table} ALTER COLUMN {column} TYPE BIGINT "
+                                 f"USING ROUND({column} * 100)::bigint")
+                else:
+                    # SQLite typ sloupce nemění - NUMERIC afinita celá čísla uloží jako INTEGER
+                    statement = (f"UPDATE {table} SET {column} = CAST(ROUND({column} * 100) AS INTEGER) "
+                                 f"WHERE {column} IS NOT NULL")
+                try:
+                    await db.execute(text(statement))
+                    await db.execute(
+                        text(f"INSERT INTO {MIGRATIONS_TABLE} (table_name, column_name) VALUES (:t, :c)"),
+                        {'t': table, 'c': column}
+                    )
+                    await db.commit()
+                    print(f"✅ {table}.{column}")
+                except Exception as e:
+                    await db.rollback()
+                    print(f"❌ Error: {table}.{column} - {e}")
+                    return
+
+        # Průběžné součty musí po převodu sedět na haléř
+        drift = await reconcile_vat_totals(db)
+        if drift:
+            print(f"⚠️  {len(drift)} rozdílů v součtech DPH - spusťte scripts/reconcile_vat_totals.py --fix")
+        else:
+            print("✅ Součty DPH sedí")
+
+    # Uzavři databázové spojení
+    from app.database.connection import close_database
+    await close_database()
+
+if __name__ == "__main__":
+    asyncio.run(convert_money_to_halere())
@@ -0,0 +1,52 @@
+"""money_in_halere
+
+Peněžní sloupce z Float na BIGINT v celých haléřích (utils.money.MoneyType)
+
+Revision ID: 3b7e51c0a9d2
+Revises: 6d9c1f22dac9
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b7e51c0a9d2'
+down_revision: Union[str, None] = '6d9c1f22dac9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+MONEY_COLUMNS = {
+    'users': ['current_year_revenue', 'last_12_months_revenue'],
+    'transactions': ['amount', 'vat_amount', 'amount_without_vat'],
+    'transaction_items': ['unit_price', 'total_without_vat', 'vat_amount', 'total_with_vat'],
+    'vat_records': [
+        'input_vat_base_21', 'input_vat_21', 'input_vat_base_12', 'input_vat_12',
+        'input_vat_base_10', 'input_vat_10',
+        'output_vat_base_21', 'output_vat_21', 'output_vat_base_12', 'output_vat_12',
+        'output_vat_base_10', 'output_vat_10',
+        'vat_liability', 'vat_refund',
+    ],
+}
+
+
+def upgrade() -> None:
+    for table, columns in MONEY_COLUMNS.items():
+        for column in columns:
+            op.execute(f"UPDATE {table} SET {column} = ROUND({column} * 100) WHERE {column} IS NOT NULL")
+        with op.batch_alter_table(table) as batch_op:
+            for column in columns:
+                batch_op.alter_column(column, existing_type=sa.Float(), type_=sa.BigInteger(),
+                                      postgresql_using=f"{column}::bigint")
+
+
+def downgrade() -> None:
+    for table, columns in MONEY_COLUMNS.items():
+        with op.batch_alter_table(table) as batch_op:
+            for column in columns:
+                batch_op.alter_column(column, existing_type=sa.BigInteger(), type_=sa.Float())
+        for column in columns:
+            op.execute(f"UPDATE {table} SET {column} = {column} / 100.0 WHERE {column} IS NOT NULL")
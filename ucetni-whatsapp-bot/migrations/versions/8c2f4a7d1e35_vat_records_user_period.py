@@ -0,0 +1,31 @@
+"""vat_records_user_period
+
+Unikátní ix_vat_records_user_period - průběžné součty DPH
+(app/database/vat_totals.py) přičítají přes ON CONFLICT na tyto sloupce
+
+Revision ID: 8c2f4a7d1e35
+Revises: 3b7e51c0a9d2
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c2f4a7d1e35'
+down_revision: Union[str, None] = '3b7e51c0a9d2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Selže na duplicitních obdobích - ty je potřeba nejdřív sloučit
+    # (součty pak dorovná scripts/reconcile_vat_totals.py --fix)
+    op.create_index('ix_vat_records_user_period', 'vat_records',
+                    ['user_id', 'period_year', 'period_month'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_vat_records_user_period', table_name='vat_records')
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Benchmark vyhledávání v offline indexu ARES
+
+Změří čas dotazu podle IČO (nalezené i chybějící IČO), hledání podle
+začátku názvu a celé AresService.validate_ico nad indexem (µs na dotaz).
+Bez zadaného indexu si vygeneruje syntetický export s --generate subjekty.
+
+Použití:
+    python scripts/benchmark_ares_index.py --index app/data/ares_index.sqlite
+    python scripts/benchmark_ares_index.py --generate 500000 --count 50000
+"""
+import argparse
+import asyncio
+import gzip
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services import ares_service as ares_service_module
+from app.services.ares_index import AresIndex, build_index
+from app.services.ares_service import AresService
+
+NAME_WORDS = ["Alfa", "Beta", "Stavby", "Obchod", "Servis", "Doprava", "Elektro", "Potraviny", "Česká", "Morava"]
+LEGAL_FORMS = ["s.r.o.", "a.s.", "v.o.s.", ""]
+
+
+def ico_with_check_digit(prefix: int) -> str:
+    digits = f"{prefix:07d}"
+    remainder = sum(int(digits[i]) * (8 - i) for i in range(7)) % 11
+    return digits + str((11 - remainder) % 10 if remainder else 1)
+
+
+def generate_export(path: Path, count: int) -> None:
+    """Syntetický gzip CSV ve tvaru hromadného exportu"""
+    rng = random.Random(42)
+    with gzip.open(path, 'wt', encoding='utf-8', newline='') as out:
+        out.write("ICO;FIRMA;FORMA;ULICE_TEXT;CDOM;OBEC_TEXT;PSC;DDATVZN;DDATZAN\n")
+        for i in range(count):
+            name = f"{rng.choice(NAME_WORDS)} {rng.choice(NAME_WORDS)} {i} {rng.choice(LEGAL_FORMS)}".strip()
+            out.write(f"{ico_with_check_digit(i * 3 + 1)};{name};112;Hlavní;{i % 999 + 1};Praha;11000;2010-01-01;\n")
+
+
+def measure(func, args: list) -> float:
+    """Průměrný čas v µs na jedno volání"""
+    started = time.perf_counter()
+    for arg in args:
+        func(arg)
+    return (time.perf_counter() - started) / len(args) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark offline indexu ARES")
+    parser.add_argument("--index", type=Path, help="Existující soubor indexu")
+    parser.add_argument("--generate", type=int, default=200000, help="Počet syntetických subjektů bez --index")
+    parser.add_argument("--count", type=int, default=20000, help="Počet dotazů")
+    args = parser.parse_args()
+
+    workdir = None
+    index_path = args.index
+    if index_path is None:
+        workdir = tempfile.TemporaryDirectory(prefix='ares_bench_')
+        export = Path(workdir.name) / "export.csv.gz"
+        generate_export(export, args.generate)
+        stats = build_index(export, Path(workdir.name) / "ares_index.sqlite")
+        index_path = Path(stats['path'])
+        print(f"📦 Syntetický index: {stats['records']:,} subjektů, "
+              f"{stats['size_mb']} MB za {stats['elapsed_s']} s")
+    elif not index_path.exists():
+        print(f"❌ Index {index_path} neexistuje")
+        return 1
+
+    index = AresIndex(index_path)
+    conn = index._connection()
+    total = conn.execute("SELECT COUNT(*) FROM subjects").fetchone()[0]
+    rng = random.Random(7)
+    offsets = sorted(rng.randrange(total) for _ in range(min(args.count, total)))
+    hits = [conn.execute("SELECT ico FROM subjects LIMIT 1 OFFSET ?", (offset,)).fetchone()[0] for offset in offsets]
+    rng.shuffle(hits)
+    misses = [f"{rng.randrange(10 ** 8):08d}" for _ in range(args.count)]
+    prefixes = [index.lookup(ico).name[:4] for ico in hits[:2000]]
+
+    print(f"🔎 Dotazů: {len(hits):,} nad {total:,} subjekty")
+    print(f"⚡ IČO nalezeno:  {measure(index.lookup, hits):8.1f} µs / dotaz")
+    print(f"⚡ IČO chybí:     {measure(index.lookup, misses):8.1f} µs / dotaz")
+    print(f"⚡ Prefix názvu:  {measure(lambda p: index.search_name(p, 10), prefixes):8.1f} µs / dotaz")
+
+    # Celá cesta AresService - kontrolní součet, index, tvar výsledku
+    ares_service_module.ares_index = index
+    service = AresService()
+
+    async def validate_all():
+        started = time.perf_counter()
+        for ico in hits:
+            await service.validate_ico(ico)
+        return (time.perf_counter() - started) / len(hits) * 1e6
+
+    print(f"⚡ validate_ico:  {asyncio.run(validate_all()):8.1f} µs / dotaz")
+
+    if workdir:
+        workdir.cleanup()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
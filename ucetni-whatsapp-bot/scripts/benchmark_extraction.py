@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark extrakce polí z OCR textu
+
+Změří čas tokenizéru a extrakce (µs na účtenku) a přesnost jednotlivých
+polí nad korpusem OCR textů. Korpus je adresář s .txt soubory
+a expected.json s očekávanými hodnotami (výchozí: tests/data/ocr_texts).
+
+Použití:
+    python scripts/benchmark_extraction.py
+    python scripts/benchmark_extraction.py ~/ocr_dumps --repeat 2000
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services.receipt_tokenizer import extract_receipt_fields, tokenize
+
+DEFAULT_CORPUS = Path(__file__).resolve().parent.parent / "tests" / "data" / "ocr_texts"
+
+
+def field_value(data: dict, field: str):
+    if field == 'items':
+        return len(data.get('items', []))
+    return data.get(field)
+
+
+def measure(func, texts: list, repeat: int) -> float:
+    """Průměrný čas v µs na jeden text"""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for text in texts:
+            func(text)
+    return (time.perf_counter() - started) / (repeat * len(texts)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark extrakce polí z OCR textu")
+    parser.add_argument("corpus", type=Path, nargs="?", default=DEFAULT_CORPUS, help="Adresář s OCR texty")
+    parser.add_argument("--repeat", type=int, default=500, help="Počet opakování korpusu")
+    args = parser.parse_args()
+
+    expected_path = args.corpus / "expected.json"
+    expected = json.loads(expected_path.read_text(encoding='utf-8')) if expected_path.exists() else {}
+    texts = {path.name: path.read_text(encoding='utf-8') for path in sorted(args.corpus.glob("*.txt"))}
+    if not texts:
+        print(f"❌ V {args.corpus} nejsou žádné OCR texty")
+        return 1
+
+    print(f"📄 Korpus: {len(texts)} textů, {sum(t.count(chr(10)) + 1 for t in texts.values())} řádků")
+    print(f"⚡ Tokenizace:  {measure(tokenize, list(texts.values()), args.repeat):8.1f} µs / účtenka")
+    print(f"⚡ Extrakce:    {measure(extract_receipt_fields, list(texts.values()), args.repeat):8.1f} µs / účtenka")
+
+    hits, totals, misses = {}, {}, []
+    for name, fields in expected.items():
+        if name not in texts:
+            continue
+        data = extract_receipt_fields(texts[name])
+        for field, value in fields.items():
+            totals[field] = totals.get(field, 0) + 1
+            if field_value(data, field) == value:
+                hits[field] = hits.get(field, 0) + 1
+            else:
+                misses.append(f"{name}: {field} očekáváno {value!r}, nalezeno {field_value(data, field)!r}")
+
+    if totals:
+        print("\n🎯 Přesnost:")
+        for field in sorted(totals):
+            print(f"  {field:<16} {hits.get(field, 0)}/{totals[field]}")
+        for miss in misses:
+            print(f"  ❌ {miss}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Benchmark souhrnů s částkami v haléřích: Decimal vs. Money vs. SQL SUM
+
+Naplní dočasnou SQLite databázi (--users × --per-user transakcí
+rozložených do jednoho roku) a pro měsíční souhrn příjmů/výdajů změří:
+  - původní cestu: načtení řádků a součet přes Decimal(str(float(...))),
+  - načtení řádků a součet Money (sčítání celých haléřů),
+  - celočíselný SUM v databázi (utils.money.money_sum, GROUP BY type).
+Pro souhrn DPH za období porovná smyčku VatCalculator.calculate_period_vat
+s agregací v databázi. Všechny cesty musí dát stejný výsledek na haléř.
+
+Použití:
+    python scripts/benchmark_money_summary.py
+    python scripts/benchmark_money_summary.py --users 3 --per-user 100000 --repeat 5
+"""
+import argparse
+import asyncio
+import sys
+import tempfile
+import time
+from decimal import Decimal
+from pathlib import Path
+
+from sqlalchemy import and_, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.database.models import Transaction
+from app.services.vat_period import load_period_vat, period_bounds
+from scripts.benchmark_vat_period import YEAR, load_as_dicts, seed, timed
+from utils.money import ZERO, money_sum
+from utils.vat_calculator import VatCalculator
+
+
+def month_filter(user_id: int, month: int):
+    start, end = period_bounds(month, YEAR)
+    return and_(
+        Transaction.user_id == user_id,
+        Transaction.transaction_date >= start,
+        Transaction.transaction_date < end,
+    )
+
+
+async def run(args) -> int:
+    workdir = tempfile.TemporaryDirectory(prefix='money_bench_')
+    engine = create_async_engine(f"sqlite+aiosqlite:///{Path(workdir.name) / 'bench.db'}")
+    started = time.perf_counter()
+    await seed(engine, args.users, args.per_user)
+    print(f"📦 {args.users} × {args.per_user:,} transakcí naplněno za {time.perf_counter() - started:.1f} s")
+
+    maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    calculator = VatCalculator()
+    user_id = 1
+    mismatches = 0
+    try:
+        async with maker() as session:
+            async def fetch_rows():
+                return (await session.execute(
+                    select(Transaction.type, Transaction.amount_czk).where(month_filter(user_id, args.month))
+                )).all()
+
+            rows = await fetch_rows()
+
+            async def decimal_sum():
+                totals = {'income': Decimal('0'), 'expense': Decimal('0')}
+                for row in await fetch_rows():
+                    totals[row.type] += Decimal(str(float(row.amount_czk)))
+                return totals
+
+            async def money_python_sum():
+                totals = {'income': ZERO, 'expense': ZERO}
+                for row in await fetch_rows():
+                    totals[row.type] += row.amount_czk
+                return totals
+
+            async def sql_sum():
+                result = await session.execute(
+                    select(Transaction.type, money_sum(Transaction.amount_czk))
+                    .where(month_filter(user_id, args.month))
+                    .group_by(Transaction.type)
+                )
+                return dict(result.all())
+
+            decimal_ms, from_decimal = await timed(args.repeat, decimal_sum)
+            money_ms, from_money = await timed(args.repeat, money_python_sum)
+            sql_ms, from_sql = await timed(args.repeat, sql_sum)
+
+            for kind in ('income', 'expense'):
+                if not from_decimal[kind] == from_money[kind] == from_sql[kind]:
+                    mismatches += 1
+                    print(f"⚠️  {kind}: Decimal {from_decimal[kind]} / Money {from_money[kind]} "
+                          f"/ SQL {from_sql[kind]}")
+
+            async def vat_loop():
+                return calculator.calculate_period_vat(await load_as_dicts(session, user_id), args.month, YEAR)
+
+            async def vat_sql():
+                return await load_period_vat(session, user_id, args.month, YEAR)
+
+            vat_loop_ms, from_loop = await timed(args.repeat, vat_loop)
+            vat_sql_ms, from_vat_sql = await timed(args.repeat, vat_sql)
+            if from_loop.vat_liability != from_vat_sql.vat_liability:
+                mismatches += 1
+                print(f"⚠️  daň: smyčka {from_loop.vat_liability} ≠ SQL {from_vat_sql.vat_liability}")
+    finally:
+        await engine.dispose()
+        workdir.cleanup()
+
+    print(f"📅 Měsíční souhrn {args.month}/{YEAR} ({len(rows):,} transakcí)")
+    print(f"🐢 Načtení + Decimal:  {decimal_ms:9.2f} ms")
+    print(f"🔁 Načtení + Money:    {money_ms:9.2f} ms  ({decimal_ms / money_ms:.1f}× rychlejší)")
+    print(f"⚡ SQL SUM haléřů:     {sql_ms:9.2f} ms  ({decimal_ms / sql_ms:.1f}× rychlejší)")
+    print(f"💰 Příjmy {from_sql.get('income', ZERO):,.2f} Kč, výdaje {from_sql.get('expense', ZERO):,.2f} Kč")
+    print(f"🧾 DPH načtení+smyčka: {vat_loop_ms:9.2f} ms")
+    print(f"⚡ DPH SQL GROUP BY:   {vat_sql_ms:9.2f} ms  ({vat_loop_ms / vat_sql_ms:.0f}× rychlejší)")
+    if mismatches:
+        print(f"❌ Výsledky se liší v {mismatches} souhrnech")
+        return 1
+    print("✅ Všechny cesty se shodují na haléř")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark souhrnů s částkami v haléřích")
+    parser.add_argument("--users", type=int, default=1, help="Počet uživatelů")
+    parser.add_argument("--per-user", type=int, default=100000, help="Transakcí na uživatele")
+    parser.add_argument("--month", type=int, default=6, help="Měsíc souhrnu")
+    parser.add_argument("--repeat", type=int, default=3, help="Počet opakování měření")
+    args = parser.parse_args()
+
+    return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Benchmark předzpracování obrázků pro OCR
+
+Porovná latenci a přesnost extrakce polí pro různá nastavení pipeline
+nad lokálním korpusem účtenek. Korpus je adresář s obrázky; ke každému
+obrázku může ležet stejnojmenný .json s očekávanými hodnotami, např.:
+
+    uctenka_lidl.jpg
+    uctenka_lidl.json   {"total": 254.9, "ico": "26178541", "date": "2024-03-15"}
+
+Použití:
+    python scripts/benchmark_ocr.py ~/receipts
+    python scripts/benchmark_ocr.py ~/receipts --no-ocr     # jen latence předzpracování
+"""
+import argparse
+import io
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from app.services.image_preprocessing import PreprocessSettings, preprocess_for_ocr
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.bmp', '.tiff'}
+CHECKED_FIELDS = ('total', 'ico', 'dic', 'date')
+
+# Porovnávaná nastavení - 'legacy' je původní pipeline na plném rozlišení
+SETTINGS = {
+    'legacy': None,
+    'text-24': PreprocessSettings(target_text_height=24),
+    'text-32': PreprocessSettings(target_text_height=32),
+    'text-40': PreprocessSettings(target_text_height=40),
+    'dpi-300': PreprocessSettings(target_dpi=300),
+    'text-32-no-deskew': PreprocessSettings(target_text_height=32, deskew=False),
+    'text-32-otsu': PreprocessSettings(target_text_height=32, adaptive_threshold=False),
+    'text-32-no-crop': PreprocessSettings(target_text_height=32, crop_receipt=False),
+}
+
+
+def legacy_preprocess(image: Image.Image) -> Image.Image:
+    """Původní preprocessing (denoise + equalizace + Otsu na plném rozlišení)"""
+    img_array = np.array(image.convert('RGB'))
+    gray = cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY)
+    denoised = cv2.fastNlMeansDenoising(gray)
+    enhanced = cv2.equalizeHist(denoised)
+    _, binary = cv2.threshold(enhanced, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    return Image.fromarray(binary)
+
+
+def load_corpus(corpus_dir: Path) -> list:
+    """Načte obrázky korpusu jako bytes spolu s očekávanými hodnotami"""
+    samples = []
+    for path in sorted(corpus_dir.iterdir()):
+        if path.suffix.lower() not in IMAGE_EXTENSIONS:
+            continue
+        expected_path = path.with_suffix('.json')
+        expected = json.loads(expected_path.read_text(encoding='utf-8')) if expected_path.exists() else {}
+        samples.append((path.name, path.read_bytes(), expected))
+    return samples
+
+
+def field_matches(field: str, expected, actual) -> bool:
+    if actual is None:
+        return False
+    if field == 'total':
+        return abs(float(expected) - float(actual)) < 0.01
+    return str(expected).strip().upper() == str(actual).strip().upper()
+
+
+def run_setting(name: str, settings, samples: list, run_ocr: bool, extractor) -> dict:
+    preprocess_ms, ocr_ms = [], []
+    hits = {field: 0 for field in CHECKED_FIELDS}
+    totals = {field: 0 for field in CHECKED_FIELDS}
+
+    for _, data, expected in samples:
+        image = Image.open(io.BytesIO(data))
+
+        started = time.perf_counter()
+        processed = legacy_preprocess(image) if settings is None else preprocess_for_ocr(image, settings).image
+        preprocess_ms.append((time.perf_counter() - started) * 1000)
+
+        if not run_ocr:
+            continue
+
+        import pytesseract
+        started = time.perf_counter()
+        text = pytesseract.image_to_string(processed, lang='ces+eng', config='--psm 4')
+        ocr_ms.append((time.perf_counter() - started) * 1000)
+
+        extracted = extractor(text)
+        for field in CHECKED_FIELDS:
+            if field in expected:
+                totals[field] += 1
+                if field_matches(field, expected[field], extracted.get(field)):
+                    hits[field] += 1
+
+    return {
+        'name': name,
+        'preprocess_ms': statistics.median(preprocess_ms) if preprocess_ms else 0.0,
+        'ocr_ms': statistics.median(ocr_ms) if ocr_ms else 0.0,
+        'accuracy': {field: hits[field] / totals[field] for field in CHECKED_FIELDS if totals[field]},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark předzpracování obrázků pro OCR")
+    parser.add_argument("corpus", type=Path, help="Adresář s obrázky účtenek")
+    parser.add_argument("--no-ocr", action="store_true", help="Měřit jen předzpracování bez Tesseractu")
+    parser.add_argument("--only", nargs="*", choices=list(SETTINGS), help="Spustit jen vybraná nastavení")
+    args = parser.parse_args()
+
+    samples = load_corpus(args.corpus)
+    if not samples:
+        print(f"❌ V {args.corpus} nejsou žádné obrázky")
+        return 1
+
+    extractor = None
+    if not args.no_ocr:
+        from app.services.whatsapp_ocr_service import whatsapp_ocr_service
+        extractor = whatsapp_ocr_service._extract_receipt_data
+
+    print(f"📸 Korpus: {len(samples)} obrázků")
+    print(f"{'nastavení':<20} {'prep ms':>9} {'ocr ms':>9}  přesnost")
+    print("-" * 70)
+
+    for name, settings in SETTINGS.items():
+        if args.only and name not in args.only:
+            continue
+        result = run_setting(name, settings, samples, not args.no_ocr, extractor)
+        accuracy = ", ".join(f"{field} {value:.0%}" for field, value in result['accuracy'].items()) or "-"
+        print(f"{result['name']:<20} {result['preprocess_ms']:>9.1f} {result['ocr_ms']:>9.1f}  {accuracy}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Benchmark souhrnu DPH za období: Python smyčka vs. SQL GROUP BY
+
+Naplní dočasnou SQLite databázi (--users × --per-user transakcí
+rozložených do jednoho roku) a změří:
+  - smyčku VatCalculator.calculate_period_vat včetně načtení transakcí,
+  - samotnou smyčku nad už načtenými slovníky,
+  - agregaci v databázi (app.services.vat_period.load_period_vat).
+Výsledky obou cest porovná.
+
+Použití:
+    python scripts/benchmark_vat_period.py
+    python scripts/benchmark_vat_period.py --users 3 --per-user 100000 --repeat 5
+"""
+import argparse
+import asyncio
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.database.models import Transaction, User
+from app.services.vat_period import load_period_vat
+from utils.vat_calculator import VatCalculator
+
+YEAR = 2025
+BATCH = 10000
+
+
+def generate_rows(user_id: int, count: int, rng: random.Random):
+    start = datetime(YEAR, 1, 1)
+    for _ in range(count):
+        rate = rng.choice((21, 21, 21, 12, 0))
+        base = Decimal(rng.randrange(100, 5000000)) / 100
+        vat = (base * rate / 100).quantize(Decimal('0.01'))
+        yield {
+            'user_id': user_id,
+            'type': rng.choice(('income', 'expense')),
+            'original_message': 'benchmark',
+            'amount_czk': base + vat,
+            'vat_rate': rate,
+            'vat_base': base,
+            'vat_amount': vat,
+            'transaction_date': start + timedelta(seconds=rng.randrange(365 * 24 * 3600)),
+        }
+
+
+async def seed(engine, users: int, per_user: int) -> None:
+    rng = random.Random(42)
+    async with engine.begin() as conn:
+        for model in (User, Transaction):
+            await conn.run_sync(model.__table__.create)
+        await conn.execute(insert(User.__table__), [
+            {'id': user_id, 'whatsapp_number': f'+420600{user_id:06d}'} for user_id in range(1, users + 1)
+        ])
+        for user_id in range(1, users + 1):
+            rows = []
+            for row in generate_rows(user_id, per_user, rng):
+                rows.append(row)
+                if len(rows) == BATCH:
+                    await conn.execute(insert(Transaction.__table__), rows)
+                    rows = []
+            if rows:
+                await conn.execute(insert(Transaction.__table__), rows)
+
+
+async def load_as_dicts(session, user_id: int):
+    """Co potřebuje smyčka: všechny transakce uživatele jako slovníky"""
+    result = await session.execute(
+        select(Transaction.type, Transaction.vat_rate, Transaction.vat_base,
+               Transaction.vat_amount, Transaction.transaction_date)
+        .where(Transaction.user_id == user_id)
+    )
+    return [
+        {
+            'type': row.type,
+            'created_at': row.transaction_date,
+            'vat_info': {'base': row.vat_base, 'vat': row.vat_amount, 'rate': row.vat_rate},
+        }
+        for row in result
+    ]
+
+
+async def timed(repeat: int, func):
+    """Nejlepší čas z opakování v ms a poslední výsledek"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = await func()
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+async def run(args) -> int:
+    workdir = tempfile.TemporaryDirectory(prefix='vat_bench_')
+    engine = create_async_engine(f"sqlite+aiosqlite:///{Path(workdir.name) / 'bench.db'}")
+    started = time.perf_counter()
+    await seed(engine, args.users, args.per_user)
+    print(f"📦 {args.users} × {args.per_user:,} transakcí naplněno za {time.perf_counter() - started:.1f} s")
+
+    maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    calculator = VatCalculator()
+    mismatches = 0
+    try:
+        async with maker() as session:
+            user_id = 1
+            dicts = await load_as_dicts(session, user_id)
+
+            async def loop_with_fetch():
+                return calculator.calculate_period_vat(await load_as_dicts(session, user_id), args.month, YEAR)
+
+            async def loop_only():
+                return calculator.calculate_period_vat(dicts, args.month, YEAR)
+
+            async def sql():
+                return await load_period_vat(session, user_id, args.month, YEAR)
+
+            loop_fetch_ms, from_loop = await timed(args.repeat, loop_with_fetch)
+            loop_ms, _ = await timed(args.repeat, loop_only)
+            sql_ms, from_sql = await timed(args.repeat, sql)
+
+            for name in ('output_base_21', 'output_vat_21', 'output_base_12', 'output_vat_12', 'output_base_0',
+                         'input_base_21', 'input_vat_21', 'input_base_12', 'input_vat_12', 'input_base_0'):
+                if getattr(from_loop, name) != getattr(from_sql, name):
+                    mismatches += 1
+                    print(f"⚠️  {name}: smyčka {getattr(from_loop, name)} ≠ SQL {getattr(from_sql, name)}")
+    finally:
+        await engine.dispose()
+        workdir.cleanup()
+
+    print(f"🔁 Načtení + smyčka: {loop_fetch_ms:9.1f} ms")
+    print(f"🔁 Jen smyčka:       {loop_ms:9.1f} ms")
+    print(f"⚡ SQL GROUP BY:     {sql_ms:9.1f} ms  ({loop_fetch_ms / sql_ms:.0f}× rychlejší)")
+    print(f"💰 Daň za {args.month}/{YEAR}: {from_sql.vat_liability:,.2f} Kč")
+    if mismatches:
+        print(f"❌ Výsledky se liší v {mismatches} řádcích")
+        return 1
+    print("✅ Výsledky smyčky a SQL se shodují")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark souhrnu DPH za období")
+    parser.add_argument("--users", type=int, default=3, help="Počet uživatelů")
+    parser.add_argument("--per-user", type=int, default=100000, help="Transakcí na uživatele")
+    parser.add_argument("--month", type=int, default=6, help="Měsíc souhrnu")
+    parser.add_argument("--repeat", type=int, default=3, help="Počet opakování měření")
+    args = parser.parse_args()
+
+    return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
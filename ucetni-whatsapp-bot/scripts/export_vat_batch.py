@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Hromadný export DP3 a KH1 všem měsíčním plátcům DPH
+
+Spouštět k termínu podání (cron, např. 1. den v měsíci) - bez --month
+exportuje předchozí měsíc. XML se generuje a kontroluje podle XSD v poolu
+procesů, každý hotový uživatel dostane řádek v ExportHistory a zprávu
+na WhatsApp. Přerušený běh stačí spustit znovu: pokračuje podle
+checkpointu (batch_<rok>_<měsíc>.json ve VAT_EXPORT_DIR).
+
+Použití:
+    python scripts/export_vat_batch.py
+    python scripts/export_vat_batch.py --month 3 --year 2025 --workers 8
+    python scripts/export_vat_batch.py --restart --no-notify
+"""
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.database.connection import db_manager
+from app.services.vat_batch_export import VatBatchExporter, previous_period, whatsapp_notifier
+
+
+async def run(args) -> int:
+    db_manager.initialize(args.database_url)
+    month, year = previous_period()
+    month, year = args.month or month, args.year or year
+
+    exporter = VatBatchExporter(
+        db_manager.get_session, workers=args.workers,
+        notifier=None if args.no_notify else whatsapp_notifier,
+        checkpoint_path=args.checkpoint
+    )
+    try:
+        report = await exporter.run(month, year, resume=not args.restart)
+    finally:
+        await db_manager.close()
+
+    print(report.format())
+    return 1 if report.failed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hromadný export DPH k termínu podání")
+    parser.add_argument("--month", type=int, help="Měsíc (výchozí: předchozí)")
+    parser.add_argument("--year", type=int, help="Rok (výchozí: rok předchozího měsíce)")
+    parser.add_argument("--workers", type=int, help="Počet procesů (výchozí: počet CPU)")
+    parser.add_argument("--checkpoint", type=Path, help="Soubor checkpointu (výchozí: ve VAT_EXPORT_DIR)")
+    parser.add_argument("--restart", action="store_true", help="Ignorovat checkpoint a exportovat všechny znovu")
+    parser.add_argument("--no-notify", action="store_true", help="Neposílat uživatelům zprávy")
+    parser.add_argument("--database-url", help="Connection string (výchozí: DATABASE_URL)")
+    args = parser.parse_args()
+
+    return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Stažení XSD schémat EPO pro DP3 a KH1
+
+Stáhne oficiální schémata přiznání DPH a kontrolního hlášení (i s importy)
+do EPO_XSD_DIR a ověří, že jdou zkompilovat. Spouští se při buildu
+(Dockerfile) - při jakékoliv chybě končí kódem 1 a stávající schémata
+nechá být. Po změně struktury na EPO stačí spustit znovu.
+
+Použití:
+    python scripts/fetch_epo_xsd.py
+    python scripts/fetch_epo_xsd.py --dir /app/data/epo_xsd --url https://.../xsd/
+"""
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services.epo_schema import LXML_AVAILABLE, SchemaFetchError, fetch_schemas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stažení XSD schémat EPO")
+    parser.add_argument("--dir", type=Path, help="Cílový adresář (výchozí: EPO_XSD_DIR)")
+    parser.add_argument("--url", help="Adresa adresáře se schématy (výchozí: EPO_XSD_URL nebo EPO)")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Timeout jednoho stažení v sekundách")
+    args = parser.parse_args()
+
+    try:
+        written = fetch_schemas(args.dir, args.url, timeout=args.timeout)
+    except SchemaFetchError as e:
+        print(f"❌ Schémata EPO se nepodařilo stáhnout: {str(e)}", file=sys.stderr)
+        return 1
+
+    for path in written:
+        print(f"✅ {path} ({path.stat().st_size:,} B)")
+    if not LXML_AVAILABLE:
+        print("⚠️  lxml není nainstalované - schémata nebyla zkompilována")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Import historických kurzů ČNB z ročních souborů
+
+Stáhne roční kurzovní lístky (rok.txt) pro zadané roky do
+CNB_HISTORY_DIR, odkud je aplikace načte při prvním dotazu na kurz
+ke dni dokladu. Aktuální rok spouštět pravidelně (cron) - ČNB ho
+každý pracovní den doplňuje. Jde načíst i lokálně stažené soubory.
+
+Použití:
+    python scripts/import_cnb_rates.py 2020 2025
+    python scripts/import_cnb_rates.py --current
+    python scripts/import_cnb_rates.py --file 2024:rok_2024.txt
+"""
+import argparse
+import sys
+import time
+from datetime import date
+from pathlib import Path
+
+import requests
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services.rate_history import CNB_YEAR_URL, RateHistory
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import ročních kurzů ČNB do historie")
+    parser.add_argument("from_year", nargs="?", type=int, help="První rok")
+    parser.add_argument("to_year", nargs="?", type=int, help="Poslední rok (výchozí stejný jako první)")
+    parser.add_argument("--current", action="store_true", help="Jen aktuální rok")
+    parser.add_argument("--file", action="append", default=[], metavar="ROK:SOUBOR",
+                        help="Lokální roční soubor místo stažení (lze opakovat)")
+    parser.add_argument("--output", type=Path, help="Adresář historie (výchozí CNB_HISTORY_DIR)")
+    args = parser.parse_args()
+
+    history = RateHistory(args.output)
+    sources = []
+    for spec in args.file:
+        year, _, path = spec.partition(':')
+        sources.append((int(year), Path(path)))
+
+    years = []
+    if args.current:
+        years = [date.today().year]
+    elif args.from_year:
+        years = list(range(args.from_year, (args.to_year or args.from_year) + 1))
+    if not years and not sources:
+        print("❌ Zadejte roky, --current nebo --file")
+        return 1
+
+    started = time.perf_counter()
+    total = 0
+    failed = 0
+    for year, path in sources:
+        try:
+            days = history.import_year(year, path.read_text(encoding='utf-8'))
+        except (OSError, ValueError) as e:
+            print(f"❌ {year}: {e}")
+            failed += 1
+            continue
+        print(f"✅ {year}: {days} dnů ze souboru {path}")
+        total += days
+
+    for year in years:
+        try:
+            response = requests.get(CNB_YEAR_URL.format(year=year), timeout=30)
+            response.raise_for_status()
+            response.encoding = 'utf-8'
+            days = history.import_year(year, response.text)
+        except (requests.RequestException, ValueError) as e:
+            print(f"❌ {year}: {e}")
+            failed += 1
+            continue
+        print(f"✅ {year}: {days} dnů")
+        total += days
+
+    coverage = history.coverage()
+    print(f"\n📦 Importováno {total} dnů za {time.perf_counter() - started:.1f} s do {history.directory}")
+    if coverage:
+        print(f"📅 Historie: {coverage[0].isoformat()} – {coverage[1].isoformat()}, "
+              f"{len(history.currencies())} měn")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Rekonciliace průběžných součtů DPH
+
+Přepočítá součty DPH za všechna období z transakcí (GROUP BY uživatel,
+rok, měsíc, typ, sazba) a porovná je s řádky VatRecord, které se
+udržují přírůstkově při každém flush. Rozdíly vzniknou jen obejitím
+ORM (hromadný UPDATE, ruční zásah do databáze). Spouštět pravidelně
+(cron) - bez --fix končí kódem 1, když najde rozdíl.
+
+Použití:
+    python scripts/reconcile_vat_totals.py
+    python scripts/reconcile_vat_totals.py --user-id 12 --fix
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.database.connection import db_manager
+from app.services.vat_period import reconcile_vat_totals
+
+
+async def run(args) -> int:
+    db_manager.initialize(args.database_url)
+    started = time.perf_counter()
+    try:
+        async with db_manager.get_session() as session:
+            drift = await reconcile_vat_totals(session, args.user_id, fix=args.fix)
+    finally:
+        await db_manager.close()
+
+    periods = {(d['user_id'], d['year'], d['month']) for d in drift}
+    for d in drift:
+        print(f"⚠️  uživatel {d['user_id']} {d['month']}/{d['year']} {d['field']}: "
+              f"uloženo {d['stored']}, přepočet {d['expected']} (rozdíl {d['expected'] - d['stored']})")
+
+    elapsed = time.perf_counter() - started
+    if not drift:
+        print(f"✅ Součty DPH sedí ({elapsed:.2f} s)")
+        return 0
+    if args.fix:
+        print(f"🔧 Opraveno {len(periods)} období ({len(drift)} rozdílů) za {elapsed:.2f} s")
+        return 0
+    print(f"❌ {len(drift)} rozdílů v {len(periods)} obdobích ({elapsed:.2f} s) - opravíte s --fix")
+    return 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rekonciliace průběžných součtů DPH")
+    parser.add_argument("--user-id", type=int, help="Jen jeden uživatel")
+    parser.add_argument("--database-url", help="Connection string (výchozí: DATABASE_URL)")
+    parser.add_argument("--fix", action="store_true", help="Přepsat rozdílné součty přepočtem")
+    args = parser.parse_args()
+
+    return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Přepočet cizoměnových transakcí kurzem ke dni dokladu
+
+Transakce uložené dřív se přepočítávaly kurzem ze dne zpracování.
+Skript vezme transakce v cizí měně za zadaný rok, najde kurz ČNB ke dni
+dokladu (document_date, jinak transaction_date) v historii kurzů
+a vypíše rozdíly. S --update přepíše amount_czk, exchange_rate
+a conversion_date. Kurzy se hledají dávkově (RateHistory.convert_batch).
+
+Použití:
+    python scripts/import_cnb_rates.py 2024 2025
+    python scripts/reconvert_foreign_transactions.py --year 2025
+    python scripts/reconvert_foreign_transactions.py --year 2025 --user-id 12 --update
+"""
+import argparse
+import asyncio
+import sys
+import time
+from datetime import datetime
+from decimal import Decimal
+from pathlib import Path
+
+from sqlalchemy import extract, select
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.database.connection import db_manager
+from app.database.models import Transaction
+from app.services.rate_history import rate_history
+
+
+async def run(args) -> int:
+    db_manager.initialize(args.database_url)
+    started = time.perf_counter()
+    try:
+        async with db_manager.get_session() as session:
+            stmt = select(Transaction).where(
+                Transaction.original_currency.isnot(None),
+                Transaction.original_currency != 'CZK',
+                extract('year', Transaction.transaction_date) == args.year
+            )
+            if args.user_id:
+                stmt = stmt.where(Transaction.user_id == args.user_id)
+            transactions = (await session.execute(stmt)).scalars().all()
+
+            days = [t.document_date or t.transaction_date.date() for t in transactions]
+            results = rate_history.convert_batch(
+                [t.original_currency for t in transactions],
+                days,
+                [
+                    t.original_amount if t.original_amount is not None else t.amount_czk.to_decimal()
+                    for t in transactions
+                ]
+            )
+
+            changed = missing = 0
+            difference = Decimal('0')
+            for transaction, day, result in zip(transactions, days, results):
+                if result is None:
+                    missing += 1
+                    print(f"⚠️  #{transaction.id}: kurz {transaction.original_currency} "
+                          f"k {day.isoformat()} není v historii")
+                    continue
+                amount_czk, rate, _ = result
+                if amount_czk == transaction.amount_czk:
+                    continue
+                changed += 1
+                difference += amount_czk - transaction.amount_czk
+                print(f"💱 #{transaction.id} {day.isoformat()}: {transaction.amount_czk} → {amount_czk} Kč "
+                      f"(kurz {transaction.exchange_rate} → {rate})")
+                if args.update:
+                    transaction.amount_czk = amount_czk
+                    transaction.exchange_rate = rate
+                    transaction.conversion_date = datetime.combine(day, datetime.min.time())
+
+            if args.update:
+                await session.commit()
+    finally:
+        await db_manager.close()
+
+    print(f"\n✅ {len(transactions)} transakcí za {time.perf_counter() - started:.2f} s: "
+          f"změněno {changed}, bez kurzu {missing}, rozdíl celkem {difference} Kč"
+          f"{'' if args.update else ' (bez --update se nic neuložilo)'}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Přepočet cizoměnových transakcí kurzem ke dni dokladu")
+    parser.add_argument("--year", type=int, required=True, help="Rok transakcí")
+    parser.add_argument("--user-id", type=int, help="Jen transakce jednoho uživatele")
+    parser.add_argument("--database-url", help="Connection string (výchozí: DATABASE_URL)")
+    parser.add_argument("--update", action="store_true", help="Uložit přepočtené částky")
+    args = parser.parse_args()
+
+    return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
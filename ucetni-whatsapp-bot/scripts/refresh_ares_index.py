@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Obnova offline indexu hromadných dat ARES
+
+Stáhne (nebo vezme lokální) hromadný export subjektů, proudově ho
+načte do SQLite indexu a hotový index atomicky přesune na místo
+starého. Běžící aplikace si nový index otevře při dalším dotazu.
+Spouštět pravidelně (cron), nejpozději po ARES_INDEX_MAX_AGE_DAYS -
+starší index AresService ignoruje a ptá se živého ARES.
+
+Použití:
+    python scripts/refresh_ares_index.py res_data.csv.gz
+    python scripts/refresh_ares_index.py https://.../export.zip --output /data/ares_index.sqlite
+    ARES_BULK_URL=https://... python scripts/refresh_ares_index.py
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import urllib.request
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services.ares_index import DEFAULT_INDEX_PATH, build_index
+
+DOWNLOAD_CHUNK = 1024 * 1024
+
+
+def download(url: str, target: Path) -> None:
+    """Stáhne export po blocích - celý soubor nikdy není v paměti"""
+    with urllib.request.urlopen(url, timeout=60) as response, open(target, 'wb') as out:
+        total = int(response.headers.get('Content-Length') or 0)
+        done = 0
+        while True:
+            chunk = response.read(DOWNLOAD_CHUNK)
+            if not chunk:
+                break
+            out.write(chunk)
+            done += len(chunk)
+            if total:
+                print(f"\r⬇️  {done / 1024 / 1024:.0f} / {total / 1024 / 1024:.0f} MB", end='', flush=True)
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Obnova offline indexu ARES z hromadného exportu")
+    parser.add_argument("source", nargs="?", default=os.getenv('ARES_BULK_URL'),
+                        help="Soubor nebo URL exportu (výchozí ARES_BULK_URL)")
+    parser.add_argument("--output", type=Path, default=Path(os.getenv('ARES_INDEX_PATH') or DEFAULT_INDEX_PATH),
+                        help="Cílový soubor indexu")
+    parser.add_argument("--encoding", default="utf-8-sig", help="Kódování CSV (např. cp1250)")
+    parser.add_argument("--keep-download", action="store_true", help="Nemazat stažený export")
+    args = parser.parse_args()
+
+    if not args.source:
+        print("❌ Zadejte soubor nebo URL exportu (nebo nastavte ARES_BULK_URL)")
+        return 1
+
+    download_dir = None
+    source = Path(args.source)
+    if args.source.startswith(('http://', 'https://')):
+        download_dir = Path(tempfile.mkdtemp(prefix='ares_bulk_'))
+        source = download_dir / (args.source.rstrip('/').rsplit('/', 1)[-1] or 'export')
+        print(f"🌐 Stahuji {args.source}")
+        try:
+            download(args.source, source)
+        except Exception as e:
+            print(f"❌ Stažení selhalo: {e}")
+            shutil.rmtree(download_dir, ignore_errors=True)
+            return 1
+    elif not source.exists():
+        print(f"❌ Soubor {source} neexistuje")
+        return 1
+
+    print(f"📦 Import {source.name} -> {args.output}")
+    try:
+        stats = build_index(source, args.output, encoding=args.encoding,
+                            progress=lambda rows: print(f"\r📥 {rows:,} subjektů", end='', flush=True))
+        print()
+    except Exception as e:
+        print(f"\n❌ Import selhal: {e}")
+        return 1
+    finally:
+        if download_dir and not args.keep_download:
+            shutil.rmtree(download_dir, ignore_errors=True)
+
+    print(f"✅ Index: {stats['records']:,} subjektů ({stats['duplicates']:,} duplicit), "
+          f"{stats['size_mb']} MB za {stats['elapsed_s']} s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Dávkové přepracování uložených příloh novým OCR a extrakcí
+
+Po změně preprocessingu nebo extrakce projde uložené přílohy
+(TransactionAttachment), znovu je přečte a zapíše report změněných polí.
+Běh jde přerušit a navázat (--resume), s --update přepíše i řádky v DB.
+
+Použití:
+    python scripts/reprocess_attachments.py --dry-run
+    python scripts/reprocess_attachments.py --workers 8 --chunk-size 200 --media-dir /data/media
+    python scripts/reprocess_attachments.py --resume --update
+"""
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.database.connection import db_manager
+from app.services.ocr_reprocessing import AttachmentReprocessor, default_executor
+
+
+async def run(args) -> int:
+    db_manager.initialize(args.database_url)
+    reprocessor = AttachmentReprocessor(
+        db_manager.get_session,
+        checkpoint_path=args.checkpoint,
+        report_path=args.report,
+        chunk_size=args.chunk_size,
+        update=args.update,
+        media_dir=args.media_dir
+    )
+
+    try:
+        if args.dry_run:
+            remaining = await reprocessor.count_remaining(0)
+            print(f"📎 Příloh ke zpracování: {remaining}")
+            return 0
+
+        with default_executor(args.workers) as executor:
+            checkpoint = await reprocessor.run(executor, resume=args.resume, limit=args.limit)
+    finally:
+        await db_manager.close()
+
+    print(f"\n✅ Hotovo: {checkpoint.processed} příloh, změněno {checkpoint.changed}, "
+          f"chyb {checkpoint.errors}, aktualizováno v DB {checkpoint.updated}")
+    if checkpoint.field_changes:
+        print("📊 Změny podle polí:")
+        for name, count in sorted(checkpoint.field_changes.items(), key=lambda item: -item[1]):
+            print(f"  {name:<16} {count}")
+    print(f"📝 Report: {args.report}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Přepracování uložených příloh novým OCR")
+    parser.add_argument("--database-url", help="Connection string (výchozí: DATABASE_URL)")
+    parser.add_argument("--workers", type=int, help="Počet procesů OCR (výchozí: počet CPU)")
+    parser.add_argument("--chunk-size", type=int, default=100, help="Počet příloh v dávce")
+    parser.add_argument("--limit", type=int, help="Zpracovat nejvýše N příloh")
+    parser.add_argument("--media-dir", help="Adresář s přílohami uloženými jako relativní cesta")
+    parser.add_argument("--checkpoint", type=Path, default=Path("reprocess_checkpoint.json"),
+                        help="Soubor se stavem běhu")
+    parser.add_argument("--report", type=Path, default=Path("reprocess_report.jsonl"), help="JSONL report změn")
+    parser.add_argument("--resume", action="store_true", help="Navázat na uložený checkpoint")
+    parser.add_argument("--update", action="store_true", help="Přepsat OCR data v databázi")
+    parser.add_argument("--dry-run", action="store_true", help="Jen spočítat přílohy ke zpracování")
+    args = parser.parse_args()
+
+    return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
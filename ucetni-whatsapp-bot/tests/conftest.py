@@ -2,6 +2,7 @@
 Test configuration and fixtures for ÚčetníBot
 """
 import pytest
+import pytest_asyncio
 import os
 import asyncio
 from unittest.mock import Mock, AsyncMock, patch
@@ -66,6 +67,42 @@ async def db_session():
     await engine.dispose()
 
 
+@pytest_asyncio.fixture
+async def session_factory(request, tmp_path):
+    """
+    Factory of sessions over a fresh SQLite database
+
+    Tables come from the db_tables marker on the test, class or module:
+    @pytest.mark.db_tables([User, Transaction], vat_totals=True) - vat_totals
+    switches the session to VatTotalsSession (running VAT totals on flush).
+    """
+    from contextlib import asynccontextmanager
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+    marker = request.node.get_closest_marker('db_tables')
+    if marker is None:
+        pytest.fail("session_factory needs @pytest.mark.db_tables([<models>])")
+
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+    async with engine.begin() as conn:
+        for model in marker.args[0]:
+            await conn.run_sync(model.__table__.create)
+
+    options = {}
+    if marker.kwargs.get('vat_totals'):
+        from app.database.vat_totals import VatTotalsSession
+        options['sync_session_class'] = VatTotalsSession
+    maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False, **options)
+
+    @asynccontextmanager
+    async def factory():
+        async with maker() as session:
+            yield session
+
+    yield factory
+    await engine.dispose()
+
+
 @pytest.fixture
 def mock_twilio_client():
     """Mock Twilio client"""
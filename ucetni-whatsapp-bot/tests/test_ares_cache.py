@@ -0,0 +1,262 @@
+"""
+Unit tests for the ARES lookup cache
+"""
+import asyncio
+from datetime import timedelta
+from unittest.mock import AsyncMock
+
+import pytest
+
+from app.database.models import AresCacheEntry
+from app.services.ares_cache import AresCache, AresCacheSettings, AresUnavailableError
+
+ALZA = {"valid": True, "ico": "27082440", "business_name": "Alza.cz a.s."}
+UNKNOWN = {"valid": False, "error": "IČO nenalezeno v ARES registru"}
+DOWN = AresUnavailableError("timeout", {"valid": False, "error": "Časový limit dotazu na ARES"})
+
+
+def memory_cache(**settings) -> AresCache:
+    return AresCache(AresCacheSettings(**settings), session_factory=None)
+
+
+pytestmark = pytest.mark.db_tables([AresCacheEntry])
+
+
+class TestAresCache:
+    """Test TTL, negative caching and stale-while-revalidate"""
+
+    @pytest.mark.asyncio
+    async def test_hit_after_first_lookup(self):
+        cache = memory_cache()
+        fetch = AsyncMock(return_value=ALZA)
+
+        assert await cache.lookup("service", "27082440", fetch) == ALZA
+        assert await cache.lookup("service", "27082440", fetch) == ALZA
+
+        fetch.assert_awaited_once()
+        stats = cache.stats()
+        assert stats["hit"] == 1 and stats["miss"] == 1
+        assert stats["hit_rate"] == 0.5
+        assert stats["ares_requests"] == 1
+
+    @pytest.mark.asyncio
+    async def test_sources_are_separate(self):
+        cache = memory_cache()
+        fetch = AsyncMock(return_value=ALZA)
+
+        await cache.lookup("service", "27082440", fetch)
+        await cache.lookup("validator", "27082440", fetch)
+
+        assert fetch.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_negative_answer_has_short_ttl(self):
+        cache = memory_cache(negative_ttl=timedelta(0))
+        fetch = AsyncMock(side_effect=[UNKNOWN, ALZA])
+
+        assert await cache.lookup("service", "27082440", fetch) == UNKNOWN
+        assert await cache.lookup("service", "27082440", fetch) == ALZA
+
+        assert fetch.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_stale_entry_is_served_and_refreshed(self):
+        cache = memory_cache(ttl=timedelta(0))
+        renamed = {**ALZA, "business_name": "Alza.cz a.s. (nový název)"}
+        fetch = AsyncMock(side_effect=[ALZA, renamed])
+
+        await cache.lookup("service", "27082440", fetch)
+        assert await cache.lookup("service", "27082440", fetch) == ALZA
+
+        await cache.wait_refreshes()
+        assert cache._entries[("service", "27082440")].data == renamed
+        assert cache.stats()["stale"] == 1
+
+    @pytest.mark.asyncio
+    async def test_failed_refresh_keeps_stale_entry(self):
+        cache = memory_cache(ttl=timedelta(0))
+        fetch = AsyncMock(side_effect=[ALZA, DOWN])
+
+        await cache.lookup("service", "27082440", fetch)
+        await cache.lookup("service", "27082440", fetch)
+        await cache.wait_refreshes()
+
+        assert cache._entries[("service", "27082440")].data == ALZA
+        assert cache.stats()["error"] == 1
+
+    @pytest.mark.asyncio
+    async def test_outage_without_entry_raises(self):
+        cache = memory_cache()
+
+        with pytest.raises(AresUnavailableError):
+            await cache.lookup("service", "27082440", AsyncMock(side_effect=DOWN))
+
+        # Chyba spojení se neukládá
+        assert not cache._entries
+
+    @pytest.mark.asyncio
+    async def test_expired_negative_entry_survives_outage(self):
+        cache = memory_cache(negative_ttl=timedelta(0))
+        fetch = AsyncMock(side_effect=[UNKNOWN, DOWN])
+
+        await cache.lookup("service", "99999999", fetch)
+        assert await cache.lookup("service", "99999999", fetch) == UNKNOWN
+        assert cache.stats()["stale_on_error"] == 1
+
+    @pytest.mark.asyncio
+    async def test_lru_eviction(self):
+        cache = memory_cache(max_entries=2)
+        fetch = AsyncMock(return_value=ALZA)
+
+        for ico in ("00000001", "00000002", "00000001", "00000003"):
+            await cache.lookup("service", ico, fetch)
+
+        assert list(cache._entries) == [("service", "00000001"), ("service", "00000003")]
+
+    @pytest.mark.asyncio
+    async def test_entries_are_shared_through_database(self, session_factory):
+        first = AresCache(AresCacheSettings(), session_factory=session_factory)
+        await first.lookup("service", "27082440", AsyncMock(return_value=ALZA))
+
+        second = AresCache(AresCacheSettings(), session_factory=session_factory)
+        fetch = AsyncMock(side_effect=AssertionError("ARES called"))
+
+        assert await second.lookup("service", "27082440", fetch) == ALZA
+        assert await second.lookup("service", "27082440", fetch) == ALZA
+        assert second.stats()["db_hit"] == 1 and second.stats()["hit"] == 1
+
+
+class TestAresClients:
+    """Test that both ARES clients go through the cache"""
+
+    @pytest.mark.asyncio
+    async def test_service_caches_lookups(self, monkeypatch):
+        import app.services.ares_service as module
+
+        monkeypatch.setattr(module, "ares_cache", memory_cache())
+        service = module.AresService()
+        lidl = {"valid": True, "ico": "26178541", "business_name": "Lidl Česká republika v.o.s."}
+        service._fetch_ico = AsyncMock(return_value=lidl)
+
+        # Zbytek 0 v kontrolním součtu dává kontrolní číslici 1
+        assert await service.validate_ico("26178541") == lidl
+        assert await service.validate_ico("26178541") == lidl
+        service._fetch_ico.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_service_network_error_fallback(self, monkeypatch):
+        import app.services.ares_service as module
+
+        monkeypatch.setattr(module, "ares_cache", memory_cache())
+        service = module.AresService()
+        fallback = {"valid": True, "business_name": None, "warning": "Síťová chyba"}
+        service._fetch_ico = AsyncMock(side_effect=AresUnavailableError("down", fallback))
+
+        assert await service.validate_ico("27082440") == fallback
+
+    @pytest.mark.asyncio
+    async def test_validator_caches_lookups(self):
+        from utils.ares_validator import AresValidator
+
+        validator = AresValidator(cache=memory_cache())
+        result = {"valid": True, "ico": "27082440", "name": "Alza.cz a.s."}
+        validator._fetch_ico = AsyncMock(return_value=result)
+
+        assert await validator.verify_ico("270 82 440") == result
+        assert await validator.verify_ico("27082440") == result
+        validator._fetch_ico.assert_awaited_once()
+        assert (await validator.verify_ico("27082441"))["valid"] is False
+
+
+    @pytest.mark.asyncio
+    async def test_validator_without_cache_goes_live(self):
+        from utils.ares_validator import AresValidator
+
+        validator = AresValidator()
+        fallback = {"valid": False, "error": "Časový limit dotazu na ARES"}
+        validator._fetch_ico = AsyncMock(side_effect=AresUnavailableError("timeout", fallback))
+
+        assert await validator.verify_ico("27082440") == fallback
+        assert await validator.verify_ico("27082440") == fallback
+        assert validator._fetch_ico.await_count == 2
+
+
+def with_check_digit(prefix: str) -> str:
+    """Valid IČO from the first seven digits"""
+    remainder = sum(int(prefix[i]) * (8 - i) for i in range(7)) % 11
+    return prefix + str((11 - remainder) % 10 if remainder else 1)
+
+
+class TestBatchValidation:
+    """Test concurrent batch validation with coalesced lookups"""
+
+    @pytest.fixture
+    def service(self, monkeypatch):
+        import app.services.ares_service as module
+
+        monkeypatch.setattr(module, "ares_cache", memory_cache())
+        return module.AresService()
+
+    @pytest.mark.asyncio
+    async def test_bounded_fan_out_in_input_order(self, service):
+        icos = [with_check_digit(f"{i:07d}") for i in range(1, 11)]
+        batch = icos + icos[:3]
+        active = {"now": 0, "max": 0}
+        sessions = set()
+
+        async def fetch(ico, session=None):
+            sessions.add(id(session))
+            active["now"] += 1
+            active["max"] = max(active["max"], active["now"])
+            await asyncio.sleep(0.01)
+            active["now"] -= 1
+            return {"valid": True, "ico": ico, "business_name": f"Firma {ico}"}
+
+        service._fetch_ico = AsyncMock(side_effect=fetch)
+
+        result = await service.batch_validate_ico(batch, max_concurrency=3)
+
+        assert [item["ico"] for item in result["items"]] == batch
+        assert result["total_count"] == result["valid_count"] == 10
+        assert service._fetch_ico.await_count == 10
+        assert active["max"] <= 3
+        assert len(sessions) == 1 and id(None) not in sessions
+
+    @pytest.mark.asyncio
+    async def test_duplicates_validated_once(self, service):
+        service.validate_ico = AsyncMock(return_value={"valid": True})
+
+        result = await service.batch_validate_ico(["27082440", "27082440", "45274649", "27082440"])
+
+        assert service.validate_ico.await_count == 2
+        assert len(result["items"]) == 4
+        assert result["total_count"] == result["valid_count"] == 2
+
+    @pytest.mark.asyncio
+    async def test_per_item_errors(self, service):
+        service._fetch_ico = AsyncMock(side_effect=[
+            {"valid": True, "ico": "27082440"},
+            RuntimeError("boom"),
+        ])
+
+        result = await service.batch_validate_ico(["27082440", "123", "45274649"], max_concurrency=1)
+
+        assert [item["valid"] for item in result["items"]] == [True, False, False]
+        assert result["items"][1]["error"] == "IČO musí mít přesně 8 číslic"
+        assert result["items"][2]["error"] == "Neočekávaná chyba při ověřování IČO"
+
+    @pytest.mark.asyncio
+    async def test_concurrent_lookups_are_coalesced(self, service):
+        import app.services.ares_service as module
+
+        async def fetch(ico, session=None):
+            await asyncio.sleep(0.01)
+            return {"valid": True, "ico": ico}
+
+        service._fetch_ico = AsyncMock(side_effect=fetch)
+
+        results = await asyncio.gather(*(service.validate_ico("27082440") for _ in range(5)))
+
+        assert all(r["valid"] for r in results)
+        service._fetch_ico.assert_awaited_once()
+        assert module.ares_cache.stats()["coalesced"] == 4
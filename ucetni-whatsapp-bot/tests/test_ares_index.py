@@ -0,0 +1,178 @@
+"""
+Unit tests for the offline ARES bulk index
+"""
+import gzip
+import sqlite3
+import zipfile
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock
+
+import pytest
+
+from app.services.ares_cache import AresCache, AresCacheSettings
+from app.services.ares_index import AresIndex, build_index
+
+EXPORT = """ICO;FIRMA;FORMA;ULICE_TEXT;CDOM;COR;OBEC_TEXT;PSC;TEXTADR;DDATVZN;DDATZAN
+27082440;Alza.cz a.s.;121;Jankovcova;1522;53;Praha;17000;Jankovcova 1522/53, 170 00 Praha 7;2003-08-26;
+26178541;Lidl Česká republika v.o.s.;118;Nárožní;1359;11;Praha;15800;;24.06.2000;
+45274649;ČEZ, a. s.;121;Duhová;1444;2;Praha;14000;;1992-05-06;
+6947;Ministerstvo financí;325;Letenská;525;15;Praha;11800;;;
+12345678;Zaniklá firma s.r.o.;112;;;;Brno;60200;;2001-01-01;2015-12-31
+abc;Chybný řádek;;;;;;;;;
+"""
+
+
+@pytest.fixture
+def export_path(tmp_path):
+    path = tmp_path / "export.csv.gz"
+    with gzip.open(path, "wt", encoding="utf-8") as out:
+        out.write(EXPORT)
+    return path
+
+
+@pytest.fixture
+def index(tmp_path, export_path):
+    build_index(export_path, tmp_path / "ares_index.sqlite")
+    return AresIndex(tmp_path / "ares_index.sqlite")
+
+
+class TestAresIndex:
+    """Test import of the bulk export and lookups"""
+
+    def test_build_skips_invalid_rows(self, tmp_path, export_path):
+        stats = build_index(export_path, tmp_path / "ares_index.sqlite")
+
+        assert stats["records"] == 5
+        assert not (tmp_path / "ares_index.sqlite.tmp").exists()
+
+    def test_lookup_by_ico(self, index):
+        record = index.lookup("27082440")
+
+        assert record.name == "Alza.cz a.s."
+        assert record.address == {"street": "Jankovcova", "house_number": "1522/53",
+                                  "city": "Praha", "postal_code": "17000"}
+        assert record.founded == "2003-08-26"
+        assert index.lookup("26178541").founded == "2000-06-24"
+        assert index.lookup("00006947").name == "Ministerstvo financí"
+        assert index.lookup("12345678").ceased == "2015-12-31"
+        assert index.lookup("99999999") is None
+
+    def test_name_prefix_search(self, index):
+        assert [r.ico for r in index.search_name("lidl")] == ["26178541"]
+        assert [r.ico for r in index.search_name("Čez")] == ["45274649"]
+        assert {r.ico for r in index.search_name("a", limit=5)} == {"27082440"}
+        assert index.search_name("") == []
+
+    def test_zip_export_with_commas(self, tmp_path):
+        path = tmp_path / "export.zip"
+        with zipfile.ZipFile(path, "w") as archive:
+            archive.writestr("readme.txt", "x")
+            archive.writestr("subjekty.csv", "ico,obchodniJmeno\n27082440,Alza.cz a.s.\n")
+
+        build_index(path, tmp_path / "zip.sqlite")
+
+        assert AresIndex(tmp_path / "zip.sqlite").lookup("27082440").name == "Alza.cz a.s."
+
+    def test_missing_columns(self, tmp_path):
+        path = tmp_path / "export.csv"
+        path.write_text("A;B\n1;2\n", encoding="utf-8")
+
+        with pytest.raises(ValueError):
+            build_index(path, tmp_path / "bad.sqlite")
+
+    def test_refresh_is_picked_up(self, tmp_path, index):
+        assert index.lookup("11111111") is None
+
+        path = tmp_path / "new.csv"
+        path.write_text("ICO;FIRMA\n11111111;Nová firma s.r.o.\n", encoding="utf-8")
+        build_index(path, index.path)
+
+        assert index.lookup("11111111").name == "Nová firma s.r.o."
+        assert index.lookup("27082440") is None
+
+    def test_freshness(self, index):
+        assert index.is_fresh()
+        assert not index.is_fresh(datetime.now() + timedelta(days=40))
+        assert not AresIndex(index.path.with_name("missing.sqlite")).is_fresh()
+
+    def test_index_without_dic_column(self, tmp_path):
+        path = tmp_path / "old.sqlite"
+        conn = sqlite3.connect(path)
+        conn.execute("CREATE TABLE subjects (ico TEXT PRIMARY KEY, name TEXT NOT NULL, legal_form TEXT, "
+                     "street TEXT, house_number TEXT, orientation_number TEXT, city TEXT, postal_code TEXT, "
+                     "address TEXT, founded TEXT, ceased TEXT, name_key TEXT NOT NULL)")
+        conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+        conn.execute("INSERT INTO subjects (ico, name, name_key) VALUES ('27082440', 'Alza.cz a.s.', 'alza cz')")
+        conn.commit()
+        conn.close()
+
+        record = AresIndex(path).lookup("27082440")
+
+        assert record.name == "Alza.cz a.s."
+        assert record.dic is None
+
+    def test_index_is_read_only(self, index):
+        conn = index._connection()
+
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute("DELETE FROM subjects")
+
+
+class TestAresServiceWithIndex:
+    """Test that AresService asks the index before the live API"""
+
+    @pytest.fixture
+    def service(self, monkeypatch, index):
+        import app.services.ares_service as module
+
+        monkeypatch.setattr(module, "ares_index", index)
+        monkeypatch.setattr(module, "ares_cache", AresCache(AresCacheSettings(), session_factory=None))
+        service = module.AresService()
+        service._fetch_ico = AsyncMock(return_value={"valid": True, "ico": "25596641", "business_name": "Live"})
+        return service
+
+    @pytest.mark.asyncio
+    async def test_hit_without_network(self, service):
+        result = await service.validate_ico("27082440")
+
+        assert result["valid"]
+        assert result["business_name"] == "Alza.cz a.s."
+        assert result["source"] == "ares_index"
+        assert service.format_address(result["address"]) == "Jankovcova 1522/53, 17000 Praha"
+        service._fetch_ico.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_miss_goes_to_live_api(self, service):
+        result = await service.validate_ico("25596641")
+
+        assert result["business_name"] == "Live"
+        service._fetch_ico.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_index_without_dic_goes_live_when_dic_needed(self, service):
+        result = await service.validate_ico("27082440", need_dic=True)
+
+        assert result["business_name"] == "Live"
+        service._fetch_ico.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_dic_from_index(self, service, tmp_path):
+        import app.services.ares_service as module
+
+        path = tmp_path / "dic.csv"
+        path.write_text("ICO;FIRMA;DIC\n27082440;Alza.cz a.s.;CZ27082440\n", encoding="utf-8")
+        build_index(path, module.ares_index.path)
+
+        result = await service.validate_ico("27082440", need_dic=True)
+
+        assert result["dic"] == "CZ27082440"
+        assert result["vat_payer"]
+        service._fetch_ico.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_old_index_goes_to_live_api(self, service, index):
+        index.max_age = timedelta(seconds=0)
+
+        await service.validate_ico("27082440")
+
+        service._fetch_ico.assert_awaited_once()
@@ -0,0 +1,145 @@
+"""
+Unit tests for background counterparty enrichment from ARES
+"""
+import asyncio
+from decimal import Decimal
+from unittest.mock import AsyncMock
+
+import pytest
+
+from app.database.models import Transaction, TransactionAttachment, User
+from app.services.ares_service import AresService
+from app.services.counterparty_enrichment import CounterpartyEnricher
+
+ALZA = {
+    "valid": True,
+    "ico": "27082440",
+    "business_name": "Alza.cz a.s.",
+    "dic": "CZ27082440",
+    "address": {"street": "Jankovcova", "house_number": "1522/53", "city": "Praha", "postal_code": "17000"},
+    "vat_payer": True,
+}
+
+
+pytestmark = pytest.mark.db_tables([User, Transaction, TransactionAttachment])
+
+
+async def add_transaction(session_factory, **fields) -> int:
+    async with session_factory() as session:
+        transaction = Transaction(
+            user_id=1, type="expense", original_message="OCR", description="Monitor",
+            amount_czk=Decimal("4990"), **fields
+        )
+        session.add(transaction)
+        await session.commit()
+        return transaction.id
+
+
+def enricher_with(session_factory, result=ALZA, delay=0.0) -> CounterpartyEnricher:
+    service = AresService()
+
+    async def validate_ico(ico, **kwargs):
+        await asyncio.sleep(delay)
+        return result
+
+    service.validate_ico = AsyncMock(side_effect=validate_ico)
+    return CounterpartyEnricher(session_factory, service)
+
+
+class TestCounterpartyEnrichment:
+    """Test filling counterparty fields after the transaction is saved"""
+
+    @pytest.mark.asyncio
+    async def test_fills_empty_fields_and_rescores(self, session_factory):
+        transaction_id = await add_transaction(session_factory, counterparty_ico="27082440",
+                                               evidence_completeness_score=Decimal("48"))
+        enricher = enricher_with(session_factory)
+
+        result = await enricher.enrich(transaction_id)
+
+        assert result["updated"] == ["counterparty_name", "counterparty_dic",
+                                     "counterparty_address", "counterparty_vat_payer"]
+        async with session_factory() as session:
+            transaction = await session.get(Transaction, transaction_id)
+        assert transaction.counterparty_name == "Alza.cz a.s."
+        assert transaction.counterparty_dic == "CZ27082440"
+        assert transaction.counterparty_address == "Jankovcova 1522/53, 17000 Praha"
+        assert transaction.counterparty_vat_payer is True
+        assert transaction.evidence_completeness_score == Decimal(str(result["completeness"]))
+        assert result["completeness"] > 48
+        assert "counterparty_name" not in transaction.evidence_missing_required
+
+    @pytest.mark.asyncio
+    async def test_document_values_win(self, session_factory):
+        transaction_id = await add_transaction(session_factory, counterparty_ico="27082440",
+                                               counterparty_name="ALZA.CZ", counterparty_dic="CZ27082440")
+        enricher = enricher_with(session_factory)
+
+        result = await enricher.enrich(transaction_id)
+
+        assert "counterparty_name" not in result["updated"]
+        async with session_factory() as session:
+            transaction = await session.get(Transaction, transaction_id)
+        assert transaction.counterparty_name == "ALZA.CZ"
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("ares", [
+        {"valid": False, "error": "IČO nenalezeno v ARES registru"},
+        {"valid": True, "business_name": None, "address": {}, "warning": "Síťová chyba"},
+    ])
+    async def test_no_data_leaves_transaction(self, session_factory, ares):
+        transaction_id = await add_transaction(session_factory, counterparty_ico="27082440")
+
+        result = await enricher_with(session_factory, ares).enrich(transaction_id)
+
+        assert result["updated"] == []
+        async with session_factory() as session:
+            assert (await session.get(Transaction, transaction_id)).counterparty_vat_payer is None
+
+    @pytest.mark.asyncio
+    async def test_vat_payer_only_from_dic(self, session_factory):
+        guessed = {**ALZA, "business_name": "Malá firma s.r.o.", "dic": None, "vat_payer": True}
+        unknown = await add_transaction(session_factory, counterparty_ico="27082440")
+        known = await add_transaction(session_factory, counterparty_ico="27082440", counterparty_vat_payer=False)
+
+        for transaction_id in (unknown, known):
+            result = await enricher_with(session_factory, guessed).enrich(transaction_id)
+            assert "counterparty_vat_payer" not in result["updated"]
+
+        async with session_factory() as session:
+            assert (await session.get(Transaction, unknown)).counterparty_vat_payer is None
+            assert (await session.get(Transaction, known)).counterparty_vat_payer is False
+
+    @pytest.mark.asyncio
+    async def test_without_ico_ares_is_not_called(self, session_factory):
+        transaction_id = await add_transaction(session_factory)
+        enricher = enricher_with(session_factory)
+
+        await enricher.enrich(transaction_id)
+
+        enricher.ares_service.validate_ico.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_schedule_does_not_wait_for_ares(self, session_factory):
+        transaction_id = await add_transaction(session_factory, counterparty_ico="27082440")
+        enricher = enricher_with(session_factory, delay=0.05)
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        enricher.schedule(transaction_id)
+        assert loop.time() - started < 0.01
+
+        await enricher.wait()
+        async with session_factory() as session:
+            assert (await session.get(Transaction, transaction_id)).counterparty_name == "Alza.cz a.s."
+
+    @pytest.mark.asyncio
+    async def test_failed_job_is_logged(self, session_factory):
+        enricher = enricher_with(session_factory)
+        enricher.ares_service.validate_ico.side_effect = RuntimeError("boom")
+        transaction_id = await add_transaction(session_factory, counterparty_ico="27082440")
+
+        enricher.schedule(transaction_id)
+        await enricher.wait()
+
+        assert not enricher._tasks
@@ -0,0 +1,227 @@
+"""
+Unit tests for cached, streaming XSD validation of VAT XML
+"""
+import os
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+import app.services.epo_schema as epo_schema_module
+import app.vat_handler as vat_handler_module
+from app.services.epo_schema import (
+    SCHEMA_FILES, EpoSchemaValidator, SchemaFetchError, fetch_schemas, epo_schema_validator
+)
+from app.vat_handler import VatHandler
+from utils.vat_calculator import VatPeriodData
+from utils.vat_xml_generator import KhDocument, VatXmlGenerator
+
+KH1_XSD = """<?xml version="1.0" encoding="UTF-8"?>
+<xs:schema xmlns:xs="http://www.w3.org/2001/XMLSchema"
+           targetNamespace="http://adis.mfcr.cz/rozhraniXML/dphkh1/"
+           xmlns="http://adis.mfcr.cz/rozhraniXML/dphkh1/"
+           elementFormDefault="qualified">
+  <xs:complexType name="veta"><xs:anyAttribute processContents="skip"/></xs:complexType>
+  <xs:complexType name="vetaA4">
+    <xs:attribute name="c_radku" type="xs:positiveInteger" use="required"/>
+    <xs:attribute name="dic_dodav" use="required">
+      <xs:simpleType>
+        <xs:restriction base="xs:string"><xs:pattern value="CZ[0-9]{8,10}"/></xs:restriction>
+      </xs:simpleType>
+    </xs:attribute>
+    <xs:anyAttribute processContents="skip"/>
+  </xs:complexType>
+  <xs:element name="Pisemnost">
+    <xs:complexType>
+      <xs:sequence>
+        <xs:element name="DPHKH1">
+          <xs:complexType>
+            <xs:sequence>
+              <xs:element name="VetaD" type="veta"/>
+              <xs:element name="VetaP" type="veta"/>
+              <xs:element name="VetaA4" type="vetaA4" minOccurs="0" maxOccurs="unbounded"/>
+              <xs:element name="VetaA5" type="veta" minOccurs="0"/>
+              <xs:element name="VetaB2" type="veta" minOccurs="0" maxOccurs="unbounded"/>
+              <xs:element name="VetaB3" type="veta" minOccurs="0"/>
+            </xs:sequence>
+          </xs:complexType>
+        </xs:element>
+      </xs:sequence>
+      <xs:anyAttribute processContents="skip"/>
+    </xs:complexType>
+  </xs:element>
+</xs:schema>
+"""
+
+SETTINGS = {"dic": "CZ8001011234", "first_name": "Jan", "last_name": "Novák"}
+
+# Oficiální schémata jsou v repu jen po scripts/fetch_epo_xsd.py (v Docker buildu vždy)
+OFFICIAL_SCHEMAS = all(epo_schema_validator.schema_path(document).exists() for document in SCHEMA_FILES)
+
+
+def expense(number: str, dic: str) -> KhDocument:
+    return KhDocument(type="expense", dic=dic, document_number=number, document_date=date(2025, 3, 1),
+                      base_21=Decimal("20000"), vat_21=Decimal("4200"))
+
+
+def write_kh(path, documents):
+    period_data = VatPeriodData(month=3, year=2025, input_base_21=Decimal("20000") * len(documents),
+                                input_vat_21=Decimal("4200") * len(documents))
+    with open(path, "w", encoding="utf-8") as out:
+        VatXmlGenerator(SETTINGS).write_kontrolni_hlaseni(out, period_data, documents)
+    return path
+
+
+@pytest.fixture
+def validator(tmp_path):
+    xsd_dir = tmp_path / "xsd"
+    xsd_dir.mkdir()
+    (xsd_dir / "dphkh1.xsd").write_text(KH1_XSD, encoding="utf-8")
+    return EpoSchemaValidator(xsd_dir)
+
+
+needs_lxml = pytest.mark.skipif(not epo_schema_module.LXML_AVAILABLE, reason="lxml is not installed")
+
+
+class TestEpoSchemaValidator:
+    """Test schema caching and streaming validation"""
+
+    @needs_lxml
+    def test_valid_file(self, validator, tmp_path):
+        path = write_kh(tmp_path / "kh1.xml", [expense(f"DOK{i}", "CZ12345678") for i in range(500)])
+
+        result = validator.validate_file(path, "KH1")
+
+        assert result.valid and result.checked
+        assert result.elements == 504
+
+    @needs_lxml
+    def test_invalid_file_reports_line(self, validator, tmp_path):
+        path = write_kh(tmp_path / "kh1.xml", [expense("DOK1", "CZ12345678"), expense("DOK2", "SK2020123456")])
+
+        result = validator.validate_file(path, "KH1")
+
+        assert not result.valid and result.checked
+        assert result.errors[0].startswith("řádek 7:")
+        assert "dic_dodav" in result.errors[0]
+
+    @needs_lxml
+    def test_schema_compiled_once_and_reloaded_on_change(self, validator):
+        schema = validator.schema("KH1")
+
+        assert validator.schema("KH1") is schema
+        assert validator.preload() == ["KH1"]
+
+        stat = validator.schema_path("KH1").stat()
+        os.utime(validator.schema_path("KH1"), (stat.st_atime, stat.st_mtime + 10))
+        assert validator.schema("KH1") is not schema
+
+    def test_missing_schema_checks_well_formedness(self, validator, tmp_path):
+        path = write_kh(tmp_path / "kh1.xml", [expense("DOK1", "SK2020123456")])
+        broken = tmp_path / "broken.xml"
+        broken.write_text("<Pisemnost><DPHKH1></Pisemnost>", encoding="utf-8")
+
+        assert validator.schema("DP3") is None
+        result = validator.validate_file(path, "DP3")
+        assert result.valid and not result.checked
+        assert not validator.validate_file(broken, "DP3").valid
+
+    def test_without_lxml(self, monkeypatch, validator, tmp_path):
+        monkeypatch.setattr(epo_schema_module, "LXML_AVAILABLE", False)
+        path = write_kh(tmp_path / "kh1.xml", [expense("DOK1", "SK2020123456")])
+
+        result = validator.validate_file(path, "KH1")
+
+        assert result.valid and not result.checked
+
+
+    def test_required_schema_missing_fails(self, validator, tmp_path):
+        path = write_kh(tmp_path / "kh1.xml", [expense("DOK1", "CZ12345678")])
+
+        result = EpoSchemaValidator(validator.directory, required=True).validate_file(path, "DP3")
+
+        assert not result.valid and not result.checked
+        assert "fetch_epo_xsd.py" in result.errors[0]
+
+
+def publish(directory, kh1=True):
+    """Fake EPO directory: DP3 includes a shared type file, KH1 is standalone"""
+    directory.mkdir(exist_ok=True)
+    (directory / "dphdp3_epo2.xsd").write_text(
+        '<xs:schema xmlns:xs="http://www.w3.org/2001/XMLSchema"><xs:include schemaLocation="spolecne.xsd"/>'
+        '<xs:element name="Pisemnost" type="pisemnost"/></xs:schema>', encoding="utf-8")
+    (directory / "spolecne.xsd").write_text(
+        '<xs:schema xmlns:xs="http://www.w3.org/2001/XMLSchema">'
+        '<xs:complexType name="pisemnost"><xs:anyAttribute processContents="skip"/></xs:complexType></xs:schema>',
+        encoding="utf-8")
+    if kh1:
+        (directory / "dphkh1_epo2.xsd").write_text(KH1_XSD, encoding="utf-8")
+    return directory.as_uri() + "/"
+
+
+class TestFetchSchemas:
+    """Test downloading the EPO schemas with their includes"""
+
+    def test_downloads_with_includes(self, tmp_path):
+        url = publish(tmp_path / "epo")
+
+        written = fetch_schemas(tmp_path / "xsd", url)
+
+        assert sorted(path.name for path in written) == ["dphdp3.xsd", "dphkh1.xsd", "spolecne.xsd"]
+        assert not (tmp_path / "xsd" / ".download").exists()
+        if epo_schema_module.LXML_AVAILABLE:
+            assert EpoSchemaValidator(tmp_path / "xsd").preload() == ["DP3", "KH1"]
+
+    def test_failure_keeps_existing_schemas(self, tmp_path):
+        url = publish(tmp_path / "epo", kh1=False)
+        (tmp_path / "xsd").mkdir()
+        (tmp_path / "xsd" / "dphdp3.xsd").write_text("stará verze", encoding="utf-8")
+
+        with pytest.raises(SchemaFetchError, match="dphkh1_epo2.xsd"):
+            fetch_schemas(tmp_path / "xsd", url)
+
+        assert (tmp_path / "xsd" / "dphdp3.xsd").read_text(encoding="utf-8") == "stará verze"
+
+
+@needs_lxml
+@pytest.mark.skipif(not OFFICIAL_SCHEMAS, reason="official EPO XSDs not downloaded (scripts/fetch_epo_xsd.py)")
+class TestOfficialSchemas:
+    """Test that the generator's DP3/KH1 match the official EPO schemas"""
+
+    def test_generated_documents_are_valid(self, tmp_path):
+        generator = VatXmlGenerator({**SETTINGS, "street": "Dlouhá", "house_number": "12", "city": "Praha",
+                                     "postal_code": "11000", "email": "jan@example.cz"})
+        period_data = VatPeriodData(month=3, year=2025, output_base_21=Decimal("60000"),
+                                    output_vat_21=Decimal("12600"), input_base_21=Decimal("20000"),
+                                    input_vat_21=Decimal("4200"))
+        dp3 = tmp_path / "dp3.xml"
+        with open(dp3, "w", encoding="utf-8") as out:
+            generator.write_dph_priznani(out, period_data)
+        kh1 = tmp_path / "kh1.xml"
+        with open(kh1, "w", encoding="utf-8") as out:
+            generator.write_kontrolni_hlaseni(out, period_data, [expense("DOK1", "CZ12345678")])
+
+        validator = EpoSchemaValidator(epo_schema_validator.directory, required=True)
+        for path, document in ((dp3, "DP3"), (kh1, "KH1")):
+            result = validator.validate_file(path, document)
+            assert result.valid and result.checked, result.errors
+
+
+class TestExportSchemaCheck:
+    """Test that the VAT export refuses files failing the XSD"""
+
+    @needs_lxml
+    @pytest.mark.asyncio
+    async def test_export_reports_schema_errors(self, monkeypatch, validator, tmp_path):
+        # Ukázková data mají příjmy nad limitem - schéma bez VetaB2 je odmítne
+        (validator.directory / "dphkh1.xsd").write_text(
+            KH1_XSD.replace('<xs:element name="VetaB2" type="veta" minOccurs="0" maxOccurs="unbounded"/>', ""),
+            encoding="utf-8"
+        )
+        monkeypatch.setattr(vat_handler_module, "epo_schema_validator", validator)
+        monkeypatch.setenv("VAT_EXPORT_DIR", str(tmp_path / "exports"))
+
+        result = await VatHandler(session_factory=lambda: None)._export_period(None, 1, SETTINGS, 3, 2025)
+
+        assert "neprošlo kontrolou podle schématu EPO" in result
+        assert "• KH1: řádek " in result
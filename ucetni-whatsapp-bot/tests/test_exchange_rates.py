@@ -0,0 +1,158 @@
+"""
+Unit tests for the persisted ČNB exchange rate service
+"""
+import json
+import subprocess
+import sys
+from datetime import date, datetime
+from decimal import Decimal
+from pathlib import Path
+from unittest.mock import AsyncMock
+
+import aiohttp
+import pytest
+
+from app.services.exchange_rates import (
+    PRAGUE, ExchangeRateService, latest_publication, next_publication, parse_cnb_daily
+)
+from utils.currency_converter import CurrencyConverter
+
+ROOT = Path(__file__).resolve().parent.parent
+
+DAILY = """17.10.2025 #202
+země|měna|množství|kód|kurz
+EMU|euro|1|EUR|24,335
+Japonsko|jen|100|JPY|13,960
+USA|dolar|1|USD|20,815
+"""
+
+
+@pytest.fixture
+def rates_path(tmp_path):
+    return tmp_path / "cnb_rates.json"
+
+
+@pytest.fixture
+def stored_service(rates_path):
+    rates_path.write_text(json.dumps({
+        "valid_for": "2025-10-17",
+        "fetched_at": "2025-10-17T14:40:00",
+        "rates": {"CZK": "1.0", "EUR": "24.335"},
+    }), encoding="utf-8")
+    return ExchangeRateService(rates_path)
+
+
+class TestCnbParsing:
+    """Test parsing of the daily table and the publication schedule"""
+
+    def test_parse_daily(self):
+        valid_for, rates = parse_cnb_daily(DAILY)
+
+        assert valid_for == date(2025, 10, 17)
+        assert rates["EUR"] == Decimal("24.335")
+        assert rates["JPY"] == Decimal("0.1396")
+        assert rates["CZK"] == Decimal("1.0")
+
+    def test_parse_rejects_garbage(self):
+        with pytest.raises(ValueError):
+            parse_cnb_daily("<html>Service unavailable</html>")
+
+    @pytest.mark.parametrize("now,expected", [
+        (datetime(2025, 10, 17, 14, 0, tzinfo=PRAGUE), date(2025, 10, 16)),   # pátek před vyhlášením
+        (datetime(2025, 10, 17, 15, 0, tzinfo=PRAGUE), date(2025, 10, 17)),   # pátek po vyhlášení
+        (datetime(2025, 10, 19, 12, 0, tzinfo=PRAGUE), date(2025, 10, 17)),   # neděle
+        (datetime(2025, 10, 20, 9, 0, tzinfo=PRAGUE), date(2025, 10, 17)),    # pondělí ráno
+    ])
+    def test_latest_publication(self, now, expected):
+        assert latest_publication(now) == expected
+
+    def test_next_publication_skips_weekend(self):
+        moment = next_publication(datetime(2025, 10, 17, 16, 0, tzinfo=PRAGUE))
+
+        assert moment.date() == date(2025, 10, 20)
+        assert (moment.hour, moment.minute) == (14, 35)
+
+
+class TestExchangeRateService:
+    """Test startup without network and background refresh"""
+
+    def test_loads_stored_table_without_network(self, stored_service):
+        stored_service._download = AsyncMock()
+
+        assert stored_service.get_rate("EUR") == Decimal("24.335")
+        assert stored_service.snapshot.source == "file"
+        stored_service._download.assert_not_called()
+
+    def test_fallback_without_stored_table(self, rates_path):
+        service = ExchangeRateService(rates_path)
+
+        assert service.snapshot.source == "fallback"
+        assert service.get_rate("EUR") == Decimal("24.50")
+        assert service.is_stale()
+        assert service.stats()["age_hours"] is None
+
+    def test_staleness(self, stored_service):
+        assert not stored_service.is_stale(datetime(2025, 10, 20, 10, 0, tzinfo=PRAGUE))
+        assert stored_service.is_stale(datetime(2025, 10, 20, 15, 0, tzinfo=PRAGUE))
+        assert stored_service.age_seconds(datetime(2025, 10, 17, 15, 30, tzinfo=PRAGUE)) == 3600
+
+    @pytest.mark.asyncio
+    async def test_refresh_replaces_snapshot_and_persists(self, rates_path):
+        service = ExchangeRateService(rates_path)
+        service._download = AsyncMock(return_value=DAILY)
+        before = service.snapshot
+
+        assert await service.refresh()
+
+        assert service.snapshot is not before
+        assert service.get_rate("USD") == Decimal("20.815")
+        assert before.rates["USD"] == Decimal("22.80")
+        assert ExchangeRateService(rates_path).snapshot.valid_for == date(2025, 10, 17)
+
+    @pytest.mark.asyncio
+    async def test_failed_refresh_keeps_table(self, stored_service):
+        stored_service._download = AsyncMock(side_effect=aiohttp.ClientError("offline"))
+
+        assert not await stored_service.refresh()
+        assert stored_service.get_rate("EUR") == Decimal("24.335")
+
+    @pytest.mark.asyncio
+    async def test_lookup_triggers_single_background_refresh(self, rates_path):
+        service = ExchangeRateService(rates_path)
+        service._download = AsyncMock(return_value=DAILY)
+
+        assert service.get_rate("USD") == Decimal("22.80")
+        task = service.refresh_in_background()
+        service.get_rate("USD")
+        await task
+
+        service._download.assert_awaited_once()
+        assert service.get_rate("USD") == Decimal("20.815")
+
+    def test_no_refresh_outside_event_loop(self, rates_path):
+        service = ExchangeRateService(rates_path)
+
+        assert service.refresh_in_background() is None
+
+
+class TestCurrencyConverterWithService:
+    """Test that CurrencyConverter reads the shared snapshot"""
+
+    def test_converter_does_not_download(self, stored_service):
+        stored_service._download = AsyncMock()
+        converter = CurrencyConverter(stored_service)
+
+        assert converter.convert_to_czk(Decimal("10"), "EUR") == Decimal("243.35")
+        assert converter.get_rate("EUR") == Decimal("24.335")
+        assert converter.rates["EUR"] == Decimal("24.335")
+        stored_service._download.assert_not_called()
+
+    def test_unknown_currency(self, stored_service):
+        with pytest.raises(ValueError):
+            CurrencyConverter(stored_service).convert_to_czk(Decimal("10"), "XYZ")
+
+    def test_converter_module_does_not_import_app(self):
+        code = "import sys, utils.currency_converter; print(sorted(m for m in sys.modules if m.split('.')[0] == 'app'))"
+        result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+
+        assert result.stdout.strip() == "[]"
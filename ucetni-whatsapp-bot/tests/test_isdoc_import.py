@@ -0,0 +1,185 @@
+"""
+Unit tests for ISDOC e-invoice import
+"""
+import io
+import zipfile
+from datetime import date
+from decimal import Decimal
+from pathlib import Path
+
+import pytest
+from sqlalchemy import select
+
+from app.database.models import Transaction, TransactionAttachment, TransactionItem, User, VatRecord
+from app.services.isdoc_import import IsdocError, import_isdoc, invoice_to_records, is_isdoc, parse_isdoc
+
+ISDOC_PATH = Path(__file__).parent / "data" / "isdoc" / "alza_faktura.isdoc"
+
+
+@pytest.fixture
+def isdoc_data():
+    return ISDOC_PATH.read_bytes()
+
+
+def large_invoice(lines: int) -> bytes:
+    """Generated invoice with many lines for the streaming test"""
+    line = ("<InvoiceLine><ID>{i}</ID><InvoicedQuantity unitCode=\"ks\">1</InvoicedQuantity>"
+            "<LineExtensionAmount>100</LineExtensionAmount>"
+            "<LineExtensionAmountTaxInclusive>121</LineExtensionAmountTaxInclusive>"
+            "<LineExtensionTaxAmount>21</LineExtensionTaxAmount><UnitPrice>100</UnitPrice>"
+            "<ClassifiedTaxCategory><Percent>21</Percent></ClassifiedTaxCategory>"
+            "<Item><Description>Položka {i}</Description></Item></InvoiceLine>")
+    body = "".join(line.format(i=i) for i in range(lines))
+    return (
+        "<?xml version=\"1.0\" encoding=\"UTF-8\"?><Invoice xmlns=\"http://isdoc.cz/namespace/2013\" version=\"6.0.1\">"
+        "<DocumentType>1</DocumentType><ID>FV1</ID><IssueDate>2024-01-10</IssueDate>"
+        f"<InvoiceLines>{body}</InvoiceLines>"
+        f"<LegalMonetaryTotal><TaxInclusiveAmount>{121 * lines}</TaxInclusiveAmount></LegalMonetaryTotal></Invoice>"
+    ).encode()
+
+
+class TestIsdocParser:
+    """Test streaming ISDOC parsing and mapping"""
+
+    def test_header_and_parties(self, isdoc_data):
+        invoice = parse_isdoc(isdoc_data)
+
+        assert invoice.version == "6.0.1"
+        assert invoice.header["document_number"] == "2412345678"
+        assert invoice.header["tax_point_date"] == date(2024, 3, 14)
+        assert invoice.total == Decimal("10240.00")
+        assert invoice.supplier["ico"] == "27082440"
+        assert invoice.supplier["dic"] == "CZ27082440"
+        assert invoice.customer["ico"] == "12345678"
+
+    def test_lines_and_vat_rows(self, isdoc_data):
+        invoice = parse_isdoc(isdoc_data)
+
+        assert [line["vat_rate"] for line in invoice.lines] == [21, 12]
+        assert invoice.lines[0]["description"] == "Monitor Dell P2422H"
+        assert invoice.lines[0]["unit"] == "ks"
+        assert [(row["rate"], row["base"], row["vat"]) for row in invoice.vat_rows] == [
+            (21, Decimal("8000.00"), Decimal("1680.00")),
+            (12, Decimal("500.00"), Decimal("60.00")),
+        ]
+
+    def test_received_invoice_is_expense(self, isdoc_data):
+        transactions, items = invoice_to_records(parse_isdoc(isdoc_data), user_id=1, user_ico="12345678")
+        transaction = transactions[0]
+
+        assert transaction["type"] == "expense"
+        assert transaction["counterparty_name"] == "Alza.cz a.s."
+        assert transaction["counterparty_address"] == "Jankovcova 1522/53, 170 00 Praha 7"
+        assert transaction["bank_account"] == "1265098001/5500"
+        assert transaction["payment_method"] == "bank_transfer"
+        assert transaction["category_code"] == "501400"  # Alza from the vendor registry
+        assert sum(item["total_with_vat"] for item in items) == sum(t["amount_czk"] for t in transactions)
+
+    def test_mixed_rates_are_split(self, isdoc_data):
+        transactions, _ = invoice_to_records(parse_isdoc(isdoc_data), user_id=1, user_ico="12345678")
+
+        assert [(t["vat_rate"], t["vat_base"], t["vat_amount"], t["amount_czk"]) for t in transactions] == [
+            (21, Decimal("8000.00"), Decimal("1680.00"), Decimal("9680.00")),
+            (12, Decimal("500.00"), Decimal("60.00"), Decimal("560.00")),
+        ]
+        assert {t["document_number"] for t in transactions} == {"2412345678"}
+
+    def test_issued_invoice_is_income(self, isdoc_data):
+        [transaction, _], _ = invoice_to_records(parse_isdoc(isdoc_data), user_id=1, user_ico="27082440")
+
+        assert transaction["type"] == "income"
+        assert transaction["counterparty_ico"] == "12345678"
+        assert transaction["category_code"] == "602100"
+
+    def test_credit_note_is_negative(self, isdoc_data):
+        data = isdoc_data.replace(b"<DocumentType>1</DocumentType>", b"<DocumentType>2</DocumentType>")
+        transactions, items = invoice_to_records(parse_isdoc(data), user_id=1)
+
+        assert sum(t["amount_czk"] for t in transactions) == Decimal("-10240.00")
+        assert transactions[0]["vat_base"] == Decimal("-8000.00")
+        assert items[0]["total_with_vat"] == Decimal("-9680.00")
+
+    def test_isdocx_archive(self, isdoc_data):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w") as archive:
+            archive.writestr("faktura.isdoc", isdoc_data)
+            archive.writestr("priloha.pdf", b"%PDF-1.4")
+
+        assert is_isdoc(buffer.getvalue())
+        assert parse_isdoc(buffer.getvalue()).header["document_number"] == "2412345678"
+
+    @pytest.mark.parametrize("data", [
+        b"<?xml version=\"1.0\"?><Invoice xmlns=\"urn:oasis:names:specification:ubl\"><ID>1</ID></Invoice>",
+        b"<Invoice xmlns=\"http://isdoc.cz/namespace/2013\"><ID>1</ID>",
+        b"<Invoice xmlns=\"http://isdoc.cz/namespace/2013\"><ID>1</ID></Invoice>",
+    ])
+    def test_invalid_documents(self, data):
+        with pytest.raises(IsdocError):
+            parse_isdoc(data)
+
+    def test_many_lines(self):
+        invoice = parse_isdoc(large_invoice(5000))
+
+        assert len(invoice.lines) == 5000
+        assert invoice.lines[-1]["description"] == "Položka 4999"
+        assert invoice.total == Decimal(121 * 5000)
+
+
+pytestmark = pytest.mark.db_tables(
+    [User, Transaction, TransactionItem, TransactionAttachment, VatRecord], vat_totals=True
+)
+
+
+class TestIsdocImport:
+    """Test saving the transaction with its items"""
+
+    @pytest.mark.asyncio
+    async def test_import_and_duplicate(self, session_factory, isdoc_data):
+        async with session_factory() as session:
+            result = await import_isdoc(session, 1, isdoc_data, user_ico="12345678", file_name="faktura.isdoc")
+
+        assert result["success"]
+        assert result["items_count"] == 2
+        assert result["transaction"]["amount_czk"] == Decimal("10240.00")
+        async with session_factory() as session:
+            transactions = (await session.execute(select(Transaction).order_by(Transaction.id))).scalars().all()
+            items = (await session.execute(select(TransactionItem))).scalars().all()
+            attachment = (await session.execute(select(TransactionAttachment))).scalar_one()
+        transaction = transactions[0]
+        assert [t.id for t in transactions] == result["transaction_ids"]
+        assert sum(t.amount_czk for t in transactions) == Decimal("10240.00")
+        assert transaction.document_date == date(2024, 3, 15)
+        assert not transaction.processed_by_ai
+        assert {(item.vat_rate, item.transaction_id) for item in items} == {
+            (21, transactions[0].id), (12, transactions[1].id)
+        }
+        assert attachment.transaction_id == transaction.id
+        assert attachment.file_name == "faktura.isdoc"
+        assert attachment.ocr_extracted_data["vat_rows"][1]["rate"] == "12"
+
+        async with session_factory() as session:
+            again = await import_isdoc(session, 1, isdoc_data, user_ico="12345678")
+        assert again["duplicate"]
+        assert again["duplicate_transaction_id"] == transaction.id
+
+    @pytest.mark.asyncio
+    async def test_mixed_rates_in_vat_record(self, session_factory, isdoc_data):
+        async with session_factory() as session:
+            session.add(User(id=1, whatsapp_number="+420111"))
+            await session.commit()
+            await import_isdoc(session, 1, isdoc_data, user_ico="12345678")
+
+        async with session_factory() as session:
+            record = (await session.execute(select(VatRecord))).scalar_one()
+        assert (record.period_year, record.period_month) == (2024, 3)
+        assert (record.input_base_21, record.input_vat_21) == (Decimal("8000.00"), Decimal("1680.00"))
+        assert (record.input_base_12, record.input_vat_12) == (Decimal("500.00"), Decimal("60.00"))
+        assert record.input_base_0 == 0
+
+    @pytest.mark.asyncio
+    async def test_invalid_file(self, session_factory):
+        async with session_factory() as session:
+            result = await import_isdoc(session, 1, b"not xml at all")
+
+        assert not result["success"]
+        assert result["message"] == "Soubor není platná ISDOC faktura."
@@ -0,0 +1,176 @@
+"""
+Unit tests for the integer-haléř Money type and its database column
+"""
+import pickle
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import column, select, table, text, type_coerce
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.database.models import Transaction, User
+from app.database.money_columns import MIGRATIONS_TABLE, MoneyColumnsNotConverted, check_money_columns
+from utils.money import Money, MoneyType, ZERO, json_dumps, money_sum
+from utils.vat_calculator import VatCalculator
+
+
+@pytest_asyncio.fixture
+async def session(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+    async with engine.begin() as conn:
+        for model in (User, Transaction):
+            await conn.run_sync(model.__table__.create)
+    maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with maker() as session:
+        session.add(User(id=1, whatsapp_number="+420111"))
+        yield session
+    await engine.dispose()
+
+
+def transaction(amount, type="expense"):
+    return Transaction(user_id=1, type=type, original_message="test", amount_czk=amount,
+                       transaction_date=datetime(2025, 3, 10))
+
+
+class TestMoney:
+    """Test conversion, arithmetic and interoperability with Decimal"""
+
+    def test_of_rounds_half_up_to_halere(self):
+        assert Money.of(Decimal("10.005")).halere == 1001
+        assert Money.of("-10.005").halere == -1001
+        assert Money.of(0.1 + 0.2).halere == 30
+        assert Money.of(12).halere == 1200
+        assert Money.of(None) is ZERO
+
+    def test_sum_is_exact(self):
+        total = sum(Money.of("0.10") for _ in range(1000))
+        assert total == Money(10000)
+        assert total == Decimal("100")
+
+    def test_arithmetic_with_koruny(self):
+        amount = Money.of("121.00")
+        assert amount - 100 == Money.of(21)
+        assert 200 - amount == Money.of("79")
+        assert amount * Decimal("0.21") == Money.of("25.41")
+        assert amount * 3 == Money.of("363")
+        assert amount / Money.of("100") == Decimal("1.21")
+        assert -amount < ZERO < abs(-amount)
+
+    def test_conversions_match_decimal(self):
+        amount = Money.of("-1234.56")
+        assert str(amount) == "-1234.56"
+        assert f"{amount:,.0f}" == "-1,235"
+        assert float(amount) == -1234.56
+        assert int(amount) == int(Decimal("-1234.56"))
+        assert hash(Money.of(5)) == hash(Decimal("5.00"))
+        assert not ZERO
+
+    def test_float_equality_matches_hash(self):
+        assert Money.of(0.1) != 0.1
+        assert Money.of(0.5) == 0.5
+        assert hash(Money.of(0.5)) == hash(0.5)
+        assert len({Money.of(0.5), 0.5, Decimal("0.50")}) == 1
+
+    def test_round_half_up(self):
+        assert round(Money.of("12.50")) == 13
+        assert round(Money.of("-12.50")) == -13
+        assert round(Money.of("12.49")) == 12
+        assert round(Money.of("12.55"), 1) == Money.of("12.60")
+        assert round(Money.of("1250.00"), -2) == Money.of("1300")
+        assert round(Money.of("12.34"), 2) == Money.of("12.34")
+
+    def test_division(self):
+        assert Money.of("12.50") / 2 == Money.of("6.25")
+        assert Money.of("10.00") / 3 == Money.of("3.33")
+        assert Money.of("100.00") / Decimal("1.21") == Money.of("82.64")
+        assert Money.of("121.00") / Money.of("100.00") == Decimal("1.21")
+
+    def test_json(self):
+        from fastapi.encoders import jsonable_encoder
+
+        assert json_dumps({"amount": Money.of("1234.56")}) == '{"amount": 1234.56}'
+        assert jsonable_encoder({"amount": Money.of("99.90")}) == {"amount": 99.9}
+
+    def test_immutable_and_picklable(self):
+        amount = Money.of("99.90")
+        with pytest.raises(AttributeError):
+            amount.halere = 1
+        assert pickle.loads(pickle.dumps(amount)) == amount
+
+
+class TestMoneyColumn:
+    """Test MoneyType storage and integer SQL sums"""
+
+    @pytest.mark.asyncio
+    async def test_stored_as_integer_halere(self, session):
+        session.add(transaction(Decimal("1234.56")))
+        await session.commit()
+
+        raw = await session.scalar(text("SELECT amount_czk FROM transactions"))
+        assert raw == 123456
+        assert await session.scalar(select(Transaction.amount_czk)) == Money(123456)
+
+    @pytest.mark.asyncio
+    async def test_money_sum_and_comparison_literal(self, session):
+        session.add_all([transaction("0.10") for _ in range(10)] + [transaction(25000, "income")])
+        await session.commit()
+
+        assert await session.scalar(select(money_sum(Transaction.amount_czk))) == Decimal("25001.00")
+        big = select(money_sum(Transaction.amount_czk)).where(Transaction.amount_czk > 10000)
+        assert await session.scalar(big) == Money.of(25000)
+        empty = select(money_sum(Transaction.amount_czk)).where(Transaction.type == "none")
+        assert (await session.scalar(empty)).halere == 0
+
+
+class TestMoneyColumnsGuard:
+    """Test that the app refuses to run against columns still stored in koruny"""
+
+    @pytest_asyncio.fixture
+    async def engine(self, tmp_path):
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'legacy.db'}")
+        yield engine
+        await engine.dispose()
+
+    @pytest.mark.asyncio
+    async def test_fractional_value_is_not_truncated(self, engine):
+        async with engine.begin() as conn:
+            await conn.execute(text("CREATE TABLE legacy (amount NUMERIC(12, 2))"))
+            await conn.execute(text("INSERT INTO legacy VALUES (123.45)"))
+            amount = type_coerce(column("amount"), MoneyType())
+            result = await conn.execute(select(amount).select_from(table("legacy")))
+            with pytest.raises(ValueError):
+                result.scalar()
+
+    @pytest.mark.asyncio
+    async def test_numeric_columns_block_start_until_recorded(self, engine):
+        async with engine.begin() as conn:
+            await conn.execute(text("CREATE TABLE transactions (id INTEGER PRIMARY KEY, amount_czk NUMERIC(12, 2), "
+                                    "vat_base NUMERIC(12, 2), vat_amount NUMERIC(12, 2))"))
+
+        with pytest.raises(MoneyColumnsNotConverted, match="transactions.amount_czk"):
+            await check_money_columns(engine)
+
+        async with engine.begin() as conn:
+            await conn.execute(text(f"CREATE TABLE {MIGRATIONS_TABLE} (table_name VARCHAR, column_name VARCHAR)"))
+            for name in ("amount_czk", "vat_base", "vat_amount"):
+                await conn.execute(text(f"INSERT INTO {MIGRATIONS_TABLE} VALUES ('transactions', '{name}')"))
+        await check_money_columns(engine)
+
+    @pytest.mark.asyncio
+    async def test_new_bigint_schema_passes(self, engine):
+        async with engine.begin() as conn:
+            await conn.run_sync(Transaction.__table__.create)
+
+        await check_money_columns(engine)
+
+
+class TestVatSplit:
+    """Test that the VAT split never loses a haléř"""
+
+    def test_inclusive_amount_splits_exactly(self):
+        calculator = VatCalculator()
+        for amount in ("99.99", "100.00", "0.01", "1234.57"):
+            result = calculator.calculate_vat(Decimal(amount), "nákup vč. DPH", "expense")
+            assert result.base + result.vat == result.total == Money.of(amount)
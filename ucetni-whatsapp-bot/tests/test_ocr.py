@@ -0,0 +1,340 @@
+"""
+Unit tests for receipt OCR pipeline (image preprocessing and text extraction)
+"""
+import io
+from unittest.mock import AsyncMock
+
+import pytest
+from PIL import Image
+
+cv2 = pytest.importorskip("cv2")
+np = pytest.importorskip("numpy")
+
+from app.services.image_preprocessing import (
+    PreprocessSettings,
+    detect_receipt_region,
+    detect_skew,
+    load_grayscale,
+    preprocess_for_ocr,
+    rotate,
+)
+
+
+def render_receipt(width=1200, height=1600, font_scale=1.2, lines=30):
+    """Render synthetic receipt with dark text on light background"""
+    canvas = np.full((height, width), 235, dtype=np.uint8)
+    line_height = int(40 * font_scale)
+    for row in range(lines):
+        y = 60 + row * line_height
+        if y > height - 20:
+            break
+        cv2.putText(canvas, f"POLOZKA {row:02d}  ROHLIK 2 KS  {row * 3 + 10},90 Kc",
+                    (40, y), cv2.FONT_HERSHEY_SIMPLEX, font_scale, 20, 2, cv2.LINE_AA)
+    return canvas
+
+
+def to_jpeg(array, orientation=None):
+    image = Image.fromarray(array)
+    buffer = io.BytesIO()
+    if orientation:
+        exif = Image.Exif()
+        exif[0x0112] = orientation
+        image.save(buffer, format="JPEG", exif=exif)
+    else:
+        image.save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+def photograph_receipt(corners, size=(2250, 3000)):
+    """Place synthetic receipt into a darker noisy scene with perspective"""
+    receipt = render_receipt(width=800, height=1600, font_scale=0.9)
+    rng = np.random.default_rng(42)
+    scene = cv2.GaussianBlur(rng.integers(40, 110, (size[1], size[0])).astype(np.uint8), (7, 7), 0)
+    source = np.float32([[0, 0], [799, 0], [799, 1599], [0, 1599]])
+    matrix = cv2.getPerspectiveTransform(source, np.float32(corners))
+    warped = cv2.warpPerspective(receipt, matrix, size)
+    mask = cv2.warpPerspective(np.full_like(receipt, 255), matrix, size)
+    return np.where(mask > 0, warped, scene).astype(np.uint8)
+
+
+class TestImagePreprocessing:
+    """Test preprocessing pipeline on synthetic receipts"""
+
+    @pytest.mark.parametrize("angle", [-8.0, 5.0, 12.0])
+    def test_deskew_detects_rotation(self, angle):
+        """Skew estimate should match the applied rotation"""
+        rotated = rotate(render_receipt(), angle)
+        detected = detect_skew(rotated, max_angle=15.0)
+        assert detected == pytest.approx(angle, abs=1.0)
+
+    def test_deskew_ignores_straight_image(self):
+        """Straight receipt should not be rotated"""
+        assert detect_skew(render_receipt(), max_angle=15.0) == 0.0
+
+    def test_exif_orientation_applied(self):
+        """Portrait photo stored as landscape with EXIF 6 must be rotated upright"""
+        landscape = render_receipt(width=1600, height=1200)
+        image = Image.open(io.BytesIO(to_jpeg(landscape, orientation=6)))
+        gray = load_grayscale(image, max_long_side=4000)
+        assert gray.mode == "L"
+        assert gray.size == (1200, 1600)
+
+    def test_large_jpeg_decoded_downscaled(self):
+        """Large JPEG should be decoded directly at reduced resolution"""
+        big = render_receipt(width=4000, height=3000, font_scale=3.0)
+        image = Image.open(io.BytesIO(to_jpeg(big)))
+        result = preprocess_for_ocr(image, PreprocessSettings(max_long_side=2000))
+        assert max(result.decoded_size) < 4000
+        assert max(result.final_size) <= 2000
+
+    def test_scales_to_target_text_height(self):
+        """Large text should be downscaled towards target glyph height"""
+        image = Image.open(io.BytesIO(to_jpeg(render_receipt(width=2400, height=3200, font_scale=2.4))))
+        result = preprocess_for_ocr(image, PreprocessSettings(target_text_height=20))
+        assert result.text_height is not None
+        assert result.scale < 1.0
+
+    def test_output_is_binary(self):
+        """Thresholded output should contain only black and white pixels"""
+        image = Image.open(io.BytesIO(to_jpeg(render_receipt())))
+        result = preprocess_for_ocr(image)
+        values = np.unique(np.asarray(result.image))
+        assert set(values.tolist()) <= {0, 255}
+        assert set(result.timings_ms) >= {"decode", "resize", "threshold"}
+
+
+class TestReceiptRegion:
+    """Test receipt quadrilateral detection and cropping"""
+
+    def test_detects_receipt_quad(self):
+        """Receipt photographed at an angle should be found with its corners"""
+        corners = [[600, 500], [1500, 420], [1650, 2500], [520, 2600]]
+        quad = detect_receipt_region(photograph_receipt(corners))
+        assert quad is not None
+        assert np.abs(quad - np.float32(corners)).max() < 40
+
+    def test_falls_back_when_receipt_fills_frame(self):
+        """Scanned receipt without background should not be cropped"""
+        assert detect_receipt_region(render_receipt()) is None
+
+    def test_crop_reduces_ocr_area(self):
+        """Preprocessing should only keep receipt pixels"""
+        corners = [[600, 500], [1500, 420], [1650, 2500], [520, 2600]]
+        image = Image.open(io.BytesIO(to_jpeg(photograph_receipt(corners))))
+        result = preprocess_for_ocr(image)
+        assert result.receipt_quad is not None
+        width, height = result.final_size
+        assert height / width > 1.5  # receipt is tall and narrow, the scene is not
+
+
+def tesseract_layout(lines):
+    """Build image_to_data style dict from [(words, top)] with fixed-width words"""
+    layout = {key: [] for key in ('text', 'block_num', 'par_num', 'line_num', 'left', 'top', 'width', 'height')}
+    for line_num, (words, top) in enumerate(lines, start=1):
+        left = 10
+        for word in words.split():
+            layout['text'].append(word)
+            layout['block_num'].append(1)
+            layout['par_num'].append(1)
+            layout['line_num'].append(line_num)
+            layout['left'].append(left)
+            layout['top'].append(top)
+            layout['width'].append(len(word) * 10)
+            layout['height'].append(20)
+            left += len(word) * 10 + 10
+    return layout
+
+
+class TestOCRLayout:
+    """Test helpers working on Tesseract word boxes"""
+
+    @pytest.fixture
+    def ocr_service(self):
+        from app.services.whatsapp_ocr_service import WhatsAppOCRService
+        return WhatsAppOCRService()
+
+    def test_layout_to_text(self, ocr_service):
+        layout = tesseract_layout([("LIDL Ceska republika", 10), ("CELKEM 254,90", 40)])
+        assert ocr_service._layout_to_text(layout) == "LIDL Ceska republika\nCELKEM 254,90"
+
+    def test_total_line_prefers_k_uhrade(self, ocr_service):
+        layout = tesseract_layout([
+            ("CELKEM 210,00", 10),
+            ("K ÚHRADĚ: 254,90", 40),
+        ])
+        left, top, right, bottom = ocr_service._find_total_line_box(layout)
+        assert top == 40 and bottom == 60
+        # box starts after the keyword, so only the amount gets OCRed again
+        assert left == 10 + 10 + 10 + len("ÚHRADĚ:") * 10
+        assert right == left + 10 + len("254,90") * 10
+
+    def test_total_line_missing(self, ocr_service):
+        layout = tesseract_layout([("ROHLIK 2,90", 10)])
+        assert ocr_service._find_total_line_box(layout) is None
+
+    def reread_total(self, ocr_service, monkeypatch, line_text, data):
+        import app.services.whatsapp_ocr_service as module
+
+        monkeypatch.setattr(module.pytesseract, "image_to_string", lambda *args, **kwargs: line_text)
+        layout = tesseract_layout([("ROHLIK 2,90", 10), ("CELKEM 254,90", 40)])
+        ocr_service._verify_total_from_line(Image.new("L", (400, 100), 255), layout, data)
+        return data
+
+    def test_total_line_confirmed_by_first_pass(self, ocr_service, monkeypatch):
+        data = self.reread_total(ocr_service, monkeypatch, "254,90",
+                                 {"confidence": 0.8, "total": 2.90, "amounts": [254.90, 2.90]})
+        assert data["total"] == 254.90
+        assert data["total_source"] == "total_line"
+        assert data["confidence"] == 0.8
+
+    def test_total_line_confirmed_by_items(self, ocr_service, monkeypatch):
+        items = [{"description": "ROHLIK", "price": 4.50}, {"description": "MLEKO", "price": 20.40}]
+        data = self.reread_total(ocr_service, monkeypatch, "24,90",
+                                 {"confidence": 0.8, "total": 20.40, "amounts": [20.40], "items": items})
+        assert data["total"] == 24.90
+
+    def test_total_line_unconfirmed_keeps_total(self, ocr_service, monkeypatch):
+        data = self.reread_total(ocr_service, monkeypatch, "25,49",
+                                 {"confidence": 0.8, "total": 254.90, "amounts": [254.90]})
+        assert data["total"] == 254.90
+        assert "total_source" not in data
+        assert data["confidence"] == pytest.approx(0.7)
+
+
+class TestReceiptDedup:
+    """Test perceptual-hash deduplication of resent receipts"""
+
+    @pytest.fixture
+    def receipt_jpeg(self):
+        return to_jpeg(render_receipt())
+
+    def test_phash_survives_recompression_and_resize(self, receipt_jpeg):
+        from app.services.receipt_dedup import hamming_distance, image_phash
+
+        smaller = Image.open(io.BytesIO(receipt_jpeg)).resize((600, 800))
+        buffer = io.BytesIO()
+        smaller.save(buffer, format="JPEG", quality=60)
+
+        distance = hamming_distance(image_phash(receipt_jpeg), image_phash(buffer.getvalue()))
+        assert distance <= 4
+
+    def test_phash_differs_for_other_receipt(self, receipt_jpeg):
+        from app.services.receipt_dedup import DEFAULT_MAX_DISTANCE, hamming_distance, image_phash
+
+        other = to_jpeg(photograph_receipt([[600, 500], [1500, 420], [1650, 2500], [520, 2600]]))
+        assert hamming_distance(image_phash(receipt_jpeg), image_phash(other)) > DEFAULT_MAX_DISTANCE
+
+    def test_exact_and_media_url_match(self):
+        from app.services.receipt_dedup import ReceiptDedupCache
+
+        cache = ReceiptDedupCache()
+        cache.add(1, "abc", 0, {"total": 100.0}, media_url="https://api.twilio.com/media/1")
+
+        assert cache.find_exact(1, "abc").match_type == "sha256"
+        assert cache.find_exact(1, "xyz", "https://api.twilio.com/media/1").match_type == "media_url"
+        assert cache.find_exact(2, "abc") is None  # other users never share entries
+
+    def test_exact_keys_kept_without_phash(self, monkeypatch):
+        import app.services.whatsapp_ocr_service as module
+
+        service = module.WhatsAppOCRService()
+        monkeypatch.setattr(module, "image_phash", lambda data: None)
+        service._remember_result(1, b"undecodable", "abc", None, {"total": 100.0},
+                                 "https://api.twilio.com/media/1")
+
+        assert service.dedup_cache.find_exact(1, "abc").match_type == "sha256"
+        assert service.dedup_cache.find_exact(1, "xyz", "https://api.twilio.com/media/1") is not None
+
+    def test_discard_unsaved_receipt(self):
+        from app.services.receipt_dedup import ReceiptDedupCache
+
+        cache = ReceiptDedupCache()
+        cache.add(1, "abc", 0, {"total": 100.0})
+        cache.discard(1, "abc")
+        cache.discard(2, "abc")
+
+        assert cache.find_exact(1, "abc") is None
+
+    def test_cache_is_bounded(self):
+        from app.services.receipt_dedup import ReceiptDedupCache
+
+        cache = ReceiptDedupCache(max_entries_per_user=3, max_users=2)
+        for i in range(5):
+            cache.add(1, f"sha{i}", i, {})
+        cache.add(2, "u2", 0, {})
+        cache.add(3, "u3", 0, {})
+
+        assert cache.find_exact(1, "sha0") is None
+        assert len(cache) == 2  # user 1 evicted as least recently used
+
+    @pytest.mark.asyncio
+    async def test_resent_receipt_skips_ocr(self, receipt_jpeg):
+        from app.services.receipt_dedup import image_phash, sha256_digest
+        from app.services.whatsapp_ocr_service import WhatsAppOCRService
+
+        service = WhatsAppOCRService()
+        entry = service.dedup_cache.add(7, sha256_digest(receipt_jpeg), image_phash(receipt_jpeg),
+                                        {"success": True, "total": 254.9})
+        entry.transaction_id = 42
+
+        result = await service.process_receipt_from_whatsapp(receipt_jpeg, "", 7)
+        assert result["duplicate"] is True
+        assert result["duplicate_match"] == "sha256"
+        assert result["duplicate_transaction_id"] == 42
+        assert result["total"] == 254.9
+
+    @pytest.mark.asyncio
+    async def test_similar_receipt_is_processed_and_flagged(self, receipt_jpeg, monkeypatch):
+        import app.services.whatsapp_ocr_service as module
+        from app.services.receipt_dedup import image_phash, sha256_digest
+
+        service = module.WhatsAppOCRService()
+        entry = service.dedup_cache.add(7, sha256_digest(receipt_jpeg), image_phash(receipt_jpeg),
+                                        {"success": True, "total": 254.9})
+        entry.transaction_id = 42
+        # Fields straight from the QR code, without Tesseract or AI
+        monkeypatch.setattr(module, "OCR_FUNCTIONAL", False)
+        monkeypatch.setattr(service, "_read_qr_fields", lambda data: {"total": 310.0, "total_source": "qr"})
+        complete = AsyncMock(side_effect=lambda data, *args: (dict(data), None))
+        monkeypatch.setattr(service, "_complete_receipt_fields", complete)
+
+        resent = Image.open(io.BytesIO(receipt_jpeg))
+        buffer = io.BytesIO()
+        resent.save(buffer, format="PNG")  # forwarded as a document, or another receipt from the same shop
+
+        result = await service.process_receipt_from_whatsapp(buffer.getvalue(), "", 7)
+        assert result["success"] is True
+        assert "duplicate" not in result
+        assert result["total"] == 310.0
+        assert result["possible_duplicate"] is True
+        assert result["possible_duplicate_transaction_id"] == 42
+
+
+class TestImageQuality:
+    """Test fast quality gate that runs before OCR"""
+
+    @pytest.fixture
+    def receipt(self):
+        return render_receipt(width=2400, height=3200, font_scale=2.4)
+
+    def test_sharp_receipt_passes(self, receipt):
+        from app.services.image_quality import assess_quality
+
+        report = assess_quality(to_jpeg(receipt))
+        assert report.ok
+        assert {"blur_variance", "brightness", "contrast", "elapsed_ms"} <= set(report.metrics)
+
+    @pytest.mark.parametrize("transform,issue", [
+        (lambda img: cv2.GaussianBlur(img, (0, 0), 9), "blurry"),
+        (lambda img: (img * 0.2).astype(np.uint8), "too_dark"),
+        (lambda img: np.clip(img.astype(int) + 60, 0, 255).astype(np.uint8), "overexposed"),
+        (lambda img: (img * 0.1 + 120).astype(np.uint8), "low_contrast"),
+        (lambda img: cv2.resize(img, (300, 400)), "too_small"),
+    ])
+    def test_bad_photo_rejected_with_hint(self, receipt, transform, issue):
+        from app.services.image_quality import QUALITY_HINTS, assess_quality
+
+        report = assess_quality(to_jpeg(transform(receipt)))
+        assert not report.ok
+        assert report.issue == issue
+        assert report.hint == QUALITY_HINTS[issue]
@@ -0,0 +1,127 @@
+"""
+Unit tests for batch OCR reprocessing of stored attachments
+"""
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import select
+
+import app.services.ocr_reprocessing as reprocessing
+from app.database.models import TransactionAttachment
+from app.services.ocr_reprocessing import AttachmentReprocessor, diff_fields, format_progress, old_field_values
+
+
+class StubService:
+    """Returns extraction based on file name instead of running Tesseract"""
+
+    def extract_from_image(self, image_data):
+        text = image_data.decode()
+        if text == "broken":
+            raise ValueError("cannot identify image file")
+        return {
+            "ocr_text": text,
+            "extracted_data": {"total": 240.1, "ico": "26178541", "date": "2024-03-15", "confidence": 0.9},
+            "quality": {"blur_variance": 320.0},
+        }
+
+    def extract_from_pdf(self, pdf_data):
+        return {
+            "ocr_text": "invoice",
+            "extracted_data": {"total": 1210.0, "ico": "27082440", "date": "2024-03-15", "text_layer": True},
+            "pages": [{"page": 1, "source": "text", "chars": 7, "elapsed_ms": 0.5}],
+        }
+
+
+pytestmark = pytest.mark.db_tables([TransactionAttachment])
+
+
+@pytest_asyncio.fixture
+async def session_factory(session_factory, tmp_path):
+    async with session_factory() as session:
+        for i in range(1, 8):
+            (tmp_path / f"{i}.jpg").write_bytes(b"broken" if i == 4 else f"receipt {i}".encode())
+            session.add(TransactionAttachment(
+                id=i, transaction_id=i, file_name=f"{i}.jpg", file_type="image/jpeg",
+                ocr_text="old", ocr_extracted_data={"total": 240.1 if i % 2 else 24.1, "ico": "26178541"}
+            ))
+        (tmp_path / "8.pdf").write_bytes(b"%PDF-1.4 invoice")
+        session.add(TransactionAttachment(id=8, transaction_id=8, file_name="8.pdf", file_type="application/pdf"))
+        session.add(TransactionAttachment(id=9, transaction_id=9, file_name="9.txt", file_type="text/plain"))
+        await session.commit()
+
+    return session_factory
+
+
+@pytest.fixture
+def reprocessor(session_factory, tmp_path, monkeypatch):
+    monkeypatch.setattr(reprocessing, "_get_worker_service", lambda: StubService())
+    return AttachmentReprocessor(
+        session_factory, tmp_path / "checkpoint.json", tmp_path / "report.jsonl",
+        chunk_size=3, media_dir=str(tmp_path), progress=lambda message: None
+    )
+
+
+class TestFieldDiff:
+    """Test comparison of stored and new extraction"""
+
+    def test_old_values_fall_back_to_ai_data(self):
+        old = old_field_values({"quality": {}}, {"amount": 99.5, "counterparty_ico": "27082440", "items": [{}, {}]})
+        assert old["total"] == 99.5
+        assert old["ico"] == "27082440"
+        assert old["items"] == 2
+
+    def test_diff_reports_only_changes(self):
+        old = old_field_values({"total": "240.10", "ico": "26178541"}, None)
+        changes = diff_fields(old, {"total": 240.1, "ico": "26178541", "date": "2024-03-15"})
+        assert changes == {"date": [None, "2024-03-15"]}
+
+    def test_progress_line(self):
+        assert format_progress(50, 200, 10.0) == "50/200 (25.0 %) | 5.0 příloh/s | ETA 0:00:30"
+
+
+class TestReprocessRun:
+    """Test chunked run with checkpoint, report and update"""
+
+    @pytest.mark.asyncio
+    async def test_report_and_checkpoint(self, reprocessor, tmp_path):
+        with ThreadPoolExecutor(2) as executor:
+            checkpoint = await reprocessor.run(executor)
+
+        assert checkpoint.processed == 8  # text file is skipped
+        assert checkpoint.errors == 1
+        assert checkpoint.last_id == 8
+        report = [json.loads(line) for line in (tmp_path / "report.jsonl").read_text().splitlines()]
+        assert {entry["id"] for entry in report if "error" in entry} == {4}
+        changed_totals = [entry["id"] for entry in report if "total" in entry.get("changes", {})]
+        assert changed_totals == [2, 6, 8]
+        assert checkpoint.field_changes["date"] == 7
+
+    @pytest.mark.asyncio
+    async def test_resume_after_interruption(self, reprocessor, tmp_path):
+        with ThreadPoolExecutor(2) as executor:
+            first = await reprocessor.run(executor, limit=3)
+            assert first.last_id == 3
+            second = await reprocessor.run(executor, resume=True)
+
+        assert second.processed == 8
+        ids = [json.loads(line)["id"] for line in (tmp_path / "report.jsonl").read_text().splitlines()]
+        assert ids == sorted(set(ids))
+
+    @pytest.mark.asyncio
+    async def test_update_rows(self, reprocessor, session_factory):
+        reprocessor.update = True
+        with ThreadPoolExecutor(2) as executor:
+            checkpoint = await reprocessor.run(executor)
+
+        assert checkpoint.updated == 7
+        async with session_factory() as session:
+            row = await session.get(TransactionAttachment, 2)
+            broken = await session.get(TransactionAttachment, 4)
+            pdf = await session.get(TransactionAttachment, 8)
+        assert row.ocr_text == "receipt 2"
+        assert row.ocr_extracted_data["total"] == 240.1
+        assert row.ocr_extracted_data["quality"] == {"blur_variance": 320.0}
+        assert broken.ocr_text == "old"
+        assert pdf.ocr_extracted_data["pdf_pages"][0]["source"] == "text"
@@ -0,0 +1,216 @@
+"""
+Unit tests for the background ARES lookup during onboarding
+"""
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+import app.onboarding as wizard_module
+from app.database.models import User
+from app.onboarding import OnboardingStep, OnboardingWizard
+from app.services.ares_prefetch import AresPrefetch
+from app.services.ares_service import ICO_NOT_FOUND_ERROR
+from app.services.onboarding_service import OnboardingService
+
+ALZA_SERVICE = {
+    "valid": True,
+    "ico": "27082440",
+    "business_name": "Alza.cz a.s.",
+    "dic": "CZ27082440",
+    "address": {"street": "Jankovcova", "house_number": "1522/53", "city": "Praha", "postal_code": "17000"},
+    "vat_payer": True,
+}
+
+ALZA_VALIDATOR = {
+    "valid": True,
+    "ico": "27082440",
+    "name": "Alza.cz a.s.",
+    "dic": "CZ27082440",
+    "full_address": "Jankovcova 1522/53, 17000 Praha",
+}
+
+
+def slow_lookup(result, delay):
+    async def lookup(ico, **kwargs):
+        await asyncio.sleep(delay)
+        return result
+    return AsyncMock(side_effect=lookup)
+
+
+@pytest.fixture
+def prefetch(monkeypatch):
+    prefetch = AresPrefetch(wait_timeout=0.5)
+    monkeypatch.setattr(wizard_module, "ares_prefetch", prefetch)
+    monkeypatch.setattr("app.services.onboarding_service.ares_prefetch", prefetch)
+    return prefetch
+
+
+class TestAresPrefetch:
+    """Test the bounded wait for a lookup started earlier"""
+
+    @pytest.mark.asyncio
+    async def test_result_of_started_lookup(self, prefetch):
+        lookup = slow_lookup(ALZA_SERVICE, 0.01)
+        prefetch.start("u1", "27082440", lookup)
+
+        assert await prefetch.result("u1", "27082440", lookup) == ALZA_SERVICE
+        lookup.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_timeout_keeps_lookup_running(self, prefetch):
+        lookup = slow_lookup(ALZA_SERVICE, 0.05)
+        prefetch.start("u1", "27082440", lookup)
+
+        assert await prefetch.result("u1", "27082440", lookup, timeout=0.001) is None
+        assert prefetch.peek("u1") is None
+
+        await asyncio.sleep(0.08)
+        assert prefetch.peek("u1") == ALZA_SERVICE
+
+    @pytest.mark.asyncio
+    async def test_missing_lookup_is_started(self, prefetch):
+        lookup = slow_lookup(ALZA_SERVICE, 0)
+
+        assert await prefetch.result("u1", "27082440", lookup) == ALZA_SERVICE
+
+    @pytest.mark.asyncio
+    async def test_failed_lookup(self, prefetch):
+        lookup = AsyncMock(side_effect=RuntimeError("boom"))
+        prefetch.start("u1", "27082440", lookup)
+
+        assert await prefetch.result("u1", "27082440", lookup) is None
+
+    @pytest.mark.asyncio
+    async def test_abandoned_result_expires(self):
+        prefetch = AresPrefetch(wait_timeout=0.5, ttl=0.1)
+        prefetch.start("u1", "27082440", slow_lookup(ALZA_SERVICE, 0))
+        prefetch.start("u2", "27082440", slow_lookup(ALZA_SERVICE, 0))
+        await asyncio.sleep(0.01)
+        assert prefetch.peek("u1") == ALZA_SERVICE
+
+        prefetch.start("u2", "26178541", slow_lookup(ALZA_SERVICE, 0.05))
+        await asyncio.sleep(0.12)
+        assert prefetch.peek("u1") is None
+        assert set(prefetch._tasks) == {"u2"}
+        assert prefetch.peek("u2") == ALZA_SERVICE
+
+
+class TestOnboardingWizardPrefetch:
+    """Test that the IČO step replies before ARES answers"""
+
+    @pytest.fixture
+    def wizard(self):
+        wizard = OnboardingWizard()
+        wizard.start_onboarding(1)
+        wizard.user_sessions[1]['step'] = OnboardingStep.ICO
+        wizard.user_sessions[1]['data']['full_name'] = 'Jan Novák'
+        return wizard
+
+    @pytest.mark.asyncio
+    async def test_ico_reply_does_not_wait(self, monkeypatch, prefetch, wizard):
+        lookup = slow_lookup(ALZA_VALIDATOR, 0.05)
+        monkeypatch.setattr(wizard_module, "validate_ico", lookup)
+        loop = asyncio.get_running_loop()
+
+        started = loop.time()
+        reply = await wizard.process_onboarding_message(1, "27082440")
+        assert loop.time() - started < 0.03
+        assert "Je to správně?" in reply
+
+        reply = await wizard.process_onboarding_message(1, "ano")
+
+        data = wizard.get_user_onboarding_data(1)
+        assert data['company_name'] == "Alza.cz a.s."
+        assert data['address'] == "Jankovcova 1522/53, 17000 Praha"
+        assert data['dic'] == "CZ27082440"
+        assert data['vat_payer'] is True
+        assert "Alza.cz a.s." in reply
+        assert wizard.user_sessions[1]['step'] == OnboardingStep.TAX_MODE
+        lookup.assert_awaited_once()
+        assert lookup.await_args.args == ("27082440",)
+        assert lookup.await_args.kwargs == {"cache": wizard_module.ares_cache}
+
+    @pytest.mark.asyncio
+    async def test_confirm_does_not_block_on_slow_ares(self, monkeypatch, prefetch, wizard):
+        prefetch.wait_timeout = 0.01
+        monkeypatch.setattr(wizard_module, "validate_ico", slow_lookup(ALZA_VALIDATOR, 1))
+
+        await wizard.process_onboarding_message(1, "27082440")
+        reply = await wizard.process_onboarding_message(1, "ano")
+
+        assert "nepodařilo načíst" in reply
+        assert wizard.user_sessions[1]['step'] == OnboardingStep.TAX_MODE
+        assert wizard.get_user_onboarding_data(1)['company_name'] == "Podnikatel IČO 27082440"
+        wizard.cleanup_session(1)
+
+    @pytest.mark.asyncio
+    async def test_bad_checksum_rejected_locally(self, monkeypatch, prefetch, wizard):
+        lookup = AsyncMock()
+        monkeypatch.setattr(wizard_module, "validate_ico", lookup)
+
+        reply = await wizard.process_onboarding_message(1, "12345678")
+
+        assert reply.startswith("❌")
+        lookup.assert_not_called()
+
+
+class TestOnboardingServicePrefetch:
+    """Test the database-backed onboarding flow"""
+
+    @pytest.fixture
+    def user(self):
+        return User(id=7, whatsapp_number="whatsapp:+420123456789", full_name="Jan Novák",
+                    onboarding_step="ico", onboarding_data={})
+
+    @pytest.mark.asyncio
+    async def test_ico_then_dic_uses_prefetched_data(self, prefetch, user):
+        service = OnboardingService()
+        service.ares_service.validate_ico = slow_lookup(ALZA_SERVICE, 0.05)
+        db = MagicMock()
+        loop = asyncio.get_running_loop()
+
+        started = loop.time()
+        result = await service.process_onboarding_step(user, "27082440", db)
+        assert loop.time() - started < 0.03
+        assert result["next_step"] == "dic"
+        assert user.business_name is None
+
+        result = await service.process_onboarding_step(user, "nemám", db)
+
+        assert result["next_step"] == "business_type"
+        assert user.business_name == "Alza.cz a.s."
+        assert user.city == "Praha"
+        assert user.onboarding_data["ares_data"]["vat_payer"] is True
+        assert "CZ27082440" in result["message"]
+        assert prefetch.peek(("onboarding_service", 7)) is None
+
+    @pytest.mark.asyncio
+    async def test_unknown_ico_goes_back(self, prefetch, user):
+        service = OnboardingService()
+        service.ares_service.validate_ico = AsyncMock(return_value={"valid": False, "error": ICO_NOT_FOUND_ERROR})
+
+        await service.process_onboarding_step(user, "27082440", MagicMock())
+        result = await service.process_onboarding_step(user, "CZ27082440", MagicMock())
+
+        assert result["next_step"] == "ico"
+        assert user.onboarding_step == "ico"
+        assert user.ico is None
+
+    @pytest.mark.asyncio
+    async def test_ares_outage_keeps_ico(self, prefetch, user):
+        service = OnboardingService()
+        outage = {"valid": False, "error": "ARES API nedostupné (HTTP 503)"}
+        service.ares_service.validate_ico = AsyncMock(side_effect=[outage, ALZA_SERVICE])
+
+        await service.process_onboarding_step(user, "27082440", MagicMock())
+        result = await service.process_onboarding_step(user, "nemám", MagicMock())
+
+        assert result["next_step"] == "business_type"
+        assert user.ico == "27082440"
+        assert user.business_name is None
+        assert "doplním později" in result["message"]
+
+        # Dotaz se zopakoval na pozadí a dokončení registrace si údaje vezme
+        await asyncio.sleep(0)
+        assert prefetch.peek(("onboarding_service", 7)) == ALZA_SERVICE
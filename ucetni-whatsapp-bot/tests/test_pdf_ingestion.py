@@ -0,0 +1,168 @@
+"""
+Unit tests for PDF invoice ingestion (text layer first, OCR of scanned pages)
+"""
+import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+pytest.importorskip("pypdfium2")
+canvas = pytest.importorskip("reportlab.pdfgen.canvas")
+from PIL import Image, ImageDraw
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.utils import ImageReader
+
+from app.services.pdf_ingestion import PdfSettings, extract_pdf_text, is_pdf, iter_pdf_pages
+
+INVOICE_TEXT = """ALZA.CZ a.s.
+Faktura c. 2024001
+ICO: 27082440
+Datum: 15.03.2024
+Celkem k uhrade 1 210,00 Kc"""
+
+
+def make_pdf(pages) -> bytes:
+    """PDF with ('text', content) pages and ('scan', content) pages that only hold an image"""
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4)
+    for kind, content in pages:
+        if kind == "text":
+            y = 800
+            for line in content.split("\n"):
+                pdf.drawString(50, y, line)
+                y -= 16
+        else:
+            image = Image.new("L", (800, 300), 255)
+            ImageDraw.Draw(image).text((10, 10), content, fill=0)
+            pdf.drawImage(ImageReader(image), 50, 400, 400, 150)
+        pdf.showPage()
+    pdf.save()
+    return buffer.getvalue()
+
+
+def ocr_layout(lines):
+    """Minimal pytesseract image_to_data output with one word per line"""
+    layout = {key: [] for key in ("text", "block_num", "par_num", "line_num", "top", "height")}
+    for i, line in enumerate(lines):
+        for word in line.split():
+            layout["text"].append(word)
+            layout["block_num"].append(1)
+            layout["par_num"].append(1)
+            layout["line_num"].append(i)
+            layout["top"].append(i * 20)
+            layout["height"].append(15)
+    return layout
+
+
+class TestPdfPages:
+    """Test page streaming"""
+
+    def test_is_pdf(self):
+        assert is_pdf(make_pdf([("text", INVOICE_TEXT)]))
+        assert not is_pdf(b"\xff\xd8\xff\xe0 JPEG")
+
+    def test_text_layer_skips_ocr(self):
+        ocr_page = MagicMock(side_effect=AssertionError("OCR called"))
+
+        result = extract_pdf_text(make_pdf([("text", INVOICE_TEXT)]), ocr_page)
+
+        assert [page.source for page in result.pages] == ["text"]
+        assert "Celkem k uhrade 1 210,00 Kc" in result.text
+        assert "\r" not in result.text
+
+    def test_scanned_pages_in_order(self):
+        pdf_data = make_pdf([("text", INVOICE_TEXT), ("scan", "a"), ("scan", "b"), ("text", INVOICE_TEXT)])
+        calls = []
+
+        def ocr_page(image):
+            calls.append(image.size)
+            return f"page {len(calls)}"
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            pages = list(iter_pdf_pages(pdf_data, ocr_page, executor))
+
+        assert [page.index for page in pages] == [0, 1, 2, 3]
+        assert [page.source for page in pages] == ["text", "ocr", "ocr", "text"]
+        assert len(calls) == 2
+
+    def test_in_flight_pages_are_bounded(self):
+        pdf_data = make_pdf([("scan", str(i)) for i in range(8)])
+        lock = threading.Lock()
+        active = {"now": 0, "max": 0}
+
+        def ocr_page(image):
+            with lock:
+                active["now"] += 1
+                active["max"] = max(active["max"], active["now"])
+            time.sleep(0.02)
+            with lock:
+                active["now"] -= 1
+            return "text"
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            pages = list(iter_pdf_pages(pdf_data, ocr_page, executor, PdfSettings(dpi=72, max_in_flight=2)))
+
+        assert len(pages) == 8
+        assert active["max"] <= 2
+
+    def test_page_error_does_not_stop_document(self):
+        pdf_data = make_pdf([("scan", "a"), ("text", INVOICE_TEXT)])
+
+        result = extract_pdf_text(pdf_data, MagicMock(side_effect=RuntimeError("tesseract")))
+
+        assert result.pages[0].error == "RuntimeError: tesseract"
+        assert result.summary()[1]["source"] == "text"
+        assert "ALZA.CZ" in result.text
+
+
+class TestPdfInWhatsAppService:
+    """Test that PDFs go through the same extraction as photos"""
+
+    @pytest.fixture
+    def service(self):
+        from app.services.whatsapp_ocr_service import WhatsAppOCRService
+
+        service = WhatsAppOCRService()
+        service.ai_processor = MagicMock()
+        service.ai_processor.client = None
+        service.ai_processor.process_missing_fields = AsyncMock(return_value=None)
+        return service
+
+    @pytest.mark.asyncio
+    async def test_text_layer_invoice(self, service):
+        pdf_data = make_pdf([("text", INVOICE_TEXT)])
+
+        result = await service.process_receipt_from_whatsapp(pdf_data, user_id=7)
+
+        assert result["success"]
+        assert result["total"] == 1210.0
+        assert result["ico"] == "27082440"
+        assert result["vendor"] == "Alza.cz"
+        assert result["pdf_pages"][0]["source"] == "text"
+
+        again = await service.process_receipt_from_whatsapp(pdf_data, user_id=7)
+        assert again["duplicate"]
+
+    def test_scanned_invoice_uses_ocr(self, service, monkeypatch):
+        import app.services.whatsapp_ocr_service as module
+
+        monkeypatch.setattr(module, "OCR_FUNCTIONAL", True)
+        layout = ocr_layout(INVOICE_TEXT.split("\n"))
+        monkeypatch.setattr(module.pytesseract, "image_to_data", MagicMock(return_value=layout))
+
+        result = service.extract_from_pdf(make_pdf([("scan", "faktura")]))
+
+        assert result["extracted_data"]["total"] == 1210.0
+        assert "text_layer" not in result["extracted_data"]
+        assert result["pages"][0]["source"] == "ocr"
+
+
+def test_allowed_file_accepts_pdf():
+    pytest.importorskip("fastapi")
+    from app.endpoints.ocr_endpoint import allowed_file
+
+    assert allowed_file("faktura.PDF")
+    assert not allowed_file("faktura.docx")
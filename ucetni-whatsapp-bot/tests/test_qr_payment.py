@@ -0,0 +1,126 @@
+"""
+Unit tests for QR Platba (SPAYD) and QR Faktura decoding
+"""
+import io
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+np = pytest.importorskip("numpy")
+from PIL import Image
+
+from app.services.qr_payment import decode_qr_texts, iban_to_czech_account, parse_spayd, read_qr_payment
+
+PAYMENT = "SPD*1.0*ACC:CZ5855000000001265098001+RZBCCZPP*AM:480.50*CC:CZK*X-VS:1234567890*DT:20240415*RN:ALZA.CZ A.S."
+INVOICE = "*X-INV:SID%2A1.0%2AID:2024001234%2ADD:20240401%2AINI:27082440%2AVII:CZ27082440"
+
+
+def invoice_photo(content: str, module_px: int = 6) -> bytes:
+    """A4-like page with the QR code in the bottom corner, encoded as JPEG"""
+    code = cv2.QRCodeEncoder.create().encode(content)
+    code = cv2.resize(code, None, fx=module_px, fy=module_px, interpolation=cv2.INTER_NEAREST)
+    page = np.full((3000, 2200), 255, np.uint8)
+    cv2.putText(page, "FAKTURA 2024001234", (150, 300), cv2.FONT_HERSHEY_SIMPLEX, 3, 0, 6)
+    page[2400:2400 + code.shape[0], 1600:1600 + code.shape[1]] = code
+    buffer = io.BytesIO()
+    Image.fromarray(page).save(buffer, "JPEG", quality=85)
+    return buffer.getvalue()
+
+
+class TestSpaydParser:
+    """Test SPAYD / SID parsing"""
+
+    def test_payment_fields(self):
+        payment = parse_spayd(PAYMENT)
+        assert payment.iban == "CZ5855000000001265098001"
+        assert payment.bic == "RZBCCZPP"
+        assert payment.bank_account == "1265098001/5500"
+        assert payment.amount == 480.5
+        assert payment.variable_symbol == "1234567890"
+        assert payment.due_date == "2024-04-15"
+        assert payment.recipient_name == "ALZA.CZ A.S."
+
+    def test_embedded_invoice(self):
+        fields = parse_spayd(PAYMENT + INVOICE).to_receipt_fields()
+        assert fields["ico"] == "27082440"
+        assert fields["dic"] == "CZ27082440"
+        assert fields["date"] == "2024-04-01"
+        assert fields["document_number"] == "2024001234"
+
+    def test_standalone_invoice(self):
+        payment = parse_spayd("SID*1.0*ID:FV-17*DD:20240301*AM:1210.00*VS:17*INI:25110161")
+        assert payment.amount == 1210.0
+        assert payment.variable_symbol == "17"
+        assert payment.ico == "25110161"
+
+    @pytest.mark.parametrize("text", ["", "https://example.com", "SPD*1.0", "BCD\n001\n1\nSCT"])
+    def test_not_spayd(self, text):
+        assert parse_spayd(text) is None
+
+    @pytest.mark.parametrize("iban,account", [
+        ("CZ5855000000001265098001", "1265098001/5500"),
+        ("CZ6508000000192000145399", "19-2000145399/0800"),
+        ("DE89370400440532013000", None),
+    ])
+    def test_iban_to_account(self, iban, account):
+        assert iban_to_czech_account(iban) == account
+
+
+class TestQrDecoding:
+    """Test decoding QR codes from photos"""
+
+    def test_decode_from_photo(self):
+        payment = read_qr_payment(invoice_photo(PAYMENT))
+        assert payment is not None
+        assert payment.amount == 480.5
+
+    def test_no_qr_code(self):
+        page = np.full((1200, 900), 255, np.uint8)
+        buffer = io.BytesIO()
+        Image.fromarray(page).save(buffer, "PNG")
+        assert decode_qr_texts(buffer.getvalue()) == []
+
+
+class TestQrFastPath:
+    """Test that the WhatsApp OCR service uses QR data before OCR"""
+
+    @pytest.fixture
+    def service(self):
+        from app.services.whatsapp_ocr_service import WhatsAppOCRService
+
+        service = WhatsAppOCRService()
+        service.ai_processor = MagicMock()
+        service.ai_processor.client = None
+        service.ai_processor.process_missing_fields = AsyncMock(return_value=None)
+        return service
+
+    @pytest.mark.asyncio
+    async def test_complete_qr_invoice_skips_ocr(self, service, monkeypatch):
+        import app.services.whatsapp_ocr_service as module
+
+        monkeypatch.setattr(module, "OCR_FUNCTIONAL", True)
+        monkeypatch.setattr(module.pytesseract, "image_to_data", MagicMock(side_effect=AssertionError("OCR called")))
+
+        result = await service.process_receipt_from_whatsapp(invoice_photo(PAYMENT + INVOICE), user_id=7)
+
+        assert result["success"]
+        assert result["amount"] == 480.5
+        assert result["bank_account"] == "1265098001/5500"
+        assert result["variable_symbol"] == "1234567890"
+        assert result["due_date"] == "2024-04-15"
+        assert result["vendor"] == "Alza.cz"
+        assert result["category"] == "501400"
+        assert not result["ai_processed"]
+
+    @pytest.mark.asyncio
+    async def test_partial_qr_without_ocr_engine(self, service, monkeypatch):
+        import app.services.whatsapp_ocr_service as module
+
+        monkeypatch.setattr(module, "OCR_FUNCTIONAL", False)
+        photo = invoice_photo(PAYMENT.replace("ALZA.CZ A.S.", "JAN NOVAK"))
+        result = await service.process_receipt_from_whatsapp(photo)
+
+        assert result["success"]
+        assert result["total"] == 480.5
+        assert "ico" not in result
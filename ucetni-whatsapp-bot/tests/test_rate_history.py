@@ -0,0 +1,111 @@
+"""
+Unit tests for the historical ČNB rate store
+"""
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+import app.services.rate_history as rate_history_module
+from app.services.exchange_rates import ExchangeRateService
+from app.services.rate_history import RateHistory, parse_cnb_year
+from utils.currency_converter import CurrencyConverter
+
+YEAR_2024 = """Datum|1 EUR|100 JPY|1 USD
+27.12.2024|25,185|15,310|24,135
+30.12.2024|25,185|15,340|24,150
+31.12.2024|25,185|15,330|24,250
+"""
+
+YEAR_2025 = """Datum|1 EUR|100 JPY|1 USD
+02.01.2025|25,160|15,360|24,315
+03.01.2025|25,205|15,440|24,520
+Datum|1 EUR|100 JPY|1 USD|1000 IDR
+06.01.2025|25,175|15,400|24,370|1,505
+"""
+
+
+@pytest.fixture
+def history(tmp_path):
+    history = RateHistory(tmp_path / "history")
+    history.import_year(2024, YEAR_2024)
+    history.import_year(2025, YEAR_2025)
+    return history
+
+
+class TestRateHistory:
+    """Test the yearly import and date lookups"""
+
+    def test_parse_year_with_repeated_header(self):
+        tables = list(parse_cnb_year(YEAR_2025))
+
+        assert [day for day, _ in tables] == [date(2025, 1, 2), date(2025, 1, 3), date(2025, 1, 6)]
+        assert tables[2][1]["IDR"] == Decimal("0.001505")
+        assert tables[0][1]["JPY"] == Decimal("0.1536")
+
+    def test_lookup_on_publication_day(self, history):
+        assert history.lookup("USD", date(2025, 1, 3)) == (Decimal("24.52"), date(2025, 1, 3))
+
+    def test_weekend_and_holiday_use_last_published_rate(self, history):
+        assert history.lookup("USD", date(2025, 1, 5)) == (Decimal("24.52"), date(2025, 1, 3))
+        assert history.lookup("USD", date(2025, 1, 1)) == (Decimal("24.25"), date(2024, 12, 31))
+        assert history.lookup("JPY", date(2024, 12, 28)) == (Decimal("0.1531"), date(2024, 12, 27))
+
+    def test_dates_outside_history(self, history):
+        assert history.lookup("USD", date(2024, 12, 1)) is None
+        assert history.lookup("USD", date(2025, 3, 1)) is None
+        assert history.lookup("IDR", date(2025, 1, 3)) is None
+        assert history.lookup("XYZ", date(2025, 1, 3)) is None
+
+    def test_reloads_from_disk(self, history):
+        reloaded = RateHistory(history.directory)
+
+        assert reloaded.coverage() == (date(2024, 12, 27), date(2025, 1, 6))
+        assert reloaded.lookup("EUR", date(2025, 1, 2)) == (Decimal("25.16"), date(2025, 1, 2))
+
+    def test_add_table_before_load(self, history):
+        lazy = RateHistory(history.directory)
+        lazy.add_table(date(2025, 1, 7), {"USD": Decimal("24.4"), "CZK": Decimal("1.0")})
+
+        assert lazy.lookup("USD", date(2025, 1, 8)) == (Decimal("24.4"), date(2025, 1, 7))
+        assert lazy.lookup("USD", date(2025, 1, 6)) == (Decimal("24.37"), date(2025, 1, 6))
+
+    @pytest.mark.parametrize("numpy_available", [True, False])
+    def test_convert_batch_matches_lookup(self, monkeypatch, history, numpy_available):
+        if numpy_available and not rate_history_module.NUMPY_AVAILABLE:
+            pytest.skip("numpy is not installed")
+        monkeypatch.setattr(rate_history_module, "NUMPY_AVAILABLE", numpy_available)
+        currencies = ["USD", "EUR", "CZK", "USD", "XYZ", "JPY"]
+        dates = [date(2025, 1, 4), date(2024, 12, 30), date(2025, 1, 2),
+                 date(2020, 1, 1), date(2025, 1, 2), date(2025, 1, 6)]
+        amounts = [Decimal("100"), Decimal("10.50"), Decimal("99"), Decimal("1"), Decimal("1"), Decimal("1000")]
+
+        results = history.convert_batch(currencies, dates, amounts)
+
+        assert results[0] == (Decimal("2452.00"), Decimal("24.52"), date(2025, 1, 3))
+        assert results[1] == (Decimal("264.44"), Decimal("25.185"), date(2024, 12, 30))
+        assert results[2][0] == Decimal("99")
+        assert results[3] is None
+        assert results[4] is None
+        assert results[5] == (Decimal("154.00"), Decimal("0.154"), date(2025, 1, 6))
+
+
+class TestConverterOnDocumentDate:
+    """Test that CurrencyConverter uses the rate for the document date"""
+
+    @pytest.fixture
+    def converter(self, tmp_path, history):
+        service = ExchangeRateService(tmp_path / "cnb_rates.json")
+        service.install(date(2025, 1, 6), {"CZK": Decimal("1.0"), "USD": Decimal("24.37")})
+        return CurrencyConverter(service, history)
+
+    def test_backdated_document(self, converter):
+        assert converter.convert_to_czk(Decimal("10"), "USD", date(2024, 12, 30)) == Decimal("241.50")
+        assert converter.rate_on("USD", date(2025, 1, 4)) == (Decimal("24.52"), date(2025, 1, 3))
+
+    def test_today_uses_current_table(self, converter):
+        assert converter.rate_on("USD") == (Decimal("24.37"), date(2025, 1, 6))
+        assert converter.get_rate("USD", date(2025, 1, 8)) == Decimal("24.37")
+
+    def test_missing_history_falls_back_to_current(self, converter):
+        assert converter.get_rate("USD", date(2019, 5, 1)) == Decimal("24.37")
@@ -0,0 +1,120 @@
+"""
+Unit tests for confidence-scored OCR cascade
+"""
+import json
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from app.services.receipt_confidence import ico_checksum_valid, score_receipt_fields
+from app.services.receipt_tokenizer import extract_receipt_fields
+
+CORPUS_DIR = Path(__file__).parent / "data" / "ocr_texts"
+
+
+def corpus_fields(name):
+    text = (CORPUS_DIR / name).read_text(encoding="utf-8")
+    return extract_receipt_fields(text), text
+
+
+class TestConfidenceScore:
+    """Test consistency checks on rule-based extraction"""
+
+    @pytest.mark.parametrize("ico,valid", [
+        ("25110161", True),   # remainder 0 -> check digit 1
+        ("00685976", True),
+        ("12345678", False),
+        ("2511016", False),
+        (None, False),
+    ])
+    def test_ico_checksum(self, ico, valid):
+        assert ico_checksum_valid(ico) is valid
+
+    @pytest.mark.parametrize("name", ["lidl.txt", "kaufland.txt", "alza.txt"])
+    def test_consistent_receipts_are_confident(self, name):
+        report = score_receipt_fields(*corpus_fields(name))
+        assert report.confident
+        assert report.score == 1.0
+        assert report.missing == []
+
+    def test_items_not_matching_total(self):
+        report = score_receipt_fields(*corpus_fields("albert.txt"))
+        assert not report.checks["items_sum"]
+        assert report.missing == ["amount"]
+        assert report.vendor.short_name == "Albert"
+
+    def test_header_vendor_disagrees_with_ico(self):
+        """IČO of a different known vendor than the one in the header"""
+        report = score_receipt_fields(*corpus_fields("shell.txt"))
+        assert not report.checks["vendor_consistent"]
+        assert report.vendor is None
+        assert {"ico", "vendor", "category"} <= set(report.missing)
+
+    def test_unknown_vendor_with_invalid_ico(self):
+        report = score_receipt_fields(*corpus_fields("restaurace.txt"))
+        assert not report.confident
+        assert report.missing == ["ico", "vendor", "category", "description"]
+
+
+class TestCascade:
+    """Test that the OCR service calls the LLM only when needed"""
+
+    @pytest.fixture
+    def service(self):
+        from app.services.whatsapp_ocr_service import WhatsAppOCRService
+
+        service = WhatsAppOCRService()
+        service.ai_processor = MagicMock()
+        service.ai_processor.client = object()
+        service.ai_processor.process_missing_fields = AsyncMock(return_value={
+            "amount": 118.6, "ai_confidence": 0.8, "ai_model_used": "llama-3.1-8b-instant"
+        })
+        return service
+
+    @pytest.mark.asyncio
+    async def test_confident_receipt_skips_llm(self, service):
+        data, text = corpus_fields("kaufland.txt")
+        result, ai_result = await service._complete_receipt_fields(data, text)
+
+        service.ai_processor.process_missing_fields.assert_not_called()
+        assert ai_result is None
+        assert result["amount"] == 129.5
+        assert result["category"] == "501100"
+        assert result["description"] == "Nákup Kaufland"
+        assert result["ai_model"] == "rules"
+
+    @pytest.mark.asyncio
+    async def test_only_missing_fields_sent_to_llm(self, service):
+        data, text = corpus_fields("albert.txt")
+        result, ai_result = await service._complete_receipt_fields(data, text, "nákup kancelář")
+
+        args = service.ai_processor.process_missing_fields.call_args[0]
+        assert args[1] == ["amount"]
+        assert ai_result is not None
+        assert result["amount"] == 118.6
+        assert result["category"] == "501100"
+        assert result["description"] == "nákup kancelář"
+
+
+class TestReducedPrompt:
+    """Test reduced prompt and response parsing"""
+
+    @pytest.fixture
+    def processor(self):
+        from app.ai_processor import AIProcessor
+        return AIProcessor()
+
+    def test_prompt_lists_only_missing_fields(self, processor):
+        prompt = processor._create_missing_fields_prompt(
+            "ALBERT\nCELKEM 118,60", ["amount"], {"ico": "44012373", "date": "2024-04-02"}
+        )
+        assert '"amount"' in prompt
+        assert '"category"' not in prompt and '"items"' not in prompt
+        assert "ico=44012373" in prompt
+
+    def test_parse_drops_unrequested_fields(self, processor):
+        response = json.dumps({"amount": "118,60", "category": "518300", "ico": "1234"})
+        result = processor._parse_missing_fields_response(response, ["amount", "ico"])
+        assert result["amount"] == 118.6
+        assert "category" not in result and "ico" not in result
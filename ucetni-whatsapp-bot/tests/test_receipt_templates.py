@@ -0,0 +1,199 @@
+"""
+Unit tests for vendor receipt layout templates
+"""
+from unittest.mock import MagicMock
+
+import pytest
+
+from app.services.receipt_templates import (
+    ReceiptTemplateStore, TemplateSettings, locate_fields, validate_template_fields
+)
+from app.services.receipt_tokenizer import extract_receipt_fields, extract_vat_breakdown, tokenize
+
+UNIT = 32
+HEADER = ["LIDL Česká republika v.o.s.", "Nárožní 1359/11, 158 00 Praha 5", "IČ: 26178541 DIČ: CZ26178541"]
+FOOTER = ["CELKEM 240,10 Kč", "Přijato hotově 500,00 Kč", "Sazba DPH 12 % Základ 214,38 DPH 25,72",
+          "15.03.2024 17:42:08"]
+
+
+def make_receipt(items):
+    return HEADER + [""] + items + [""] + FOOTER
+
+
+def make_layout(lines, pitch=48):
+    """Tesseract image_to_data-like dict, one word per line for simplicity"""
+    layout = {key: [] for key in ("text", "block_num", "par_num", "line_num", "left", "top", "width", "height")}
+    for number, text in enumerate(lines):
+        if not text:
+            continue
+        for key, value in (("text", text), ("block_num", 1), ("par_num", 1), ("line_num", number),
+                           ("left", 10), ("top", 20 + number * pitch), ("width", 600), ("height", UNIT)):
+            layout[key].append(value)
+    return layout, 20 + len(lines) * pitch + 20
+
+
+def learn(store, lines):
+    layout, height = make_layout(lines)
+    data = extract_receipt_fields("\n".join(lines))
+    return store.learn(data["ico"], "Lidl", layout, height, UNIT, data)
+
+
+class TestTemplateLearning:
+    """Test learning stable line positions"""
+
+    def test_locate_fields(self):
+        lines = make_receipt(["Rohlík 3,90 Kč"])
+        layout, _ = make_layout(lines)
+        fields = locate_fields(layout, extract_receipt_fields("\n".join(lines)))
+        assert set(fields) == {"ico", "total", "date", "vat"}
+
+    def test_anchors_follow_stable_edge(self):
+        store = ReceiptTemplateStore()
+        assert learn(store, make_receipt(["Rohlík 3,90 Kč"]))
+        assert store.get("26178541") is None  # one sample is not enough
+        learn(store, make_receipt(["Rohlík 3,90 Kč", "Máslo 49,90 Kč", "Mléko 21,90 Kč", "Banány 34,50 Kč"]))
+
+        template = store.get("26178541")
+        assert template is not None
+        assert template.regions["ico"].anchor == "top"
+        assert template.regions["total"].anchor == "bottom"
+        assert template.regions["vat"].anchor == "bottom"
+        assert template.regions["total"].spread == 0
+
+    def test_band_covers_line_on_new_receipt(self):
+        store = ReceiptTemplateStore()
+        learn(store, make_receipt(["A 1,00 Kč"]))
+        learn(store, make_receipt(["A 1,00 Kč", "B 2,00 Kč", "C 3,00 Kč"]))
+        lines = make_receipt(["A 1,00 Kč"] * 9)
+        layout, height = make_layout(lines)
+        total_top = layout["top"][layout["text"].index("CELKEM 240,10 Kč")]
+
+        y0, y1 = store.get("26178541").regions["total"].band(height, UNIT, 1.0)
+        assert y0 < total_top and total_top + UNIT < y1
+
+    def test_persistence(self, tmp_path):
+        path = tmp_path / "templates.json"
+        store = ReceiptTemplateStore(path)
+        learn(store, make_receipt(["A 1,00 Kč"]))
+        learn(store, make_receipt(["A 1,00 Kč", "B 2,00 Kč"]))
+        assert ReceiptTemplateStore(path).get("26178541") is not None
+
+    def test_failures_disable_template(self):
+        store = ReceiptTemplateStore(settings=TemplateSettings(max_failures=2))
+        learn(store, make_receipt(["A 1,00 Kč"]))
+        learn(store, make_receipt(["A 1,00 Kč", "B 2,00 Kč"]))
+        store.record_failure("26178541", "vat")
+        store.record_failure("26178541", "vat")
+        assert store.get("26178541") is None
+        assert store.stats()["failures"] == 2
+
+
+class TestTemplateValidation:
+    """Test validation of template-driven extraction"""
+
+    @pytest.fixture
+    def template(self):
+        store = ReceiptTemplateStore()
+        learn(store, make_receipt(["A 1,00 Kč"]))
+        learn(store, make_receipt(["A 1,00 Kč", "B 2,00 Kč"]))
+        return store.get("26178541")
+
+    def check(self, template, text):
+        data = extract_receipt_fields(text)
+        return validate_template_fields(data, extract_vat_breakdown(tokenize(text)), template, template.regions)
+
+    def test_valid(self, template):
+        assert self.check(template, "\n".join(HEADER + FOOTER)) is None
+
+    def test_vat_not_matching_total(self, template):
+        text = "\n".join(HEADER + FOOTER).replace("CELKEM 240,10", "CELKEM 2240,10")
+        assert self.check(template, text) == "vat"
+
+    def test_different_vendor(self, template):
+        text = "\n".join(HEADER + FOOTER).replace("26178541", "25110161")
+        assert self.check(template, text) == "ico"
+
+    def test_vat_breakdown_forms(self):
+        rows = extract_vat_breakdown(tokenize(
+            "DPH 21 % 22,48\nA 21% 198,42 41,67 240,09\nSazba DPH 12 % Základ 214,38 DPH 25,72"
+        ))
+        assert rows == [
+            {"rate": 21, "vat": 22.48},
+            {"rate": 12, "base": 214.38, "vat": 25.72},
+        ]
+
+
+class TestTemplateExtraction:
+    """Test the OCR service template path with a stubbed band OCR"""
+
+    @pytest.fixture
+    def service(self):
+        from app.services.whatsapp_ocr_service import WhatsAppOCRService
+
+        service = WhatsAppOCRService()
+        learn(service.template_store, make_receipt(["A 1,00 Kč"]))
+        learn(service.template_store, make_receipt(["A 1,00 Kč", "B 2,00 Kč"]))
+        return service
+
+    def stub_bands(self, service, lines, pitch=48):
+        layout, height = make_layout(lines, pitch)
+
+        def ocr_band(image, y0, y1):
+            return "\n".join(text for text, top in zip(layout["text"], layout["top"]) if y0 <= top and top + UNIT <= y1)
+
+        def ocr_band_layout(image, y0, y1, psm=6):
+            # A line crossing the lower edge comes back cut, like from Tesseract
+            indexes = [i for i, top in enumerate(layout["top"]) if y0 <= top < y1]
+            band = {key: [values[i] for i in indexes] for key, values in layout.items()}
+            band["height"] = [min(UNIT, y1 - top) for top in band["top"]]
+            return band
+
+        service._ocr_band = MagicMock(side_effect=ocr_band)
+        service._ocr_band_layout = MagicMock(side_effect=ocr_band_layout)
+        image = MagicMock()
+        image.size = (640, height)
+        return image
+
+    def test_template_skips_full_ocr(self, service):
+        lines = make_receipt(["Položka %d 1,00 Kč" % i for i in range(12)])
+        image = self.stub_bands(service, lines)
+
+        template, header = service._find_template(image, None)
+        text, data = service._extract_with_template(image, template, header)
+
+        assert data["total"] == 240.1
+        assert data["date"] == "2024-03-15"
+        assert data["total_source"] == "template"
+        assert "Položka 5" not in text
+        assert service.template_store.stats()["hits"] == 1
+        service._ocr_band_layout.assert_called_once()
+
+    def test_falls_back_when_validation_fails(self, service):
+        lines = make_receipt(["A 1,00 Kč"] * 6)
+        lines[lines.index("CELKEM 240,10 Kč")] = "CELKEM 24O,1O Kč"
+        image = self.stub_bands(service, lines)
+
+        assert service._extract_with_template(image, service.template_store.get("26178541")) is None
+        assert service.template_store.stats()["failures"] == 1
+
+    def test_qr_ico_decides_without_header_ocr(self, service):
+        image = self.stub_bands(service, make_receipt(["A 1,00 Kč"]))
+
+        assert service._find_template(image, "25110161") == (None, None)
+        template, header = service._find_template(image, "26178541")
+        assert template.ico == "26178541" and header is None
+        service._ocr_band_layout.assert_not_called()
+
+    def test_header_reused_by_generic_path(self, service):
+        lines = ["Kaufland Česká republika v.o.s.", "IČ: 25110161"] + ["Položka %d 1,00 Kč" % i for i in range(20)]
+        image = self.stub_bands(service, lines, pitch=40)  # a line crosses the header band edge
+
+        template, header = service._find_template(image, None)
+        assert template is None
+        text, layout, data = service._ocr_and_extract(image, verify_total=False, header=header)
+
+        body_call = service._ocr_band_layout.call_args_list[1]
+        assert body_call.args[1] == header[0] > 0
+        assert data["ico"] == "25110161"
+        assert text.count("Položka 8") == 1
+        assert [line for line in lines if line not in text] == []
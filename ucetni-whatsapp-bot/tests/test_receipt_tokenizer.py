@@ -0,0 +1,72 @@
+"""
+Unit tests for single-pass receipt tokenizer and field extraction
+"""
+import json
+from pathlib import Path
+
+import pytest
+
+from app.services.receipt_tokenizer import extract_receipt_fields, parse_date, tokenize_line
+
+CORPUS_DIR = Path(__file__).parent / "data" / "ocr_texts"
+EXPECTED = json.loads((CORPUS_DIR / "expected.json").read_text(encoding="utf-8"))
+
+
+class TestTokenizer:
+    """Test typed tokens and their positions"""
+
+    def test_token_kinds_and_positions(self):
+        line = tokenize_line("IČO: 26178541 DIČ: CZ26178541 15.03.2024 17:42 DPH 21 % 254,90 Kč", 3)
+        kinds = [(token.kind, token.value) for token in line.tokens]
+        assert kinds == [
+            ("keyword", "ICO"), ("amount", 26178541.0), ("keyword", "DIC"), ("dic", "CZ26178541"),
+            ("date", "15.03.2024"), ("time", "17:42"), ("keyword", "DPH"), ("percent", 21),
+            ("amount", 254.9),
+        ]
+        amount = line.tokens[-1]
+        assert amount.currency and amount.line == 3
+        assert line.text[amount.start:amount.end] == "254,90 Kč"
+
+    def test_keywords_only_at_word_start(self):
+        """'IC' inside a word must not become an IČO keyword"""
+        line = tokenize_line("ELECTRIC 12345678")
+        assert [token.kind for token in line.tokens] == ["word", "amount"]
+
+    def test_thousands_separator(self):
+        line = tokenize_line("Notebook   12 990,00 Kč")
+        assert line.tokens[-1].value == 12990.0
+
+    @pytest.mark.parametrize("text,expected", [
+        ("15.03.2024", "2024-03-15"),
+        ("2024-05-20", "2024-05-20"),
+        ("11.01.24", "2024-01-11"),
+        ("31.02.2024", None),
+    ])
+    def test_parse_date(self, text, expected):
+        assert parse_date(text) == expected
+
+
+class TestFieldExtraction:
+    """Test layout-based field extraction"""
+
+    def test_total_from_payable_line_not_cash_tendered(self):
+        text = "Rohlík 3,90 Kč\nCELKEM 3,90 Kč\nPřijato hotově 500,00 Kč\nVráceno 496,10 Kč"
+        data = extract_receipt_fields(text)
+        assert data["total"] == 3.9
+        assert 500.0 in data["amounts"]
+        assert [item["description"] for item in data["items"]] == ["Rohlík"]
+
+    def test_total_on_next_line(self):
+        data = extract_receipt_fields("Celkem:\n372,00 Kč")
+        assert data["total"] == 372.0
+
+    def test_empty_text(self):
+        assert extract_receipt_fields("") == {"confidence": 0.6}
+
+    @pytest.mark.parametrize("file_name", sorted(EXPECTED))
+    def test_corpus_accuracy(self, file_name):
+        """Regression test against local OCR text corpus"""
+        data = extract_receipt_fields((CORPUS_DIR / file_name).read_text(encoding="utf-8"))
+        for field, expected in EXPECTED[file_name].items():
+            actual = len(data.get("items", [])) if field == "items" else data.get(field)
+            assert actual == expected, f"{file_name}: {field}"
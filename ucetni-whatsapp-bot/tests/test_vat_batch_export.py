@@ -0,0 +1,159 @@
+"""
+Unit tests for the month-end batch VAT export
+"""
+import json
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import func, select
+
+from app.database.models import ExportHistory, Transaction, User, UserSettings, VatRecord
+from app.services import vat_batch_export
+from app.services.vat_batch_export import (
+    ExportCheckpoint, ExportJob, VatBatchExporter, previous_period, run_export_job
+)
+from utils.vat_calculator import VatPeriodData
+
+
+pytestmark = pytest.mark.db_tables([User, UserSettings, Transaction, VatRecord, ExportHistory], vat_totals=True)
+
+
+@pytest_asyncio.fixture
+async def session_factory(session_factory):
+    async with session_factory() as session:
+        session.add_all([
+            User(id=1, whatsapp_number="+420111", full_name="Jan Novák", dic="CZ8001011234", vat_payer=True),
+            User(id=2, whatsapp_number="+420222", full_name="Eva Malá", dic="CZ8552021234", vat_payer=True),
+            User(id=3, whatsapp_number="+420333", full_name="Petr Čtvrtletní", vat_payer=True),
+            User(id=4, whatsapp_number="+420444", full_name="Neplátce", vat_payer=False),
+            UserSettings(user_id=3, vat_payer=True, vat_monthly=False),
+        ])
+        for user_id, dic in ((1, "CZ12345678"), (2, None), (3, None), (4, None)):
+            session.add(Transaction(
+                user_id=user_id, type="income", original_message="test", description="Faktura za web",
+                amount_czk=Decimal("60500"), vat_rate=21, vat_base=Decimal("50000"), vat_amount=Decimal("10500"),
+                transaction_date=datetime(2025, 3, 10), partner_vat_id=dic, document_number=f"FAK{user_id}"
+            ))
+        await session.commit()
+
+    return session_factory
+
+
+@pytest.fixture
+def notifications():
+    return []
+
+
+@pytest.fixture
+def exporter(session_factory, notifications, tmp_path, monkeypatch):
+    monkeypatch.setenv("VAT_EXPORT_DIR", str(tmp_path / "exports"))
+
+    async def notifier(user, message):
+        notifications.append((user.id, message))
+        return True
+
+    return VatBatchExporter(session_factory, workers=2, notifier=notifier)
+
+
+async def history(session_factory):
+    async with session_factory() as session:
+        rows = (await session.execute(select(ExportHistory).order_by(ExportHistory.export_type))).scalars()
+        return [(row.user_id, row.export_type, row.file_name, row.status) for row in rows]
+
+
+class TestVatBatchExporter:
+    """Test the process-pool export, history rows and notifications"""
+
+    @pytest.mark.asyncio
+    async def test_exports_monthly_payers(self, exporter, session_factory, notifications, tmp_path):
+        report = await exporter.run(3, 2025)
+
+        assert (report.users, report.exported, report.failed, report.quarterly_skipped) == (3, 1, 1, 1)
+        assert report.files == 2 and report.bytes_written > 0 and report.kh_rows == 1
+        assert await history(session_factory) == [
+            (1, "xml_dp3", "dph_priznani_3_2025.xml", "ready"),
+            (1, "xml_kh1", "kontrolni_hlaseni_3_2025.xml", "ready"),
+        ]
+        kh1 = (tmp_path / "exports" / "1" / "kontrolni_hlaseni_3_2025.xml").read_text(encoding="utf-8")
+        assert 'dic_odb="CZ12345678"' in kh1
+        assert 'prijmeni="Novák"' in kh1
+
+        messages = dict(notifications)
+        assert "XML soubory vygenerovány" in messages[1]
+        assert "Nelze připravit XML" in messages[2]
+        assert 3 not in messages and 4 not in messages
+        assert "uživatelů/s" in report.format()
+
+    @pytest.mark.asyncio
+    async def test_resume_skips_completed_users(self, exporter, session_factory, notifications, tmp_path):
+        await exporter.run(3, 2025)
+        checkpoint = json.loads((tmp_path / "exports" / "batch_2025_03.json").read_text(encoding="utf-8"))
+        assert checkpoint["completed"] == [1]
+        assert list(checkpoint["failed"]) == ["2"]
+        notifications.clear()
+
+        report = await exporter.run(3, 2025)
+
+        assert (report.resumed, report.exported, report.failed) == (1, 0, 1)
+        assert [user_id for user_id, _ in notifications] == [2]
+
+    @pytest.mark.asyncio
+    async def test_restart_keeps_one_history_row_per_file(self, exporter, session_factory):
+        await exporter.run(3, 2025)
+        report = await exporter.run(3, 2025, resume=False)
+
+        assert report.exported == 1
+        async with session_factory() as session:
+            assert await session.scalar(select(func.count(ExportHistory.id))) == 2
+
+
+    @pytest.mark.asyncio
+    async def test_unexpected_error_fails_only_that_user(self, exporter, monkeypatch, tmp_path):
+        prepare = exporter._prepare
+
+        async def broken_prepare(user, *args):
+            if user.id == 1:
+                raise RuntimeError("databáze nedostupná")
+            return await prepare(user, *args)
+
+        monkeypatch.setattr(exporter, "_prepare", broken_prepare)
+        report = await exporter.run(3, 2025)
+
+        assert (report.exported, report.failed) == (0, 2)
+        checkpoint = ExportCheckpoint.load(tmp_path / "exports" / "batch_2025_03.json", 3, 2025)
+        assert "RuntimeError: databáze nedostupná" in checkpoint.failed[1]
+
+        monkeypatch.setattr(exporter, "_prepare", prepare)
+        report = await exporter.run(3, 2025)
+        assert report.exported == 1
+
+    def test_worker_exception_is_a_result(self, tmp_path, monkeypatch):
+        def broken(*args, **kwargs):
+            raise ValueError("chybná data")
+
+        monkeypatch.setattr(vat_batch_export.VatXmlGenerator, "write_dph_priznani", broken)
+        paths = {key: str(tmp_path / name) for key, name in (("dp3", "dp3.xml"), ("kh1", "kh1.xml"))}
+        result = run_export_job(ExportJob(1, {}, VatPeriodData(month=3, year=2025), [], paths))
+
+        assert not result.ok
+        assert result.errors == ["ValueError: chybná data"]
+
+
+class TestCheckpoint:
+    """Test checkpoint persistence"""
+
+    def test_other_period_is_ignored(self, tmp_path):
+        path = tmp_path / "batch.json"
+        checkpoint = ExportCheckpoint(path, 2, 2025)
+        checkpoint.mark(1)
+        checkpoint.mark(2, "chybí DIČ")
+
+        assert ExportCheckpoint.load(path, 2, 2025).completed == {1}
+        assert ExportCheckpoint.load(path, 2, 2025).failed == {2: "chybí DIČ"}
+        assert ExportCheckpoint.load(path, 3, 2025).completed == set()
+
+    def test_previous_period(self):
+        assert previous_period(datetime(2025, 4, 1)) == (3, 2025)
+        assert previous_period(datetime(2025, 1, 25)) == (12, 2024)
@@ -0,0 +1,150 @@
+"""
+Unit tests for the SQL-side VAT period aggregation
+"""
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+import pytest_asyncio
+
+from app.database.models import Transaction, User, VatRecord
+from app.services.vat_period import load_export_checks, load_period_vat, period_bounds, stream_kh_documents
+from app.vat_handler import VatHandler
+from utils.vat_calculator import VatCalculator
+
+ROWS = [
+    # (user, type, rate, base, vat, transaction_date, partner DIČ)
+    (1, "income", 21, "125000.00", "26250.00", datetime(2025, 3, 15), "CZ12345678"),
+    (1, "income", 21, "25000.50", "5250.11", datetime(2025, 3, 31, 23, 59), None),
+    (1, "income", 12, "1000.00", "120.00", datetime(2025, 3, 1), None),
+    (1, "income", 0, "5000.00", "0.00", datetime(2025, 3, 2), None),
+    (1, "expense", 21, "45000.00", "9450.00", datetime(2025, 3, 10), "CZ87654321"),
+    (1, "expense", 12, "300.00", "36.00", datetime(2025, 3, 11), None),
+    (1, "expense", 21, "999.00", "209.79", datetime(2025, 4, 1), None),    # další měsíc
+    (1, "expense", 21, "999.00", "209.79", datetime(2025, 2, 28, 23, 59), None),  # předchozí měsíc
+    (2, "income", 21, "7000.00", "1470.00", datetime(2025, 3, 5), None),  # jiný uživatel
+]
+
+
+pytestmark = pytest.mark.db_tables([User, Transaction, VatRecord], vat_totals=True)
+
+
+@pytest_asyncio.fixture
+async def session_factory(session_factory):
+    async with session_factory() as session:
+        for user_id, trans_type, rate, base, vat, when, dic in ROWS:
+            session.add(Transaction(
+                user_id=user_id, type=trans_type, original_message="test", description=f"{trans_type} {rate}",
+                amount_czk=Decimal(base) + Decimal(vat), vat_rate=rate, vat_base=Decimal(base),
+                vat_amount=Decimal(vat), transaction_date=when, partner_vat_id=dic
+            ))
+        await session.commit()
+
+    return session_factory
+
+
+def as_dicts(rows):
+    return [
+        {
+            "type": trans_type,
+            "created_at": when,
+            "vat_info": {"base": Decimal(base), "vat": Decimal(vat), "rate": rate},
+        }
+        for user_id, trans_type, rate, base, vat, when, _ in rows
+        if user_id == 1
+    ]
+
+
+class TestPeriodAggregation:
+    """Test that the GROUP BY query matches the Python loop"""
+
+    def test_period_bounds(self):
+        assert period_bounds(3, 2025) == (datetime(2025, 3, 1), datetime(2025, 4, 1))
+        assert period_bounds(12, 2025) == (datetime(2025, 12, 1), datetime(2026, 1, 1))
+
+    @pytest.mark.asyncio
+    async def test_matches_python_loop(self, session_factory):
+        async with session_factory() as session:
+            from_sql = await load_period_vat(session, 1, 3, 2025)
+
+        from_loop = VatCalculator().calculate_period_vat(as_dicts(ROWS), 3, 2025)
+
+        assert from_sql == from_loop
+        assert from_sql.output_base_21 == Decimal("150000.50")
+        assert from_sql.output_vat_21 == Decimal("31500.11")
+        assert from_sql.output_base_0 == Decimal("5000.00")
+        assert from_sql.input_vat_12 == Decimal("36.00")
+        assert from_sql.vat_liability == Decimal("22134.11")
+
+    @pytest.mark.asyncio
+    async def test_empty_period(self, session_factory):
+        async with session_factory() as session:
+            period_data = await load_period_vat(session, 1, 6, 2025)
+
+        assert period_data.total_output_vat == 0
+        assert period_data.vat_liability == 0
+
+    @pytest.mark.asyncio
+    async def test_kh_documents_grouped_by_dic(self, session_factory):
+        async with session_factory() as session:
+            documents = [d async for d in stream_kh_documents(session, 1, 3, 2025)]
+
+        assert [(d.type, d.dic, d.total) for d in documents] == [
+            ("expense", "CZ87654321", Decimal("54450.00")),
+            ("income", "CZ12345678", Decimal("151250.00")),
+        ]
+        assert documents[0].document_date == date(2025, 3, 10)
+
+    @pytest.mark.asyncio
+    async def test_export_checks(self, session_factory):
+        async with session_factory() as session:
+            checks = await load_export_checks(session, 1, 3, 2025)
+
+        # 25 000,50 + DPH bez DIČ je nad limitem, ostatní doklady bez DIČ jsou pod ním
+        assert checks == {"missing_dic": ["income 21"], "missing_document_numbers": 5}
+
+
+class TestVatHandlerWithDatabase:
+    """Test that VatHandler reads the period from the database"""
+
+    @pytest.mark.asyncio
+    async def test_load_period_uses_database(self, session_factory):
+        handler = VatHandler(session_factory=session_factory)
+
+        period_data = await handler._load_period(2, 3, 2025)
+
+        assert period_data.output_vat_21 == Decimal("1470.00")
+
+    @pytest.mark.asyncio
+    async def test_export_streams_files(self, session_factory, tmp_path, monkeypatch):
+        monkeypatch.setenv("VAT_EXPORT_DIR", str(tmp_path / "exports"))
+        handler = VatHandler(session_factory=session_factory)
+        settings = {"vat_payer": True, "dic": "CZ8001011234", "first_name": "Jan", "last_name": "Novák"}
+
+        async with session_factory() as session:
+            summary = await handler._export_period(session, 2, settings, 3, 2025)
+
+        assert "XML soubory vygenerovány" in summary
+        kh1 = (tmp_path / "exports" / "2" / "kontrolni_hlaseni_3_2025.xml").read_text(encoding="utf-8")
+        assert '<VetaB3 zakl_dane1="7000" dan1="1470"/>' in kh1
+        assert "VetaB2" not in kh1
+
+    @pytest.mark.asyncio
+    async def test_export_rejects_missing_dic(self, session_factory, tmp_path, monkeypatch):
+        monkeypatch.setenv("VAT_EXPORT_DIR", str(tmp_path / "exports"))
+        handler = VatHandler(session_factory=session_factory)
+        settings = {"vat_payer": True, "dic": "CZ8001011234", "first_name": "Jan", "last_name": "Novák"}
+
+        async with session_factory() as session:
+            result = await handler._export_period(session, 1, settings, 3, 2025)
+
+        assert "Nelze exportovat" in result
+        assert not (tmp_path / "exports").exists()
+
+    @pytest.mark.asyncio
+    async def test_load_period_without_database(self):
+        handler = VatHandler(session_factory=lambda: None)
+
+        period_data = await handler._load_period(1, 3, 2025)
+
+        assert period_data.output_base_21 == Decimal("150000")
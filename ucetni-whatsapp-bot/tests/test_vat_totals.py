@@ -0,0 +1,175 @@
+"""
+Unit tests for incremental VatRecord running totals and their reconciliation
+"""
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import select, update
+
+from app.database.models import Transaction, TransactionAttachment, TransactionItem, User, VatRecord
+from app.services.vat_period import load_period_totals, load_period_vat, reconcile_vat_totals
+
+
+pytestmark = pytest.mark.db_tables(
+    [User, Transaction, TransactionItem, TransactionAttachment, VatRecord], vat_totals=True
+)
+
+
+async def add_transaction(session_factory, **fields) -> int:
+    values = dict(user_id=1, type="income", original_message="test", amount_czk=Decimal("1210"),
+                  vat_rate=21, vat_base=Decimal("1000.00"), vat_amount=Decimal("210.00"),
+                  transaction_date=datetime(2025, 3, 10))
+    values.update(fields)
+    async with session_factory() as session:
+        transaction = Transaction(**values)
+        session.add(transaction)
+        await session.commit()
+        return transaction.id
+
+
+async def totals(session_factory, month=3, year=2025, user_id=1):
+    async with session_factory() as session:
+        return await load_period_totals(session, user_id, month, year)
+
+
+class TestRunningTotals:
+    """Test that every change of a VAT transaction updates its period"""
+
+    @pytest.mark.asyncio
+    async def test_insert_adds_to_period(self, session_factory):
+        await add_transaction(session_factory)
+        await add_transaction(session_factory, type="expense", vat_rate=12,
+                              vat_base=Decimal("500.00"), vat_amount=Decimal("60.00"))
+        await add_transaction(session_factory, vat_rate=0, vat_base=Decimal("300.00"), vat_amount=Decimal("0"))
+
+        period_data = await totals(session_factory)
+
+        assert period_data.output_base_21 == Decimal("1000.00")
+        assert period_data.output_vat_21 == Decimal("210.00")
+        assert period_data.input_vat_12 == Decimal("60.00")
+        assert period_data.output_base_0 == Decimal("300.00")
+        async with session_factory() as session:
+            record = (await session.execute(select(VatRecord))).scalar_one()
+            assert record.vat_liability == Decimal("150.00")
+
+    @pytest.mark.asyncio
+    async def test_update_moves_between_rates_and_periods(self, session_factory):
+        transaction_id = await add_transaction(session_factory)
+
+        async with session_factory() as session:
+            transaction = await session.get(Transaction, transaction_id)
+            transaction.vat_rate = 12
+            transaction.vat_amount = Decimal("120.00")
+            await session.commit()
+        period_data = await totals(session_factory)
+        assert (period_data.output_vat_21, period_data.output_vat_12) == (Decimal("0"), Decimal("120.00"))
+
+        async with session_factory() as session:
+            transaction = await session.get(Transaction, transaction_id)
+            transaction.transaction_date = datetime(2025, 4, 2)
+            await session.commit()
+        assert (await totals(session_factory)).output_base_12 == Decimal("0")
+        assert (await totals(session_factory, month=4)).output_base_12 == Decimal("1000.00")
+
+    @pytest.mark.asyncio
+    async def test_unrelated_update_and_delete(self, session_factory):
+        transaction_id = await add_transaction(session_factory)
+        await add_transaction(session_factory, vat_base=Decimal("50.00"), vat_amount=Decimal("10.50"))
+
+        async with session_factory() as session:
+            transaction = await session.get(Transaction, transaction_id)
+            transaction.description = "Oprava popisu"
+            await session.commit()
+        assert (await totals(session_factory)).output_vat_21 == Decimal("220.50")
+
+        async with session_factory() as session:
+            await session.delete(await session.get(Transaction, transaction_id))
+            await session.commit()
+        assert (await totals(session_factory)).output_vat_21 == Decimal("10.50")
+
+    @pytest.mark.asyncio
+    async def test_owner_set_through_relationship(self, session_factory):
+        async with session_factory() as session:
+            session.add(User(id=1, whatsapp_number="+420111"))
+            user = User(id=2, whatsapp_number="+420222")
+            session.add(Transaction(user=user, type="income", original_message="test", amount_czk=Decimal("121"),
+                                    vat_rate=21, vat_base=Decimal("100"), vat_amount=Decimal("21"),
+                                    transaction_date=datetime(2025, 3, 11)))
+            await session.commit()
+
+            # Přesun na jiného uživatele jen přes vztah
+            transaction = (await session.execute(select(Transaction))).scalar_one()
+            transaction.user = await session.get(User, 1)
+            await session.commit()
+
+        assert (await totals(session_factory, user_id=1)).output_vat_21 == Decimal("21.00")
+        assert (await totals(session_factory, user_id=2)).output_vat_21 == 0
+        async with session_factory() as session:
+            assert await reconcile_vat_totals(session) == []
+
+    @pytest.mark.asyncio
+    async def test_rollback_discards_delta(self, session_factory):
+        await add_transaction(session_factory)
+
+        async with session_factory() as session:
+            session.add(Transaction(user_id=1, type="income", original_message="test", amount_czk=Decimal("121"),
+                                    vat_rate=21, vat_base=Decimal("100"), vat_amount=Decimal("21"),
+                                    transaction_date=datetime(2025, 3, 11)))
+            await session.flush()
+            await session.rollback()
+
+        assert (await totals(session_factory)).output_vat_21 == Decimal("210.00")
+
+    @pytest.mark.asyncio
+    async def test_totals_match_full_aggregation(self, session_factory):
+        for day in range(1, 20):
+            await add_transaction(session_factory, type="expense" if day % 3 else "income",
+                                  vat_rate=(21, 12, 0)[day % 3], vat_base=Decimal(f"{day * 111}.11"),
+                                  vat_amount=Decimal(f"{day * 11}.37"), transaction_date=datetime(2025, 3, day))
+
+        async with session_factory() as session:
+            assert await load_period_totals(session, 1, 3, 2025) == await load_period_vat(session, 1, 3, 2025)
+
+
+class TestReconciliation:
+    """Test drift detection against a full recompute"""
+
+    @pytest.mark.asyncio
+    async def test_no_drift(self, session_factory):
+        await add_transaction(session_factory)
+
+        async with session_factory() as session:
+            assert await reconcile_vat_totals(session) == []
+
+    @pytest.mark.asyncio
+    async def test_bulk_update_is_reported_and_fixed(self, session_factory):
+        await add_transaction(session_factory)
+        async with session_factory() as session:
+            # Hromadný UPDATE obchází ORM události
+            await session.execute(update(Transaction).values(vat_amount=Decimal("200.00")))
+            await session.commit()
+
+        async with session_factory() as session:
+            drift = await reconcile_vat_totals(session, fix=True)
+
+        assert {(d["field"], d["stored"], d["expected"]) for d in drift} == {
+            ("output_vat_21", Decimal("210.00"), Decimal("200.00")),
+            ("vat_liability", Decimal("210.00"), Decimal("200.00")),
+        }
+        assert (await totals(session_factory)).output_vat_21 == Decimal("200.00")
+        async with session_factory() as session:
+            assert await reconcile_vat_totals(session) == []
+
+    @pytest.mark.asyncio
+    async def test_missing_record_is_backfilled(self, session_factory):
+        await add_transaction(session_factory, user_id=2)
+        async with session_factory() as session:
+            await session.execute(VatRecord.__table__.delete())
+            await session.commit()
+
+        async with session_factory() as session:
+            drift = await reconcile_vat_totals(session, user_id=2, fix=True)
+
+        assert {d["field"] for d in drift} == {"output_base_21", "output_vat_21", "vat_liability"}
+        assert (await totals(session_factory, user_id=2)).output_vat_21 == Decimal("210.00")
@@ -0,0 +1,129 @@
+"""
+Unit tests for the streaming DP3/KH1 XML writer
+"""
+import io
+import xml.etree.ElementTree as ET
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+
+from utils.vat_calculator import VatCalculator, VatPeriodData
+from utils.vat_xml_generator import KhDocument, VatXmlGenerator, XmlStreamWriter, kh_documents
+
+NS = "{http://adis.mfcr.cz/rozhraniXML/dphkh1/}"
+
+SETTINGS = {"dic": "CZ8001011234", "first_name": "Jiří", "last_name": "Šťastný", "city": "Brno & okolí"}
+
+
+def transaction(id, type, base, vat, rate=21, dic=None, number=None, day=10, description="Doklad"):
+    return {
+        "id": id, "type": type, "description": description, "created_at": datetime(2025, 3, day),
+        "vat_info": {"base": Decimal(base), "vat": Decimal(vat), "rate": rate},
+        "partner_vat_id": dic, "document_number": number,
+    }
+
+
+TRANSACTIONS = [
+    transaction(1, "expense", "45000", "9450", dic="CZ87654321", number="DOK1"),
+    transaction(2, "expense", "5000", "1050", dic="CZ87654321", number="DOK2"),     # pod limitem
+    transaction(3, "expense", "6000", "1260", dic="CZ11111111", number="DOK3"),     # dva řádky jednoho dokladu
+    transaction(4, "expense", "2000", "240", rate=12, dic="CZ11111111", number="DOK3"),
+    transaction(5, "income", "125000", "26250", dic="CZ12345678", number="FAK1"),
+    transaction(6, "income", "800", "168"),                                           # drobný prodej bez DIČ
+]
+
+
+@pytest.fixture
+def generator():
+    return VatXmlGenerator(SETTINGS)
+
+
+@pytest.fixture
+def period_data():
+    return VatCalculator().calculate_period_vat(TRANSACTIONS, 3, 2025)
+
+
+class TestXmlStreamWriter:
+    """Test the element-by-element writer"""
+
+    def test_escapes_and_nests(self):
+        out = io.StringIO()
+        writer = XmlStreamWriter(out)
+        writer.start("Root", {"a": 'x"<&>'})
+        writer.element("Child", {"b": "Šťastný"})
+        writer.element("Text", text="1 < 2")
+        writer.close_all()
+
+        root = ET.fromstring(out.getvalue().encode("utf-8"))
+        assert out.getvalue().startswith('<?xml version="1.0" encoding="UTF-8"?>')
+        assert root.get("a") == 'x"<&>'
+        assert root.find("Child").get("b") == "Šťastný"
+        assert root.find("Text").text == "1 < 2"
+
+
+class TestDphPriznani:
+    """Test the DP3 output"""
+
+    def test_rows(self, generator, period_data):
+        root = ET.fromstring(generator.generate_dph_priznani(period_data).encode("utf-8"))
+        dp3 = root.find("{http://adis.mfcr.cz/rozhraniXML/dphdp3/}DPHDP3")
+
+        rows = {child.tag.split("}")[1]: child.attrib for child in dp3}
+        assert rows["Veta1"] == {"zakl_dane1": "125800", "dan1": "26418"}
+        assert rows["Veta40"]["dan1"] == "11760"
+        assert rows["Veta62"] == {"dan_zocelk": "14418"}
+        assert rows["VetaP"]["naz_obce"] == "Brno & okolí"
+
+
+class TestKontrolniHlaseni:
+    """Test the KH1 output and the 10 000 CZK threshold"""
+
+    def test_documents_grouped(self):
+        documents = {d.document_number: d for d in kh_documents(TRANSACTIONS)}
+
+        assert documents["DOK3"].total == Decimal("9500")
+        assert not documents["DOK3"].reported_individually
+        assert documents["DOK1"].reported_individually
+        assert not documents["ID6"].reported_individually
+
+    def test_sections(self, generator, period_data):
+        root = ET.fromstring(generator.generate_kontrolni_hlaseni(period_data, TRANSACTIONS).encode("utf-8"))
+        kh1 = root.find(f"{NS}DPHKH1")
+
+        assert [child.tag[len(NS):] for child in kh1] == ["VetaD", "VetaP", "VetaA4", "VetaA5", "VetaB2", "VetaB3"]
+        assert kh1.find(f"{NS}VetaA4").attrib == {
+            "c_radku": "1", "dic_dodav": "CZ87654321", "c_evid_dd": "DOK1", "d_uctpri": "10.03.2025",
+            "zakl_dane1": "45000", "dan1": "9450",
+        }
+        assert kh1.find(f"{NS}VetaA5").attrib == {
+            "zakl_dane1": "11000", "dan1": "2310", "zakl_dane2": "2000", "dan2": "240"
+        }
+        assert kh1.find(f"{NS}VetaB3").attrib == {"zakl_dane1": "800", "dan1": "168"}
+
+    def test_accepts_iterator(self, generator):
+        def documents():
+            for i in range(1, 2001):
+                yield KhDocument(type="income", dic="CZ12345678", document_number=f"FAK{i}",
+                                 document_date=date(2025, 3, 1), base_21=Decimal("20000"), vat_21=Decimal("4200"))
+
+        period_data = VatPeriodData(month=3, year=2025, output_base_21=Decimal("40000000"),
+                                    output_vat_21=Decimal("8400000"))
+        out = io.StringIO()
+        generator.write_kontrolni_hlaseni(out, period_data, documents())
+
+        kh1 = ET.fromstring(out.getvalue().encode("utf-8")).find(f"{NS}DPHKH1")
+        rows = kh1.findall(f"{NS}VetaB2")
+        assert len(rows) == 2000
+        assert rows[-1].get("c_radku") == "2000"
+        assert kh1.find(f"{NS}VetaB3") is None
+
+    def test_validation_flags_document_without_dic(self, generator, period_data):
+        transactions = TRANSACTIONS + [
+            transaction(7, "expense", "12000", "2520", number="DOK7", description="Notebook")
+        ]
+
+        validation = generator.validate_before_export(period_data, transactions)
+
+        assert not validation["valid"]
+        assert validation["warnings"][0] == "• Notebook"
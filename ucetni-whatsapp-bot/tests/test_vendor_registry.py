@@ -0,0 +1,77 @@
+"""
+Unit tests for vendor registry and fuzzy vendor matching
+"""
+import pytest
+
+from app.services.vendor_registry import BKTree, VendorRegistry, levenshtein, vendor_registry
+
+
+class TestVendorRegistry:
+    """Test exact IČO index and fuzzy name index"""
+
+    def test_icos_are_unique(self):
+        icos = [vendor.ico for vendor in vendor_registry.vendors if vendor.ico]
+        assert len(icos) == len(set(icos))
+
+    def test_lookup_by_ico(self):
+        vendor = vendor_registry.by_ico("25110161")
+        assert vendor.short_name == "Kaufland"
+        assert vendor.dic == "CZ25110161"
+        assert vendor.category_code == "501100"
+
+    @pytest.mark.parametrize("text,expected", [
+        ("KAUFLAMD", "Kaufland"),
+        ("nákup v lidlu", "Lidl"),
+        ("TESC0 STORES", "Tesco"),
+        ("Tankování Benz1na", "Benzina"),
+        ("PENNY MARKET s.r.o.", "Penny Market"),
+        ("Alza.cz a.s.", "Alza.cz"),
+    ])
+    def test_fuzzy_name_match(self, text, expected):
+        assert vendor_registry.find_by_name(text).short_name == expected
+
+    @pytest.mark.parametrize("text", ["lidi v obchodě", "idea", "mols", ""])
+    def test_short_words_need_exact_match(self, text):
+        assert vendor_registry.find_by_name(text) is None
+
+    def test_bk_tree_search(self):
+        tree = BKTree()
+        for word in ["kaufland", "albert", "globus", "benzina"]:
+            tree.add(word)
+        assert tree.search("kauflamd", 1) == [(1, "kaufland")]
+        assert tree.search("xyz", 1) == []
+        assert levenshtein("kitten", "sitting", 5) == 3
+
+    def test_load_custom_file(self, tmp_path):
+        path = tmp_path / "vendors.json"
+        path.write_text(
+            '{"categories": {"fuel": {"category_code": "501300", "category_name": "PHM"}},'
+            ' "vendors": [{"key": "eurooil", "name": "ČEPRO, a.s.", "ico": "60193531", "group": "fuel",'
+            ' "aliases": ["eurooil"]}]}',
+            encoding="utf-8"
+        )
+        registry = VendorRegistry.load(path)
+        vendor = registry.find_by_name("EUROOlL")
+        assert vendor.ico == "60193531"
+        assert vendor.category_name == "PHM"
+
+
+class TestVendorConsumers:
+    """Test that OCR service and tax validator share the registry"""
+
+    def test_tax_validator_uses_registry(self):
+        from app.services.tax_evidence_validator import TaxEvidenceValidator
+
+        validator = TaxEvidenceValidator()
+        assert validator._find_known_vendor("v kauflandu")["ico"] == "25110161"
+        options = validator.get_quick_vendor_options("tankování nafta")
+        assert [option["name"] for option in options] == ["Shell", "Benzina", "OMV", "MOL"]
+        assert validator.get_quick_vendor_options("oběd s klientem") == []
+
+    def test_ocr_identify_vendor_prefers_header(self):
+        from app.services.whatsapp_ocr_service import WhatsAppOCRService
+
+        service = WhatsAppOCRService()
+        text = "KAUFLAMD Česká republika\nPraha 2\n\n\n\nRohlík 3,90 Kč"
+        assert service._identify_vendor(text) == "Kaufland"
+        assert service._identify_vendor("nečitelné", "26178541") == "Lidl"
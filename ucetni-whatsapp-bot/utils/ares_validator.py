@@ -4,11 +4,22 @@ import xml.etree.ElementTree as ET
 import logging
 import re
 
+from utils.ico import AresUnavailableError, ico_checksum_valid
+
 logger = logging.getLogger(__name__)
 
+# Odpovědi, které ARES nevrátil v očekávaném tvaru - neukládají se jako "IČO neexistuje"
+PARSE_ERRORS = ('Chyba při parsování odpovědi z ARES', 'Neočekávaná chyba při zpracování údajů')
+
 class AresValidator:
-    def __init__(self):
+    def __init__(self, cache=None):
+        """
+        Args:
+            cache: cache odpovědí ARES s lookup(source, ico, fetch) - typicky
+                app.services.ares_cache.ares_cache; bez ní se ptá vždy živě
+        """
         self.session = None
+        self.cache = cache
     
     async def __aenter__(self):
         self.session = aiohttp.ClientSession()
@@ -25,24 +36,7 @@ class AresValidator:
     
     def calculate_ico_checksum(self, ico: str) -> bool:
         """Validuje kontrolní součet IČO podle algoritmu"""
-        try:
-            ico = ico.replace(' ', '')
-            if len(ico) != 8:
-                return False
-            
-            # Kontrolní algoritmus IČO
-            weights = [8, 7, 6, 5, 4, 3, 2]
-            checksum = sum(int(ico[i]) * weights[i] for i in range(7))
-            remainder = checksum % 11
-            
-            if remainder < 2:
-                expected_check = remainder
-            else:
-                expected_check = 11 - remainder
-            
-            return int(ico[7]) == expected_check
-        except (ValueError, IndexError):
-            return False
+        return ico_checksum_valid(ico.replace(' ', ''))
     
     async def verify_ico(self, ico: str):
         """Ověří IČO v ARES a vrátí údaje o firmě"""
@@ -56,6 +50,15 @@ class AresValidator:
         if not self.calculate_ico_checksum(ico):
             return {'valid': False, 'error': 'Neplatné IČO. Kontrolní součet nesedí.'}
         
+        try:
+            if self.cache is None:
+                return await self._fetch_ico(ico)
+            return await self.cache.lookup('validator', ico, lambda: self._fetch_ico(ico))
+        except AresUnavailableError as e:
+            return e.fallback
+    
+    async def _fetch_ico(self, ico: str):
+        """Dotaz na ARES bez cache - při nedostupnosti vyhodí AresUnavailableError"""
         try:
             url = f"http://wwwinfo.mfcr.cz/cgi-bin/ares/darv_bas.cgi?ico={ico}"
             
@@ -64,17 +67,24 @@ class AresValidator:
             
             async with self.session.get(url, timeout=10) as response:
                 if response.status != 200:
-                    return {'valid': False, 'error': 'Chyba při dotazu na ARES'}
+                    raise AresUnavailableError(
+                        f"HTTP {response.status}", {'valid': False, 'error': 'Chyba při dotazu na ARES'}
+                    )
                 
                 xml_data = await response.text()
-                return self._parse_ares_response(xml_data, ico)
+                result = self._parse_ares_response(xml_data, ico)
+                if result.get('error') in PARSE_ERRORS:
+                    raise AresUnavailableError(result['error'], result)
+                return result
                 
+        except AresUnavailableError:
+            raise
         except asyncio.TimeoutError:
             logger.error("ARES API timeout")
-            return {'valid': False, 'error': 'Časový limit dotazu na ARES'}
+            raise AresUnavailableError('timeout', {'valid': False, 'error': 'Časový limit dotazu na ARES'})
         except Exception as e:
             logger.error(f"ARES API error: {str(e)}")
-            return {'valid': False, 'error': 'Chyba při ověřování IČO'}
+            raise AresUnavailableError(str(e), {'valid': False, 'error': 'Chyba při ověřování IČO'})
     
     def _parse_ares_response(self, xml_data: str, ico: str):
         """Parsuje XML odpověď z ARES"""
@@ -186,7 +196,7 @@ class AresValidator:
             return await self.verify_ico(ico)
 
 # Samostatná funkce pro jednoduché použití
-async def validate_ico(ico: str):
+async def validate_ico(ico: str, cache=None):
     """Validuje IČO bez nutnosti instanciovat třídu"""
-    validator = AresValidator()
+    validator = AresValidator(cache)
     return await validator.get_company_info(ico)
\ No newline at end of file
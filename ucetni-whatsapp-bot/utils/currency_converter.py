@@ -1,16 +1,20 @@
-import requests
 from decimal import Decimal, ROUND_HALF_UP
-from datetime import datetime, timedelta
+from datetime import date, datetime
+from typing import Dict, Optional, Tuple
 import re
 import logging
 
 logger = logging.getLogger(__name__)
 
 class CurrencyConverter:
-    def __init__(self):
-        self.rates = {}
-        self.last_update = None
-        self.update_rates()
+    def __init__(self, rate_service, history=None):
+        """
+        Args:
+            rate_service: aktuální lístek ČNB (app.services.exchange_rates) - převodník nic nestahuje
+            history: historické kurzy (app.services.rate_history); bez ní platí pro každý den aktuální lístek
+        """
+        self.rate_service = rate_service
+        self.history = history
         
         # Mapování symbolů na kódy měn
         self.symbol_to_currency = {
@@ -33,72 +37,64 @@ class CurrencyConverter:
             'CZK': 'koruna'
         }
     
+    @property
+    def rates(self) -> Dict[str, Decimal]:
+        """Kurzy z aktuálního lístku ČNB (kopie)"""
+        return dict(self.rate_service.snapshot.rates)
+    
+    @property
+    def last_update(self) -> datetime:
+        return self.rate_service.snapshot.fetched_at
+    
     def update_rates(self):
-        """Stáhne denní kurz z ČNB API"""
-        try:
-            url = "https://www.cnb.cz/cs/financni-trhy/devizovy-trh/kurzy-devizoveho-trhu/kurzy-devizoveho-trhu/denni_kurz.txt"
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()
-            
-            # Parse ČNB format
-            lines = response.text.split('\n')
-            self.rates = {'CZK': Decimal('1.0')}
-            
-            for line in lines[2:]:  # Skip header
-                if '|' in line:
-                    parts = line.split('|')
-                    if len(parts) >= 5:
-                        currency = parts[3].strip()  # EUR, USD, etc.
-                        rate_str = parts[4].strip().replace(',', '.')
-                        amount_str = parts[2].strip()
-                        
-                        try:
-                            rate = Decimal(rate_str)
-                            amount = Decimal(amount_str)
-                            # Některé měny jsou per 100 (např. JPY)
-                            self.rates[currency] = rate / amount
-                        except (ValueError, IndexError):
-                            continue
-            
-            self.last_update = datetime.now()
-            logger.info(f"Kurzovní lístek aktualizován: {len(self.rates)} měn")
-            
-        except Exception as e:
-            logger.error(f"Chyba při stahování kurzů z ČNB: {str(e)}")
-            # Fallback kurzy pro základní testování
-            self.rates = {
-                'CZK': Decimal('1.0'),
-                'EUR': Decimal('24.50'),
-                'USD': Decimal('22.80'),
-                'GBP': Decimal('28.90'),
-                'PLN': Decimal('5.60')
-            }
-            self.last_update = datetime.now()
+        """Synchronně stáhne denní kurz z ČNB - jen pro skripty, aplikace obnovuje kurzy na pozadí"""
+        self.rate_service.refresh_blocking()
+    
+    def rate_on(self, currency: str, on_date: Optional[date] = None) -> Tuple[Optional[Decimal], Optional[date]]:
+        """
+        Kurz ČNB platný pro den dokladu
+        
+        Bez data nebo pro den od vyhlášení aktuálního lístku platí aktuální
+        lístek, pro starší den historie (poslední kurz vyhlášený do toho dne).
+        
+        Returns:
+            (kurz za 1 jednotku měny, den vyhlášení lístku); (None, None) pro neznámou měnu
+        """
+        if currency == 'CZK':
+            return Decimal('1.0'), on_date or date.today()
+        
+        snapshot = self.rate_service.snapshot
+        if self.history is not None and on_date is not None and (
+                snapshot.valid_for is None or on_date < snapshot.valid_for):
+            found = self.history.lookup(currency, on_date)
+            if found:
+                return found
+            logger.warning(f"Kurz {currency} k {on_date.isoformat()} není v historii ČNB, použit aktuální lístek")
+        
+        rate = self.rate_service.get_rate(currency)
+        if rate is None:
+            return None, None
+        return rate, snapshot.valid_for or date.today()
     
-    def convert_to_czk(self, amount: Decimal, currency: str) -> Decimal:
-        """Převede částku na CZK"""
+    def convert_to_czk(self, amount: Decimal, currency: str, on_date: Optional[date] = None) -> Decimal:
+        """Převede částku na CZK kurzem ze dne dokladu (bez data aktuálním)"""
         if currency == 'CZK':
             return amount
         
-        # Update rates if older than 1 day
-        if not self.last_update or datetime.now() - self.last_update > timedelta(days=1):
-            self.update_rates()
-        
-        if currency in self.rates:
-            converted = amount * self.rates[currency]
-            return converted.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-        else:
+        rate, _ = self.rate_on(currency, on_date)
+        if rate is None:
             raise ValueError(f"Neznámá měna: {currency}")
+        
+        converted = amount * rate
+        return converted.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
     
-    def get_rate(self, currency: str) -> Decimal:
-        """Vrátí aktuální kurz měny vůči CZK"""
+    def get_rate(self, currency: str, on_date: Optional[date] = None) -> Decimal:
+        """Vrátí kurz měny vůči CZK ke dni dokladu (bez data aktuální)"""
         if currency == 'CZK':
             return Decimal('1.0')
         
-        if not self.last_update or datetime.now() - self.last_update > timedelta(days=1):
-            self.update_rates()
-        
-        return self.rates.get(currency, Decimal('0'))
+        rate, _ = self.rate_on(currency, on_date)
+        return rate or Decimal('0')
     
     def parse_amount_and_currency(self, message: str):
         """
@@ -0,0 +1,24 @@
+"""
+IČO - kontrolní součet a výpadek ARES
+
+Sdílí je OCR účtenek (receipt_confidence, šablony) i ověřování v ARES
+(AresService, AresValidator), modul nesmí záviset na app.
+"""
+from typing import Any, Dict, Optional
+
+
+def ico_checksum_valid(ico: Optional[str]) -> bool:
+    """Kontrolní součet IČO (vážený součet modulo 11)"""
+    if not ico or len(ico) != 8 or not ico.isdigit():
+        return False
+    remainder = sum(int(ico[i]) * (8 - i) for i in range(7)) % 11
+    expected = (11 - remainder) % 10 if remainder else 1
+    return int(ico[7]) == expected
+
+
+class AresUnavailableError(Exception):
+    """ARES neodpověděl - fallback je výsledek, který má klient vrátit bez cache"""
+
+    def __init__(self, message: str, fallback: Dict[str, Any]):
+        super().__init__(message)
+        self.fallback = fallback
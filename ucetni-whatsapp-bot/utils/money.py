@@ -0,0 +1,231 @@
+"""
+Peníze v celých haléřích
+
+Money drží částku v Kč jako celé číslo haléřů - součty jsou přesné
+a rychlé (sčítání intů, žádný Decimal na řádek). Do databáze se ukládá
+jako BIGINT (MoneyType), SUM v SQL je tedy celočíselný.
+
+Na hranici se vstupy (AI, OCR, API) se částka v korunách převádí přes
+Money.of() se zaokrouhlením na haléře (ROUND_HALF_UP). Aritmetika
+a porovnání s obyčejným číslem ho berou jako koruny, float(), str(),
+round() a formátování ({:,.0f}) fungují jako u Decimal. Float se porovnává
+přesně (jako Decimal) - Money.of(0.1) != 0.1, hash je tak s == konzistentní.
+Do JSON se Money převádí přes json_default (FastAPI ho zná samo).
+"""
+import json
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Any, Optional, Union
+
+from sqlalchemy import BigInteger, func, type_coerce
+from sqlalchemy.types import TypeDecorator
+
+HALERE_PER_CZK = 100
+
+Number = Union['Money', Decimal, int, float, str]
+
+
+class Money:
+    """Částka v Kč jako celé haléře (neměnná)"""
+
+    __slots__ = ('halere',)
+
+    def __init__(self, halere: int = 0):
+        object.__setattr__(self, 'halere', int(halere))
+
+    @classmethod
+    def of(cls, value: Any) -> 'Money':
+        """Částka v korunách (Decimal, int, float, str) zaokrouhlená na haléře; None = 0"""
+        if isinstance(value, Money):
+            return value
+        if value is None:
+            return ZERO
+        if isinstance(value, int) and not isinstance(value, bool):
+            return cls(value * HALERE_PER_CZK)
+        if isinstance(value, float):
+            value = repr(value)
+        amount = Decimal(value) if not isinstance(value, Decimal) else value
+        return cls(int((amount * HALERE_PER_CZK).quantize(Decimal('1'), rounding=ROUND_HALF_UP)))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Money je neměnné")
+
+    def __reduce__(self):
+        return (Money, (self.halere,))
+
+    def to_decimal(self) -> Decimal:
+        """Koruny jako Decimal se dvěma desetinnými místy"""
+        return Decimal(self.halere).scaleb(-2)
+
+    # Převody
+    def __float__(self) -> float:
+        return self.halere / HALERE_PER_CZK
+
+    def __int__(self) -> int:
+        """Celé koruny, desetinná část se odřízne (jako int(Decimal))"""
+        whole = abs(self.halere) // HALERE_PER_CZK
+        return whole if self.halere >= 0 else -whole
+
+    def __bool__(self) -> bool:
+        return self.halere != 0
+
+    def __str__(self) -> str:
+        return str(self.to_decimal())
+
+    def __repr__(self) -> str:
+        return f"Money('{self}')"
+
+    def __format__(self, spec: str) -> str:
+        return format(self.to_decimal(), spec)
+
+    # Aritmetika - obyčejná čísla jsou koruny
+    def __add__(self, other: Number) -> 'Money':
+        if other.__class__ is Money:
+            return Money(self.halere + other.halere)
+        other = _coerce(other)
+        return NotImplemented if other is None else Money(self.halere + other.halere)
+
+    def __radd__(self, other: Number) -> 'Money':
+        # sum() začíná od int 0
+        return self.__add__(other)
+
+    def __sub__(self, other: Number) -> 'Money':
+        if other.__class__ is Money:
+            return Money(self.halere - other.halere)
+        other = _coerce(other)
+        return NotImplemented if other is None else Money(self.halere - other.halere)
+
+    def __rsub__(self, other: Number) -> 'Money':
+        other = _coerce(other)
+        return NotImplemented if other is None else Money(other.halere - self.halere)
+
+    def __mul__(self, factor: Union[int, Decimal]) -> 'Money':
+        """Násobek (sazba, kurz) zaokrouhlený na haléře"""
+        if isinstance(factor, int) and not isinstance(factor, bool):
+            return Money(self.halere * factor)
+        if isinstance(factor, (Decimal, float)):
+            factor = factor if isinstance(factor, Decimal) else Decimal(repr(factor))
+            return Money(int((self.halere * factor).quantize(Decimal('1'), rounding=ROUND_HALF_UP)))
+        return NotImplemented
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, other: Union['Money', int, Decimal, float]) -> Union[Decimal, 'Money']:
+        """Poměr dvou částek (Decimal), nebo podíl číslem zaokrouhlený na haléře (Money)"""
+        if isinstance(other, Money):
+            return Decimal(self.halere) / Decimal(other.halere)
+        if isinstance(other, (int, Decimal, float)) and not isinstance(other, bool):
+            divisor = Decimal(repr(other)) if isinstance(other, float) else Decimal(other)
+            return Money(int((self.halere / divisor).quantize(Decimal('1'), rounding=ROUND_HALF_UP)))
+        return NotImplemented
+
+    def __round__(self, ndigits: Optional[int] = None) -> Union[int, 'Money']:
+        """round(m) = celé koruny (int), round(m, n) = Money na n desetinných míst; vždy ROUND_HALF_UP"""
+        places = 0 if ndigits is None else ndigits
+        if places >= 2:
+            return self
+        step = 10 ** (2 - places)
+        whole = (abs(self.halere) * 2 + step) // (2 * step)
+        rounded = whole if self.halere >= 0 else -whole
+        return rounded * (step // HALERE_PER_CZK) if ndigits is None else Money(rounded * step)
+
+    def __neg__(self) -> 'Money':
+        return Money(-self.halere)
+
+    def __pos__(self) -> 'Money':
+        return self
+
+    def __abs__(self) -> 'Money':
+        return Money(abs(self.halere))
+
+    # Porovnání
+    def _compare_key(self, other: Any):
+        if isinstance(other, Money):
+            return self.halere, other.halere
+        if isinstance(other, (int, Decimal, float)) and not isinstance(other, bool):
+            # Float přesně (Decimal(0.1) != 0.1) - stejně jako Decimal, jinak by nesouhlasil hash
+            return self.to_decimal(), other if not isinstance(other, float) else Decimal(other)
+        return None
+
+    def __eq__(self, other: Any) -> bool:
+        pair = self._compare_key(other)
+        return NotImplemented if pair is None else pair[0] == pair[1]
+
+    def __hash__(self) -> int:
+        # Stejný hash jako číselně rovný Decimal/int
+        return hash(self.to_decimal())
+
+    def __lt__(self, other: Any) -> bool:
+        pair = self._compare_key(other)
+        return NotImplemented if pair is None else pair[0] < pair[1]
+
+    def __le__(self, other: Any) -> bool:
+        pair = self._compare_key(other)
+        return NotImplemented if pair is None else pair[0] <= pair[1]
+
+    def __gt__(self, other: Any) -> bool:
+        pair = self._compare_key(other)
+        return NotImplemented if pair is None else pair[0] > pair[1]
+
+    def __ge__(self, other: Any) -> bool:
+        pair = self._compare_key(other)
+        return NotImplemented if pair is None else pair[0] >= pair[1]
+
+
+def _coerce(value: Any):
+    if isinstance(value, Money):
+        return value
+    if isinstance(value, (int, Decimal, float)) and not isinstance(value, bool):
+        return Money.of(value)
+    return None
+
+
+ZERO = Money(0)
+
+
+def json_default(value: Any) -> Any:
+    """default= pro json.dumps - Money a Decimal jako číslo v korunách"""
+    if isinstance(value, (Money, Decimal)):
+        return float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def json_dumps(value: Any, **kwargs) -> str:
+    """json.dumps, který zvládá Money (serializer pro JSON sloupce)"""
+    return json.dumps(value, default=json_default, **kwargs)
+
+
+try:
+    # Odpovědi FastAPI (jsonable_encoder) - Money jako číslo jako Decimal
+    from fastapi.encoders import ENCODERS_BY_TYPE
+    ENCODERS_BY_TYPE[Money] = float
+except ImportError:
+    pass
+
+
+class MoneyType(TypeDecorator):
+    """Sloupec s částkou v Kč - v databázi BIGINT haléřů, v Pythonu Money"""
+
+    impl = BigInteger
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return Money.of(value).halere
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        if not isinstance(value, int) and value != int(value):
+            # Sloupec je ještě NUMERIC v korunách - int() by částku tiše usekl
+            raise ValueError(f"Částka {value} není v celých haléřích - spusťte convert_money_to_halere.py")
+        return Money(value)
+
+    def coerce_compared_value(self, op, value):
+        # Literál v porovnání (amount_czk > 10000) jsou koruny - převede se na haléře
+        return self
+
+
+def money_sum(expression) -> Any:
+    """SUM částek jako Money (0 pro prázdnou množinu), celočíselně v databázi"""
+    return type_coerce(func.coalesce(func.sum(expression), 0), MoneyType())
@@ -1,53 +1,93 @@
-from decimal import Decimal, ROUND_HALF_UP
-from typing import Dict, Any, List, Optional
+from decimal import Decimal
+from typing import Dict, Any, List, Optional, Tuple
 import re
 import logging
 from datetime import datetime
 from dataclasses import dataclass
 
+from utils.money import Money, ZERO
+
 logger = logging.getLogger(__name__)
 
 @dataclass
 class VatResult:
     """Výsledek výpočtu DPH"""
-    base: Decimal  # základ daně
-    vat: Decimal   # výše DPH
+    base: Money    # základ daně
+    vat: Money     # výše DPH
     rate: int      # sazba DPH (21, 12, 0)
-    total: Decimal # celkem s DPH
+    total: Money   # celkem s DPH
     includes_vat: bool  # zda částka už obsahuje DPH
 
+VAT_TOTAL_FIELDS = (
+    'output_base_21', 'output_vat_21', 'output_base_12', 'output_vat_12', 'output_base_0',
+    'input_base_21', 'input_vat_21', 'input_base_12', 'input_vat_12', 'input_base_0',
+)
+
+
+def vat_columns(trans_type: str, rate: int) -> Optional[Tuple[str, Optional[str]]]:
+    """
+    Řádky souhrnu DPH pro typ transakce a sazbu
+    
+    Returns:
+        (sloupec základu, sloupec DPH nebo None u 0 %), None když se transakce do DPH nepočítá
+    """
+    prefix = {'income': 'output', 'expense': 'input'}.get(trans_type)
+    if prefix is None or rate not in (21, 12, 0):
+        return None
+    if rate == 0:
+        return f'{prefix}_base_0', None
+    return f'{prefix}_base_{rate}', f'{prefix}_vat_{rate}'
+
 @dataclass
 class VatPeriodData:
-    """Data DPH za období"""
+    """Data DPH za období (částky v haléřích jako Money)"""
     month: int
     year: int
     
     # Výstupy (prodeje)
-    output_base_21: Decimal = Decimal('0')
-    output_vat_21: Decimal = Decimal('0')
-    output_base_12: Decimal = Decimal('0')
-    output_vat_12: Decimal = Decimal('0')
-    output_base_0: Decimal = Decimal('0')
+    output_base_21: Money = ZERO
+    output_vat_21: Money = ZERO
+    output_base_12: Money = ZERO
+    output_vat_12: Money = ZERO
+    output_base_0: Money = ZERO
     
     # Vstupy (nákupy)
-    input_base_21: Decimal = Decimal('0')
-    input_vat_21: Decimal = Decimal('0')
-    input_base_12: Decimal = Decimal('0')
-    input_vat_12: Decimal = Decimal('0')
-    input_base_0: Decimal = Decimal('0')
+    input_base_21: Money = ZERO
+    input_vat_21: Money = ZERO
+    input_base_12: Money = ZERO
+    input_vat_12: Money = ZERO
+    input_base_0: Money = ZERO
+    
+    def __post_init__(self):
+        # Částky předané jako Decimal/int (koruny) převedeme na haléře
+        for field in VAT_TOTAL_FIELDS:
+            value = getattr(self, field)
+            if not isinstance(value, Money):
+                setattr(self, field, Money.of(value))
+    
+    def add(self, trans_type: str, rate: int, base: Money, vat: Money) -> None:
+        """Přičte základ a DPH do řádku podle typu (výstup/vstup) a sazby"""
+        columns = vat_columns(trans_type, rate)
+        if columns is None:
+            return
+        
+        base_column, vat_column = columns
+        setattr(self, base_column, getattr(self, base_column) + Money.of(base))
+        if vat_column:
+            setattr(self, vat_column, getattr(self, vat_column) + Money.of(vat))
     
     @property
-    def total_output_vat(self) -> Decimal:
+    def total_output_vat(self) -> Money:
         """Celková DPH na výstupu"""
         return self.output_vat_21 + self.output_vat_12
     
     @property
-    def total_input_vat(self) -> Decimal:
+    def total_input_vat(self) -> Money:
         """Celková DPH na vstupu (odpočet)"""
         return self.input_vat_21 + self.input_vat_12
     
     @property
-    def vat_liability(self) -> Decimal:
+    def vat_liability(self) -> Money:
         """Daň k zaplacení (+) nebo nadměrný odpočet (-)"""
         return self.total_output_vat - self.total_input_vat
 
@@ -117,10 +157,10 @@ class VatCalculator:
         if not is_vat_payer:
             # Neplátce DPH - žádné výpočty
             return VatResult(
-                base=amount,
-                vat=Decimal('0'),
+                base=Money.of(amount),
+                vat=ZERO,
                 rate=0,
-                total=amount,
+                total=Money.of(amount),
                 includes_vat=False
             )
         
@@ -130,19 +170,16 @@ class VatCalculator:
         # Detekce, zda částka obsahuje DPH
         includes_vat = self.detect_vat_inclusion(description, transaction_type)
         
+        amount = Money.of(amount)
         if includes_vat:
-            # Částka obsahuje DPH - vypočítáme základ
-            vat_multiplier = Decimal('1') + Decimal(str(vat_rate)) / Decimal('100')
-            vat_base = amount / vat_multiplier
+            # Částka obsahuje DPH - základ zaokrouhlený na haléře, DPH je zbytek
+            vat_multiplier = Decimal('1') + Decimal(vat_rate) / Decimal('100')
+            vat_base = Money.of(amount.to_decimal() / vat_multiplier)
             vat_amount = amount - vat_base
         else:
-            # Částka je bez DPH - připočítáme DPH
+            # Částka je bez DPH - připočítáme DPH (zaokrouhlení na haléře)
             vat_base = amount
-            vat_amount = amount * Decimal(str(vat_rate)) / Decimal('100')
-        
-        # Zaokrouhlení na haléře
-        vat_base = vat_base.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-        vat_amount = vat_amount.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+            vat_amount = amount * (Decimal(vat_rate) / Decimal('100'))
         total_amount = vat_base + vat_amount
         
         return VatResult(
@@ -196,7 +233,13 @@ class VatCalculator:
     
     def calculate_period_vat(self, transactions: List[Dict[str, Any]], 
                            month: int, year: int) -> VatPeriodData:
-        """Vypočítá DPH za celé období"""
+        """
+        Vypočítá DPH za celé období ze seznamu transakcí
+        
+        Transakce uložené v databázi sčítá přímo SQL dotaz
+        (app.services.vat_period.load_period_vat) - tohle je cesta pro
+        data, která v databázi nejsou (import, testy).
+        """
         period_data = VatPeriodData(month=month, year=year)
         
         for transaction in transactions:
@@ -209,31 +252,12 @@ class VatCalculator:
             if not vat_info:
                 continue
             
-            base = Decimal(str(vat_info.get('base', 0)))
-            vat = Decimal(str(vat_info.get('vat', 0)))
-            rate = vat_info.get('rate', 0)
-            trans_type = transaction.get('type')
-            
-            # Rozdělení podle typu a sazby
-            if trans_type == 'income':  # Výstupy
-                if rate == 21:
-                    period_data.output_base_21 += base
-                    period_data.output_vat_21 += vat
-                elif rate == 12:
-                    period_data.output_base_12 += base
-                    period_data.output_vat_12 += vat
-                elif rate == 0:
-                    period_data.output_base_0 += base
-            
-            elif trans_type == 'expense':  # Vstupy
-                if rate == 21:
-                    period_data.input_base_21 += base
-                    period_data.input_vat_21 += vat
-                elif rate == 12:
-                    period_data.input_base_12 += base
-                    period_data.input_vat_12 += vat
-                elif rate == 0:
-                    period_data.input_base_0 += base
+            period_data.add(
+                transaction.get('type'),
+                vat_info.get('rate', 0),
+                Money.of(vat_info.get('base', 0)),
+                Money.of(vat_info.get('vat', 0))
+            )
         
         return period_data
     
@@ -335,7 +359,7 @@ Chceš exportovat XML? Napiš "export dph" """
         
         return summary
     
-    def _format_amount(self, amount: Decimal) -> str:
+    def _format_amount(self, amount: Money) -> str:
         """Formátuje částku pro zobrazení"""
         return f"{amount:,.0f}".replace(",", " ")
     
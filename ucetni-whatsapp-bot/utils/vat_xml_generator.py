@@ -1,12 +1,208 @@
-import xml.etree.ElementTree as ET
-from datetime import datetime
-import xml.dom.minidom
-from typing import Dict, Any, List, Optional
+"""
+XML pro přiznání k DPH (DP3) a kontrolní hlášení (KH1)
+
+Soubory se zapisují proudově element po elementu (XmlStreamWriter) -
+kontrolní hlášení s desítkami tisíc řádků se nestaví celé v paměti
+jako strom, řádky se píšou tak, jak přicházejí (z databáze po dávkách).
+"""
+import io
 import logging
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Dict, Any, Iterable, List, Optional, TextIO
+from xml.sax.saxutils import escape, quoteattr
+
+from utils.money import Money, ZERO
 from utils.vat_calculator import VatPeriodData
 
 logger = logging.getLogger(__name__)
 
+# Doklad nad 10 000 Kč včetně DPH se v KH uvádí jednotlivě (A.4/B.2), ostatní souhrnně (A.5/B.3)
+KH_THRESHOLD = Money.of(10000)
+
+
+class XmlStreamWriter:
+    """Minimalistický proudový zápis XML s odsazením"""
+    
+    def __init__(self, out: TextIO, indent: str = "  "):
+        self.out = out
+        self.indent = indent
+        self._open: List[str] = []
+        out.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+    
+    def _tag(self, tag: str, attrs: Optional[Dict[str, str]]) -> str:
+        parts = [tag]
+        for name, value in (attrs or {}).items():
+            parts.append(f"{name}={quoteattr(str(value))}")
+        return " ".join(parts)
+    
+    def start(self, tag: str, attrs: Optional[Dict[str, str]] = None) -> None:
+        self.out.write(f"{self.indent * len(self._open)}<{self._tag(tag, attrs)}>\n")
+        self._open.append(tag)
+    
+    def element(self, tag: str, attrs: Optional[Dict[str, str]] = None, text: Optional[str] = None) -> None:
+        prefix = self.indent * len(self._open)
+        if text is None:
+            self.out.write(f"{prefix}<{self._tag(tag, attrs)}/>\n")
+        else:
+            self.out.write(f"{prefix}<{self._tag(tag, attrs)}>{escape(text)}</{tag}>\n")
+    
+    def end(self) -> None:
+        tag = self._open.pop()
+        self.out.write(f"{self.indent * len(self._open)}</{tag}>\n")
+    
+    def close_all(self) -> None:
+        while self._open:
+            self.end()
+
+
+@dataclass
+class KhDocument:
+    """Jeden doklad pro kontrolní hlášení (součet jeho transakcí)"""
+    type: str                       # income, expense
+    dic: Optional[str]
+    document_number: str
+    document_date: date
+    base_21: Money = ZERO
+    vat_21: Money = ZERO
+    base_12: Money = ZERO
+    vat_12: Money = ZERO
+    description: str = ''
+    
+    @property
+    def total(self) -> Money:
+        """Celkem včetně DPH - rozhoduje o limitu 10 000 Kč"""
+        return self.base_21 + self.vat_21 + self.base_12 + self.vat_12
+    
+    @property
+    def reported_individually(self) -> bool:
+        """Patří do A.4/B.2 (nad limitem a s DIČ protistrany)"""
+        return bool(self.dic) and self.total > KH_THRESHOLD
+
+
+def kh_documents(transactions: List[Dict[str, Any]]) -> List[KhDocument]:
+    """
+    Seskupí transakce ve tvaru vat_info na doklady podle typu, DIČ a čísla dokladu
+    
+    Stejné seskupení pro data v databázi dělá SQL
+    (app.services.vat_period.stream_kh_documents).
+    """
+    documents: Dict[tuple, KhDocument] = {}
+    for transaction in transactions:
+        vat_info = transaction.get('vat_info') or {}
+        rate = vat_info.get('rate')
+        if transaction.get('type') not in ('income', 'expense') or rate not in (21, 12):
+            continue
+        
+        dic = transaction.get('partner_vat_id') or None
+        number = transaction.get('document_number') or f"ID{transaction.get('id', len(documents) + 1)}"
+        when = transaction.get('created_at') or datetime.now()
+        key = (transaction['type'], dic, number)
+        if key not in documents:
+            documents[key] = KhDocument(
+                type=transaction['type'], dic=dic, document_number=number,
+                document_date=when.date() if isinstance(when, datetime) else when,
+                description=transaction.get('description') or ''
+            )
+        document = documents[key]
+        setattr(document, f'base_{rate}', getattr(document, f'base_{rate}') + Money.of(vat_info.get('base', 0)))
+        setattr(document, f'vat_{rate}', getattr(document, f'vat_{rate}') + Money.of(vat_info.get('vat', 0)))
+    
+    # Pořadí jako v KH: nejdřív přijatá plnění (A), potom uskutečněná (B)
+    return sorted(documents.values(), key=lambda d: (d.type, d.dic or '', d.document_number))
+
+
+class KontrolniHlaseniWriter:
+    """
+    Postupný zápis KH1: hlavička, řádky A.4, souhrn A.5, řádky B.2, souhrn B.3
+    
+    Souhrnné řádky A.5/B.3 jsou součty období minus jednotlivě uvedené
+    doklady, takže se doklady pod limitem vůbec nemusí načítat.
+    """
+    
+    def __init__(self, generator: 'VatXmlGenerator', out: TextIO, period_data: VatPeriodData):
+        self.generator = generator
+        self.writer = XmlStreamWriter(out)
+        self.period_data = period_data
+        self.rows = 0
+        self._section = 'A'
+        self._row_number = 0
+        self._reported = {'base_21': ZERO, 'vat_21': ZERO, 'base_12': ZERO, 'vat_12': ZERO}
+    
+    def begin(self) -> None:
+        self.writer.start("Pisemnost", self.generator._pisemnost_attrs("http://adis.mfcr.cz/rozhraniXML/dphkh1/"))
+        self.writer.start("DPHKH1")
+        
+        # VetaD - základní údaje
+        self.writer.element("VetaD", {
+            "d_poddp": datetime.now().strftime("%d.%m.%Y"),
+            "dokument": "KH1",
+            "khdph_forma": "B",  # Běžné kontrolní hlášení
+            "k_uladis": "DPH",
+            "mesic": str(self.period_data.month),
+            "rok": str(self.period_data.year)
+        })
+        
+        # VetaP - údaje o plátci
+        self.writer.element("VetaP", {
+            "dic": self.generator._get_user_value('dic'),
+            "jmeno": self.generator._get_user_value('first_name'),
+            "prijmeni": self.generator._get_user_value('last_name'),
+            "c_pop": self.generator._get_user_value('house_number', '1'),
+            "naz_obce": self.generator._get_user_value('city', 'Praha'),
+            "psc": self.generator._get_user_value('postal_code', '10000')
+        })
+    
+    def add(self, document: KhDocument) -> None:
+        """Řádek A.4 (výdaj) nebo B.2 (příjem) - doklady musí přijít výdaje napřed"""
+        if document.type == 'income' and self._section == 'A':
+            self._close_section()
+        
+        self._row_number += 1
+        attrs = {
+            "c_radku": str(self._row_number),
+            "dic_dodav" if document.type == 'expense' else "dic_odb": document.dic,
+            "c_evid_dd": document.document_number,
+            "d_uctpri": document.document_date.strftime("%d.%m.%Y")
+        }
+        attrs.update(self._amounts(document.base_21, document.vat_21, document.base_12, document.vat_12))
+        self.writer.element("VetaA4" if document.type == 'expense' else "VetaB2", attrs)
+        
+        for field in self._reported:
+            self._reported[field] += getattr(document, field)
+        self.rows += 1
+    
+    def finish(self) -> None:
+        if self._section == 'A':
+            self._close_section()
+        self._close_section()
+        self.writer.close_all()
+    
+    def _close_section(self) -> None:
+        """Souhrnný řádek A.5/B.3 za doklady pod limitem"""
+        prefix = 'input' if self._section == 'A' else 'output'
+        rest = {
+            field: getattr(self.period_data, f'{prefix}_{field}') - reported
+            for field, reported in self._reported.items()
+        }
+        attrs = self._amounts(rest['base_21'], rest['vat_21'], rest['base_12'], rest['vat_12'])
+        if attrs:
+            self.writer.element("VetaA5" if self._section == 'A' else "VetaB3", attrs)
+        
+        self._section = 'B' if self._section == 'A' else 'done'
+        self._row_number = 0
+        self._reported = {field: ZERO for field in self._reported}
+    
+    @staticmethod
+    def _amounts(base_21: Money, vat_21: Money, base_12: Money, vat_12: Money) -> Dict[str, str]:
+        attrs = {}
+        if base_21 > 0:
+            attrs.update({"zakl_dane1": str(int(base_21)), "dan1": str(int(vat_21))})
+        if base_12 > 0:
+            attrs.update({"zakl_dane2": str(int(base_12)), "dan2": str(int(vat_12))})
+        return attrs
+
+
 class VatXmlGenerator:
     """Generátor XML souborů pro DPH přiznání a kontrolní hlášení"""
     
@@ -36,19 +232,19 @@ class VatXmlGenerator:
         Returns:
             str: XML jako string
         """
+        out = io.StringIO()
+        self.write_dph_priznani(out, period_data)
+        return out.getvalue()
+    
+    def write_dph_priznani(self, out: TextIO, period_data: VatPeriodData) -> None:
+        """Zapíše přiznání k DPH (DP3) rovnou do výstupu (soubor, StringIO)"""
         try:
-            # Root element s hlavičkou
-            root = ET.Element("Pisemnost", {
-                "nazevSW": "ÚčetníBot",
-                "verzeSW": str(int(datetime.now().timestamp())),
-                "xmlns": "http://adis.mfcr.cz/rozhraniXML/dphdp3/"
-            })
-            
-            # Hlavní element pro DPH přiznání
-            dphdp3 = ET.SubElement(root, "DPHDP3")
+            writer = XmlStreamWriter(out)
+            writer.start("Pisemnost", self._pisemnost_attrs("http://adis.mfcr.cz/rozhraniXML/dphdp3/"))
+            writer.start("DPHDP3")
             
             # VetaD - základní údaje o přiznání
-            veta_d = ET.SubElement(dphdp3, "VetaD", {
+            writer.element("VetaD", {
                 "c_okec": self._get_user_value('okec_code'),
                 "d_poddp": datetime.now().strftime("%d.%m.%Y"),
                 "dapdph_forma": "B",  # Běžný plátce
@@ -60,7 +256,7 @@ class VatXmlGenerator:
             })
             
             # VetaP - údaje o plátci
-            veta_p = ET.SubElement(dphdp3, "VetaP", {
+            writer.element("VetaP", {
                 "c_ufo": self._get_user_value('tax_office_code'),
                 "c_pracufo": self._get_user_value('tax_office_workplace'),
                 "typ_ds": "F",  # Fyzická osoba
@@ -79,21 +275,21 @@ class VatXmlGenerator:
             
             # Řádek 1 - základní sazba 21%
             if period_data.output_base_21 > 0:
-                ET.SubElement(dphdp3, "Veta1", {
+                writer.element("Veta1", {
                     "zakl_dane1": str(int(period_data.output_base_21)),
                     "dan1": str(int(period_data.output_vat_21))
                 })
             
             # Řádek 2 - první snížená sazba 12%
             if period_data.output_base_12 > 0:
-                ET.SubElement(dphdp3, "Veta2", {
+                writer.element("Veta2", {
                     "zakl_dane2": str(int(period_data.output_base_12)),
                     "dan2": str(int(period_data.output_vat_12))
                 })
             
             # Řádek 3 - plnění osvobozená od daně (0%)
             if period_data.output_base_0 > 0:
-                ET.SubElement(dphdp3, "Veta6", {
+                writer.element("Veta6", {
                     "rez_plneni": str(int(period_data.output_base_0))
                 })
             
@@ -114,7 +310,7 @@ class VatXmlGenerator:
                     })
                 
                 if attrs:
-                    ET.SubElement(dphdp3, "Veta40", attrs)
+                    writer.element("Veta40", attrs)
             
             # VÝSLEDEK - daň k zaplacení nebo nadměrný odpočet
             
@@ -122,21 +318,21 @@ class VatXmlGenerator:
             
             if liability > 0:
                 # Řádek 62 - daň k zaplacení
-                ET.SubElement(dphdp3, "Veta62", {
+                writer.element("Veta62", {
                     "dan_zocelk": str(int(liability))
                 })
             elif liability < 0:
                 # Řádek 63 - nadměrný odpočet
-                ET.SubElement(dphdp3, "Veta63", {
+                writer.element("Veta63", {
                     "dano_zocelk": str(int(abs(liability)))
                 })
             else:
                 # Nulová daň - řádek 62 s hodnotou 0
-                ET.SubElement(dphdp3, "Veta62", {
+                writer.element("Veta62", {
                     "dan_zocelk": "0"
                 })
             
-            return self._prettify_xml(root)
+            writer.close_all()
             
         except Exception as e:
             logger.error(f"Chyba při generování DPH přiznání: {str(e)}")
@@ -154,123 +350,47 @@ class VatXmlGenerator:
         Returns:
             str: XML jako string
         """
+        out = io.StringIO()
+        documents = [d for d in kh_documents(transactions) if d.reported_individually]
+        self.write_kontrolni_hlaseni(out, period_data, documents)
+        return out.getvalue()
+    
+    def write_kontrolni_hlaseni(self, out: TextIO, period_data: VatPeriodData,
+                                documents: Iterable['KhDocument']) -> None:
+        """
+        Zapíše kontrolní hlášení (KH1) rovnou do výstupu
+        
+        Args:
+            documents: Doklady nad limitem s DIČ (A.4/B.2), nejdřív výdaje,
+                potom příjmy - stačí iterátor, nic se nedrží v paměti
+        """
         try:
-            # Root element
-            root = ET.Element("Pisemnost", {
-                "nazevSW": "ÚčetníBot",
-                "verzeSW": str(int(datetime.now().timestamp())),
-                "xmlns": "http://adis.mfcr.cz/rozhraniXML/dphkh1/"
-            })
-            
-            # Hlavní element pro kontrolní hlášení
-            dphkh1 = ET.SubElement(root, "DPHKH1")
-            
-            # VetaD - základní údaje
-            veta_d = ET.SubElement(dphkh1, "VetaD", {
-                "d_poddp": datetime.now().strftime("%d.%m.%Y"),
-                "dokument": "KH1",
-                "khdph_forma": "B",  # Běžné kontrolní hlášení
-                "k_uladis": "DPH",
-                "mesic": str(period_data.month),
-                "rok": str(period_data.year)
-            })
-            
-            # VetaP - údaje o plátci
-            veta_p = ET.SubElement(dphkh1, "VetaP", {
-                "dic": self._get_user_value('dic'),
-                "jmeno": self._get_user_value('first_name'),
-                "prijmeni": self._get_user_value('last_name'),
-                "c_pop": self._get_user_value('house_number', '1'),
-                "naz_obce": self._get_user_value('city', 'Praha'),
-                "psc": self._get_user_value('postal_code', '10000')
-            })
-            
-            # Sekce A - přijatá zdanitelná plnění (nákupy)
-            row_number_a = 1
-            for transaction in transactions:
-                if (transaction.get('type') == 'expense' and 
-                    transaction.get('vat_info', {}).get('vat', 0) > 0):
-                    
-                    vat_info = transaction['vat_info']
-                    partner_vat_id = transaction.get('partner_vat_id', '')
-                    
-                    if partner_vat_id and vat_info['vat'] > 0:
-                        attrs = {
-                            "c_radku": str(row_number_a),
-                            "dic_dodav": partner_vat_id,
-                            "c_evid_dd": transaction.get('document_number', f"DOK{row_number_a:04d}"),
-                            "d_uctpri": transaction.get('created_at', datetime.now()).strftime("%d.%m.%Y")
-                        }
-                        
-                        # Podle sazby DPH
-                        if vat_info['rate'] == 21:
-                            attrs.update({
-                                "zakl_dane1": str(int(vat_info['base'])),
-                                "dan1": str(int(vat_info['vat']))
-                            })
-                        elif vat_info['rate'] == 12:
-                            attrs.update({
-                                "zakl_dane2": str(int(vat_info['base'])),
-                                "dan2": str(int(vat_info['vat']))
-                            })
-                        
-                        ET.SubElement(dphkh1, "VetaA4", attrs)
-                        row_number_a += 1
-            
-            # Sekce B - uskutečněná zdanitelná plnění (prodeje)
-            row_number_b = 1
-            for transaction in transactions:
-                if (transaction.get('type') == 'income' and 
-                    transaction.get('vat_info', {}).get('vat', 0) > 0):
-                    
-                    vat_info = transaction['vat_info']
-                    partner_vat_id = transaction.get('partner_vat_id', '')
-                    
-                    if partner_vat_id and vat_info['vat'] > 0:
-                        attrs = {
-                            "c_radku": str(row_number_b),
-                            "dic_odb": partner_vat_id,
-                            "c_evid_dd": transaction.get('document_number', f"FAK{row_number_b:04d}"),
-                            "d_uctpri": transaction.get('created_at', datetime.now()).strftime("%d.%m.%Y")
-                        }
-                        
-                        # Podle sazby DPH
-                        if vat_info['rate'] == 21:
-                            attrs.update({
-                                "zakl_dane1": str(int(vat_info['base'])),
-                                "dan1": str(int(vat_info['vat']))
-                            })
-                        elif vat_info['rate'] == 12:
-                            attrs.update({
-                                "zakl_dane2": str(int(vat_info['base'])),
-                                "dan2": str(int(vat_info['vat']))
-                            })
-                        
-                        ET.SubElement(dphkh1, "VetaB2", attrs)
-                        row_number_b += 1
-            
-            return self._prettify_xml(root)
-            
+            writer = self.kontrolni_hlaseni_writer(out, period_data)
+            writer.begin()
+            for document in documents:
+                writer.add(document)
+            writer.finish()
         except Exception as e:
             logger.error(f"Chyba při generování kontrolního hlášení: {str(e)}")
             raise
     
+    def kontrolni_hlaseni_writer(self, out: TextIO, period_data: VatPeriodData) -> 'KontrolniHlaseniWriter':
+        """Writer KH1 pro postupné plnění (např. z databázového streamu)"""
+        return KontrolniHlaseniWriter(self, out, period_data)
+    
+    def _pisemnost_attrs(self, namespace: str) -> Dict[str, str]:
+        return {
+            "nazevSW": "ÚčetníBot",
+            "verzeSW": str(int(datetime.now().timestamp())),
+            "xmlns": namespace
+        }
+    
     def _clean_phone(self, phone: str) -> str:
         """Vyčistí telefonní číslo pro XML"""
         # Odstraní +420 prefix a mezery
         cleaned = phone.replace('+420', '').replace(' ', '').replace('-', '')
         return cleaned[:9]  # Max 9 číslic
     
-    def _prettify_xml(self, elem: ET.Element) -> str:
-        """Naformátuje XML pro čitelnost"""
-        rough_string = ET.tostring(elem, encoding='unicode')
-        reparsed = xml.dom.minidom.parseString(rough_string)
-        pretty_xml = reparsed.toprettyxml(indent="  ")
-        
-        # Odstraní prázdné řádky
-        lines = [line for line in pretty_xml.split('\n') if line.strip()]
-        return '\n'.join(lines)
-    
     def validate_before_export(self, period_data: VatPeriodData, 
                              transactions: List[Dict[str, Any]]) -> Dict[str, Any]:
         """
@@ -283,6 +403,28 @@ class VatXmlGenerator:
         Returns:
             Dict s výsledky validace
         """
+        missing_dic = [
+            d.description or d.document_number for d in kh_documents(transactions)
+            if not d.dic and d.total > KH_THRESHOLD
+        ]
+        missing_docs = [t for t in transactions 
+                       if t.get('vat_info', {}).get('vat', 0) > 0 
+                       and not t.get('document_number')]
+        
+        validation = self.validate_period(period_data, missing_dic, len(missing_docs))
+        validation['summary'] = f"Validováno {len(transactions)} transakcí za {period_data.month}/{period_data.year}"
+        return validation
+    
+    def validate_period(self, period_data: VatPeriodData, missing_dic: List[str],
+                        missing_document_numbers: int) -> Dict[str, Any]:
+        """
+        Validuje export z již spočítaných kontrol (pro data v databázi je dělá SQL)
+        
+        Args:
+            period_data: Souhrnná data za období
+            missing_dic: Popisy dokladů nad 10 000 Kč bez DIČ protistrany
+            missing_document_numbers: Počet transakcí s DPH bez čísla dokladu
+        """
         issues = []
         warnings = []
         
@@ -296,26 +438,15 @@ class VatXmlGenerator:
         if period_data.total_output_vat == 0 and period_data.total_input_vat == 0:
             issues.append("❌ Žádné DPH transakce za dané období")
         
-        # Kontrola transakcí nad 10 000 Kč pro kontrolní hlášení
-        high_value_transactions = []
-        for transaction in transactions:
-            vat_info = transaction.get('vat_info', {})
-            if vat_info.get('base', 0) > 10000:  # Nad 10k bez DPH
-                if not transaction.get('partner_vat_id'):
-                    high_value_transactions.append(transaction.get('description', 'Neznámá transakce'))
-        
-        if high_value_transactions:
-            issues.append(f"❌ {len(high_value_transactions)} transakce nad 10 000 Kč nemá DIČ dodavatele")
-            for desc in high_value_transactions[:3]:  # Zobraz max 3 příklady
+        # Kontrola dokladů nad 10 000 Kč pro kontrolní hlášení
+        if missing_dic:
+            issues.append(f"❌ {len(missing_dic)} dokladů nad 10 000 Kč nemá DIČ protistrany")
+            for desc in missing_dic[:3]:  # Zobraz max 3 příklady
                 warnings.append(f"• {desc}")
         
         # Kontrola čísel dokladů
-        missing_docs = [t for t in transactions 
-                       if t.get('vat_info', {}).get('vat', 0) > 0 
-                       and not t.get('document_number')]
-        
-        if missing_docs:
-            warnings.append(f"⚠️ {len(missing_docs)} dokladů nemá číslo")
+        if missing_document_numbers:
+            warnings.append(f"⚠️ {missing_document_numbers} dokladů nemá číslo")
         
         # Upozornění na neobvyklé hodnoty
         if period_data.vat_liability > 100000:
@@ -325,7 +456,7 @@ class VatXmlGenerator:
             'valid': len(issues) == 0,
             'issues': issues,
             'warnings': warnings,
-            'summary': f"Validováno {len(transactions)} transakcí za {period_data.month}/{period_data.year}"
+            'summary': f"Validováno období {period_data.month}/{period_data.year}"
         }
     
     def generate_export_summary(self, period_data: VatPeriodData, 